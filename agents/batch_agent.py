@@ -0,0 +1,933 @@
+"""
+Batch Agent
+Analiza múltiples competidores en paralelo como un pipeline de fases
+(extracción → scoring → validación → insights → persistencia) unidas por
+colas acotadas.
+Con una JobQueue el run es reanudable y repartible entre procesos.
+Las llamadas LLM, de embeddings y de scraping van al carril batch del
+scheduler, con el presupuesto del run y del dominio.
+"""
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+from infrastructure.scheduler import BATCH, BudgetExceeded, Scope, get_scheduler, scope
+from services.incremental_service import (
+    IncrementalAnalysisService,
+    current_source_urls,
+    domain_from_url,
+)
+
+
+@dataclass
+class BatchResult:
+    """Resultado del análisis de un competidor dentro de un batch"""
+    url: str
+    domain: str
+    success: bool = False
+    phase: str = "pendiente"
+    competitor_id: Optional[int] = None
+    error: Optional[str] = None
+    duration: float = 0.0
+    # full, delta o exact con INSIGHTS_REUSE (ver services/insights_reuse_service.py)
+    insights_mode: Optional[str] = None
+    # Totales del ValidationReport (ver services/validation_service.py)
+    validation: Optional[Dict[str, int]] = None
+    # Guardado sin insights por presupuesto (ver infrastructure/scheduler.py)
+    degraded: bool = False
+
+
+def read_urls(source: str) -> List[str]:
+    """
+    Lee URLs desde un archivo o desde stdin ("-").
+    Ignora líneas vacías, comentarios (#) y URLs duplicadas.
+    """
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+
+    urls = []
+    seen = set()
+    for line in lines:
+        url = line.strip()
+        if not url or url.startswith("#"):
+            continue
+        if not url.startswith(("http://", "https://")):
+            url = f"https://{url}"
+        if url in seen:
+            continue
+        seen.add(url)
+        urls.append(url)
+    return urls
+
+
+class _WorkItem:
+    """Estado de un competidor mientras avanza por el pipeline"""
+    __slots__ = ("index", "url", "result", "start", "competitor_data", "scores", "insights",
+                 "insights_reuse", "validation", "snapshot", "diff", "fingerprints", "embedding",
+                 "skipped", "resumed")
+
+    def __init__(self, index: int, url: str):
+        self.index = index
+        self.url = url
+        self.result = BatchResult(url=url, domain=domain_from_url(url))
+        self.start = time.monotonic()
+        self.competitor_data = None
+        self.scores = None
+        self.insights = None
+        self.insights_reuse = None
+        self.validation = None
+        self.snapshot = None
+        self.diff = None
+        # Modo incremental: fingerprints de las fuentes actuales (se calculan fuera del escritor)
+        self.fingerprints = None
+        # Índice vectorial: embeddings de la extracción, se insertan tras guardar
+        self.embedding = None
+        self.skipped = False
+        # Fase del último checkpoint desde el que se reanudó (cola persistente)
+        self.resumed = None
+
+
+_STOP = object()
+
+
+class BatchAgent:
+    """
+    Ejecuta FASE 1-4 como un pipeline en streaming.
+
+    Cada fase tiene su propio grupo de hilos y se comunica con la siguiente
+    mediante una cola acotada: el scraping de N+1 se solapa con el scoring
+    e insights de N, y cuando las fases LLM se retrasan la cola llena bloquea
+    a los navegadores (backpressure) en lugar de acumular páginas en memoria.
+    Un único escritor drena los resultados hacia BulkDBWriterAgent en lotes.
+
+    Con ``job_queue`` + ``run_id`` los competidores se toman de la cola con
+    lease, cada fase completada deja un checkpoint y un run interrumpido se
+    reanuda desde la última fase hecha de cada dominio.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        scrape_concurrency: Optional[int] = None,
+        llm_concurrency: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        incremental: bool = False,
+        dry_run: bool = False,
+        log_file: Optional[str] = None,
+        writer_factory: Optional[Callable[[], object]] = None,
+        job_queue=None,
+        run_id: Optional[str] = None,
+        worker_id: Optional[str] = None,
+        export: Optional[bool] = None,
+        validate: Optional[bool] = None,
+        llm_batch: Optional[bool] = None,
+    ):
+        self.scrape_concurrency = scrape_concurrency or workers or int(os.getenv("BATCH_SCRAPE_CONCURRENCY", "4"))
+        self.llm_concurrency = llm_concurrency or workers or int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+        self.queue_size = queue_size or int(os.getenv("BATCH_QUEUE_SIZE", "4"))
+        self.validation_concurrency = int(os.getenv("BATCH_VALIDATION_CONCURRENCY", "2"))
+        self.write_batch_size = int(os.getenv("DB_WRITE_BATCH_SIZE", "25"))
+        self.flush_seconds = float(os.getenv("DB_WRITE_FLUSH_SECONDS", "10"))
+        self.dry_run = dry_run
+        # Escritor con la interfaz save_batch(items) -> {dominio: id} (default: BulkDBWriterAgent)
+        self.writer_factory = writer_factory
+        self.logger = get_logger("BatchAgent", log_file)
+        self.incremental = IncrementalAnalysisService() if incremental else None
+        self.job_queue = job_queue
+        self.run_id = run_id
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        if job_queue is not None and not run_id:
+            raise ValueError("run_id es obligatorio con job_queue")
+        # Snapshot columnar (Parquet/Arrow) de lo que se persiste (default: ANALYTICS_EXPORT)
+        if export is None:
+            export = os.getenv("ANALYTICS_EXPORT", "false").lower() == "true"
+        self.exporter = None
+        if export:
+            from services.analytics_export_service import AnalyticsExporter
+            self.exporter = AnalyticsExporter(run_id=run_id)
+        # Etapa de validación de esquema y URLs de evidencia (default: VALIDATION_ENABLED)
+        if validate is None:
+            validate = os.getenv("VALIDATION_ENABLED", "true").lower() == "true"
+        self.validate = validate
+        # Scoring de varios competidores como un batch job (LLM_BATCH, sólo SCORING_MODE=single_call)
+        if llm_batch is None:
+            llm_batch = os.getenv("LLM_BATCH", "false").lower() == "true"
+        scoring_mode = os.getenv("SCORING_MODE", "per_attribute").lower()
+        if llm_batch and scoring_mode != "single_call":
+            self.logger.warning(f"⚠ LLM_BATCH requiere SCORING_MODE=single_call (actual: {scoring_mode}); desactivado")
+            llm_batch = False
+        self.llm_batch = llm_batch
+        self.llm_batch_size = int(os.getenv("LLM_BATCH_SIZE", "50"))
+        self.llm_batch_wait = float(os.getenv("LLM_BATCH_WAIT_SECONDS", "5"))
+        # Inserciones incrementales en el índice vectorial RAG (VECTOR_INDEX_ENABLED)
+        from services.context_index_service import get_context_indexer
+        self.indexer = get_context_indexer()
+        # Clave del presupuesto del run (BUDGET_RUN_*): el run_id o uno por llamada a run()
+        self._budget_run = run_id
+        self.scheduler = get_scheduler()
+
+        # Scoring e insights comparten el cupo de llamadas LLM simultáneas
+        self._llm_slots = threading.BoundedSemaphore(self.llm_concurrency)
+        self._stop = threading.Event()
+        self._progress_lock = threading.Lock()
+        self._done = 0
+        self._total = 0
+        self._results: List[Optional[BatchResult]] = []
+        # Dominios con lease de este worker (renovados por el heartbeat)
+        self._leased = set()
+        # Estado caliente de analyze(): agentes por hilo y escritor compartido
+        self._local = threading.local()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Fases
+    # ------------------------------------------------------------------
+
+    def _scrape(self, item: _WorkItem, local) -> bool:
+        if not hasattr(local, "scraper"):
+            from agents.scraper_agent import ScraperAgent
+            local.scraper = ScraperAgent()
+        if self.incremental:
+            item.result.phase = "revalidación"
+            item.snapshot = self.incremental.load_snapshot(item.result.domain)
+            if item.snapshot:
+                item.diff = self.incremental.diff_sources(item.snapshot)
+                if not item.diff.has_changes:
+                    item.result.phase = "sin cambios"
+                    item.skipped = True
+                    return True
+
+        item.result.phase = "extracción"
+        item.competitor_data = local.scraper.scrape(item.url)
+        if not item.competitor_data:
+            item.result.error = "No se pudieron extraer datos"
+            return False
+        item.result.domain = item.competitor_data.domain or item.result.domain
+        if item.snapshot:
+            self.incremental.add_current_sources(
+                item.diff, item.snapshot, current_source_urls(item.competitor_data)
+            )
+        self._fingerprint(item)
+        return True
+
+    def _fingerprint(self, item: _WorkItem):
+        """
+        Modo incremental: fingerprints de las fuentes actuales para el snapshot.
+        Descargar las fuentes desconocidas es I/O de red: se hace en las fases
+        con varios hilos, nunca en el escritor único.
+        """
+        if not self.incremental or item.fingerprints is not None:
+            return
+        known = item.diff.fingerprints if item.diff else None
+        item.fingerprints = self.incremental.fingerprint_sources(
+            current_source_urls(item.competitor_data), known=known
+        )
+
+    def _score(self, item: _WorkItem, local) -> bool:
+        if not hasattr(local, "scorer"):
+            from services.multi_attribute_scoring_service import build_scorer
+            local.scorer = build_scorer()
+        # Reanudado tras la extracción con un checkpoint sin fingerprints
+        self._fingerprint(item)
+        item.result.phase = "scoring"
+        if not self.scheduler.allows("scoring"):
+            item.result.error = "Presupuesto agotado"
+            return False
+        with self._llm_slots:
+            if item.snapshot:
+                attributes = self.incremental.attributes_to_rescore(item.snapshot, item.diff)
+                item.scores = self.incremental.rescore(
+                    local.scorer, item.competitor_data, item.snapshot, attributes
+                )
+            else:
+                item.scores = local.scorer.calculate_scores(item.competitor_data)
+        if not item.scores:
+            item.result.error = "No se pudieron calcular scores"
+            return False
+        return True
+
+    def _score_batch(self, items: List[_WorkItem], local):
+        """
+        Puntúa con un único batch job los competidores sin snapshot (los
+        incrementales re-puntúan sólo algunos atributos y van uno a uno).
+        """
+        if not hasattr(local, "scorer"):
+            from services.multi_attribute_scoring_service import build_scorer
+            local.scorer = build_scorer()
+        fresh = [item for item in items if not item.snapshot and item.scores is None]
+        if not fresh:
+            return
+        scopes = [Scope(lane=BATCH, run=self._budget_run, domain=domain_from_url(item.url)) for item in fresh]
+        for item in fresh:
+            item.result.phase = "scoring"
+        self.logger.info(f"📦 Scoring en batch: {len(fresh)} competidores")
+        try:
+            with metrics.phase("scoring"):
+                results = local.scorer.calculate_scores_many([item.competitor_data for item in fresh], scopes)
+        except Exception as e:
+            # Sin batch, cada competidor se puntúa por separado en _score_batched
+            self.logger.error(f"❌ Batch de scoring fallido: {e}", exc_info=True)
+            return
+        for item, scores in zip(fresh, results):
+            item.scores = scores
+
+    def _score_batched(self, item: _WorkItem, local) -> bool:
+        """Tras el batch job: los que no obtuvieron scores válidos se puntúan uno a uno"""
+        if item.scores is None:
+            return self._score(item, local)
+        self._fingerprint(item)
+        return True
+
+    def _batch_score_worker(self, in_q: queue.Queue, out_q: queue.Queue):
+        """
+        Etapa de scoring con LLM_BATCH: acumula hasta LLM_BATCH_SIZE
+        competidores (o los que lleguen antes de LLM_BATCH_WAIT_SECONDS sin
+        nuevos) y los envía como un solo batch job.
+        """
+        local = threading.local()
+        pending: List[_WorkItem] = []
+        stopping = False
+        while not stopping:
+            try:
+                item = in_q.get(timeout=self.llm_batch_wait if pending else None)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif item is not None and not self._stop.is_set():
+                pending.append(item)
+            if pending and (stopping or item is None or len(pending) >= self.llm_batch_size):
+                if not self._stop.is_set():
+                    self._score_batch(pending, local)
+                for batched in pending:
+                    if self._stop.is_set():
+                        break
+                    self._process("scoring", self._score_batched, batched, local, out_q)
+                pending = []
+
+    def _validate(self, item: _WorkItem, local) -> bool:
+        """Informe de validación; en modo enforce puede anular scores sin evidencia válida"""
+        if not hasattr(local, "validator"):
+            from services.validation_service import ValidationService
+            local.validator = ValidationService()
+        item.result.phase = "validación"
+        item.validation = local.validator.validate(item.competitor_data, item.scores)
+        item.result.validation = item.validation.totals()
+        if item.validation.issues:
+            local.validator.log_report(item.validation)
+        return True
+
+    def _insights(self, item: _WorkItem, local) -> bool:
+        if not hasattr(local, "insights_agent"):
+            from services.insights_reuse_service import build_insights_generator
+            local.insights_agent = build_insights_generator()
+        self._embed(item)
+        item.result.phase = "insights"
+        if item.snapshot and not self.incremental.needs_insights(
+            item.snapshot, item.competitor_data, item.scores
+        ):
+            item.insights = item.snapshot.insights
+            return True
+        if not self.scheduler.allows("insights"):
+            return self._degrade(item)
+        try:
+            with self._llm_slots:
+                item.insights = local.insights_agent.generate_insights(item.competitor_data, item.scores)
+        except BudgetExceeded:
+            return self._degrade(item)
+        item.insights_reuse = getattr(local.insights_agent, "last_reuse", None)
+        if item.insights_reuse:
+            item.result.insights_mode = item.insights_reuse.mode
+        if not item.insights:
+            item.result.error = "No se pudieron generar insights"
+            return False
+        return True
+
+    def _embed(self, item: _WorkItem):
+        """Embeddings de la extracción para el índice vectorial; un fallo no afecta al análisis"""
+        if self.indexer is None or item.embedding is not None:
+            return
+        try:
+            item.embedding = self.indexer.embed(item.competitor_data)
+        except Exception as e:
+            metrics.inc("context_index_errors_total")
+            self.logger.warning(f"⚠ {item.result.domain}: no se pudo embeber la extracción: {e}")
+
+    def _degrade(self, item: _WorkItem) -> bool:
+        """Presupuesto cerca del límite: se guardan los scores sin insights (la BD conserva los anteriores)"""
+        item.insights = None
+        item.result.degraded = True
+        metrics.inc("budget_degraded_total", phase="insights")
+        self.logger.warning(f"⚠ {item.result.domain}: presupuesto cerca del límite, se guarda sin insights")
+        return True
+
+    def _flush(self, writer, items: List[_WorkItem]):
+        """Persiste un lote completo en una transacción (BulkDBWriterAgent)"""
+        for item in items:
+            item.result.phase = "persistencia"
+        try:
+            with metrics.phase("persistence"):
+                ids = writer.save_batch([(i.competitor_data, i.scores, i.insights) for i in items])
+        except Exception as e:
+            if len(items) > 1:
+                # Un competidor problemático no debe tumbar a los otros del lote (rollback completo)
+                self.logger.warning(f"⚠ Error al guardar lote de {len(items)} competidores ({e}); "
+                                    f"reintentando uno a uno")
+                metrics.inc("db_batch_fallbacks_total")
+                for item in items:
+                    self._flush_safely(writer, [item])
+                return
+            self.logger.error(f"❌ Error al guardar lote de {len(items)} competidores: {e}", exc_info=True)
+            for item in items:
+                self.logger.log_db_save(item.competitor_data.domain, None, False)
+                item.result.error = f"{type(e).__name__}: {e}"
+                self._finish(item, False)
+            return
+
+        saved = []
+        for item in items:
+            domain = item.competitor_data.domain
+            competitor_id = ids.get(domain)
+            self.logger.log_db_save(domain, competitor_id, bool(competitor_id))
+            if not competitor_id:
+                item.result.error = "No se pudo guardar competidor"
+                self._finish(item, False)
+                continue
+            item.result.competitor_id = competitor_id
+            try:
+                self._save_snapshot(item)
+            except Exception as e:
+                # Sólo falla este competidor: el resto del lote ya está guardado
+                self.logger.error(f"❌ {domain}: error tras guardar: {e}", exc_info=True)
+                item.result.error = f"{type(e).__name__}: {e}"
+                self._finish(item, False)
+                continue
+            saved.append(item)
+        # Antes de _finish, que libera los datos del competidor
+        self._export(saved, ids)
+        self._index_context(saved)
+        for item in saved:
+            self._finish(item, True)
+
+    def _flush_safely(self, writer, items: List[_WorkItem]):
+        """
+        ``_flush`` sin dejar caer al escritor: es el único hilo que drena la cola
+        de persistencia y, si muere, las fases anteriores se bloquean en put().
+        Los competidores del lote que quedaran sin cerrar se marcan como fallidos.
+        """
+        try:
+            self._flush(writer, items)
+        except Exception as e:
+            self.logger.error(f"❌ Error inesperado al persistir un lote: {e}", exc_info=True)
+            for item in items:
+                with self._progress_lock:
+                    finished = self._results[item.index] is not None
+                if not finished:
+                    item.result.error = item.result.error or f"{type(e).__name__}: {e}"
+                    try:
+                        self._finish(item, False)
+                    except Exception:
+                        self.logger.error(f"❌ No se pudo cerrar {item.result.domain}", exc_info=True)
+
+    def _save_snapshot(self, item: _WorkItem):
+        """Modo incremental: guarda fingerprints y resultados como referencia del próximo run"""
+        if not self.incremental:
+            return
+        # Calculados en extracción/scoring; sin red aquí (hilo del escritor)
+        fingerprints = item.fingerprints
+        if fingerprints is None:
+            fingerprints = item.diff.fingerprints if item.diff else {}
+        self.incremental.save_snapshot(item.competitor_data, item.scores, item.insights, fingerprints)
+
+    def _export(self, items: List[_WorkItem], ids: Dict[str, int]):
+        """Añade el lote persistido al snapshot analítico; un fallo no afecta al análisis"""
+        if self.exporter is None or not items:
+            return
+        try:
+            self.exporter.export_batch([(i.competitor_data, i.scores, i.insights) for i in items], ids)
+        except Exception as e:
+            metrics.inc("analytics_export_errors_total")
+            self.logger.error(f"❌ Error al exportar snapshot analítico de {len(items)} competidores: {e}",
+                              exc_info=True)
+
+    def _index_context(self, items: List[_WorkItem]):
+        """Inserta en el índice vectorial las extracciones ya persistidas"""
+        if self.indexer is None:
+            return
+        for item in items:
+            if item.embedding is None:
+                continue
+            try:
+                self.indexer.add(item.embedding, item.result.competitor_id)
+            except Exception as e:
+                metrics.inc("context_index_errors_total")
+                self.logger.error(f"❌ {item.result.domain}: error al indexar la extracción: {e}", exc_info=True)
+
+    def _make_writer(self):
+        if self.writer_factory is None:
+            from agents.bulk_db_writer_agent import BulkDBWriterAgent
+            self.writer_factory = BulkDBWriterAgent
+        return self.writer_factory()
+
+    def _writer_worker(self, in_q: queue.Queue):
+        """
+        Escritor único: agrupa resultados en lotes de DB_WRITE_BATCH_SIZE y
+        los persiste cuando el lote se llena o tras DB_WRITE_FLUSH_SECONDS sin
+        nuevos resultados.
+        """
+        writer = None if self.dry_run else self._make_writer()
+        pending: List[_WorkItem] = []
+        while True:
+            try:
+                item = in_q.get(timeout=self.flush_seconds if pending else None)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                if pending:
+                    self._flush_safely(writer, pending)
+                return
+            if item is not None:
+                if self._stop.is_set():
+                    continue
+                if self.dry_run:
+                    self._finish(item, True)
+                    continue
+                pending.append(item)
+
+            if pending and (item is None or len(pending) >= self.write_batch_size):
+                self._flush_safely(writer, pending)
+                pending = []
+
+    # ------------------------------------------------------------------
+    # Análisis individual (servicio HTTP)
+    # ------------------------------------------------------------------
+
+    def analyze(
+        self, url: str, on_phase: Optional[Callable[[str, str], None]] = None
+    ) -> Tuple[BatchResult, Optional[Dict]]:
+        """
+        Analiza una URL de forma síncrona con las mismas fases que el pipeline,
+        reutilizando los agentes del hilo y el escritor del proceso entre
+        llamadas (estado caliente). ``on_phase(fase, estado)`` recibe
+        "started", "done" o "failed" de cada fase.
+
+        Devuelve el resultado y, si tuvo éxito, competitor_data/scores/insights.
+        """
+        notify = on_phase or (lambda phase, status: None)
+        item = _WorkItem(0, url)
+        # Carril y run los fija quien llama (p. ej. el job de la API)
+        domain = domain_from_url(url)
+        with scope(domain=domain) as current:
+            try:
+                return self._analyze(item, notify)
+            finally:
+                self.scheduler.forget(current.run, domain)
+
+    def _analyze(self, item: _WorkItem, notify: Callable[[str, str], None]) -> Tuple[BatchResult, Optional[Dict]]:
+        stages = [("extraction", self._scrape), ("scoring", self._score), ("insights", self._insights)]
+        if self.validate:
+            stages.insert(2, ("validation", self._validate))
+        for name, stage in stages:
+            notify(name, "started")
+            try:
+                with metrics.phase(name):
+                    ok = stage(item, self._local)
+            except Exception as e:
+                item.result.error = f"{type(e).__name__}: {e}"
+                self.logger.error(f"❌ {item.result.domain} falló en {item.result.phase}: {e}", exc_info=True)
+                ok = False
+            if not ok:
+                notify(name, "failed")
+                return self._single_result(item, False), None
+            notify(name, "done")
+            if item.skipped:
+                item.scores = item.snapshot.scores
+                item.insights = item.snapshot.insights
+                break
+
+        if not self.dry_run and not item.skipped:
+            notify("persistence", "started")
+            item.result.phase = "persistencia"
+            try:
+                with self._writer_lock:
+                    if self._writer is None:
+                        self._writer = self._make_writer()
+                with metrics.phase("persistence"):
+                    ids = self._writer.save_batch([(item.competitor_data, item.scores, item.insights)])
+                item.result.competitor_id = ids.get(item.competitor_data.domain)
+                if not item.result.competitor_id:
+                    raise RuntimeError("No se pudo guardar competidor")
+                self._save_snapshot(item)
+            except Exception as e:
+                item.result.error = f"{type(e).__name__}: {e}"
+                self.logger.error(f"❌ Error al guardar {item.result.domain}: {e}", exc_info=True)
+                notify("persistence", "failed")
+                return self._single_result(item, False), None
+            notify("persistence", "done")
+            self._export([item], ids)
+            self._index_context([item])
+
+        data = {"competitor_data": item.competitor_data, "scores": item.scores, "insights": item.insights}
+        if item.insights_reuse:
+            data["insights_reuse"] = item.insights_reuse.to_dict()
+        if item.validation:
+            data["validation"] = item.validation.to_dict()
+        if item.result.degraded:
+            data["degraded"] = True
+        return self._single_result(item, True), data
+
+    def _single_result(self, item: _WorkItem, success: bool) -> BatchResult:
+        """Cierra el BatchResult de un competidor y registra su duración"""
+        result = item.result
+        result.success = success
+        if success and not item.skipped:
+            result.phase = "completado"
+        result.duration = time.monotonic() - item.start
+        metrics.observe("competitor_seconds", result.duration,
+                        status="skipped" if item.skipped else str(success).lower())
+        return result
+
+    # ------------------------------------------------------------------
+    # Cola persistente (runs reanudables)
+    # ------------------------------------------------------------------
+
+    def _checkpoint(self, item: _WorkItem, phase: str):
+        """Guarda el estado del competidor tras ``phase`` (extracción, scoring o insights)"""
+        payload = {
+            "domain": item.result.domain,
+            "competitor_data": item.competitor_data,
+            "scores": item.scores,
+            "insights": item.insights,
+            "diff": item.diff,
+            "fingerprints": item.fingerprints,
+        }
+        try:
+            if not self.job_queue.checkpoint(self.run_id, domain_from_url(item.url), self.worker_id, phase, payload):
+                self.logger.warning(f"⚠ {item.result.domain}: lease perdido, otro worker retomará el job")
+        except Exception as e:
+            # Sin checkpoint el job se repite desde la fase anterior al reanudar
+            self.logger.warning(f"⚠ No se pudo guardar el checkpoint de {item.result.domain} ({phase}): {e}")
+
+    def _close_job(self, item: _WorkItem, success: bool):
+        domain = domain_from_url(item.url)
+        try:
+            if success:
+                self.job_queue.complete(self.run_id, domain, self.worker_id, item.result.competitor_id)
+            else:
+                self.job_queue.fail(self.run_id, domain, self.worker_id,
+                                    f"[{item.result.phase}] {item.result.error}")
+        except Exception as e:
+            self.logger.warning(f"⚠ No se pudo cerrar el job de {domain}: {e}")
+        with self._progress_lock:
+            self._leased.discard(domain)
+
+    def _resume(self, job) -> _WorkItem:
+        """WorkItem de un job, con los datos de su último checkpoint si lo hay"""
+        item = _WorkItem(job.position, job.url)
+        payload = self.job_queue.load_checkpoint(self.run_id, job.domain, job.phase) if job.phase else None
+        if payload:
+            item.resumed = job.phase
+            item.result.domain = payload.get("domain") or item.result.domain
+            item.competitor_data = payload.get("competitor_data")
+            item.scores = payload.get("scores")
+            item.insights = payload.get("insights")
+            item.diff = payload.get("diff")
+            item.fingerprints = payload.get("fingerprints")
+            if self.incremental and item.diff is not None:
+                item.snapshot = self.incremental.load_snapshot(item.result.domain)
+            metrics.inc("jobs_resumed_total", phase=job.phase)
+        return item
+
+    def _reclaim_dead_workers(self):
+        """
+        Libera los leases de workers de esta máquina cuyo proceso ya no existe
+        (kill -9, OOM, reinicio): relanzar el run los retoma de inmediato en
+        vez de esperar JOB_LEASE_SECONDS. Los de otras máquinas caducan solos.
+        """
+        host = socket.gethostname()
+        for owner in self.job_queue.owners(self.run_id):
+            owner_host, _, rest = owner.partition(":")
+            pid = rest.split(":", 1)[0]
+            if owner_host != host or not pid.isdigit() or owner == self.worker_id:
+                continue
+            try:
+                os.kill(int(pid), 0)
+                continue
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                continue
+            reclaimed = self.job_queue.reclaim(self.run_id, owner)
+            if reclaimed:
+                self.logger.info(f"↻ {reclaimed} jobs recuperados del worker caído {owner}")
+
+    def _heartbeat(self, stop: threading.Event):
+        """Renueva los leases de este worker cada tercio de JOB_LEASE_SECONDS"""
+        while not stop.wait(self.job_queue.lease_seconds / 3):
+            with self._progress_lock:
+                domains = list(self._leased)
+            try:
+                lost = self.job_queue.extend(self.run_id, self.worker_id, domains)
+            except Exception as e:
+                self.logger.warning(f"⚠ No se pudieron renovar los leases: {e}")
+                continue
+            if lost:
+                self.logger.warning(f"⚠ Leases perdidos ({len(lost)}): {', '.join(lost[:5])}")
+
+    def _feed_jobs(self, targets: Dict[Optional[str], queue.Queue]):
+        """
+        Toma jobs de la cola en lotes pequeños (el put bloqueante mantiene el
+        backpressure) y los envía a la fase siguiente a su último checkpoint
+        (``targets``: fase del checkpoint → cola; None = sin checkpoint).
+        Termina cuando no quedan jobs disponibles para este worker.
+        """
+        while not self._stop.is_set():
+            jobs = self.job_queue.lease(self.run_id, self.worker_id, limit=self.queue_size)
+            if not jobs:
+                return
+            with self._progress_lock:
+                self._leased.update(job.domain for job in jobs)
+            for job in jobs:
+                item = self._resume(job)
+                if item.resumed:
+                    self.logger.info(f"  ↻ {item.result.domain}: reanudado tras {item.resumed}")
+                targets[item.resumed].put(item)
+
+    def _release_jobs(self):
+        """Ctrl-C: devuelve a la cola los jobs en curso (sus checkpoints se conservan)"""
+        with self._progress_lock:
+            domains = list(self._leased)
+            self._leased.clear()
+        if domains:
+            try:
+                self.job_queue.release(self.run_id, self.worker_id, domains)
+                self.logger.warning(f"⚠ {len(domains)} jobs devueltos a la cola; reanudar con --run-id {self.run_id}")
+            except Exception as e:
+                self.logger.warning(f"⚠ No se pudieron liberar los jobs (se liberarán al caducar el lease): {e}")
+
+    # ------------------------------------------------------------------
+    # Infraestructura del pipeline
+    # ------------------------------------------------------------------
+
+    def _finish(self, item: _WorkItem, success: bool):
+        """Registra el resultado final de un competidor (éxito o fallo)"""
+        result = self._single_result(item, success)
+        if self.job_queue is not None:
+            self._close_job(item, success)
+        self.scheduler.forget(self._budget_run, domain_from_url(item.url))
+        # Liberar datos intermedios lo antes posible
+        item.competitor_data = item.scores = item.insights = None
+        item.validation = item.snapshot = item.diff = item.fingerprints = item.embedding = None
+
+        with self._progress_lock:
+            self._results[item.index] = result
+            self._done += 1
+            done = self._done
+        status = "✓" if success else "❌"
+        self.logger.info(f"  [{done}/{self._total}] {status} {result.domain} ({result.duration:.1f}s)")
+
+    def _process(self, name: str, stage, item: _WorkItem, local, out_q: queue.Queue):
+        """Ejecuta ``stage`` sobre ``item`` y lo entrega a la fase siguiente o lo cierra"""
+        try:
+            with scope(lane=BATCH, run=self._budget_run, domain=domain_from_url(item.url)):
+                with metrics.phase(name):
+                    ok = stage(item, local)
+        except Exception as e:
+            item.result.error = f"{type(e).__name__}: {e}"
+            self.logger.error(f"❌ {item.result.domain} falló en {item.result.phase}: {e}", exc_info=True)
+            ok = False
+
+        if not ok:
+            self._finish(item, False)
+        elif item.skipped:
+            self._finish(item, True)
+        else:
+            if self.job_queue is not None:
+                self._checkpoint(item, name)
+            # Bloquea si la fase siguiente va retrasada (backpressure)
+            out_q.put(item)
+
+    def _stage_worker(self, name: str, stage, in_q: queue.Queue, out_q: queue.Queue):
+        local = threading.local()
+        while True:
+            item = in_q.get()
+            if item is _STOP:
+                return
+            if self._stop.is_set():
+                continue
+            self._process(name, stage, item, local, out_q)
+
+    def _start_stage(self, name: str, stage, in_q, out_q, workers: int) -> List[threading.Thread]:
+        threads = []
+        for i in range(workers):
+            t = threading.Thread(
+                target=self._stage_worker,
+                args=(name, stage, in_q, out_q),
+                name=f"{name}-{i}",
+                daemon=True,
+            )
+            t.start()
+            threads.append(t)
+        return threads
+
+    def run(self, urls: Iterable[str] = ()) -> List[BatchResult]:
+        """
+        Analiza todas las URLs y devuelve los resultados en el orden de entrada.
+        Con cola persistente las URLs se añaden al run (puede ser vacío para
+        sumarse como worker a un run existente) y sólo se devuelven los
+        resultados procesados por este worker.
+        """
+        urls = list(urls)
+        self._done = 0
+        self._stop.clear()
+        self._budget_run = self.run_id or f"batch-{uuid.uuid4().hex[:8]}"
+        if self.job_queue is not None:
+            added = self.job_queue.enqueue(self.run_id, urls) if urls else 0
+            self._reclaim_dead_workers()
+            progress = self.job_queue.progress(self.run_id)
+            self._total = progress["pending"] + progress["leased"]
+            self._results = [None] * self.job_queue.size(self.run_id)
+            self.logger.info(
+                f"🗂 RUN {self.run_id} | worker {self.worker_id} | {added} nuevos | "
+                f"pendientes={progress['pending']} en curso={progress['leased']} "
+                f"hechos={progress['done']} fallidos={progress['failed']}"
+            )
+        else:
+            self._total = len(urls)
+            self._results = [None] * len(urls)
+        self.logger.info(
+            f"🚀 BATCH | {self._total} URLs | scrape={self.scrape_concurrency} "
+            f"llm={self.llm_concurrency} validación={self.validation_concurrency if self.validate else 'off'} "
+            f"cola={self.queue_size} writer=1" + (f" | scoring en batch de {self.llm_batch_size}" if self.llm_batch else "")
+        )
+        if self._total:
+            from infrastructure.llm_client import warm_up_llm
+            # El modelo local se carga mientras se extraen las primeras páginas
+            warm_up_llm()
+
+        scrape_q = queue.Queue(maxsize=self.queue_size)
+        score_q = queue.Queue(maxsize=self.queue_size)
+        insights_q = queue.Queue(maxsize=self.queue_size)
+        write_q = queue.Queue(maxsize=self.queue_size)
+        # Sin validación el scoring entrega directamente a insights
+        validate_q = queue.Queue(maxsize=self.queue_size) if self.validate else insights_q
+
+        writer = threading.Thread(target=self._writer_worker, args=(write_q,), name="writer", daemon=True)
+        writer.start()
+        # (cola de entrada, hilos que la consumen)
+        stages = [
+            (scrape_q, self._start_stage("extraction", self._scrape, scrape_q, score_q, self.scrape_concurrency)),
+        ]
+        if self.llm_batch:
+            scorer = threading.Thread(target=self._batch_score_worker, args=(score_q, validate_q),
+                                      name="scoring-batch", daemon=True)
+            scorer.start()
+            stages.append((score_q, [scorer]))
+        else:
+            stages.append((score_q, self._start_stage("scoring", self._score, score_q, validate_q,
+                                                      self.llm_concurrency)))
+        if self.validate:
+            stages.append((validate_q, self._start_stage("validation", self._validate, validate_q, insights_q,
+                                                         self.validation_concurrency)))
+        stages += [
+            (insights_q, self._start_stage("insights", self._insights, insights_q, write_q, self.llm_concurrency)),
+            (write_q, [writer]),
+        ]
+
+        heartbeat_stop = threading.Event()
+        if self.job_queue is not None:
+            threading.Thread(target=self._heartbeat, args=(heartbeat_stop,), name="lease-heartbeat",
+                             daemon=True).start()
+        try:
+            if self.job_queue is not None:
+                self._feed_jobs({None: scrape_q, "extraction": score_q, "scoring": validate_q,
+                                 "validation": insights_q, "insights": write_q})
+            else:
+                for i, url in enumerate(urls):
+                    scrape_q.put(_WorkItem(i, url))
+            # Cierre ordenado: cuando una fase termina se detiene la siguiente
+            for in_q, stage_threads in stages:
+                for _ in stage_threads:
+                    in_q.put(_STOP)
+                for t in stage_threads:
+                    t.join()
+        except KeyboardInterrupt:
+            self._stop.set()
+            if self.job_queue is not None:
+                self._release_jobs()
+            raise
+        finally:
+            heartbeat_stop.set()
+        if self.indexer is not None:
+            try:
+                self.indexer.save()
+            except Exception as e:
+                self.logger.error(f"❌ No se pudo guardar el índice vectorial: {e}", exc_info=True)
+
+        if self.job_queue is not None:
+            return [r for r in self._results if r is not None]
+        return self._results
+
+    def print_summary(self, results: List[BatchResult]):
+        """Muestra el resumen por dominio al final del batch"""
+        ok = [r for r in results if r.success]
+        failed = [r for r in results if not r.success]
+
+        self.logger.info("\n" + "=" * 80)
+        self.logger.info("📋 RESUMEN DEL BATCH")
+        self.logger.info("=" * 80)
+        for r in results:
+            if r.success:
+                if r.phase == "sin cambios":
+                    detail = "sin cambios"
+                else:
+                    detail = f"ID: {r.competitor_id}" if r.competitor_id else "dry-run"
+                    if r.degraded:
+                        detail += " (sin insights)"
+                self.logger.info(f"  ✓ {r.domain:<40} {r.duration:>7.1f}s  {detail}")
+            else:
+                self.logger.info(f"  ❌ {r.domain:<40} {r.duration:>7.1f}s  [{r.phase}] {r.error}")
+        self.logger.info("=" * 80)
+        self.logger.info(f"Éxitos: {len(ok)} | Fallos: {len(failed)} | Total: {len(results)}")
+        modes = [r.insights_mode for r in results if r.insights_mode]
+        if modes:
+            self.logger.info(
+                f"Insights: {modes.count('full')} generados | {modes.count('delta')} adaptados (delta) | "
+                f"{modes.count('exact')} reutilizados"
+            )
+        validated = [r.validation for r in results if r.validation]
+        if validated:
+            errors = sum(1 for v in validated if v["errors"])
+            self.logger.info(
+                f"Validación: {errors}/{len(validated)} con errores | "
+                f"{sum(v['urls_broken'] for v in validated)} URLs rotas de {sum(v['urls_checked'] for v in validated)} | "
+                f"{sum(v['scores_nulled'] for v in validated)} scores anulados"
+            )
+        budget = self.scheduler.run_budget(self._budget_run) if self._budget_run else None
+        degraded = sum(1 for r in results if r.degraded)
+        if budget or degraded:
+            usage = budget.snapshot() if budget else {}
+            self.logger.info(
+                f"Presupuesto: {degraded} sin insights | {usage.get('tokens', 0)} tokens | "
+                f"${usage.get('cost_usd', 0):.4f} ({usage.get('usage', 0):.0%} del límite del run)"
+            )
+        if self.job_queue is not None:
+            progress = self.job_queue.progress(self.run_id)
+            self.logger.info(
+                f"Run {self.run_id}: hechos={progress['done']} fallidos={progress['failed']} "
+                f"pendientes={progress['pending']} en curso={progress['leased']}"
+            )
+        self.logger.info("=" * 80)
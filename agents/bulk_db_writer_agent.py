@@ -0,0 +1,243 @@
+"""
+Bulk DB Writer Agent
+Persiste lotes de competidores con INSERT ... ON CONFLICT en una sola
+transacción por lote: competidores, scores por atributo, fuentes y productos,
+más una fila por análisis en el histórico de scores (SCORE_HISTORY).
+
+Pensado para sweeps de cientos de dominios contra una BD remota, donde la
+latencia de ida y vuelta domina: el número de round trips es constante por
+lote (una sentencia por tabla) en lugar de proporcional a las filas.
+
+Lo usan el modo batch y la API; requiere migrations/004_bulk_upsert_constraints.sql.
+El análisis individual (--url) sigue guardando con DBWriterAgent.
+"""
+import dataclasses
+import json
+import math
+import re
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from psycopg2.extras import Json, execute_values
+
+from infrastructure.db_pool import db_transaction
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+from services.incremental_service import current_source_urls, evidence_urls
+from services.score_history_service import append_history, history_enabled
+
+# Tablas (ver migrations/004_bulk_upsert_constraints.sql)
+COMPETITORS_TABLE = "competitors"
+SCORES_TABLE = "competitor_attribute_scores"
+SOURCES_TABLE = "competitor_sources"
+PRODUCTS_TABLE = "products"
+
+# Campos extraídos que se guardan en competitors.extracted_data
+_EXCLUDED_FIELDS = {"sources", "pricing"}
+
+
+def _as_dict(obj) -> Dict:
+    if obj is None:
+        return {}
+    if isinstance(obj, dict):
+        return dict(obj)
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    return {k: v for k, v in vars(obj).items() if not k.startswith("_")}
+
+
+def _slugify(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", (text or "").lower()).strip("-")
+
+
+def competitor_slug(competitor_data) -> str:
+    """
+    Slug único del competidor. Se deriva del dominio (único), no del nombre:
+    acme.com y acme.io pueden llamarse igual y chocarían con el índice único.
+    """
+    return _slugify(competitor_data.domain)
+
+
+def _dedupe(rows: List[tuple], key_size: int) -> List[tuple]:
+    """
+    Elimina filas repetidas por clave de conflicto (la última gana).
+    ON CONFLICT DO UPDATE falla si la misma clave aparece dos veces en un INSERT.
+    """
+    unique = {}
+    for row in rows:
+        unique[row[:key_size]] = row
+    return list(unique.values())
+
+
+class BulkDBWriterAgent:
+    """Escritor por lotes basado en execute_values y el pool compartido"""
+
+    def __init__(self, page_size: int = 500):
+        self.logger = get_logger("BulkDBWriter")
+        self.page_size = page_size
+        # Histórico append-only (migrations/006_score_history.sql)
+        self.history = history_enabled()
+        self._attribute_ids: Optional[Dict[str, int]] = None
+
+    def _load_attribute_ids(self, cursor) -> Dict[str, int]:
+        if self._attribute_ids is None:
+            cursor.execute("SELECT code, id FROM dim_attribute")
+            metrics.inc("db_round_trips_total", operation="select")
+            self._attribute_ids = dict(cursor.fetchall())
+        return self._attribute_ids
+
+    # ------------------------------------------------------------------
+    # Filas por tabla
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _competitor_row(competitor_data, scores, insights, now) -> tuple:
+        extracted = {k: v for k, v in _as_dict(competitor_data).items() if k not in _EXCLUDED_FIELDS}
+        return (
+            competitor_data.domain,
+            competitor_data.name,
+            competitor_slug(competitor_data),
+            getattr(scores, "x_score", None),
+            getattr(scores, "y_score", None),
+            Json(extracted, dumps=lambda o: json.dumps(o, default=str)),
+            # Sin insights (presupuesto agotado) se conservan los ya guardados
+            Json(_as_dict(insights), dumps=lambda o: json.dumps(o, default=str)) if insights is not None else None,
+            now,
+        )
+
+    def _count_round_trips(self, table: str, rows: List[tuple]):
+        """execute_values envía una sentencia por página de ``page_size`` filas"""
+        metrics.inc("db_round_trips_total", math.ceil(len(rows) / self.page_size), operation="upsert", table=table)
+        metrics.inc("db_rows_written_total", len(rows), table=table)
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def save_batch(self, items: Iterable[Tuple[object, object, object]]) -> Dict[str, int]:
+        """
+        Guarda ``(competitor_data, scores, insights)`` en una transacción.
+        Devuelve {dominio: competitor_id}.
+        """
+        items = [item for item in items if item[0] is not None]
+        if not items:
+            return {}
+        now = datetime.now(timezone.utc)
+
+        competitor_rows = _dedupe(
+            [self._competitor_row(cd, scores, insights, now) for cd, scores, insights in items], 1
+        )
+
+        with db_transaction() as conn:
+            cursor = conn.cursor()
+
+            returned = execute_values(
+                cursor,
+                f"""INSERT INTO {COMPETITORS_TABLE}
+                        (domain, name, slug, x_score, y_score, extracted_data, insights, updated_at)
+                    VALUES %s
+                    ON CONFLICT (domain) DO UPDATE SET
+                        name = EXCLUDED.name,
+                        x_score = EXCLUDED.x_score,
+                        y_score = EXCLUDED.y_score,
+                        extracted_data = EXCLUDED.extracted_data,
+                        insights = COALESCE(EXCLUDED.insights, {COMPETITORS_TABLE}.insights),
+                        updated_at = EXCLUDED.updated_at
+                    RETURNING domain, id""",
+                competitor_rows,
+                page_size=self.page_size,
+                fetch=True,
+            )
+            ids = dict(returned)
+            self._count_round_trips(COMPETITORS_TABLE, competitor_rows)
+            attribute_ids = self._load_attribute_ids(cursor)
+
+            score_rows, source_rows, product_rows = [], [], []
+            for competitor_data, scores, _ in items:
+                competitor_id = ids[competitor_data.domain]
+                for code, attribute in (getattr(scores, "attributes", None) or {}).items():
+                    if code not in attribute_ids:
+                        continue
+                    score_rows.append((
+                        competitor_id,
+                        attribute_ids[code],
+                        getattr(attribute, "raw_score", None),
+                        evidence_urls(attribute),
+                        now,
+                    ))
+                for url in current_source_urls(competitor_data):
+                    source_rows.append((competitor_id, url, now))
+                pricing = getattr(competitor_data, "pricing", None) or {}
+                for product in pricing.get("products", []) if isinstance(pricing, dict) else []:
+                    product = _as_dict(product)
+                    if not product.get("name"):
+                        continue
+                    product_rows.append((
+                        competitor_id,
+                        product["name"],
+                        Json(product, dumps=lambda o: json.dumps(o, default=str)),
+                        product.get("source_url") or product.get("url"),
+                        now,
+                    ))
+
+            score_rows = _dedupe(score_rows, 2)
+            source_rows = _dedupe(source_rows, 2)
+            product_rows = _dedupe(product_rows, 2)
+
+            if score_rows:
+                execute_values(
+                    cursor,
+                    f"""INSERT INTO {SCORES_TABLE}
+                            (competitor_id, attribute_id, raw_score, evidence_urls, scored_at)
+                        VALUES %s
+                        ON CONFLICT (competitor_id, attribute_id) DO UPDATE SET
+                            raw_score = EXCLUDED.raw_score,
+                            evidence_urls = EXCLUDED.evidence_urls,
+                            scored_at = EXCLUDED.scored_at""",
+                    score_rows,
+                    page_size=self.page_size,
+                )
+                self._count_round_trips(SCORES_TABLE, score_rows)
+            if source_rows:
+                execute_values(
+                    cursor,
+                    f"""INSERT INTO {SOURCES_TABLE} (competitor_id, url, last_seen_at)
+                        VALUES %s
+                        ON CONFLICT (competitor_id, url) DO UPDATE SET
+                            last_seen_at = EXCLUDED.last_seen_at""",
+                    source_rows,
+                    page_size=self.page_size,
+                )
+                self._count_round_trips(SOURCES_TABLE, source_rows)
+            if product_rows:
+                execute_values(
+                    cursor,
+                    f"""INSERT INTO {PRODUCTS_TABLE} (competitor_id, name, pricing, source_url, updated_at)
+                        VALUES %s
+                        ON CONFLICT (competitor_id, name) DO UPDATE SET
+                            pricing = EXCLUDED.pricing,
+                            source_url = EXCLUDED.source_url,
+                            updated_at = EXCLUDED.updated_at""",
+                    product_rows,
+                    page_size=self.page_size,
+                )
+                self._count_round_trips(PRODUCTS_TABLE, product_rows)
+            history_runs = 0
+            if self.history:
+                history_runs = append_history(
+                    cursor,
+                    [(ids.get(cd.domain), cd, scores) for cd, scores, _ in items],
+                    attribute_ids,
+                    now,
+                    page_size=self.page_size,
+                )
+
+        self.logger.info(
+            f"🗄 Lote guardado | competidores: {len(competitor_rows)} | scores: {len(score_rows)} | "
+            f"fuentes: {len(source_rows)} | productos: {len(product_rows)} | histórico: {history_runs}"
+        )
+        return ids
+
+    def save_competitor(self, competitor_data, scores, insights) -> Optional[int]:
+        """Misma interfaz que DBWriterAgent.save_competitor (lote de uno)"""
+        return self.save_batch([(competitor_data, scores, insights)]).get(competitor_data.domain)
@@ -0,0 +1,109 @@
+"""
+Cliente del Daemon de Análisis
+Cliente mínimo para api/server.py con sólo la biblioteca estándar, para que
+``main.py --server`` arranque en milisegundos y delegue el trabajo en un
+proceso con navegador, cliente LLM y pool de BD ya inicializados.
+"""
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Iterator, Optional
+
+# Eventos con los que termina el stream de un job (ver TERMINAL_STATUSES en api/server.py)
+TERMINAL_EVENTS = ("completed", "failed", "cached")
+
+
+class AnalysisClientError(Exception):
+    """El daemon no está disponible o rechazó la petición"""
+
+
+class AnalysisClient:
+    """Envía análisis al daemon y sigue su progreso por SSE"""
+
+    def __init__(self, base_url: str, timeout: Optional[float] = None, max_reconnects: int = 3,
+                 reconnect_backoff: float = 0.5):
+        self.base_url = base_url.rstrip("/")
+        # Mayor que API_SSE_KEEPALIVE: un stream sin datos ni keepalive es una conexión caída
+        self.timeout = timeout if timeout is not None else float(os.getenv("ANALYSIS_SERVER_TIMEOUT", "60"))
+        self.max_reconnects = max_reconnects
+        # Espera antes de la reconexión n: reconnect_backoff * 2^(n-1), máx. 10 s
+        self.reconnect_backoff = reconnect_backoff
+
+    def _open(self, path: str, method: str = "GET", body: Optional[Dict] = None, headers: Optional[Dict] = None):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(body).encode("utf-8") if body is not None else None,
+            method=method,
+            headers={"Content-Type": "application/json", **(headers or {})},
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", errors="replace")[:200]
+            raise AnalysisClientError(f"{method} {path}: HTTP {e.code} {detail}") from e
+        except OSError as e:
+            raise AnalysisClientError(f"Daemon no disponible en {self.base_url}: {e}") from e
+
+    def _json(self, path: str, method: str = "GET", body: Optional[Dict] = None) -> Dict:
+        with self._open(path, method, body) as response:
+            return json.loads(response.read())
+
+    def health(self) -> Dict:
+        return self._json("/health")
+
+    def submit(self, url: str, force: bool = False, priority: str = "interactive") -> Dict:
+        """
+        Encola el análisis (o se une al que ya está en curso) y devuelve el job.
+        Con ``priority="batch"`` cede el paso a las peticiones interactivas.
+        """
+        return self._json("/analyses", "POST", {"url": url, "force": force, "priority": priority})
+
+    def get(self, job_id: str) -> Dict:
+        return self._json(f"/analyses/{job_id}")
+
+    def events(self, job_id: str) -> Iterator[Dict]:
+        """
+        Eventos del job hasta el final (completed, failed o cached).
+        Si la conexión se corta o se cierra sin evento final, reconecta con
+        Last-Event-ID sin repetir eventos, como máximo ``max_reconnects`` veces.
+        """
+        last_seq = 0
+        reconnects = 0
+        while True:
+            try:
+                with self._open(f"/analyses/{job_id}/events",
+                                headers={"Accept": "text/event-stream", "Last-Event-ID": str(last_seq)}) as stream:
+                    data = []
+                    for raw in stream:
+                        line = raw.decode("utf-8").rstrip("\r\n")
+                        if line.startswith("data:"):
+                            data.append(line[5:].lstrip())
+                        elif not line and data:
+                            event = json.loads("\n".join(data))
+                            data = []
+                            last_seq = event["seq"]
+                            yield event
+                            if event["type"] in TERMINAL_EVENTS:
+                                return
+            except (AnalysisClientError, OSError) as e:
+                error = e
+            else:
+                error = None
+            # Stream cerrado sin evento final: el job terminó antes de reconectar o se cayó la conexión
+            try:
+                job = self.get(job_id)
+            except AnalysisClientError as e:
+                job, error = None, e
+            if job and job["status"] in TERMINAL_EVENTS and (
+                not job["events"] or job["events"][-1]["seq"] <= last_seq
+            ):
+                return
+            if reconnects >= self.max_reconnects:
+                reason = error or "cerrado sin evento final"
+                raise AnalysisClientError(
+                    f"Stream de {job_id} interrumpido tras {reconnects} reconexiones: {reason}"
+                ) from error
+            reconnects += 1
+            time.sleep(min(self.reconnect_backoff * 2 ** (reconnects - 1), 10.0))
@@ -0,0 +1,553 @@
+"""
+API de Análisis (FastAPI)
+Servicio HTTP sobre el mismo pipeline que el CLI.
+
+- ``POST /analyses`` encola un análisis y devuelve el id del job al instante.
+- ``GET /analyses/{id}/events`` (SSE) y ``/analyses/{id}/ws`` (WebSocket)
+  emiten el progreso por fase (extracción, scoring, insights, persistencia).
+- Resultados de dominios analizados dentro de API_FRESHNESS_HOURS se sirven
+  sin volver a analizar (memoria del proceso y, si hay BD, tabla competitors).
+- Navegador, cliente LLM y pool de BD se crean una vez y se mantienen
+  calientes entre peticiones; se cierran al apagar el servicio.
+- ``GET /history/*``: movimientos, cambios de pricing y trayectorias X/Y del
+  histórico de scores (services/score_history_service.py).
+- Prioridad por petición: los jobs ``interactive`` (default) se ejecutan antes
+  que los ``batch`` en cola y van al carril interactivo del scheduler, que les
+  cede cupo LLM/scraping por delante de los sweeps (infrastructure/scheduler.py).
+
+Uso:
+    python -m api.server
+    uvicorn api.server:app --port 8000   # un solo worker: el estado vive en el proceso
+"""
+import asyncio
+import dataclasses
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, List, Literal, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+load_dotenv()
+
+from agents.batch_agent import BatchAgent  # noqa: E402
+from infrastructure.browser_pool import close_browser_pool, get_browser_pool  # noqa: E402
+from infrastructure.cache import evict_caches  # noqa: E402
+from infrastructure.llm_client import close_llm_client, get_llm_client, warm_up_llm  # noqa: E402
+from infrastructure.logging_config import get_logger  # noqa: E402
+from infrastructure.metrics import metrics  # noqa: E402
+from infrastructure.scheduler import INTERACTIVE, get_scheduler, scope  # noqa: E402
+from services.context_index_service import close_context_indexer  # noqa: E402
+from services.incremental_service import domain_from_url  # noqa: E402
+from services.validation_service import close_url_verifier  # noqa: E402
+
+logger = get_logger("API")
+
+TERMINAL_STATUSES = ("completed", "failed", "cached")
+PHASES = ("extraction", "scoring", "insights", "persistence")
+
+
+def to_jsonable(obj):
+    """Convierte dataclasses, modelos pydantic y objetos simples a JSON"""
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if isinstance(obj, dict):
+        return {str(k): to_jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, set)):
+        return [to_jsonable(v) for v in obj]
+    if hasattr(obj, "model_dump"):
+        return to_jsonable(obj.model_dump())
+    if dataclasses.is_dataclass(obj):
+        return to_jsonable(dataclasses.asdict(obj))
+    if hasattr(obj, "item"):
+        return obj.item()
+    if hasattr(obj, "__dict__"):
+        return {k: to_jsonable(v) for k, v in vars(obj).items() if not k.startswith("_")}
+    return str(obj)
+
+
+# ----------------------------------------------------------------------
+# Jobs
+# ----------------------------------------------------------------------
+
+class AnalysisJob:
+    """Análisis de una URL con su historial de eventos y suscriptores"""
+
+    def __init__(self, url: str, priority: str = INTERACTIVE):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.domain = domain_from_url(url)
+        self.priority = priority
+        self.status = "queued"
+        self.phase: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict] = []
+        # (event loop, cola) de cada cliente SSE/WebSocket conectado
+        self.subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+
+    def summary(self, include_result: bool = False) -> Dict:
+        data = {
+            "id": self.id,
+            "url": self.url,
+            "domain": self.domain,
+            "priority": self.priority,
+            "status": self.status,
+            "phase": self.phase,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+        if include_result:
+            data["result"] = self.result
+        return data
+
+
+class AnalysisManager:
+    """
+    Ejecuta análisis en un grupo de hilos con un BatchAgent de larga
+    duración (agentes por hilo y escritor reutilizados entre peticiones).
+    """
+
+    def __init__(self):
+        self.freshness_seconds = float(os.getenv("API_FRESHNESS_HOURS", "24")) * 3600
+        self.max_jobs = int(os.getenv("API_MAX_JOBS", "1000"))
+        self.dry_run = os.getenv("API_DRY_RUN", "false").lower() == "true"
+        workers = int(os.getenv("API_MAX_CONCURRENT_ANALYSES", "2"))
+        self.batch = BatchAgent(
+            dry_run=self.dry_run,
+            incremental=os.getenv("API_INCREMENTAL", "false").lower() == "true",
+        )
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis")
+        self._lock = threading.Lock()
+        # Jobs en cola por (prioridad, orden de llegada): cada hilo libre toma el primero
+        self._pending: List[Tuple[int, int, AnalysisJob]] = []
+        self._sequence = itertools.count()
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        # dominio → job en curso (peticiones repetidas se unen al mismo job)
+        self._active: Dict[str, str] = {}
+        # dominio → (timestamp, resultado) de análisis recientes
+        self._fresh: Dict[str, Tuple[float, Dict]] = {}
+
+    # ------------------------------------------------------------------
+    # Eventos
+    # ------------------------------------------------------------------
+
+    def _emit(self, job: AnalysisJob, event_type: str, **data):
+        with self._lock:
+            event = {"seq": len(job.events) + 1, "type": event_type, "job_id": job.id,
+                     "time": time.time(), **data}
+            job.events.append(event)
+            subscribers = list(job.subscribers)
+        for loop, q in subscribers:
+            try:
+                loop.call_soon_threadsafe(q.put_nowait, event)
+            except RuntimeError:
+                pass  # cliente desconectado con el loop cerrado
+
+    def subscribe(self, job: AnalysisJob, after: int = 0) -> asyncio.Queue:
+        """Cola con los eventos posteriores a ``after`` y los que lleguen después"""
+        q: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            for event in job.events[after:]:
+                q.put_nowait(event)
+            job.subscribers.append((asyncio.get_running_loop(), q))
+        return q
+
+    def unsubscribe(self, job: AnalysisJob, q: asyncio.Queue):
+        with self._lock:
+            job.subscribers = [(loop, sub) for loop, sub in job.subscribers if sub is not q]
+
+    # ------------------------------------------------------------------
+    # Resultados frescos
+    # ------------------------------------------------------------------
+
+    def fresh_result(self, domain: str) -> Optional[Dict]:
+        with self._lock:
+            cached = self._fresh.get(domain)
+        if cached and time.time() - cached[0] <= self.freshness_seconds:
+            return cached[1]
+        return self._db_result(domain)
+
+    def _db_result(self, domain: str) -> Optional[Dict]:
+        """Último análisis guardado en la BD si está dentro de la ventana de frescura"""
+        if self.dry_run or not os.getenv("SUPABASE_DB_URL"):
+            return None
+        from infrastructure.db_pool import db_transaction
+
+        try:
+            with db_transaction() as conn, conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT c.id, c.name, c.x_score, c.y_score, c.extracted_data, c.insights, c.updated_at,
+                           COALESCE(json_object_agg(a.code, json_build_object(
+                               'raw_score', s.raw_score, 'evidence_urls', s.evidence_urls
+                           )) FILTER (WHERE a.code IS NOT NULL), '{}')
+                    FROM competitors c
+                    LEFT JOIN competitor_attribute_scores s ON s.competitor_id = c.id
+                    LEFT JOIN dim_attribute a ON a.id = s.attribute_id
+                    WHERE c.domain = %s AND c.updated_at >= NOW() - make_interval(secs => %s)
+                    GROUP BY c.id
+                    """,
+                    (domain, self.freshness_seconds),
+                )
+                row = cur.fetchone()
+        except Exception as e:
+            logger.warning(f"⚠ No se pudo consultar el último análisis de {domain}: {e}")
+            return None
+        if not row:
+            return None
+        competitor_id, name, x_score, y_score, extracted, insights, updated_at, attributes = row
+        return to_jsonable({
+            "competitor_id": competitor_id,
+            "competitor_data": {"name": name, "domain": domain, **(extracted or {})},
+            "scores": {"x_score": x_score, "y_score": y_score, "attributes": attributes},
+            "insights": insights,
+            "analyzed_at": updated_at.timestamp() if updated_at else None,
+        })
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+
+    def submit(self, url: str, force: bool = False, priority: str = INTERACTIVE) -> Tuple[AnalysisJob, bool]:
+        """
+        Devuelve (job, creado). Reutiliza el job en curso o el resultado fresco
+        del dominio. Los jobs ``batch`` esperan a que no quede ningún
+        ``interactive`` en cola.
+        """
+        domain = domain_from_url(url)
+        with self._lock:
+            active = self._active.get(domain)
+            if active and active in self._jobs:
+                return self._jobs[active], False
+
+        fresh = None if force else self.fresh_result(domain)
+        job = AnalysisJob(url, priority)
+        with self._lock:
+            # Otra petición pudo registrar el dominio mientras se consultaba el resultado fresco
+            active = self._active.get(domain)
+            if active and active in self._jobs:
+                return self._jobs[active], False
+            self._jobs[job.id] = job
+            # Historial acotado: se descartan los jobs terminados más antiguos
+            for old_id in list(self._jobs)[:max(0, len(self._jobs) - self.max_jobs)]:
+                if self._jobs[old_id].status in TERMINAL_STATUSES:
+                    del self._jobs[old_id]
+            if fresh is None:
+                self._active[domain] = job.id
+
+        if fresh is not None:
+            job.status, job.result = "cached", fresh
+            job.finished_at = time.time()
+            metrics.inc("api_analyses_total", status="cached")
+            self._emit(job, "cached", result=fresh)
+            return job, False
+
+        self._emit(job, "queued", url=url, priority=priority)
+        with self._lock:
+            heapq.heappush(self._pending, (0 if priority == INTERACTIVE else 1, next(self._sequence), job))
+        self._executor.submit(self._run_next)
+        return job, True
+
+    def _run_next(self):
+        """Ejecuta el job en cola de mayor prioridad (uno por cada submit)"""
+        with self._lock:
+            _, _, job = heapq.heappop(self._pending)
+        self._run(job)
+
+    def _run(self, job: AnalysisJob):
+        job.status, job.started_at = "running", time.time()
+
+        def on_phase(phase: str, status: str):
+            job.phase = phase
+            self._emit(job, "phase", phase=phase, status=status)
+
+        try:
+            with scope(lane=job.priority):
+                result, data = self.batch.analyze(job.url, on_phase=on_phase)
+        except Exception as e:
+            logger.error(f"❌ Error analizando {job.url}: {e}", exc_info=True)
+            result, data = None, None
+            job.error = f"{type(e).__name__}: {e}"
+
+        job.finished_at = time.time()
+        if result is not None and result.success:
+            payload = to_jsonable({"competitor_id": result.competitor_id, **data,
+                                   "analyzed_at": job.finished_at})
+            job.status, job.result = "completed", payload
+            with self._lock:
+                self._fresh[domain_from_url(job.url)] = (job.finished_at, payload)
+            metrics.inc("api_analyses_total", status="completed")
+            self._emit(job, "completed", result=payload, duration=result.duration)
+        else:
+            job.status = "failed"
+            job.error = job.error or (result.error if result else None)
+            metrics.inc("api_analyses_total", status="failed")
+            self._emit(job, "failed", error=job.error, phase=job.phase)
+        with self._lock:
+            if self._active.get(job.domain) == job.id:
+                del self._active[job.domain]
+
+    def get(self, job_id: str) -> AnalysisJob:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job no encontrado")
+        return job
+
+    def jobs(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            recent = list(self._jobs.values())[-limit:]
+        return [job.summary() for job in reversed(recent)]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ----------------------------------------------------------------------
+# Estado caliente
+# ----------------------------------------------------------------------
+
+def warm_up() -> Dict[str, bool]:
+    """Crea por adelantado los recursos compartidos del pipeline"""
+    state = {"llm": False, "db": False, "browser": False}
+    try:
+        get_llm_client()
+        warm_up_llm(wait=True)
+        state["llm"] = True
+    except Exception as e:
+        logger.warning(f"⚠ Cliente LLM no disponible: {e}")
+    if os.getenv("SUPABASE_DB_URL") and os.getenv("API_DRY_RUN", "false").lower() != "true":
+        try:
+            from infrastructure.db_pool import get_db_pool
+            get_db_pool()
+            state["db"] = True
+        except Exception as e:
+            logger.warning(f"⚠ Pool de BD no disponible: {e}")
+    if os.getenv("API_WARM_BROWSER", "false").lower() == "true" \
+            and os.getenv("USE_DYNAMIC_SCRAPER", "true").lower() == "true":
+        try:
+            get_browser_pool().warm()
+            state["browser"] = True
+        except Exception as e:
+            logger.warning(f"⚠ No se pudo iniciar el navegador: {e}")
+    return state
+
+
+def release_resources():
+    close_browser_pool()
+    close_llm_client()
+    close_url_verifier()
+    close_context_indexer()
+    try:
+        from infrastructure.db_pool import close_db_pool
+        close_db_pool()
+    except ImportError:
+        pass
+    evict_caches()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.manager = AnalysisManager()
+    app.state.warm = await asyncio.to_thread(warm_up)
+    app.state.started_at = time.time()
+    logger.info(f"🚀 API lista | recursos calientes: {app.state.warm}")
+    try:
+        yield
+    finally:
+        app.state.manager.shutdown()
+        await asyncio.to_thread(release_resources)
+
+
+app = FastAPI(title="Competitor Intelligence API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[o.strip() for o in os.getenv("API_CORS_ORIGINS", "*").split(",") if o.strip()],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+def _manager(request) -> AnalysisManager:
+    return request.app.state.manager
+
+
+class AnalysisRequest(BaseModel):
+    url: str = Field(..., min_length=4, description="URL del competidor")
+    force: bool = Field(False, description="Analizar aunque haya un resultado fresco")
+    priority: Literal["interactive", "batch"] = Field(
+        INTERACTIVE, description="interactive: por delante de los jobs batch y de los sweeps en curso"
+    )
+
+
+# ----------------------------------------------------------------------
+# Endpoints
+# ----------------------------------------------------------------------
+
+@app.post("/analyses", status_code=202)
+def create_analysis(body: AnalysisRequest, request: Request):
+    url = body.url.strip()
+    if not url.startswith(("http://", "https://")):
+        url = f"https://{url}"
+    job, created = _manager(request).submit(url, force=body.force, priority=body.priority)
+    payload = {
+        **job.summary(include_result=job.status in TERMINAL_STATUSES),
+        "events_url": f"/analyses/{job.id}/events",
+        "websocket_url": f"/analyses/{job.id}/ws",
+    }
+    # 200 si no se encoló nada nuevo (resultado fresco o job ya en curso)
+    return JSONResponse(payload, status_code=202 if created else 200)
+
+
+@app.get("/analyses")
+def list_analyses(request: Request, limit: int = 50):
+    return {"jobs": _manager(request).jobs(limit)}
+
+
+@app.get("/analyses/{job_id}")
+def get_analysis(job_id: str, request: Request):
+    job = _manager(request).get(job_id)
+    return {**job.summary(include_result=True), "events": job.events}
+
+
+@app.get("/analyses/{job_id}/events")
+async def stream_events(job_id: str, request: Request, last_event_id: Optional[str] = Header(None)):
+    """Progreso por Server-Sent Events; admite reconexión con Last-Event-ID"""
+    manager = _manager(request)
+    job = manager.get(job_id)
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    keepalive = float(os.getenv("API_SSE_KEEPALIVE", "15"))
+
+    async def events():
+        if job.events and after >= job.events[-1]["seq"] and job.events[-1]["type"] in TERMINAL_STATUSES:
+            return  # reconexión tras el evento final: nada que reenviar
+        q = manager.subscribe(job, after)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(q.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                if event["type"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            manager.unsubscribe(job, q)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.websocket("/analyses/{job_id}/ws")
+async def websocket_events(websocket: WebSocket, job_id: str):
+    manager = websocket.app.state.manager
+    await websocket.accept()
+    try:
+        job = manager.get(job_id)
+    except HTTPException:
+        await websocket.close(code=4404, reason="Job no encontrado")
+        return
+    q = manager.subscribe(job)
+    try:
+        while True:
+            event = await q.get()
+            await websocket.send_json(event)
+            if event["type"] in TERMINAL_STATUSES:
+                break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.unsubscribe(job, q)
+
+
+@app.get("/competitors/{domain}")
+def get_competitor(domain: str, request: Request):
+    """Último resultado del dominio si está dentro de la ventana de frescura"""
+    result = _manager(request).fresh_result(domain_from_url(domain if "//" in domain else f"https://{domain}"))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Sin análisis reciente para este dominio")
+    return result
+
+
+def _history(query: str, **params) -> List[Dict]:
+    """Ejecuta una consulta del histórico y la devuelve como lista de registros JSON"""
+    if not os.getenv("SUPABASE_DB_URL"):
+        raise HTTPException(status_code=503, detail="Histórico no disponible: SUPABASE_DB_URL no configurada")
+    from services import score_history_service
+
+    frame = getattr(score_history_service, query)(**params)
+    return json.loads(frame.to_json(orient="records", date_format="iso"))
+
+
+@app.get("/history/movers")
+def history_movers(limit: int = Query(20, ge=1, le=1000), since: Optional[datetime] = None,
+                   attribute: Optional[str] = None, min_delta: float = 0.0):
+    """Mayores movimientos de X/Y (o de ``attribute``) respecto al análisis anterior o a ``since``"""
+    return _history("top_movers", limit=limit, since=since, attribute=attribute, min_delta=min_delta)
+
+
+@app.get("/history/pricing-changes")
+def history_pricing_changes(since: Optional[datetime] = None, limit: int = Query(100, ge=1, le=1000)):
+    return _history("pricing_changes", since=since, limit=limit)
+
+
+@app.get("/history/trajectories")
+def history_trajectories(domain: Optional[List[str]] = Query(None), runs: int = Query(5, ge=1, le=100)):
+    """Últimos ``runs`` análisis de X/Y por dominio (``?domain=a.com&domain=b.com``; default: todos)"""
+    return _history("trajectories", domains=domain, runs=runs)
+
+
+@app.get("/health")
+def health(request: Request):
+    return {
+        "status": "ok",
+        "uptime_seconds": round(time.time() - request.app.state.started_at, 1),
+        "warm": request.app.state.warm,
+        "jobs": _manager(request).stats(),
+        "scheduler": get_scheduler().snapshot(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return metrics.render_prometheus()
+
+
+def serve(host: Optional[str] = None, port: Optional[int] = None):
+    """Arranca el servicio (un solo worker: los jobs viven en este proceso)"""
+    import uvicorn
+
+    uvicorn.run(app, host=host or os.getenv("API_HOST", "0.0.0.0"), port=port or int(os.getenv("PORT", "8000")))
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,208 @@
+"""
+Fixtures de Benchmark
+Snapshots HTML de sitios de competidores para reproducir el pipeline sin red.
+
+- ``record_sites``: graba la portada y las páginas clave (pricing, features,
+  integraciones, ...) de sitios reales en benchmarks/fixtures/sites/<dominio>/.
+- ``generate_sites``: genera sitios sintéticos deterministas (misma semilla,
+  mismos bytes) cuando no hay grabaciones, con tamaño y estructura realistas.
+"""
+import json
+import os
+import random
+import re
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import urljoin, urlparse
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "sites"
+# Los sitios sintéticos se regeneran bajo demanda, no se versionan
+GENERATED_DIR = Path(os.getenv("CACHE_DIR", ".cache")) / "bench_sites"
+
+# Páginas que se graban/generan por sitio (ruta → archivo)
+PAGES = {
+    "/": "index.html",
+    "/pricing": "pricing.html",
+    "/features": "features.html",
+    "/integrations": "integrations.html",
+    "/about": "about.html",
+}
+
+_KEY_PAGES = re.compile(r"pricing|precios|plans|features|producto|product|integra|about|nosotros", re.I)
+
+_PRODUCTS = ["PMS", "Channel Manager", "Booking Engine", "Revenue Management", "CRM", "Guest App",
+             "Business Intelligence", "Payments", "Housekeeping", "POS"]
+_CAPABILITIES = ["pricing dinámico con IA", "forecasting de demanda", "dashboards en tiempo real",
+                 "API abierta", "automatización de check-in", "segmentación de huéspedes",
+                 "reporting multi-propiedad", "upselling automatizado", "benchmark de mercado",
+                 "conciliación de pagos"]
+_INTEGRATIONS = ["Booking.com", "Expedia", "Airbnb", "Stripe", "Salesforce", "HubSpot", "Oracle Opera",
+                 "Mews", "Cloudbeds", "SiteMinder", "Google Hotel Ads", "TripAdvisor"]
+_SEGMENTS = ["hoteles independientes", "cadenas hoteleras", "resorts", "apartamentos turísticos",
+             "hostels", "grupos enterprise"]
+_FILLER = ("Nuestra plataforma ayuda a {segment} a aumentar ingresos y reducir trabajo manual. "
+           "Con {capability} y conexión nativa con {integration}, el equipo decide más rápido. ")
+
+
+def _boilerplate(rng: random.Random, name: str) -> tuple:
+    """Navegación, banner de cookies y footer: ruido típico que el extractor debe ignorar"""
+    links = "".join(f'<li><a href="{path}">{file.split(".")[0].title()}</a></li>' for path, file in PAGES.items())
+    footer_links = "".join(f'<a href="/legal/{i}">Legal {i}</a> ' for i in range(rng.randint(10, 25)))
+    return (
+        f'<header><nav><ul>{links}</ul></nav></header>'
+        f'<div class="cookie-banner">Usamos cookies para mejorar tu experiencia. '
+        f'<button>Aceptar</button></div>',
+        f'<footer><p>© 2025 {name}. Todos los derechos reservados.</p>{footer_links}</footer>'
+        f'<script>window.analytics={{"id":"{rng.getrandbits(64):x}"}};</script>',
+    )
+
+
+def _page(rng: random.Random, name: str, title: str, body: str) -> str:
+    header, footer = _boilerplate(rng, name)
+    return (
+        f'<!DOCTYPE html><html lang="es"><head><meta charset="utf-8"><title>{title} | {name}</title>'
+        f'<meta name="description" content="{name} - software para hoteles">'
+        f'<style>{"body{font-family:sans-serif}" * rng.randint(20, 60)}</style></head>'
+        f'<body>{header}<main>{body}</main>{footer}</body></html>'
+    )
+
+
+def _paragraphs(rng: random.Random, count: int) -> str:
+    return "".join(
+        "<p>" + "".join(
+            _FILLER.format(
+                segment=rng.choice(_SEGMENTS),
+                capability=rng.choice(_CAPABILITIES),
+                integration=rng.choice(_INTEGRATIONS),
+            )
+            for _ in range(rng.randint(2, 5))
+        ) + "</p>"
+        for _ in range(count)
+    )
+
+
+def generate_site(target: Path, index: int, seed: int = 0) -> Path:
+    """Genera un sitio sintético determinista en ``target``"""
+    rng = random.Random(seed * 100003 + index)
+    name = f"HotelTech {index:02d}"
+    products = rng.sample(_PRODUCTS, rng.randint(2, 6))
+    integrations = rng.sample(_INTEGRATIONS, rng.randint(2, 8))
+    target.mkdir(parents=True, exist_ok=True)
+
+    plans = "".join(
+        f'<div class="plan"><h3>{tier}</h3><p class="price">{price} € / mes</p>'
+        f'<ul>{"".join(f"<li>{p}</li>" for p in products[:i + 1])}</ul></div>'
+        for i, (tier, price) in enumerate(zip(("Starter", "Pro", "Enterprise"), sorted(rng.sample(range(49, 999), 3))))
+    ) if rng.random() < 0.7 else "<p>Solicita una demo para conocer nuestros precios.</p>"
+
+    bodies = {
+        "index.html": f"<h1>{name}</h1><h2>{', '.join(products)} para {rng.choice(_SEGMENTS)}</h2>"
+                      + _paragraphs(rng, rng.randint(8, 20)),
+        "pricing.html": f"<h1>Precios</h1>{plans}" + _paragraphs(rng, rng.randint(2, 5)),
+        "features.html": "<h1>Funcionalidades</h1>" + "".join(
+            f"<section><h2>{p}</h2>{_paragraphs(rng, rng.randint(2, 6))}</section>" for p in products
+        ),
+        "integrations.html": "<h1>Integraciones</h1><ul>"
+                             + "".join(f"<li>{i}</li>" for i in integrations) + "</ul>"
+                             + _paragraphs(rng, rng.randint(1, 4)),
+        "about.html": f"<h1>Sobre {name}</h1>" + _paragraphs(rng, rng.randint(3, 8)),
+    }
+    for filename, body in bodies.items():
+        (target / filename).write_text(_page(rng, name, filename.split(".")[0].title(), body), encoding="utf-8")
+    (target / "robots.txt").write_text("User-agent: *\nAllow: /\nSitemap: /sitemap.xml\n", encoding="utf-8")
+    urls = "".join(f"<url><loc>{path}</loc></url>" for path in PAGES)
+    (target / "sitemap.xml").write_text(
+        f'<?xml version="1.0" encoding="UTF-8"?><urlset>{urls}</urlset>', encoding="utf-8"
+    )
+    return target
+
+
+def generate_sites(count: int = 50, target_dir: Optional[Path] = None, seed: int = 0) -> List[Path]:
+    target_dir = Path(target_dir or GENERATED_DIR)
+    return [generate_site(target_dir / f"site-{i:02d}", i, seed) for i in range(count)]
+
+
+def record_site(url: str, target_dir: Optional[Path] = None, max_pages: int = 5) -> Path:
+    """Graba la portada de ``url`` y hasta ``max_pages - 1`` páginas clave enlazadas"""
+    import requests
+    from lxml import html as lxml_html
+
+    from infrastructure.cache import DEFAULT_USER_AGENT
+
+    session = requests.Session()
+    session.headers["User-Agent"] = DEFAULT_USER_AGENT
+    domain = urlparse(url).netloc.lower().removeprefix("www.")
+    target = Path(target_dir or FIXTURES_DIR) / domain
+    target.mkdir(parents=True, exist_ok=True)
+
+    response = session.get(url, timeout=30)
+    response.raise_for_status()
+    pages = {"/": "index.html"}
+    (target / "index.html").write_bytes(response.content)
+
+    tree = lxml_html.fromstring(response.content)
+    for href in tree.xpath("//a/@href"):
+        if len(pages) >= max_pages:
+            break
+        absolute = urljoin(response.url, href)
+        parsed = urlparse(absolute)
+        if parsed.netloc.lower().removeprefix("www.") != domain or not _KEY_PAGES.search(parsed.path):
+            continue
+        path = parsed.path.rstrip("/") or "/"
+        if path in pages:
+            continue
+        try:
+            page = session.get(absolute, timeout=30)
+        except requests.RequestException:
+            continue
+        if page.status_code == 200 and "html" in page.headers.get("Content-Type", ""):
+            filename = re.sub(r"[^a-z0-9]+", "-", path.lower()).strip("-") + ".html"
+            (target / filename).write_bytes(page.content)
+            pages[path] = filename
+
+    (target / "pages.json").write_text(json.dumps(pages, indent=2), encoding="utf-8")
+    return target
+
+
+def record_sites(urls: List[str], target_dir: Optional[Path] = None) -> List[Path]:
+    recorded = []
+    for url in urls:
+        try:
+            recorded.append(record_site(url, target_dir))
+            print(f"✓ {url}")
+        except Exception as e:
+            print(f"❌ {url}: {e}")
+    return recorded
+
+
+def load_sites(source_dir: Optional[Path] = None, count: int = 50, seed: int = 0) -> List[Path]:
+    """Sitios grabados en ``source_dir``; si no hay suficientes, se generan sintéticos"""
+    source_dir = Path(source_dir or FIXTURES_DIR)
+    sites = sorted(p for p in source_dir.iterdir() if p.is_dir()) if source_dir.exists() else []
+    if len(sites) < count:
+        sites = generate_sites(count, seed=seed)
+    return sites[:count]
+
+
+def site_pages(site: Path) -> dict:
+    """Ruta → archivo de un sitio (pages.json si fue grabado)"""
+    manifest = site / "pages.json"
+    if manifest.exists():
+        return json.loads(manifest.read_text(encoding="utf-8"))
+    return {path: filename for path, filename in PAGES.items() if (site / filename).exists()}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Grabar o generar fixtures HTML para los benchmarks")
+    parser.add_argument("--record", metavar="ARCHIVO", help="Archivo con una URL por línea a grabar")
+    parser.add_argument("--generate", type=int, metavar="N", help="Generar N sitios sintéticos")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.record:
+        from agents.batch_agent import read_urls
+        record_sites(read_urls(args.record))
+    if args.generate:
+        print(f"✓ {len(generate_sites(args.generate, seed=args.seed))} sitios en {GENERATED_DIR}")
@@ -0,0 +1,138 @@
+"""
+Presupuesto de Arranque
+Comprueba que los puntos de entrada importan rápido y sin dependencias
+pesadas: playwright, openai, pandas, psycopg2... sólo deben cargarse en la
+fase que los usa (ver main.py), no al importar el módulo.
+
+Cada módulo se importa en un intérprete nuevo con ``-X importtime`` y se toma
+la mediana de varias repeticiones (tras una primera que compila los .pyc y se
+descarta). Sale con código 1 si algún módulo supera su presupuesto o arrastra
+una dependencia pesada. Un módulo que no se puede importar en este checkout
+(falta un módulo del propio proyecto) se informa como omitido. También corre
+como test: ``pytest tests/test_import_time.py``.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 10 --output benchmarks/results/import_time.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# módulo → presupuesto en ms (tiempo acumulado de su import, sin contar el arranque del intérprete).
+# ~2x la mediana medida: api.client son ~35-50 ms de urllib.request/http.client de la
+# biblioteca estándar, así que un presupuesto de 50 ms fallaba por ruido.
+IMPORT_BUDGETS_MS = {
+    "main": float(os.getenv("IMPORT_BUDGET_MAIN_MS", "150")),
+    "agents.batch_agent": float(os.getenv("IMPORT_BUDGET_BATCH_MS", "150")),
+    "api.client": float(os.getenv("IMPORT_BUDGET_CLIENT_MS", "100")),
+}
+
+# Dependencias que ningún punto de entrada debe cargar al importarse
+HEAVY_MODULES = (
+    "playwright", "openai", "pandas", "numpy", "psycopg2", "pymongo",
+    "httpx", "pydantic", "lxml", "requests", "fastapi", "pyarrow", "duckdb",
+)
+
+
+class ModuleUnavailable(RuntimeError):
+    """El módulo importa otro del proyecto que no está en este checkout"""
+
+
+def _missing_project_module(stderr: str) -> Optional[str]:
+    match = re.search(r"ModuleNotFoundError: No module named '([\w.]+)'", stderr)
+    if match and (ROOT / match.group(1).split(".")[0]).is_dir():
+        return match.group(1)
+    return None
+
+
+def measure(module: str) -> Dict:
+    """Tiempo de import (µs) y dependencias pesadas cargadas, en un proceso limpio"""
+    code = f"import sys, {module}; print(' '.join(sorted(m for m in sys.modules if '.' not in m)))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        missing = _missing_project_module(proc.stderr)
+        if missing:
+            raise ModuleUnavailable(f"falta {missing}")
+        raise RuntimeError(f"No se pudo importar {module}:\n{proc.stderr[-2000:]}")
+
+    cumulative_us = 0
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:"):
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            cumulative_us = int(parts[1])
+    loaded = set(proc.stdout.split())
+    return {"us": cumulative_us, "heavy": sorted(loaded.intersection(HEAVY_MODULES))}
+
+
+def check(module: str, repeat: int = 5) -> Dict:
+    """Mide ``module`` contra su presupuesto; ``skipped`` si no se puede importar en este checkout"""
+    budget_ms = IMPORT_BUDGETS_MS[module]
+    try:
+        # La primera importación compila los .pyc: no cuenta
+        measure(module)
+        samples = [measure(module) for _ in range(repeat)]
+    except ModuleUnavailable as e:
+        return {"module": module, "import_ms": None, "budget_ms": budget_ms, "heavy_modules": [],
+                "ok": True, "skipped": str(e)}
+    elapsed_ms = statistics.median(sample["us"] for sample in samples) / 1000
+    heavy = samples[-1]["heavy"]
+    return {
+        "module": module,
+        "import_ms": round(elapsed_ms, 1),
+        "budget_ms": budget_ms,
+        "heavy_modules": heavy,
+        "ok": elapsed_ms <= budget_ms and not heavy,
+        "skipped": None,
+    }
+
+
+def run(modules: List[str], repeat: int) -> List[Dict]:
+    return [check(module, repeat) for module in modules]
+
+
+def print_report(results: List[Dict]):
+    print(f"{'Módulo':<22} {'Import':>10} {'Presupuesto':>12}  Estado")
+    for result in results:
+        if result["skipped"]:
+            print(f"{result['module']:<22} {'-':>10} {result['budget_ms']:>10.0f}ms  omitido ({result['skipped']})")
+            continue
+        status = "✓" if result["ok"] else "✗"
+        if result["heavy_modules"]:
+            status += f" carga {', '.join(result['heavy_modules'])}"
+        print(f"{result['module']:<22} {result['import_ms']:>8.1f}ms {result['budget_ms']:>10.0f}ms  {status}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Presupuesto de tiempo de import de los puntos de entrada")
+    parser.add_argument("modules", nargs="*", help=f"Módulos a medir (default: {', '.join(IMPORT_BUDGETS_MS)})")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por módulo (se usa la mediana)")
+    parser.add_argument("--output", help="Guardar el resultado JSON")
+    args = parser.parse_args(argv)
+    unknown = set(args.modules) - set(IMPORT_BUDGETS_MS)
+    if unknown:
+        parser.error(f"sin presupuesto para: {', '.join(sorted(unknown))}")
+
+    results = run(args.modules or list(IMPORT_BUDGETS_MS), max(1, args.repeat))
+    print_report(results)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
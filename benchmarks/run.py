@@ -0,0 +1,271 @@
+"""
+Benchmark Offline del Pipeline
+Reproduce el análisis completo sin red ni credenciales:
+
+- Sitios grabados (o sintéticos) servidos por SiteFarm en 127.0.0.1.
+- LLM y embeddings simulados por FakeLLMServer (OpenAI u Ollama) con latencia.
+- Persistencia en SQLite (SQLiteBulkWriter) o en un Postgres local.
+
+Informa throughput, p50/p95 por fase y pico de RSS, y compara contra un
+baseline para detectar regresiones en PRs:
+
+    python -m benchmarks.run --sites 50 --output benchmarks/results/latest.json
+    python -m benchmarks.run --baseline benchmarks/results/baseline.json --tolerance 0.2
+
+Suites:
+- components: crawl priorizado + scoring single-call + embeddings + escritura,
+  usando sólo los módulos de infraestructura/servicios.
+- pipeline: BatchAgent completo (FASE 1-4) con los agentes del proyecto.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from benchmarks.fixtures import load_sites
+from benchmarks.servers import FakeLLMServer, SiteFarm
+
+SUITES = ("components", "pipeline")
+
+
+def configure_environment(args, llm_url: str, workdir: str):
+    """Apunta todos los clientes a los servidores locales (antes de crearlos)"""
+    os.environ.update({
+        "LLM_PROVIDER": args.provider,
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{llm_url}/v1",
+        "OLLAMA_URL": f"{llm_url}/api/generate",
+        "EMBEDDING_PROVIDER": args.provider,
+        "LLM_RPM": "1000000",
+        "LLM_TPM": "1000000000",
+        "USE_DYNAMIC_SCRAPER": "true" if args.render else "false",
+        "CACHE_ENABLED": "true" if args.warm_cache else "false",
+        "CACHE_DIR": os.path.join(workdir, "cache"),
+        "SNAPSHOT_DIR": os.path.join(workdir, "snapshots"),
+        "SCORING_MODE": args.scoring_mode,
+        # Los servidores locales no necesitan cortesía entre peticiones
+        "CRAWL_DELAY": "0",
+    })
+    if args.db == "postgres":
+        os.environ["SUPABASE_DB_URL"] = args.db_url or os.environ.get("BENCH_DB_URL", "")
+
+
+def make_writer(args, workdir: str):
+    if args.db == "postgres":
+        from agents.bulk_db_writer_agent import BulkDBWriterAgent
+        return BulkDBWriterAgent()
+    from benchmarks.sqlite_writer import SQLiteBulkWriter
+    return SQLiteBulkWriter(os.path.join(workdir, "benchmark.db"))
+
+
+# ----------------------------------------------------------------------
+# Suites
+# ----------------------------------------------------------------------
+
+def run_components(args, urls: List[str], sites: List[Path], workdir: str) -> Dict:
+    from infrastructure.metrics import metrics
+    from services.crawl_frontier import CrawlFrontier
+    from services.embedding_service import EmbeddingService
+    from services.multi_attribute_scoring_service import MultiAttributeScoringService
+
+    scorer = MultiAttributeScoringService()
+    embeddings = EmbeddingService()
+    writer = make_writer(args, workdir)
+    results = []
+
+    def analyze(url: str, site: Path):
+        start = time.perf_counter()
+        with metrics.phase("extraction"):
+            crawl = CrawlFrontier(url).crawl()
+            pages, extractor = crawl.pages, crawl.evidence
+            text = extractor.to_prompt()
+            domain = url.split("//", 1)[1].rstrip("/")
+            competitor = SimpleNamespace(
+                name=domain, domain=domain,
+                sources=[{"url": p.final_url} for p in pages],
+                servicios=None, integraciones=None, pricing=None, has_explicit_pricing=False,
+                evidence=extractor.evidence(),
+            )
+        with metrics.phase("scoring"):
+            scores = scorer.calculate_scores(competitor)
+        with metrics.phase("embedding"):
+            embeddings.embed_document(text)
+        metrics.observe("competitor_seconds", time.perf_counter() - start, status="true")
+        return competitor, scores, None
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for item in pool.map(analyze, urls, sites):
+            results.append(item)
+
+    batch_size = int(os.getenv("DB_WRITE_BATCH_SIZE", "25"))
+    for i in range(0, len(results), batch_size):
+        with metrics.phase("persistence"):
+            writer.save_batch(results[i:i + batch_size])
+    embeddings.close()
+    return {"analyzed": len(results), "failed": 0}
+
+
+def run_pipeline(args, urls: List[str], sites: List[Path], workdir: str) -> Dict:
+    try:
+        from agents.batch_agent import BatchAgent
+        import agents.scraper_agent  # noqa: F401
+        import agents.insights_agent  # noqa: F401
+    except ImportError as e:
+        return {"skipped": f"agentes no disponibles: {e}"}
+
+    writer = make_writer(args, workdir)
+    batch = BatchAgent(
+        scrape_concurrency=args.concurrency,
+        llm_concurrency=args.llm_concurrency,
+        writer_factory=lambda: writer,
+    )
+    results = batch.run(urls)
+    return {
+        "analyzed": sum(1 for r in results if r and r.success),
+        "failed": sum(1 for r in results if r and not r.success),
+    }
+
+
+# ----------------------------------------------------------------------
+# Informe
+# ----------------------------------------------------------------------
+
+def summarize(suite: str, outcome: Dict, elapsed: float, llm: FakeLLMServer) -> Dict:
+    from infrastructure.metrics import _peak_rss_bytes, metrics
+
+    snapshot = metrics.snapshot()
+    phases = {
+        series["labels"]["phase"]: {k: series[k] for k in ("count", "sum", "p50", "p95", "max")}
+        for series in snapshot["histograms"].get("phase_seconds", [])
+    }
+    analyzed = outcome.get("analyzed", 0)
+    peak = _peak_rss_bytes()
+    return {
+        "suite": suite,
+        **outcome,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_minute": round(analyzed / elapsed * 60, 2) if elapsed and analyzed else 0.0,
+        "phases": phases,
+        "llm_requests": dict(llm.requests),
+        "llm_tokens_in": metrics.counter_total("llm_tokens_total", direction="in"),
+        "llm_tokens_out": metrics.counter_total("llm_tokens_total", direction="out"),
+        "http_bytes": metrics.counter_total("http_bytes_total"),
+        "db_round_trips": metrics.counter_total("db_round_trips_total"),
+        "peak_rss_mb": round(peak / 1024 / 1024, 1) if peak else None,
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regresiones: menos throughput o más p95 por fase que el baseline ± tolerancia"""
+    regressions = []
+    previous = {suite["suite"]: suite for suite in baseline.get("suites", [])}
+    for suite in report["suites"]:
+        base = previous.get(suite["suite"])
+        if not base or "skipped" in suite or "skipped" in base:
+            continue
+        if suite["throughput_per_minute"] < base["throughput_per_minute"] * (1 - tolerance):
+            regressions.append(
+                f"{suite['suite']}: throughput {suite['throughput_per_minute']}/min "
+                f"< baseline {base['throughput_per_minute']}/min"
+            )
+        for phase, stats in suite["phases"].items():
+            base_p95 = (base["phases"].get(phase) or {}).get("p95")
+            if base_p95 and stats["p95"] and stats["p95"] > base_p95 * (1 + tolerance):
+                regressions.append(
+                    f"{suite['suite']}/{phase}: p95 {stats['p95']:.3f}s > baseline {base_p95:.3f}s"
+                )
+    return regressions
+
+
+def print_report(report: Dict):
+    for suite in report["suites"]:
+        print("=" * 80)
+        if "skipped" in suite:
+            print(f"{suite['suite']}: omitida ({suite['skipped']})")
+            continue
+        print(f"{suite['suite']}: {suite['analyzed']} competidores en {suite['elapsed_seconds']:.1f}s "
+              f"→ {suite['throughput_per_minute']:.1f}/min | pico RSS {suite['peak_rss_mb']} MB")
+        for phase, stats in sorted(suite["phases"].items(), key=lambda kv: -kv[1]["sum"]):
+            print(f"  {phase:<12} n={stats['count']:<4} p50 {stats['p50']:.3f}s  p95 {stats['p95']:.3f}s  "
+                  f"total {stats['sum']:.1f}s")
+        print(f"  LLM {suite['llm_requests']} | tokens {suite['llm_tokens_in']:.0f}/{suite['llm_tokens_out']:.0f} "
+              f"| bytes {suite['http_bytes']:.0f} | round trips BD {suite['db_round_trips']:.0f}")
+    print("=" * 80)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark offline del pipeline de análisis")
+    parser.add_argument("--suite", choices=SUITES + ("all",), default="all")
+    parser.add_argument("--sites", type=int, default=50, help="Número de sitios a reproducir")
+    parser.add_argument("--fixtures", help="Directorio de sitios grabados (default: benchmarks/fixtures/sites)")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los sitios sintéticos")
+    parser.add_argument("--provider", choices=("openai", "ollama"), default="openai")
+    parser.add_argument("--scoring-mode", default="single_call")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Latencia base por llamada LLM (s)")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Latencia por token generado (s)")
+    parser.add_argument("--site-latency", type=float, default=0.02, help="Latencia por respuesta HTTP (s)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Sitios en paralelo")
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--db", choices=("sqlite", "postgres"), default="sqlite")
+    parser.add_argument("--db-url", help="Postgres local (default: BENCH_DB_URL)")
+    parser.add_argument("--render", action="store_true", help="Permitir render con Playwright")
+    parser.add_argument("--warm-cache", action="store_true", help="Habilitar la cache de páginas/LLM")
+    parser.add_argument("--output", help="Guardar el informe JSON")
+    parser.add_argument("--baseline", help="Informe previo contra el que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Regresión tolerada (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    sites = load_sites(Path(args.fixtures) if args.fixtures else None, args.sites, args.seed)
+    farm = SiteFarm(sites, latency=args.site_latency)
+    llm = FakeLLMServer(args.llm_latency, args.token_latency)
+    urls = farm.start()
+    llm_url = llm.start()
+    workdir = tempfile.mkdtemp(prefix="cia-bench-")
+    configure_environment(args, llm_url, workdir)
+
+    from infrastructure.llm_client import close_llm_client
+    from infrastructure.metrics import metrics
+
+    report = {"config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+              "python": sys.version.split()[0], "suites": []}
+    suites = SUITES if args.suite == "all" else (args.suite,)
+    try:
+        for suite in suites:
+            metrics.reset()
+            llm.requests.clear()
+            start = time.perf_counter()
+            runner = run_components if suite == "components" else run_pipeline
+            outcome = runner(args, urls, sites, workdir)
+            elapsed = time.perf_counter() - start
+            report["suites"].append(
+                {"suite": suite, **outcome} if "skipped" in outcome else summarize(suite, outcome, elapsed, llm)
+            )
+            close_llm_client()
+    finally:
+        farm.stop()
+        llm.stop()
+
+    print_report(report)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Informe: {args.output}")
+
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+        for regression in regressions:
+            print(f"❌ Regresión: {regression}")
+        if regressions:
+            return 1
+        print("✓ Sin regresiones respecto al baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
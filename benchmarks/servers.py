@@ -0,0 +1,277 @@
+"""
+Servidores Locales de Benchmark
+- SiteFarm: un servidor HTTP por sitio grabado (puerto propio → dominio propio).
+- FakeLLMServer: endpoints compatibles con OpenAI (/v1/chat/completions,
+  /v1/embeddings) y Ollama (/api/generate, /api/chat, /api/embed) con
+  respuestas deterministas y latencia simulada (base + por token).
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from benchmarks.fixtures import site_pages
+from domain.attributes import ATTRIBUTE_CODES
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+# ----------------------------------------------------------------------
+# Sitios
+# ----------------------------------------------------------------------
+
+class _SiteHandler(_QuietHandler):
+    site: Path
+    pages: dict
+    latency: float = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        path = self.path.split("?", 1)[0].rstrip("/") or "/"
+        filename = self.pages.get(path)
+        if filename is None and (self.site / path.lstrip("/")).is_file():
+            filename = path.lstrip("/")
+        if filename is None:
+            self._send(404, b"Not Found", "text/plain")
+            return
+        file = self.site / filename
+        body = file.read_bytes()
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        content_type = "text/plain" if filename.endswith(".txt") else (
+            "application/xml" if filename.endswith(".xml") else "text/html; charset=utf-8"
+        )
+        self._send(200, body, content_type, {
+            "ETag": etag,
+            "Last-Modified": formatdate(file.stat().st_mtime, usegmt=True),
+        })
+
+    do_HEAD = do_GET
+
+
+class SiteFarm:
+    """Sirve cada sitio en su propio puerto de 127.0.0.1"""
+
+    def __init__(self, sites: List[Path], latency: float = 0.0):
+        self.sites = sites
+        self.latency = latency
+        self._servers: List[ThreadingHTTPServer] = []
+        self.urls: List[str] = []
+
+    def start(self) -> List[str]:
+        for site in self.sites:
+            handler = type("SiteHandler", (_SiteHandler,), {
+                "site": site, "pages": site_pages(site), "latency": self.latency,
+            })
+            server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name=f"site-{site.name}", daemon=True).start()
+            self._servers.append(server)
+            self.urls.append(f"http://127.0.0.1:{server.server_port}/")
+        return self.urls
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers.clear()
+
+
+# ----------------------------------------------------------------------
+# LLM / embeddings
+# ----------------------------------------------------------------------
+
+_URL = re.compile(r"https?://[^\s\"'<>\\]+")
+_CODES = re.compile(r"^- (\w+) \(", re.M)
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+def fake_completion(prompt: str) -> str:
+    """
+    Respuesta JSON determinista para cualquier fase. Incluye a la vez los
+    campos de extracción, scoring (por atributo y single-call) e insights,
+    así sirve para todos los agentes sin conocer su prompt exacto.
+    """
+    seed = _seed(prompt)
+    urls = list(dict.fromkeys(_URL.findall(prompt))) or ["https://example.com/"]
+    codes = [c for c in _CODES.findall(prompt) if c in ATTRIBUTE_CODES]
+
+    def score(code: str) -> Optional[float]:
+        value = _seed(f"{seed}:{code}") % 1000 / 1000
+        return None if value < 0.15 else round(value, 2)
+
+    attributes = []
+    for code in codes:
+        value = score(code)
+        attributes.append({
+            "code": code,
+            "score": value,
+            "evidence_urls": [urls[_seed(code) % len(urls)]] if value is not None else [],
+            "justification": "Evidencia simulada para benchmark",
+        })
+    single = score("single")
+    return json.dumps({
+        "name": f"Competitor {seed % 997}",
+        "servicios": ["PMS", "Channel Manager", "Revenue Management"][: 1 + seed % 3],
+        "modelo_negocio": "SaaS",
+        "segmento": "Hoteles independientes",
+        "propuesta_valor": "Plataforma todo en uno para hoteles",
+        "integraciones": ["Booking.com", "Expedia"],
+        "attributes": attributes,
+        "score": single,
+        "evidence_urls": [urls[0]] if single is not None else [],
+        "justification": "Evidencia simulada para benchmark",
+        "fortalezas_clave": ["Producto integrado", "Base instalada amplia", "API abierta"],
+        "oportunidades_mercado": ["Expansión a cadenas", "Módulos de IA"],
+        "riesgos_debilidades": ["Dependencia de OTAs", "Precio elevado"],
+    }, ensure_ascii=False)
+
+
+def fake_embedding(text: str, dimension: int) -> List[float]:
+    rng = np.random.default_rng(_seed(text))
+    vector = rng.standard_normal(dimension).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class _LLMHandler(_QuietHandler):
+    base_latency: float = 0.2
+    token_latency: float = 0.002
+    dimension: int = 1536
+    counter = None
+    counter_lock = threading.Lock()
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length", "0"))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _simulate(self, completion_tokens: int):
+        time.sleep(self.base_latency + self.token_latency * completion_tokens)
+
+    def _stream(self, chunks: List[bytes], content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_POST(self):
+        body = self._body()
+        path = self.path.split("?", 1)[0]
+        with self.counter_lock:
+            self.counter[path] = self.counter.get(path, 0) + 1
+
+        if path.endswith("/embeddings") or path == "/api/embed":
+            inputs = body.get("input") or body.get("prompt") or []
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self._simulate(0)
+            dimension = body.get("dimensions") or self.dimension
+            vectors = [fake_embedding(text, dimension) for text in inputs]
+            tokens = sum(len(t) // 4 for t in inputs)
+            if path == "/api/embed":
+                payload = {"model": body.get("model"), "embeddings": vectors}
+            else:
+                payload = {
+                    "data": [{"index": i, "embedding": v, "object": "embedding"} for i, v in enumerate(vectors)],
+                    "model": body.get("model"),
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                }
+            self._send(200, json.dumps(payload).encode(), "application/json")
+            return
+
+        if path.endswith("/chat/completions") or path in ("/api/generate", "/api/chat"):
+            messages = body.get("messages") or []
+            prompt = body.get("prompt") or "\n".join(m.get("content", "") for m in messages)
+            text = fake_completion(prompt)
+            prompt_tokens, completion_tokens = len(prompt) // 4, len(text) // 4
+            self._simulate(completion_tokens)
+            pieces = [text[i:i + 64] for i in range(0, len(text), 64)]
+
+            if path.endswith("/chat/completions"):
+                if not body.get("stream"):
+                    payload = {
+                        "model": body.get("model"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}}],
+                        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens},
+                    }
+                    self._send(200, json.dumps(payload).encode(), "application/json")
+                    return
+                events = [{"choices": [{"delta": {"content": p}}]} for p in pieces]
+                events.append({"choices": [], "usage": {"prompt_tokens": prompt_tokens,
+                                                        "completion_tokens": completion_tokens}})
+                chunks = [f"data: {json.dumps(e)}\n\n".encode() for e in events] + [b"data: [DONE]\n\n"]
+                self._stream(chunks, "text/event-stream")
+                return
+
+            key = "message" if path == "/api/chat" else "response"
+            def ollama_event(piece, done):
+                content = {"role": "assistant", "content": piece} if key == "message" else piece
+                event = {"model": body.get("model"), key: content, "done": done}
+                if done:
+                    event.update(prompt_eval_count=prompt_tokens, eval_count=completion_tokens,
+                                 eval_duration=int(self.token_latency * completion_tokens * 1e9))
+                return (json.dumps(event) + "\n").encode()
+
+            if body.get("stream") is False:
+                self._send(200, ollama_event(text, True), "application/json")
+                return
+            self._stream([ollama_event(p, False) for p in pieces] + [ollama_event("", True)],
+                         "application/x-ndjson")
+            return
+
+        self._send(404, b"{}", "application/json")
+
+
+class FakeLLMServer:
+    """Proveedor LLM/embeddings local con latencia simulada"""
+
+    def __init__(self, base_latency: float = 0.2, token_latency: float = 0.002, dimension: int = 1536):
+        self.requests = {}
+        handler = type("LLMHandler", (_LLMHandler,), {
+            "base_latency": base_latency,
+            "token_latency": token_latency,
+            "dimension": dimension,
+            "counter": self.requests,
+        })
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self) -> str:
+        threading.Thread(target=self._server.serve_forever, name="fake-llm", daemon=True).start()
+        return self.url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,147 @@
+"""
+Escritor SQLite para Benchmarks
+Misma interfaz que BulkDBWriterAgent (save_batch / save_competitor) y el
+mismo esquema lógico (competitors, scores por atributo, fuentes, productos),
+sobre un archivo SQLite local: el pipeline se puede medir sin Postgres.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from agents.bulk_db_writer_agent import _as_dict, _dedupe, _EXCLUDED_FIELDS, competitor_slug
+from infrastructure.metrics import metrics
+from services.incremental_service import current_source_urls, evidence_urls
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS competitors (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        domain TEXT UNIQUE NOT NULL,
+        name TEXT,
+        slug TEXT,
+        x_score REAL,
+        y_score REAL,
+        extracted_data TEXT,
+        insights TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS competitor_attribute_scores (
+        competitor_id INTEGER NOT NULL,
+        attribute_code TEXT NOT NULL,
+        raw_score REAL,
+        evidence_urls TEXT,
+        scored_at TEXT,
+        PRIMARY KEY (competitor_id, attribute_code)
+    );
+    CREATE TABLE IF NOT EXISTS competitor_sources (
+        competitor_id INTEGER NOT NULL,
+        url TEXT NOT NULL,
+        last_seen_at TEXT,
+        PRIMARY KEY (competitor_id, url)
+    );
+    CREATE TABLE IF NOT EXISTS products (
+        competitor_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        pricing TEXT,
+        source_url TEXT,
+        updated_at TEXT,
+        PRIMARY KEY (competitor_id, name)
+    );
+"""
+
+
+def _json(value) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class SQLiteBulkWriter:
+    """Stand-in de BulkDBWriterAgent para medir el pipeline sin Postgres"""
+
+    def __init__(self, path: str = ":memory:"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def save_batch(self, items: Iterable[Tuple[object, object, object]]) -> Dict[str, int]:
+        items = [item for item in items if item[0] is not None]
+        if not items:
+            return {}
+        now = datetime.now(timezone.utc).isoformat()
+
+        competitor_rows = _dedupe([
+            (
+                cd.domain,
+                cd.name,
+                competitor_slug(cd),
+                getattr(scores, "x_score", None),
+                getattr(scores, "y_score", None),
+                _json({k: v for k, v in _as_dict(cd).items() if k not in _EXCLUDED_FIELDS}),
+                _json(_as_dict(insights)),
+                now,
+            )
+            for cd, scores, insights in items
+        ], 1)
+
+        with self._lock, self._conn:
+            cursor = self._conn.cursor()
+            cursor.executemany(
+                """INSERT INTO competitors (domain, name, slug, x_score, y_score, extracted_data, insights, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (domain) DO UPDATE SET
+                       name = excluded.name, x_score = excluded.x_score, y_score = excluded.y_score,
+                       extracted_data = excluded.extracted_data, insights = excluded.insights,
+                       updated_at = excluded.updated_at""",
+                competitor_rows,
+            )
+            domains = [row[0] for row in competitor_rows]
+            placeholders = ",".join("?" * len(domains))
+            ids = dict(cursor.execute(
+                f"SELECT domain, id FROM competitors WHERE domain IN ({placeholders})", domains
+            ).fetchall())
+
+            score_rows, source_rows, product_rows = [], [], []
+            for cd, scores, _ in items:
+                competitor_id = ids[cd.domain]
+                for code, attribute in (getattr(scores, "attributes", None) or {}).items():
+                    score_rows.append((competitor_id, code, getattr(attribute, "raw_score", None),
+                                       _json(evidence_urls(attribute)), now))
+                for url in current_source_urls(cd):
+                    source_rows.append((competitor_id, url, now))
+                pricing = getattr(cd, "pricing", None) or {}
+                for product in pricing.get("products", []) if isinstance(pricing, dict) else []:
+                    product = _as_dict(product)
+                    if product.get("name"):
+                        product_rows.append((competitor_id, product["name"], _json(product),
+                                             product.get("source_url") or product.get("url"), now))
+
+            cursor.executemany(
+                """INSERT INTO competitor_attribute_scores VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (competitor_id, attribute_code) DO UPDATE SET
+                       raw_score = excluded.raw_score, evidence_urls = excluded.evidence_urls,
+                       scored_at = excluded.scored_at""",
+                _dedupe(score_rows, 2),
+            )
+            cursor.executemany(
+                """INSERT INTO competitor_sources VALUES (?, ?, ?)
+                   ON CONFLICT (competitor_id, url) DO UPDATE SET last_seen_at = excluded.last_seen_at""",
+                _dedupe(source_rows, 2),
+            )
+            cursor.executemany(
+                """INSERT INTO products VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (competitor_id, name) DO UPDATE SET
+                       pricing = excluded.pricing, source_url = excluded.source_url,
+                       updated_at = excluded.updated_at""",
+                _dedupe(product_rows, 2),
+            )
+        # Mismo número de sentencias que el escritor de Postgres (una por tabla)
+        metrics.inc("db_round_trips_total", 5, operation="sqlite")
+        return ids
+
+    def save_competitor(self, competitor_data, scores, insights) -> Optional[int]:
+        return self.save_batch([(competitor_data, scores, insights)]).get(competitor_data.domain)
+
+    def count(self, table: str = "competitors") -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
@@ -0,0 +1,44 @@
+"""
+Atributos de Scoring
+Catálogo de los 10 atributos evaluados y su dimensión en el plano estratégico.
+"""
+
+# (code, name, description, dimension)
+ATTRIBUTES = [
+    ("price_competitiveness", "Price Competitiveness", "Higher is better/cheaper", "Strategy"),
+    ("feature_set_completeness", "Feature Set Completeness", "Completeness of features", "Complexity"),
+    ("brand_sentiment", "Brand Sentiment", "Public perception", "Strategy"),
+    ("market_reach", "Market Reach", "Market presence", "Strategy"),
+    ("innovation_score", "Innovation Score", "Level of innovation", "Strategy"),
+    ("customer_satisfaction", "Customer Satisfaction", "User happiness", "Strategy"),
+    ("ease_of_use", "Ease of Use", "Usability", "Complexity"),
+    ("integration_capabilities", "Integration Capabilities", "Ability to integrate", "Complexity"),
+    ("support_quality", "Support Quality", "Quality of support", "Complexity"),
+    ("security_compliance", "Security/Compliance", "Security standards", "Complexity"),
+]
+
+ATTRIBUTE_CODES = [code for code, _, _, _ in ATTRIBUTES]
+
+# Eje del plano: Strategy → X, Complexity → Y (ver dim_attribute.dimension)
+ATTRIBUTE_AXIS = {code: ("X" if dimension == "Strategy" else "Y") for code, _, _, dimension in ATTRIBUTES}
+
+STRATEGY_ATTRIBUTES = [code for code in ATTRIBUTE_CODES if ATTRIBUTE_AXIS[code] == "X"]
+COMPLEXITY_ATTRIBUTES = [code for code in ATTRIBUTE_CODES if ATTRIBUTE_AXIS[code] == "Y"]
+
+# Estrategias de scoring (ver services/multi_attribute_scoring_service.build_scorer)
+SCORING_MODES = ("per_attribute", "single_call", "compare")
+
+
+def axis_scores(attributes):
+    """
+    X/Y como media de los atributos con evidencia de cada eje.
+    Un eje sin ningún atributo puntuado es NULL (no se usan valores por defecto).
+    """
+    totals = {"X": [], "Y": []}
+    for code, attribute in attributes.items():
+        score = getattr(attribute, "raw_score", None)
+        if score is not None and code in ATTRIBUTE_AXIS:
+            totals[ATTRIBUTE_AXIS[code]].append(score)
+    x = sum(totals["X"]) / len(totals["X"]) if totals["X"] else None
+    y = sum(totals["Y"]) / len(totals["Y"]) if totals["Y"] else None
+    return x, y
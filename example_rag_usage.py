@@ -85,7 +85,43 @@ def example_rag_usage():
         print(f"\n❌ Error: {e}")
         traceback.print_exc()
 
+def example_local_vector_index():
+    """Búsqueda en el índice vectorial local (funciona sin MongoDB)"""
+    
+    print("\n" + "=" * 80)
+    print("ÍNDICE VECTORIAL LOCAL")
+    print("=" * 80)
+    
+    try:
+        import time
+        from infrastructure.vector_index import get_vector_index
+        from services.embedding_service import EmbeddingService
+        
+        index = get_vector_index()
+        print(f"\n   Vectores indexados: {len(index)}")
+        if not len(index):
+            print("   El índice se llena con index.add(doc_ids, embeddings, context_types, domains)")
+            print("   o desde MongoDB con VectorIndex.from_documents(collection.find()).")
+            return
+        
+        query = "competitor with AI features and hotel management"
+        query_embedding = EmbeddingService().generate_embedding(query)
+        
+        start = time.perf_counter()
+        hits = index.search(query_embedding, k=3, context_type="extraction")
+        elapsed = (time.perf_counter() - start) * 1000
+        
+        print(f"   Consulta: {query} ({elapsed:.1f} ms)")
+        for hit in hits:
+            print(f"   - {hit.domain} | similitud {hit.similarity:.2f} | {hit.doc_id}")
+        
+    except Exception as e:
+        import traceback
+        print(f"\n❌ Error: {e}")
+        traceback.print_exc()
+
 if __name__ == "__main__":
     example_rag_usage()
+    example_local_vector_index()
 
 
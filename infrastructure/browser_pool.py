@@ -0,0 +1,448 @@
+"""
+Browser Pool
+Navegador Playwright de larga duración compartido por todos los hilos.
+
+- Un único Chromium por proceso; los contextos se reciclan tras N navegaciones.
+- Límite global de páginas abiertas simultáneamente.
+- Páginas reutilizadas por dominio (cookies y conexiones ya establecidas).
+- Bloqueo de imágenes, fuentes, media y scripts de analítica.
+- ``fetch_page``: descarga estática (requests + lxml) y renderizado sólo si
+  el HTML estático no tiene contenido suficiente. Cada host tiene su propio
+  límite de peticiones/min y concurrencia adaptativa en el scheduler.
+"""
+import asyncio
+import atexit
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from lxml import html as lxml_html
+
+from infrastructure.cache import DEFAULT_USER_AGENT, decode_html, get_page_cache
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+from infrastructure.scheduler import current_scope, get_scheduler
+
+logger = get_logger("BrowserPool")
+
+# Hosts de analítica/ads que no aportan contenido
+BLOCKED_HOST_PATTERNS = re.compile(
+    r"(google-analytics|googletagmanager|doubleclick|facebook\.net|connect\.facebook|hotjar|"
+    r"segment\.(io|com)|mixpanel|hubspot|hs-analytics|intercom|clarity\.ms|linkedin\.com/px|"
+    r"bat\.bing|tiktok|snap\.licdn|fullstory|optimizely|newrelic|sentry)",
+    re.IGNORECASE,
+)
+
+# Marcadores típicos de una SPA cuyo HTML estático es sólo un contenedor vacío
+_SPA_SHELL = re.compile(
+    r'<div[^>]+id=["\'](root|app|__next|__nuxt)["\'][^>]*>\s*</div>', re.IGNORECASE
+)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class RenderedPage:
+    """HTML de una página, obtenido estáticamente o renderizado"""
+    url: str
+    final_url: str
+    html: str
+    status: Optional[int]
+    rendered: bool
+
+
+def _domain(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+def _env_list(name: str, default: str) -> List[str]:
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+class _ContextEntry:
+    __slots__ = ("context", "navigations", "open_pages", "retired")
+
+    def __init__(self, context):
+        self.context = context
+        self.navigations = 0
+        self.open_pages = 0
+        self.retired = False
+
+
+class BrowserPool:
+    """
+    Pool de páginas Playwright con API síncrona.
+
+    Playwright async corre en un event loop propio en un hilo de fondo, de
+    modo que cualquier hilo (p.ej. los workers de BatchAgent) puede llamar a
+    ``render`` sin crear su propio navegador.
+    """
+
+    def __init__(
+        self,
+        max_pages: Optional[int] = None,
+        recycle_after: Optional[int] = None,
+        blocked_resources: Optional[List[str]] = None,
+        headless: bool = True,
+    ):
+        self.max_pages = max_pages or int(os.getenv("BROWSER_MAX_PAGES", "4"))
+        self.recycle_after = recycle_after or int(os.getenv("BROWSER_RECYCLE_AFTER", "50"))
+        self.blocked_resources = set(
+            blocked_resources or _env_list("BROWSER_BLOCK_RESOURCES", "image,font,media")
+        )
+        self.headless = headless
+        self.timeout = float(os.getenv("PLAYWRIGHT_TIMEOUT", "90"))
+
+        self.pages_rendered = 0
+        self.requests_blocked = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="browser-pool", daemon=True)
+        self._thread.start()
+
+        self._playwright = None
+        self._browser = None
+        self._contexts: List[_ContextEntry] = []
+        # Páginas ociosas (página → dominio) en orden LRU, como máximo max_pages
+        self._idle_pages: "OrderedDict[object, str]" = OrderedDict()
+        self._page_context: Dict[object, _ContextEntry] = {}
+        self._slots = asyncio.Semaphore(self.max_pages)
+        self._lock = asyncio.Lock()
+        self._init_lock = asyncio.Lock()
+        self._closed = False
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida (se ejecuta dentro del event loop del pool)
+    # ------------------------------------------------------------------
+
+    def _run(self, coro, timeout: Optional[float] = None):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    async def _ensure_browser(self):
+        """Navegador conectado; si Chromium se cayó o se desconectó, lo relanza"""
+        async with self._init_lock:
+            if self._browser is not None:
+                if self._browser.is_connected():
+                    return self._browser
+                logger.info("🔄 Relanzando Chromium tras la desconexión")
+                metrics.inc("browser_relaunches_total")
+                await self._discard_browser()
+            from playwright.async_api import async_playwright
+
+            self._playwright = await async_playwright().start()
+            try:
+                self._browser = await self._playwright.chromium.launch(headless=self.headless)
+            except Exception:
+                await self._playwright.stop()
+                self._playwright = None
+                raise
+            self._browser.on("disconnected", self._on_disconnected)
+            browser = self._browser
+        logger.info(f"🌐 Navegador iniciado | páginas máx: {self.max_pages} | reciclado cada {self.recycle_after}")
+        return browser
+
+    def _forget_pages(self):
+        """Olvida contextos y páginas; los renders en curso sólo liberan su contador"""
+        for entry in self._contexts:
+            entry.retired = True
+        self._contexts.clear()
+        self._idle_pages.clear()
+        self._page_context.clear()
+
+    def _on_disconnected(self, browser):
+        # Crash de Chromium o cierre externo: ninguna página del pool sirve ya
+        if browser is self._browser and not self._closed:
+            logger.warning("⚠ Navegador desconectado; se relanzará en el próximo render")
+            self._forget_pages()
+
+    async def _discard_browser(self):
+        self._forget_pages()
+        browser, self._browser = self._browser, None
+        try:
+            await browser.close()
+        except Exception:
+            pass
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+    async def _route(self, route):
+        request = route.request
+        if request.resource_type in self.blocked_resources or BLOCKED_HOST_PATTERNS.search(request.url):
+            self.requests_blocked += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _new_context(self) -> _ContextEntry:
+        context = await self._browser.new_context(
+            user_agent=DEFAULT_USER_AGENT,
+            java_script_enabled=True,
+            ignore_https_errors=True,
+        )
+        await context.route("**/*", self._route)
+        entry = _ContextEntry(context)
+        self._contexts.append(entry)
+        return entry
+
+    async def _close_context_if_drained(self, entry: _ContextEntry):
+        if entry.retired and entry.open_pages == 0:
+            # Descartar páginas ociosas que aún apuntan al contexto retirado
+            for page in [p for p in self._idle_pages if self._page_context.get(p) is entry]:
+                del self._idle_pages[page]
+                self._page_context.pop(page, None)
+            if entry in self._contexts:
+                self._contexts.remove(entry)
+            try:
+                await entry.context.close()
+            except Exception:
+                pass
+
+    async def _acquire_page(self, domain: str):
+        async with self._lock:
+            # Reutilizar una página ociosa del mismo dominio
+            for page in [p for p, d in self._idle_pages.items() if d == domain]:
+                del self._idle_pages[page]
+                entry = self._page_context.get(page)
+                if entry and not entry.retired and not page.is_closed():
+                    entry.open_pages += 1
+                    return page, entry
+                self._page_context.pop(page, None)
+
+            entry = next((c for c in self._contexts if not c.retired), None)
+            if entry is None:
+                entry = await self._new_context()
+            page = await entry.context.new_page()
+            self._page_context[page] = entry
+            entry.open_pages += 1
+            return page, entry
+
+    async def _release_page(self, domain: str, page, entry: _ContextEntry, reusable: bool):
+        async with self._lock:
+            entry.open_pages -= 1
+            entry.navigations += 1
+            if entry.navigations >= self.recycle_after:
+                entry.retired = True
+
+            if reusable and not entry.retired and not page.is_closed():
+                self._idle_pages[page] = domain
+                # Limitar páginas ociosas: cerrar la menos usada recientemente
+                while len(self._idle_pages) > self.max_pages:
+                    oldest, _ = self._idle_pages.popitem(last=False)
+                    self._page_context.pop(oldest, None)
+                    try:
+                        await oldest.close()
+                    except Exception:
+                        pass
+            else:
+                self._page_context.pop(page, None)
+                if not page.is_closed():
+                    try:
+                        await page.close()
+                    except Exception:
+                        pass
+            await self._close_context_if_drained(entry)
+
+    async def _render(self, url: str, timeout: float, wait_until: str) -> RenderedPage:
+        """Renderiza con un reintento si el navegador se cae durante la navegación"""
+        browser = await self._ensure_browser()
+        try:
+            return await self._render_page(url, timeout, wait_until)
+        except Exception:
+            if browser.is_connected() or self._closed:
+                raise
+        logger.warning(f"⚠ Navegador caído renderizando {url}, reintentando")
+        await self._ensure_browser()
+        return await self._render_page(url, timeout, wait_until)
+
+    async def _render_page(self, url: str, timeout: float, wait_until: str) -> RenderedPage:
+        domain = _domain(url)
+        async with self._slots:
+            page, entry = await self._acquire_page(domain)
+            reusable = False
+            try:
+                response = await page.goto(url, timeout=timeout * 1000, wait_until=wait_until)
+                content = await page.content()
+                self.pages_rendered += 1
+                metrics.inc("pages_rendered_total")
+                metrics.inc("http_bytes_total", len(content.encode("utf-8")), kind="render")
+                reusable = True
+                return RenderedPage(
+                    url=url,
+                    final_url=page.url,
+                    html=content,
+                    status=response.status if response else None,
+                    rendered=True,
+                )
+            finally:
+                await self._release_page(domain, page, entry, reusable)
+
+    async def _shutdown(self):
+        for entry in list(self._contexts):
+            try:
+                await entry.context.close()
+            except Exception:
+                pass
+        self._contexts.clear()
+        self._idle_pages.clear()
+        self._page_context.clear()
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    # ------------------------------------------------------------------
+    # API pública (síncrona, segura entre hilos)
+    # ------------------------------------------------------------------
+
+    def warm(self):
+        """Lanza Chromium por adelantado (servicios de larga duración)"""
+        self._run(self._ensure_browser())
+
+    def render(self, url: str, timeout: Optional[float] = None, wait_until: str = "domcontentloaded") -> RenderedPage:
+        """Renderiza ``url`` con JavaScript usando una página del pool"""
+        if self._closed:
+            raise RuntimeError("BrowserPool cerrado")
+        timeout = timeout or self.timeout
+        with metrics.timer("render_seconds"):
+            return self._run(self._render(url, timeout, wait_until))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._run(self._shutdown(), timeout=30)
+        except Exception as e:
+            logger.warning(f"⚠ Error al cerrar el navegador: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        if self.pages_rendered:
+            logger.info(
+                f"🌐 Navegador cerrado | páginas renderizadas: {self.pages_rendered} | "
+                f"peticiones bloqueadas: {self.requests_blocked}"
+            )
+
+
+# ----------------------------------------------------------------------
+# Pool compartido y descarga estática-primero
+# ----------------------------------------------------------------------
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """BrowserPool compartido del proceso (se crea en el primer uso)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+        return _pool
+
+
+def close_browser_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+atexit.register(close_browser_pool)
+
+_static_session = requests.Session()
+_static_session.headers["User-Agent"] = DEFAULT_USER_AGENT
+
+# Respuestas con las que un sitio pide bajar el ritmo
+_THROTTLE_STATUS = {429, 503}
+
+
+def static_has_content(html: str, min_text_chars: Optional[int] = None) -> bool:
+    """True si el HTML estático tiene texto visible suficiente (no es un shell de SPA)"""
+    min_text_chars = min_text_chars or int(os.getenv("STATIC_MIN_TEXT_CHARS", "1500"))
+    if _SPA_SHELL.search(html):
+        return False
+    try:
+        tree = lxml_html.fromstring(html)
+    except Exception:
+        return False
+    for element in tree.xpath("//script|//style|//noscript|//template"):
+        element.drop_tree()
+    text = _WHITESPACE.sub(" ", tree.text_content()).strip()
+    return len(text) >= min_text_chars
+
+
+def fetch_page(
+    url: str, pricing: bool = False, force_render: bool = False, max_age: Optional[float] = None
+) -> Optional[RenderedPage]:
+    """
+    Obtiene el HTML de ``url`` de la forma más barata posible.
+
+    Primero intenta una descarga estática (con cache/peticiones condicionales
+    si está habilitada); sólo si responde pero el HTML no tiene contenido
+    suficiente, o si la petición falla, se renderiza con el BrowserPool. Un
+    4xx, 429 o 5xx devuelve None: el navegador repetiría una petición más cara.
+    ``pricing`` usa PLAYWRIGHT_PRICING_TIMEOUT. ``max_age=0`` revalida siempre
+    la entrada de la cache.
+    """
+    use_dynamic = os.getenv("USE_DYNAMIC_SCRAPER", "true").lower() == "true"
+    gate = get_scheduler().gate("scrape", "web", _domain(url))
+    lane = current_scope().lane
+
+    if not force_render:
+        permit = gate.acquire(lane=lane)
+        try:
+            cache = get_page_cache()
+            if cache:
+                page = cache.fetch(url, session=_static_session, timeout=30, max_age=max_age)
+                html, status = page.text, page.status_code
+            else:
+                with metrics.timer("http_fetch_seconds", kind="static"):
+                    response = _static_session.get(url, timeout=30)
+                metrics.inc("http_bytes_total", len(response.content), kind="static")
+                # response.text asume ISO-8859-1 sin charset en la cabecera e ignora <meta charset>
+                html = decode_html(response.content, response.headers.get("Content-Type"))
+                status = response.status_code
+            permit.release(throttled=status in _THROTTLE_STATUS)
+            if status not in (200, 304):
+                logger.debug(f"Descarga estática de {url}: HTTP {status}, sin renderizar")
+                return None
+            if not use_dynamic or static_has_content(html):
+                metrics.inc("pages_fetched_total", mode="static")
+                return RenderedPage(url=url, final_url=url, html=html, status=status, rendered=False)
+        except requests.RequestException as e:
+            logger.debug(f"Descarga estática fallida para {url}: {e}")
+        finally:
+            permit.release()
+
+    if not use_dynamic:
+        return None
+
+    timeout = float(os.getenv("PLAYWRIGHT_PRICING_TIMEOUT" if pricing else "PLAYWRIGHT_TIMEOUT",
+                              "120" if pricing else "90"))
+    permit = gate.acquire(lane=lane)
+    try:
+        rendered = get_browser_pool().render(url, timeout=timeout)
+        permit.release(throttled=rendered.status in _THROTTLE_STATUS)
+    except Exception as e:
+        logger.warning(f"⚠ No se pudo renderizar {url}: {e}")
+        return None
+    finally:
+        permit.release()
+
+    cache = get_page_cache()
+    if cache and rendered.status == 200:
+        # Conserva el ETag/Last-Modified de la descarga estática: la revalidación
+        # condicional sigue funcionando y un 304 sirve el HTML renderizado
+        cache.put(url, rendered.html, content_type="text/html", keep_validators=True)
+    return rendered
@@ -0,0 +1,700 @@
+"""
+Cache en disco para páginas y respuestas LLM
+Evita re-renderizar páginas que no cambiaron y re-enviar prompts idénticos.
+
+- PageCache: contenido direccionado por hash (sha256) + índice por URL con
+  ETag/Last-Modified para peticiones condicionales, TTL y expulsión por tamaño.
+- LLMCache: memoiza respuestas por (modelo, hash del prompt, parámetros).
+- EmbeddingCache: embeddings por (modelo, hash del chunk), en float32,
+  float16 o int8 (EMBEDDING_STORAGE).
+- UrlCheckCache: resultado de comprobar URLs de evidencia (responde / rota).
+"""
+import codecs
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Optional, Tuple
+
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+
+if TYPE_CHECKING:  # numpy y requests se importan al usarse (arranque rápido del CLI)
+    import numpy as np
+    import requests
+
+logger = get_logger("Cache")
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (compatible; CompetitorIntelligenceAgent/1.0)"
+
+
+def content_hash(content: bytes) -> str:
+    """Hash sha256 del contenido (clave del almacenamiento direccionado por contenido)"""
+    return hashlib.sha256(content).hexdigest()
+
+
+_HEADER_CHARSET = re.compile(r"charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+_META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+
+
+def _codec(name) -> Optional[str]:
+    if isinstance(name, bytes):
+        name = name.decode("ascii", errors="ignore")
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+
+def sniff_charset(head: bytes, content_type: Optional[str] = None) -> str:
+    """
+    Codificación de un HTML a partir de sus primeros bytes: BOM, charset de
+    la cabecera Content-Type y ``<meta charset>`` / http-equiv, en ese orden.
+    Sin declaración: UTF-8 si los bytes lo son, si no windows-1252.
+    """
+    for bom, name in _BOMS:
+        if head.startswith(bom):
+            return name
+    match = _HEADER_CHARSET.search(content_type or "")
+    charset = _codec(match.group(1)) if match else None
+    if charset is None:
+        match = _META_CHARSET.search(head[:4096])
+        charset = _codec(match.group(1)) if match else None
+    if charset is not None:
+        return charset
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def decode_html(content: bytes, content_type: Optional[str] = None) -> str:
+    """HTML en bytes → texto con su codificación real (ver sniff_charset)"""
+    return content.decode(sniff_charset(content, content_type), errors="replace")
+
+
+@dataclass
+class CachedPage:
+    """Página servida desde la cache o recién descargada"""
+    url: str
+    content: bytes
+    content_hash: str
+    from_cache: bool
+    changed: bool
+    status_code: int = 200
+    content_type: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        return decode_html(self.content, self.content_type)
+
+
+class _SQLiteStore:
+    """Conexión SQLite compartida entre hilos (WAL + lock)"""
+
+    def __init__(self, path: Path, schema: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(schema)
+
+    def execute(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class PageCache:
+    """
+    Cache de páginas web en disco.
+
+    Los cuerpos se guardan una sola vez por hash de contenido en
+    ``<cache_dir>/blobs`` y el índice (URL → hash, validadores HTTP, fechas)
+    vive en ``<cache_dir>/pages.db``.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            content_type TEXT,
+            size INTEGER NOT NULL,
+            fetched_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_pages_hash ON pages(content_hash);
+        CREATE INDEX IF NOT EXISTS idx_pages_access ON pages(last_access);
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.cache_dir = Path(cache_dir or os.getenv("CACHE_DIR", ".cache"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("CACHE_TTL_HOURS", "24")) * 3600
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("CACHE_MAX_MB", "1024")) * 1024 * 1024
+        self.blob_dir = self.cache_dir / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self._db = _SQLiteStore(self.cache_dir / "pages.db", self._SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    # ------------------------------------------------------------------
+    # Blobs
+    # ------------------------------------------------------------------
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def _write_blob(self, content: bytes) -> str:
+        digest = content_hash(content)
+        path = self._blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(content)
+            os.replace(tmp, path)
+        return digest
+
+    def _read_blob(self, digest: str) -> Optional[bytes]:
+        try:
+            return self._blob_path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def get(self, url: str, max_age: Optional[float] = None) -> Optional[CachedPage]:
+        """Devuelve la página si está en cache y no supera ``max_age`` (default: TTL)"""
+        rows = self._db.execute(
+            "SELECT content_hash, content_type, fetched_at FROM pages WHERE url = ?", (url,)
+        )
+        if not rows:
+            return None
+        digest, content_type, fetched_at = rows[0]
+        max_age = self.ttl_seconds if max_age is None else max_age
+        if time.time() - fetched_at > max_age:
+            return None
+        content = self._read_blob(digest)
+        if content is None:
+            return None
+        self._db.execute("UPDATE pages SET last_access = ? WHERE url = ?", (time.time(), url))
+        return CachedPage(url, content, digest, from_cache=True, changed=False, content_type=content_type)
+
+    def put(
+        self,
+        url: str,
+        content: bytes,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        content_type: Optional[str] = None,
+        keep_validators: bool = False,
+    ) -> CachedPage:
+        """
+        Guarda una página (p.ej. HTML renderizado por Playwright).
+        ``changed`` indica si el contenido difiere de la versión anterior.
+        ``keep_validators`` conserva el ETag/Last-Modified ya guardados si no
+        se pasan otros (el HTML renderizado deriva de esa misma respuesta).
+        """
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+            # Un <meta charset> del HTML renderizado ya no describe estos bytes
+            content_type = f"{(content_type or 'text/html').split(';')[0]}; charset=utf-8"
+        digest = self._write_blob(content)
+        previous = self._db.execute(
+            "SELECT content_hash, etag, last_modified FROM pages WHERE url = ?", (url,)
+        )
+        changed = not previous or previous[0][0] != digest
+        if keep_validators and previous:
+            etag = etag or previous[0][1]
+            last_modified = last_modified or previous[0][2]
+        now = time.time()
+        self._db.execute(
+            """INSERT INTO pages (url, content_hash, etag, last_modified, content_type, size, fetched_at, last_access)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(url) DO UPDATE SET
+                   content_hash = excluded.content_hash, etag = excluded.etag,
+                   last_modified = excluded.last_modified, content_type = excluded.content_type,
+                   size = excluded.size, fetched_at = excluded.fetched_at,
+                   last_access = excluded.last_access""",
+            (url, digest, etag, last_modified, content_type, len(content), now, now),
+        )
+        return CachedPage(url, content, digest, from_cache=False, changed=changed, content_type=content_type)
+
+    def fetch(
+        self,
+        url: str,
+        session: Optional["requests.Session"] = None,
+        timeout: float = 30,
+        max_age: Optional[float] = None,
+    ) -> CachedPage:
+        """
+        Descarga estática con cache.
+
+        1. Entrada fresca (dentro del TTL) → se sirve sin red.
+        2. Entrada caducada con ETag/Last-Modified → petición condicional;
+           un 304 renueva la entrada sin descargar el cuerpo.
+        3. Sin entrada o contenido nuevo → descarga completa y se guarda.
+        """
+        cached = self.get(url, max_age=max_age)
+        if cached:
+            self.hits += 1
+            metrics.inc("cache_requests_total", cache="page", result="hit")
+            return cached
+
+        headers = {"User-Agent": DEFAULT_USER_AGENT}
+        rows = self._db.execute(
+            "SELECT content_hash, etag, last_modified, content_type FROM pages WHERE url = ?", (url,)
+        )
+        if rows:
+            _, etag, last_modified, _ = rows[0]
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        if session is None:
+            import requests
+
+            session = requests
+        with metrics.timer("http_fetch_seconds", kind="static"):
+            response = session.get(url, headers=headers, timeout=timeout)
+        metrics.inc("http_bytes_total", len(response.content), kind="static")
+
+        if response.status_code == 304 and rows:
+            digest, _, _, content_type = rows[0]
+            content = self._read_blob(digest)
+            if content is not None:
+                now = time.time()
+                self._db.execute(
+                    "UPDATE pages SET fetched_at = ?, last_access = ? WHERE url = ?", (now, now, url)
+                )
+                self.revalidated += 1
+                metrics.inc("cache_requests_total", cache="page", result="revalidated")
+                return CachedPage(url, content, digest, from_cache=True, changed=False,
+                                  status_code=304, content_type=content_type)
+        if response.status_code == 304:
+            # 304 sin cuerpo en disco (blob expulsado o borrado): se repite sin validadores
+            headers = {"User-Agent": DEFAULT_USER_AGENT}
+            with metrics.timer("http_fetch_seconds", kind="static"):
+                response = session.get(url, headers=headers, timeout=timeout)
+            metrics.inc("http_bytes_total", len(response.content), kind="static")
+
+        self.misses += 1
+        metrics.inc("cache_requests_total", cache="page", result="miss")
+        if response.status_code != 200:
+            return CachedPage(url, response.content, content_hash(response.content), from_cache=False,
+                              changed=True, status_code=response.status_code,
+                              content_type=response.headers.get("Content-Type"))
+
+        page = self.put(
+            url,
+            response.content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            content_type=response.headers.get("Content-Type"),
+        )
+        page.status_code = response.status_code
+        return page
+
+    def evict(self) -> int:
+        """
+        Elimina entradas caducadas y, si la cache supera ``max_bytes``,
+        las menos usadas recientemente. Devuelve el número de entradas borradas.
+        """
+        removed = 0
+        # Las entradas con validadores HTTP se conservan más allá del TTL para
+        # poder revalidarlas con un 304; el resto caduca con el TTL.
+        expired_before = time.time() - self.ttl_seconds
+        rows = self._db.execute(
+            "DELETE FROM pages WHERE fetched_at < ? AND etag IS NULL AND last_modified IS NULL RETURNING url",
+            (expired_before,),
+        )
+        removed += len(rows)
+
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages")[0][0]
+        if total > self.max_bytes:
+            for url, size in self._db.execute("SELECT url, size FROM pages ORDER BY last_access ASC"):
+                if total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                total -= size
+                removed += 1
+
+        # Blobs huérfanos (ya no referenciados por ninguna URL)
+        referenced = {row[0] for row in self._db.execute("SELECT DISTINCT content_hash FROM pages")}
+        for path in self.blob_dir.glob("*/*"):
+            if path.name not in referenced and not path.name.endswith(".tmp"):
+                path.unlink(missing_ok=True)
+
+        if removed:
+            logger.info(f"🧹 Cache de páginas: {removed} entradas expulsadas")
+        return removed
+
+    def close(self):
+        self._db.close()
+
+
+class LLMCache:
+    """
+    Memoiza respuestas LLM por (modelo, hash del prompt, parámetros).
+
+    Los parámetros que cambian la salida (temperature, formato JSON, etc.)
+    forman parte de la clave para no mezclar respuestas distintas.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS llm_responses (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_llm_access ON llm_responses(last_access);
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.cache_dir = Path(cache_dir or os.getenv("CACHE_DIR", ".cache"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("LLM_CACHE_TTL_HOURS", "720")) * 3600
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("CACHE_MAX_MB", "1024")) * 1024 * 1024
+        self._db = _SQLiteStore(self.cache_dir / "llm.db", self._SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, prompt: str, **params) -> str:
+        payload = json.dumps({"model": model, "params": params}, sort_keys=True, default=str)
+        digest = hashlib.sha256()
+        digest.update(payload.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, model: str, prompt: str, **params) -> Optional[str]:
+        key = self.key(model, prompt, **params)
+        rows = self._db.execute("SELECT response, created_at FROM llm_responses WHERE key = ?", (key,))
+        if not rows or time.time() - rows[0][1] > self.ttl_seconds:
+            self.misses += 1
+            metrics.inc("cache_requests_total", cache="llm", result="miss")
+            return None
+        self._db.execute("UPDATE llm_responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        metrics.inc("cache_requests_total", cache="llm", result="hit")
+        return rows[0][0]
+
+    def put(self, model: str, prompt: str, response: str, **params):
+        key = self.key(model, prompt, **params)
+        now = time.time()
+        self._db.execute(
+            """INSERT OR REPLACE INTO llm_responses (key, model, response, size, created_at, last_access)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (key, model, response, len(response.encode("utf-8")), now, now),
+        )
+
+    def get_or_call(self, model: str, prompt: str, call: Callable[[], str], **params) -> str:
+        """Devuelve la respuesta memoizada o ejecuta ``call()`` y la guarda"""
+        cached = self.get(model, prompt, **params)
+        if cached is not None:
+            return cached
+        response = call()
+        if response:
+            self.put(model, prompt, response, **params)
+        return response
+
+    def evict(self) -> int:
+        removed = len(self._db.execute(
+            "DELETE FROM llm_responses WHERE created_at < ? RETURNING key",
+            (time.time() - self.ttl_seconds,),
+        ))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses")[0][0]
+        if total > self.max_bytes:
+            for key, size in self._db.execute("SELECT key, size FROM llm_responses ORDER BY last_access ASC"):
+                if total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                total -= size
+                removed += 1
+        return removed
+
+    def close(self):
+        self._db.close()
+
+
+class EmbeddingCache:
+    """
+    Embeddings por (modelo, hash sha256 del chunk normalizado).
+
+    Los vectores se guardan en el formato de ``storage`` (float16 / int8
+    reducen el tamaño 2x / 4x) y se devuelven siempre como float32.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS embeddings (
+            model TEXT NOT NULL,
+            chunk_hash TEXT NOT NULL,
+            storage TEXT NOT NULL,
+            scale REAL NOT NULL,
+            vector BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL,
+            PRIMARY KEY (model, chunk_hash)
+        );
+        CREATE INDEX IF NOT EXISTS idx_embeddings_access ON embeddings(last_access);
+    """
+
+    # Límite de parámetros por sentencia de SQLite
+    _MAX_PARAMS = 500
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        storage: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.cache_dir = Path(cache_dir or os.getenv("CACHE_DIR", ".cache"))
+        self.storage = storage or os.getenv("EMBEDDING_STORAGE", "float32")
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("CACHE_MAX_MB", "1024")) * 1024 * 1024
+        self._db = _SQLiteStore(self.cache_dir / "embeddings.db", self._SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model: str, chunk_hashes: Iterable[str]) -> Dict[str, "np.ndarray"]:
+        """{hash: vector float32} de los hashes presentes en la cache"""
+        import numpy as np
+
+        from infrastructure.vector_index import decode_vectors
+
+        chunk_hashes = list(dict.fromkeys(chunk_hashes))
+        found = {}
+        for start in range(0, len(chunk_hashes), self._MAX_PARAMS):
+            batch = chunk_hashes[start:start + self._MAX_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(
+                f"SELECT chunk_hash, storage, scale, vector FROM embeddings "
+                f"WHERE model = ? AND chunk_hash IN ({placeholders})",
+                (model, *batch),
+            )
+            for chunk_hash, storage, scale, blob in rows:
+                encoded = np.frombuffer(blob, dtype=storage)
+                found[chunk_hash] = decode_vectors(encoded[None, :], np.array([scale]))[0]
+            if rows:
+                self._db.execute(
+                    f"UPDATE embeddings SET last_access = ? WHERE model = ? AND chunk_hash IN ({placeholders})",
+                    (time.time(), model, *batch),
+                )
+        self.hits += len(found)
+        self.misses += len(chunk_hashes) - len(found)
+        metrics.inc("cache_requests_total", len(found), cache="embedding", result="hit")
+        metrics.inc("cache_requests_total", len(chunk_hashes) - len(found), cache="embedding", result="miss")
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, "np.ndarray"]):
+        import numpy as np
+
+        from infrastructure.vector_index import encode_vectors
+
+        if not vectors:
+            return
+        hashes = list(vectors)
+        encoded, scales = encode_vectors(np.stack([vectors[h] for h in hashes]), self.storage)
+        now = time.time()
+        rows = [
+            (model, h, self.storage, float(scale), row.tobytes(), row.nbytes, now, now)
+            for h, row, scale in zip(hashes, encoded, scales)
+        ]
+        with self._db._lock:
+            self._db._conn.executemany(
+                """INSERT OR REPLACE INTO embeddings
+                       (model, chunk_hash, storage, scale, vector, size, created_at, last_access)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows,
+            )
+
+    def evict(self) -> int:
+        """Sin TTL (un embedding no caduca para el mismo modelo); sólo límite de tamaño"""
+        removed = 0
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings")[0][0]
+        if total > self.max_bytes:
+            for model, chunk_hash, size in self._db.execute(
+                "SELECT model, chunk_hash, size FROM embeddings ORDER BY last_access ASC"
+            ):
+                if total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM embeddings WHERE model = ? AND chunk_hash = ?", (model, chunk_hash))
+                total -= size
+                removed += 1
+        return removed
+
+    def close(self):
+        self._db.close()
+
+
+class UrlCheckCache:
+    """
+    Último resultado de comprobar cada URL de evidencia (ValidationService).
+
+    Sólo se guardan resultados concluyentes (la URL responde o está rota);
+    los fallos transitorios (timeouts, 5xx, 429) se vuelven a comprobar.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS url_checks (
+            url TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            status_code INTEGER,
+            final_url TEXT,
+            checked_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_url_checks_time ON url_checks(checked_at);
+    """
+
+    # Límite de parámetros por sentencia de SQLite
+    _MAX_PARAMS = 500
+
+    def __init__(self, cache_dir: Optional[str] = None, ttl_seconds: Optional[float] = None):
+        self.cache_dir = Path(cache_dir or os.getenv("CACHE_DIR", ".cache"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("URL_CHECK_TTL_HOURS", "24")) * 3600
+        self._db = _SQLiteStore(self.cache_dir / "url_checks.db", self._SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, urls: Iterable[str]) -> Dict[str, Tuple[str, Optional[int], Optional[str]]]:
+        """{url: (status, status_code, final_url)} de las URLs comprobadas dentro del TTL"""
+        urls = list(dict.fromkeys(urls))
+        found = {}
+        oldest = time.time() - self.ttl_seconds
+        for start in range(0, len(urls), self._MAX_PARAMS):
+            batch = urls[start:start + self._MAX_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(
+                f"SELECT url, status, status_code, final_url FROM url_checks "
+                f"WHERE checked_at >= ? AND url IN ({placeholders})",
+                (oldest, *batch),
+            )
+            for url, status, status_code, final_url in rows:
+                found[url] = (status, status_code, final_url)
+        self.hits += len(found)
+        self.misses += len(urls) - len(found)
+        metrics.inc("cache_requests_total", len(found), cache="url_check", result="hit")
+        metrics.inc("cache_requests_total", len(urls) - len(found), cache="url_check", result="miss")
+        return found
+
+    def put_many(self, checks: Iterable[Tuple[str, str, Optional[int], Optional[str]]]):
+        """Guarda ``(url, status, status_code, final_url)``"""
+        now = time.time()
+        rows = [(url, status, status_code, final_url, now) for url, status, status_code, final_url in checks]
+        if not rows:
+            return
+        with self._db._lock:
+            self._db._conn.executemany(
+                """INSERT OR REPLACE INTO url_checks (url, status, status_code, final_url, checked_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                rows,
+            )
+
+    def evict(self) -> int:
+        return len(self._db.execute(
+            "DELETE FROM url_checks WHERE checked_at < ? RETURNING url",
+            (time.time() - self.ttl_seconds,),
+        ))
+
+    def close(self):
+        self._db.close()
+
+
+# ----------------------------------------------------------------------
+# Instancias compartidas (configuradas por variables de entorno)
+# ----------------------------------------------------------------------
+
+_page_cache: Optional[PageCache] = None
+_llm_cache: Optional[LLMCache] = None
+_embedding_cache: Optional[EmbeddingCache] = None
+_url_check_cache: Optional[UrlCheckCache] = None
+_init_lock = threading.Lock()
+
+
+def cache_enabled() -> bool:
+    return os.getenv("CACHE_ENABLED", "true").lower() == "true"
+
+
+def get_page_cache() -> Optional[PageCache]:
+    """PageCache compartida del proceso, o None si CACHE_ENABLED=false"""
+    global _page_cache
+    if not cache_enabled():
+        return None
+    with _init_lock:
+        if _page_cache is None:
+            _page_cache = PageCache()
+        return _page_cache
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """LLMCache compartida del proceso, o None si CACHE_ENABLED=false"""
+    global _llm_cache
+    if not cache_enabled():
+        return None
+    with _init_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMCache()
+        return _llm_cache
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """EmbeddingCache compartida del proceso, o None si CACHE_ENABLED=false"""
+    global _embedding_cache
+    if not cache_enabled():
+        return None
+    with _init_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache()
+        return _embedding_cache
+
+
+def get_url_check_cache() -> Optional[UrlCheckCache]:
+    """UrlCheckCache compartida del proceso, o None si CACHE_ENABLED=false"""
+    global _url_check_cache
+    if not cache_enabled():
+        return None
+    with _init_lock:
+        if _url_check_cache is None:
+            _url_check_cache = UrlCheckCache()
+        return _url_check_cache
+
+
+def evict_caches():
+    """Aplica TTL y límite de tamaño a las caches abiertas en este proceso"""
+    if _page_cache is not None:
+        _page_cache.evict()
+    if _llm_cache is not None:
+        _llm_cache.evict()
+    if _embedding_cache is not None:
+        _embedding_cache.evict()
+    if _url_check_cache is not None:
+        _url_check_cache.evict()
@@ -0,0 +1,67 @@
+"""
+Pool de Conexiones PostgreSQL
+Pool psycopg2 compartido por todos los hilos del proceso (SUPABASE_DB_URL).
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from psycopg2.pool import ThreadedConnectionPool
+
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+
+logger = get_logger("DBPool")
+
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_db_pool() -> ThreadedConnectionPool:
+    """Pool compartido (DB_POOL_MIN/DB_POOL_MAX conexiones)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            db_url = (os.getenv("SUPABASE_DB_URL") or "").strip()
+            if not db_url:
+                raise RuntimeError("SUPABASE_DB_URL no está configurada")
+            _pool = ThreadedConnectionPool(
+                int(os.getenv("DB_POOL_MIN", "1")),
+                int(os.getenv("DB_POOL_MAX", "8")),
+                dsn=db_url,
+            )
+            logger.info(f"🗄 Pool de conexiones creado (máx {_pool.maxconn})")
+        return _pool
+
+
+@contextmanager
+def db_transaction():
+    """
+    Conexión del pool dentro de una transacción.
+    Hace commit al salir sin errores y rollback si hay excepción.
+    """
+    pool = get_db_pool()
+    conn = pool.getconn()
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield conn
+        conn.commit()
+        status = "ok"
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+        metrics.observe("db_transaction_seconds", time.perf_counter() - start, status=status)
+        metrics.inc("db_round_trips_total", operation="commit" if status == "ok" else "rollback")
+
+
+def close_db_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
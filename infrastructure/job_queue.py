@@ -0,0 +1,381 @@
+"""
+Cola de Trabajos Persistente
+Runs de batch reanudables y repartibles entre procesos/máquinas.
+
+- Un job por (run, dominio); cada fase completada (extracción, scoring,
+  insights) guarda un checkpoint con los datos intermedios (JSON con tipos,
+  infrastructure/serialization.py), así un run reiniciado retoma cada
+  dominio en la fase siguiente a la última hecha.
+- Leases con visibilidad limitada (JOB_LEASE_SECONDS): si un worker muere,
+  sus jobs vuelven a estar disponibles cuando caduca el lease. Los workers
+  vivos lo renuevan periódicamente.
+- Fencing: un worker que perdió el lease no puede escribir checkpoints ni
+  cerrar el job.
+
+Backends (JOB_QUEUE_URL):
+- ``sqlite:///ruta/jobs.db`` (default: $CACHE_DIR/jobs.db): varios procesos
+  en la misma máquina (BEGIN IMMEDIATE).
+- ``postgres``: tablas de migrations/005_job_queue.sql en SUPABASE_DB_URL,
+  para workers en varias máquinas (FOR UPDATE SKIP LOCKED).
+"""
+import abc
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+from infrastructure.serialization import dumps, loads
+from services.incremental_service import domain_from_url
+
+logger = get_logger("JobQueue")
+
+# Fases con checkpoint, en orden del pipeline
+CHECKPOINT_PHASES = ("extraction", "scoring", "insights")
+JOB_STATUSES = ("pending", "leased", "done", "failed")
+
+_SQLITE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS batch_jobs (
+        run_id TEXT NOT NULL,
+        domain TEXT NOT NULL,
+        url TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        phase TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        lease_owner TEXT,
+        lease_expires REAL,
+        competitor_id INTEGER,
+        error TEXT,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (run_id, domain)
+    );
+    CREATE INDEX IF NOT EXISTS ix_batch_jobs_lease ON batch_jobs (run_id, status, position);
+    CREATE TABLE IF NOT EXISTS batch_checkpoints (
+        run_id TEXT NOT NULL,
+        domain TEXT NOT NULL,
+        phase TEXT NOT NULL,
+        payload BLOB NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (run_id, domain, phase)
+    );
+"""
+
+
+@dataclass
+class Job:
+    """Un dominio de un run, tal como se entrega a un worker"""
+    run_id: str
+    domain: str
+    url: str
+    position: int
+    attempts: int
+    phase: Optional[str] = None
+
+
+class _Cursor:
+    """Cursor con placeholders '?' para ambos backends"""
+
+    def __init__(self, cursor, paramstyle: str):
+        self._cursor = cursor
+        self._paramstyle = paramstyle
+
+    def _sql(self, sql: str) -> str:
+        return sql if self._paramstyle == "qmark" else sql.replace("?", "%s")
+
+    def execute(self, sql: str, params=()) -> list:
+        self._cursor.execute(self._sql(sql), params)
+        return self._cursor.fetchall() if self._cursor.description else []
+
+    def executemany(self, sql: str, rows) -> None:
+        self._cursor.executemany(self._sql(sql), rows)
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+
+class JobQueue(abc.ABC):
+    """Operaciones de la cola; los backends sólo aportan la transacción"""
+
+    paramstyle = "qmark"
+    # Sufijo del SELECT de lease (bloqueo de filas en Postgres)
+    lock_clause = ""
+
+    def __init__(self, lease_seconds: Optional[float] = None, max_attempts: Optional[int] = None):
+        self.lease_seconds = lease_seconds or float(os.getenv("JOB_LEASE_SECONDS", "900"))
+        self.max_attempts = max_attempts or int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+    @abc.abstractmethod
+    def _transaction(self):
+        """Context manager que abre una transacción y entrega un cursor (paramstyle de la clase)"""
+
+    def close(self):
+        pass
+
+    # ------------------------------------------------------------------
+    # Runs
+    # ------------------------------------------------------------------
+
+    def enqueue(self, run_id: str, urls: Iterable[str]) -> int:
+        """
+        Añade las URLs al run (idempotente: los dominios ya presentes se
+        conservan con su progreso). Los jobs fallidos con intentos restantes
+        vuelven a quedar pendientes, así relanzar el run reintenta los fallos.
+        """
+        now = time.time()
+        with self._transaction() as cur:
+            start = cur.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM batch_jobs WHERE run_id = ?",
+                                (run_id,))[0][0]
+            existing = {row[0] for row in cur.execute("SELECT domain FROM batch_jobs WHERE run_id = ?", (run_id,))}
+            rows, seen = [], set(existing)
+            for url in urls:
+                domain = domain_from_url(url)
+                if domain in seen:
+                    continue
+                seen.add(domain)
+                rows.append((run_id, domain, url, start + len(rows), now))
+            cur.executemany(
+                "INSERT INTO batch_jobs (run_id, domain, url, position, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (run_id, domain) DO NOTHING",
+                rows,
+            )
+            cur.execute(
+                "UPDATE batch_jobs SET status = 'pending', lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE run_id = ? AND status = 'failed' AND attempts < ?",
+                (now, run_id, self.max_attempts),
+            )
+        metrics.inc("jobs_enqueued_total", len(rows))
+        return len(rows)
+
+    def progress(self, run_id: str) -> Dict[str, int]:
+        with self._transaction() as cur:
+            rows = cur.execute("SELECT status, COUNT(*) FROM batch_jobs WHERE run_id = ? GROUP BY status", (run_id,))
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def size(self, run_id: str) -> int:
+        with self._transaction() as cur:
+            return cur.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM batch_jobs WHERE run_id = ?",
+                               (run_id,))[0][0]
+
+    def failures(self, run_id: str) -> List[tuple]:
+        """(dominio, fase, intentos, error) de los jobs fallidos"""
+        with self._transaction() as cur:
+            return cur.execute(
+                "SELECT domain, phase, attempts, error FROM batch_jobs "
+                "WHERE run_id = ? AND status = 'failed' ORDER BY position",
+                (run_id,),
+            )
+
+    # ------------------------------------------------------------------
+    # Leases
+    # ------------------------------------------------------------------
+
+    def lease(self, run_id: str, owner: str, limit: int = 1) -> List[Job]:
+        """Toma hasta ``limit`` jobs pendientes o con lease caducado, en orden"""
+        now = time.time()
+        with self._transaction() as cur:
+            # Jobs que agotaron sus intentos muriendo con el lease tomado
+            cur.execute(
+                "UPDATE batch_jobs SET status = 'failed', error = 'lease caducado', lease_owner = NULL, updated_at = ? "
+                "WHERE run_id = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, run_id, now, self.max_attempts),
+            )
+            rows = cur.execute(
+                "SELECT domain, url, position, attempts, phase FROM batch_jobs "
+                "WHERE run_id = ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) "
+                "ORDER BY position LIMIT ?" + self.lock_clause,
+                (run_id, now, limit),
+            )
+            cur.executemany(
+                "UPDATE batch_jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE run_id = ? AND domain = ?",
+                [(owner, now + self.lease_seconds, now, run_id, row[0]) for row in rows],
+            )
+        metrics.inc("jobs_leased_total", len(rows))
+        return [Job(run_id, domain, url, position, attempts + 1, phase)
+                for domain, url, position, attempts, phase in rows]
+
+    def extend(self, run_id: str, owner: str, domains: Iterable[str]) -> List[str]:
+        """Renueva los leases de ``owner``; devuelve los dominios que ya no le pertenecen"""
+        domains = list(domains)
+        if not domains:
+            return []
+        now = time.time()
+        lost = []
+        with self._transaction() as cur:
+            for domain in domains:
+                cur.execute(
+                    "UPDATE batch_jobs SET lease_expires = ?, updated_at = ? "
+                    "WHERE run_id = ? AND domain = ? AND lease_owner = ? AND status = 'leased'",
+                    (now + self.lease_seconds, now, run_id, domain, owner),
+                )
+                if cur.rowcount == 0:
+                    lost.append(domain)
+        return lost
+
+    def owners(self, run_id: str) -> List[str]:
+        """Workers con leases activos en el run"""
+        with self._transaction() as cur:
+            return [row[0] for row in cur.execute(
+                "SELECT DISTINCT lease_owner FROM batch_jobs WHERE run_id = ? AND status = 'leased'", (run_id,)
+            )]
+
+    def reclaim(self, run_id: str, owner: str) -> int:
+        """Libera todos los leases de un worker muerto sin esperar a que caduquen"""
+        with self._transaction() as cur:
+            cur.execute(
+                "UPDATE batch_jobs SET status = 'pending', lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE run_id = ? AND lease_owner = ? AND status = 'leased'",
+                (time.time(), run_id, owner),
+            )
+            return cur.rowcount
+
+    def release(self, run_id: str, owner: str, domains: Iterable[str]):
+        """Devuelve jobs a la cola sin contar el intento (p.ej. Ctrl-C)"""
+        now = time.time()
+        with self._transaction() as cur:
+            cur.executemany(
+                "UPDATE batch_jobs SET status = 'pending', lease_owner = NULL, lease_expires = NULL, "
+                "attempts = CASE WHEN attempts > 0 THEN attempts - 1 ELSE 0 END, updated_at = ? "
+                "WHERE run_id = ? AND domain = ? AND lease_owner = ? AND status = 'leased'",
+                [(now, run_id, domain, owner) for domain in domains],
+            )
+
+    # ------------------------------------------------------------------
+    # Checkpoints
+    # ------------------------------------------------------------------
+
+    def checkpoint(self, run_id: str, domain: str, owner: str, phase: str, payload) -> bool:
+        """Guarda el estado tras ``phase``; False si el worker ya no tiene el lease"""
+        blob = dumps(payload)
+        now = time.time()
+        with self._transaction() as cur:
+            cur.execute(
+                "UPDATE batch_jobs SET phase = ?, updated_at = ? "
+                "WHERE run_id = ? AND domain = ? AND lease_owner = ? AND status = 'leased'",
+                (phase, now, run_id, domain, owner),
+            )
+            if cur.rowcount == 0:
+                return False
+            cur.execute(
+                "INSERT INTO batch_checkpoints (run_id, domain, phase, payload, created_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (run_id, domain, phase) DO UPDATE SET payload = excluded.payload, "
+                "created_at = excluded.created_at",
+                (run_id, domain, phase, blob, now),
+            )
+        metrics.inc("job_checkpoints_total", phase=phase)
+        metrics.inc("job_checkpoint_bytes_total", len(blob), phase=phase)
+        return True
+
+    def load_checkpoint(self, run_id: str, domain: str, phase: str):
+        with self._transaction() as cur:
+            rows = cur.execute(
+                "SELECT payload FROM batch_checkpoints WHERE run_id = ? AND domain = ? AND phase = ?",
+                (run_id, domain, phase),
+            )
+        if not rows:
+            return None
+        try:
+            # Nunca pickle: la tabla es compartida entre workers y máquinas
+            return loads(rows[0][0])
+        except Exception as e:
+            logger.warning(f"⚠ Checkpoint ilegible para {domain} ({phase}), se repite el análisis: {e}")
+            return None
+
+    # ------------------------------------------------------------------
+    # Cierre
+    # ------------------------------------------------------------------
+
+    def complete(self, run_id: str, domain: str, owner: str, competitor_id: Optional[int] = None) -> bool:
+        """Marca el job como hecho y borra sus checkpoints"""
+        now = time.time()
+        with self._transaction() as cur:
+            cur.execute(
+                "UPDATE batch_jobs SET status = 'done', competitor_id = ?, error = NULL, lease_owner = NULL, "
+                "lease_expires = NULL, updated_at = ? "
+                "WHERE run_id = ? AND domain = ? AND lease_owner = ? AND status = 'leased'",
+                (competitor_id, now, run_id, domain, owner),
+            )
+            if cur.rowcount == 0:
+                return False
+            cur.execute("DELETE FROM batch_checkpoints WHERE run_id = ? AND domain = ?", (run_id, domain))
+        metrics.inc("jobs_finished_total", status="done")
+        return True
+
+    def fail(self, run_id: str, domain: str, owner: str, error: Optional[str]) -> bool:
+        """Marca el job como fallido (se reintenta al relanzar el run si quedan intentos)"""
+        now = time.time()
+        with self._transaction() as cur:
+            cur.execute(
+                "UPDATE batch_jobs SET status = 'failed', error = ?, lease_owner = NULL, lease_expires = NULL, "
+                "updated_at = ? WHERE run_id = ? AND domain = ? AND lease_owner = ? AND status = 'leased'",
+                ((error or "")[:1000], now, run_id, domain, owner),
+            )
+            ok = cur.rowcount > 0
+        metrics.inc("jobs_finished_total", status="failed")
+        return ok
+
+
+class SQLiteJobQueue(JobQueue):
+    """Cola en un archivo SQLite compartido por los procesos de una máquina"""
+
+    def __init__(self, path: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path or os.path.join(os.getenv("CACHE_DIR", ".cache"), "jobs.db"))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SQLITE_SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            # IMMEDIATE: el lock de escritura se toma al empezar, dos procesos
+            # no pueden leer los mismos jobs pendientes y arrendarlos a la vez
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield _Cursor(self._conn.cursor(), self.paramstyle)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class PostgresJobQueue(JobQueue):
+    """Cola en Postgres (SUPABASE_DB_URL) para workers en varias máquinas"""
+
+    paramstyle = "format"
+    lock_clause = " FOR UPDATE SKIP LOCKED"
+
+    @contextmanager
+    def _transaction(self):
+        from infrastructure.db_pool import db_transaction
+
+        with db_transaction() as conn:
+            with conn.cursor() as cursor:
+                yield _Cursor(cursor, self.paramstyle)
+
+
+def get_job_queue(url: Optional[str] = None) -> JobQueue:
+    """Cola según ``url`` o JOB_QUEUE_URL (sqlite:///ruta o postgres)"""
+    url = (url or os.getenv("JOB_QUEUE_URL") or "sqlite://").strip()
+    if url.startswith("postgres"):
+        return PostgresJobQueue()
+    if url.startswith("sqlite://"):
+        path = url[len("sqlite:///"):] if url.startswith("sqlite:///") else ""
+        return SQLiteJobQueue(path or None)
+    raise ValueError(f"JOB_QUEUE_URL no soportada: {url} (usa sqlite:///ruta o postgres)")
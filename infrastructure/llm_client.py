@@ -0,0 +1,688 @@
+"""
+Async LLM Client
+Cliente único para OpenAI y Ollama sobre asyncio + httpx.
+
+- Pool de conexiones HTTP keep-alive compartido.
+- Límites de requests/min, tokens/min y concurrencia adaptativa por
+  proveedor y modelo, y presupuestos de tokens/coste por run y dominio
+  (ver infrastructure/scheduler.py).
+- Reintentos con backoff exponencial y jitter (respeta Retry-After).
+- Respuestas en streaming con validación incremental de JSON.
+- Envío de muchos prompts como un batch job (OpenAI Batch API) o en
+  paralelo acotado cuando el proveedor no tiene API de batch (Ollama).
+- Ollama en modo throughput local: /api/chat con salida JSON restringida
+  (schema), modelo precargado y fijado con keep_alive, paralelismo según
+  núcleos y prompt acotado por fase (ver infrastructure/ollama_runtime.py).
+- Fachada síncrona (``LLMClient``) para los agentes, que no son async.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from infrastructure.cache import get_llm_cache
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+from infrastructure.ollama_runtime import OllamaSettings, fit_prompt, ollama_base_url
+from infrastructure.scheduler import BudgetExceeded, Scope, current_scope, get_scheduler
+
+logger = get_logger("LLMClient")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Error definitivo de una llamada LLM (tras agotar reintentos)"""
+
+
+class InvalidJSONStream(Exception):
+    """La respuesta en streaming dejó de ser JSON válido"""
+
+
+@dataclass
+class LLMRequest:
+    """Petición a un modelo de chat"""
+    prompt: str
+    model: Optional[str] = None
+    system: Optional[str] = None
+    temperature: float = 0.0
+    max_tokens: Optional[int] = None
+    json_mode: bool = False
+    # JSON Schema de la respuesta: Ollama restringe la generación a él (format)
+    json_schema: Optional[Dict] = None
+    phase: str = "default"
+    custom_id: Optional[str] = None
+
+    def messages(self) -> List[Dict[str, str]]:
+        messages = []
+        if self.system:
+            messages.append({"role": "system", "content": self.system})
+        messages.append({"role": "user", "content": self.prompt})
+        return messages
+
+    def estimated_tokens(self) -> int:
+        text = (self.system or "") + self.prompt
+        return len(text) // 4 + (self.max_tokens or 512)
+
+
+@dataclass
+class LLMResponse:
+    """Respuesta de un modelo de chat"""
+    text: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency: float = 0.0
+    # Segundos hasta el primer token: señal de saturación del proveedor para el scheduler
+    first_token_latency: Optional[float] = None
+    cached: bool = False
+    custom_id: Optional[str] = None
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class JSONStreamValidator:
+    """
+    Valida JSON a medida que llegan los fragmentos.
+
+    No construye el documento: sólo sigue strings y anidamiento para detectar
+    cuanto antes una respuesta que no es JSON y para saber cuándo se cerró el
+    objeto raíz (el resto de la respuesta puede ignorarse).
+    """
+
+    # Texto tolerado antes del JSON (p.ej. "```json\n" de algunos modelos locales)
+    MAX_PREFIX = 16
+
+    def __init__(self):
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.complete = False
+        self._prefix = 0
+        self._stack: List[str] = []
+
+    def feed(self, chunk: str):
+        for char in chunk:
+            if self.complete:
+                return
+            if not self.started:
+                if char not in "{[":
+                    if not char.isspace():
+                        self._prefix += 1
+                        if self._prefix > self.MAX_PREFIX:
+                            raise InvalidJSONStream("La respuesta no empieza con JSON")
+                    continue
+                self.started = True
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+
+            if char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self._stack.append("}" if char == "{" else "]")
+            elif char in "}]":
+                if not self._stack or self._stack.pop() != char:
+                    raise InvalidJSONStream("Cierre de JSON desbalanceado")
+                if not self._stack:
+                    self.complete = True
+
+
+def extract_json(text: str) -> str:
+    """Recorta el primer documento JSON completo de ``text`` (sin ```json ni texto extra)"""
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        return text
+    validator = JSONStreamValidator()
+    for end in range(start, len(text)):
+        validator.feed(text[end])
+        if validator.complete:
+            return text[start:end + 1]
+    return text[start:]
+
+
+def record_usage(response: LLMResponse, phase: str):
+    """Tokens consumidos por fase y modelo (métricas del run)"""
+    metrics.inc("llm_requests_total", phase=phase, model=response.model, status="ok")
+    metrics.inc("llm_tokens_total", response.prompt_tokens, direction="in", phase=phase, model=response.model)
+    metrics.inc("llm_tokens_total", response.completion_tokens, direction="out", phase=phase, model=response.model)
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Cabecera Retry-After en segundos (None si falta o es una fecha)"""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Backoff exponencial con jitter completo; Retry-After tiene prioridad"""
+    seconds = retry_after_seconds(retry_after)
+    if seconds is not None:
+        return seconds + random.uniform(0, 1)
+    return random.uniform(0, min(60.0, 2 ** attempt))
+
+
+class AsyncLLMClient:
+    """
+    Cliente LLM asíncrono para ``LLM_PROVIDER`` (openai u ollama).
+
+    Los modelos por fase se leen de OPENAI_MODEL_<FASE> (EXTRACTION, SCORING,
+    INSIGHTS, ...) u OLLAMA_MODEL.
+    """
+
+    def __init__(self, provider: Optional[str] = None):
+        self.provider = (provider or os.getenv("LLM_PROVIDER", "openai")).lower()
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "5"))
+        self.timeout = float(os.getenv("LLM_TIMEOUT", "120"))
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+        self.ollama: Optional[OllamaSettings] = None
+        if self.provider == "ollama":
+            # Un modelo local sólo atiende OLLAMA_NUM_PARALLEL peticiones a la vez
+            self.ollama = OllamaSettings.from_env()
+            self.max_concurrency = self.ollama.parallel
+        # Límites, concurrencia AIMD y presupuestos compartidos con embeddings y scraping
+        self.scheduler = get_scheduler()
+
+        if self.provider == "ollama":
+            self.base_url = ollama_base_url()
+            headers = {}
+        else:
+            self.base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+            headers = {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', '')}"}
+
+        self._http = httpx.AsyncClient(
+            headers=headers,
+            timeout=httpx.Timeout(self.timeout, connect=10),
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+                keepalive_expiry=60,
+            ),
+        )
+
+    def model_for(self, phase: str) -> str:
+        if self.provider == "ollama":
+            return os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+        return os.getenv(f"OPENAI_MODEL_{phase.upper()}", "gpt-4.1")
+
+    def gate(self, model: str):
+        """Gate del scheduler para ``model`` (con Ollama, el techo es OLLAMA_NUM_PARALLEL)"""
+        return self.scheduler.gate("llm", self.provider, model,
+                                   max_concurrency=self.ollama.parallel if self.ollama else None)
+
+    # ------------------------------------------------------------------
+    # Llamadas individuales
+    # ------------------------------------------------------------------
+
+    async def complete(self, request: LLMRequest, on_delta: Optional[Callable[[str], None]] = None,
+                       call_scope: Optional[Scope] = None) -> LLMResponse:
+        """
+        Ejecuta una petición con cache, límites del scheduler y reintentos.
+        Lanza BudgetExceeded si el presupuesto de ``call_scope`` (por defecto
+        el del contexto actual) no admite la fase de la petición.
+        """
+        model = request.model or self.model_for(request.phase)
+        cache = get_llm_cache()
+        if cache:
+            cached = cache.get(model, request.prompt, **self._cache_params(request))
+            if cached is not None:
+                return LLMResponse(text=cached, model=model, cached=True, custom_id=request.custom_id)
+
+        call_scope = call_scope or current_scope()
+        self.scheduler.check_budget(request.phase, call_scope)
+        response = await self._with_retries(request, model, on_delta, call_scope)
+        self.scheduler.charge(request.phase, self.provider, model,
+                              response.prompt_tokens, response.completion_tokens, call_scope)
+        if cache and response.text:
+            cache.put(model, request.prompt, response.text, **self._cache_params(request))
+        return response
+
+    def _cache_params(self, request: LLMRequest) -> Dict[str, object]:
+        """Parámetros que cambian la salida y forman parte de la clave de cache"""
+        params = {"system": request.system, "temperature": request.temperature,
+                  "max_tokens": request.max_tokens, "json": request.json_mode}
+        if request.json_schema and self.provider == "ollama":
+            params["schema"] = request.json_schema
+        return params
+
+    async def _with_retries(self, request: LLMRequest, model: str, on_delta, call_scope: Scope) -> LLMResponse:
+        estimated = request.estimated_tokens()
+        gate = self.gate(model)
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            permit = await gate.acquire_async(estimated, call_scope.lane)
+            try:
+                start = time.monotonic()
+                if self.provider == "ollama":
+                    response = await self._stream_ollama(request, model, on_delta)
+                else:
+                    response = await self._stream_openai(request, model, on_delta)
+                response.latency = time.monotonic() - start
+                response.custom_id = request.custom_id
+                used = response.prompt_tokens + response.completion_tokens
+                permit.release(latency=response.first_token_latency or response.latency, tokens_used=used or None)
+                metrics.observe("llm_request_seconds", response.latency,
+                                provider=self.provider, phase=request.phase)
+                record_usage(response, request.phase)
+                return response
+            except httpx.HTTPStatusError as e:
+                retry_after = e.response.headers.get("Retry-After")
+                permit.release(throttled=e.response.status_code == 429,
+                               retry_after=retry_after_seconds(retry_after))
+                if e.response.status_code not in RETRYABLE_STATUS:
+                    raise LLMError(f"{e.response.status_code}: {e.response.text[:300]}") from e
+                last_error = e
+            except (httpx.TransportError, InvalidJSONStream) as e:
+                last_error = e
+                retry_after = None
+            finally:
+                permit.release()
+
+            if attempt == self.max_retries:
+                break
+            delay = retry_delay(attempt, retry_after)
+            metrics.inc("llm_retries_total", provider=self.provider, phase=request.phase)
+            logger.warning(f"⚠ LLM reintento {attempt + 1}/{self.max_retries} en {delay:.1f}s: {last_error}")
+            await asyncio.sleep(delay)
+        metrics.inc("llm_requests_total", phase=request.phase, model=model, status="error")
+        raise LLMError(f"LLM falló tras {self.max_retries} reintentos: {last_error}")
+
+    async def _stream_openai(self, request: LLMRequest, model: str, on_delta) -> LLMResponse:
+        payload = {
+            "model": model,
+            "messages": request.messages(),
+            "temperature": request.temperature,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        if request.max_tokens:
+            payload["max_tokens"] = request.max_tokens
+        if request.json_mode:
+            payload["response_format"] = {"type": "json_object"}
+
+        validator = JSONStreamValidator() if request.json_mode else None
+        parts: List[str] = []
+        usage = {}
+        start = time.monotonic()
+        first_token = None
+        async with self._http.stream("POST", f"{self.base_url}/chat/completions", json=payload) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                usage = event.get("usage") or usage
+                for choice in event.get("choices", []):
+                    delta = choice.get("delta", {}).get("content")
+                    if delta:
+                        if first_token is None:
+                            first_token = time.monotonic() - start
+                        parts.append(delta)
+                        if validator:
+                            validator.feed(delta)
+                        if on_delta:
+                            on_delta(delta)
+
+        return LLMResponse(
+            text="".join(parts),
+            model=model,
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            first_token_latency=first_token,
+        )
+
+    async def _stream_ollama(self, request: LLMRequest, model: str, on_delta) -> LLMResponse:
+        budget = self.ollama.prompt_budget(request.phase, request.max_tokens)
+        prompt = fit_prompt(request.prompt, budget, request.system)
+        if len(prompt) < len(request.prompt):
+            metrics.inc("llm_prompts_truncated_total", provider=self.provider, phase=request.phase)
+        messages = [{"role": "system", "content": request.system}] if request.system else []
+        messages.append({"role": "user", "content": prompt})
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": self.ollama.keep_alive,
+            "options": self.ollama.options(temperature=request.temperature, num_predict=request.max_tokens),
+        }
+        if request.json_mode:
+            payload["format"] = request.json_schema or "json"
+
+        validator = JSONStreamValidator() if request.json_mode else None
+        parts: List[str] = []
+        final = {}
+        start = time.monotonic()
+        first_token = None
+        async with self._http.stream("POST", f"{self.base_url}/api/chat", json=payload) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                delta = (event.get("message") or {}).get("content", "")
+                if delta:
+                    if first_token is None:
+                        first_token = time.monotonic() - start
+                    parts.append(delta)
+                    if validator:
+                        validator.feed(delta)
+                    if on_delta:
+                        on_delta(delta)
+                if event.get("done"):
+                    final = event
+                    break
+                if validator and validator.complete and not request.json_schema:
+                    # El objeto raíz ya se cerró: no esperar tokens de relleno (con schema
+                    # el modelo termina ahí y el evento final trae los tiempos)
+                    break
+
+        self._record_ollama_timings(final, request.phase)
+        return LLMResponse(
+            text="".join(parts),
+            model=model,
+            prompt_tokens=final.get("prompt_eval_count", 0),
+            completion_tokens=final.get("eval_count", 0),
+            first_token_latency=first_token,
+        )
+
+    def _record_ollama_timings(self, final: Dict, phase: str):
+        """Segundos de prompt y de generación (base de los tokens/s por fase) y cargas en frío"""
+        if final.get("eval_duration"):
+            metrics.inc("llm_generation_seconds_total", final["eval_duration"] / 1e9,
+                        provider=self.provider, phase=phase)
+            metrics.inc("llm_generation_tokens_total", final.get("eval_count", 0),
+                        provider=self.provider, phase=phase)
+        if final.get("prompt_eval_duration"):
+            metrics.inc("llm_prompt_eval_seconds_total", final["prompt_eval_duration"] / 1e9,
+                        provider=self.provider, phase=phase)
+            metrics.inc("llm_prompt_eval_tokens_total", final.get("prompt_eval_count", 0),
+                        provider=self.provider, phase=phase)
+        load_seconds = final.get("load_duration", 0) / 1e9
+        if load_seconds > 1:
+            metrics.inc("llm_model_loads_total", provider=self.provider, phase=phase)
+            logger.warning(f"⚠ Carga en frío del modelo en {phase} ({load_seconds:.1f}s): "
+                           f"revisa OLLAMA_KEEP_ALIVE o la memoria disponible")
+
+    async def warm_up(self, model: Optional[str] = None) -> bool:
+        """
+        Carga el modelo local y lo fija con keep_alive antes de la primera fase
+        LLM, con las mismas opciones que usarán las peticiones. No-op con OpenAI.
+        """
+        if self.provider != "ollama":
+            return False
+        model = model or self.model_for("default")
+        start = time.monotonic()
+        try:
+            response = await self._http.post(
+                f"{self.base_url}/api/chat",
+                json={"model": model, "messages": [], "keep_alive": self.ollama.keep_alive,
+                      "options": self.ollama.options()},
+                timeout=float(os.getenv("OLLAMA_WARMUP_TIMEOUT", "600")),
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"⚠ No se pudo precargar {model}: {e}")
+            return False
+        logger.info(f"🔥 {model} cargado en {time.monotonic() - start:.1f}s | keep_alive={self.ollama.keep_alive} | "
+                    f"{self.ollama.parallel} peticiones en paralelo | num_ctx={self.ollama.num_ctx}")
+        return True
+
+    # ------------------------------------------------------------------
+    # Muchas peticiones
+    # ------------------------------------------------------------------
+
+    async def complete_many(self, requests: List[LLMRequest], call_scope: Optional[Scope] = None) -> List[LLMResponse]:
+        """Ejecuta ``requests`` en paralelo (acotado por concurrencia y rate limit)"""
+        return await asyncio.gather(*(self.complete(r, call_scope=call_scope) for r in requests))
+
+    async def submit_batch(self, requests: List[LLMRequest], endpoint: str = "/v1/chat/completions",
+                           scopes: Optional[List[Scope]] = None) -> str:
+        """
+        Sube ``requests`` como un batch job de OpenAI y devuelve su id.
+        El batch se procesa de forma asíncrona (ventana de 24h, coste reducido).
+        Lanza BudgetExceeded si el presupuesto de alguna petición (``scopes``,
+        una por petición; default: el contexto actual) no admite su fase.
+        """
+        if self.provider != "openai":
+            raise LLMError("Los batch jobs sólo están disponibles con LLM_PROVIDER=openai")
+        scopes = scopes or [current_scope()] * len(requests)
+        for request, call_scope in zip(requests, scopes):
+            self.scheduler.check_budget(request.phase, call_scope)
+
+        lines = []
+        for i, request in enumerate(requests):
+            body = {
+                "model": request.model or self.model_for(request.phase),
+                "messages": request.messages(),
+                "temperature": request.temperature,
+            }
+            if request.max_tokens:
+                body["max_tokens"] = request.max_tokens
+            if request.json_schema:
+                body["response_format"] = {
+                    "type": "json_schema",
+                    "json_schema": {"name": f"{request.phase}_response", "schema": request.json_schema},
+                }
+            elif request.json_mode:
+                body["response_format"] = {"type": "json_object"}
+            lines.append(json.dumps({
+                "custom_id": request.custom_id or str(i),
+                "method": "POST",
+                "url": endpoint,
+                "body": body,
+            }))
+
+        upload = await self._http.post(
+            f"{self.base_url}/files",
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", "\n".join(lines).encode("utf-8"), "application/jsonl")},
+        )
+        upload.raise_for_status()
+        batch = await self._http.post(
+            f"{self.base_url}/batches",
+            json={
+                "input_file_id": upload.json()["id"],
+                "endpoint": endpoint,
+                "completion_window": "24h",
+            },
+        )
+        batch.raise_for_status()
+        batch_id = batch.json()["id"]
+        logger.info(f"📦 Batch LLM enviado: {batch_id} ({len(requests)} peticiones)")
+        return batch_id
+
+    async def wait_batch(self, batch_id: str, poll_interval: float = 30, timeout: Optional[float] = None) -> Dict[str, LLMResponse]:
+        """
+        Espera a que termine un batch job y devuelve las respuestas por
+        custom_id. El consumo lo imputa ``run_batch`` al contexto de cada petición.
+        """
+        start = time.monotonic()
+        while True:
+            status = await self._http.get(f"{self.base_url}/batches/{batch_id}")
+            status.raise_for_status()
+            batch = status.json()
+            if batch["status"] in ("completed", "failed", "expired", "cancelled"):
+                break
+            if timeout and time.monotonic() - start > timeout:
+                raise LLMError(f"Batch {batch_id} sin terminar tras {timeout:.0f}s")
+            await asyncio.sleep(poll_interval)
+
+        if batch["status"] != "completed" or not batch.get("output_file_id"):
+            raise LLMError(f"Batch {batch_id} terminó con estado {batch['status']}")
+
+        output = await self._http.get(f"{self.base_url}/files/{batch['output_file_id']}/content")
+        output.raise_for_status()
+        results = {}
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            body = (item.get("response") or {}).get("body") or {}
+            choices = body.get("choices") or [{}]
+            usage = body.get("usage") or {}
+            results[item["custom_id"]] = LLMResponse(
+                text=choices[0].get("message", {}).get("content", ""),
+                model=body.get("model", ""),
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                completion_tokens=usage.get("completion_tokens", 0),
+                custom_id=item["custom_id"],
+            )
+        return results
+
+    async def _complete_or_none(self, request: LLMRequest, call_scope: Scope) -> Optional[LLMResponse]:
+        try:
+            return await self.complete(request, call_scope=call_scope)
+        except (BudgetExceeded, LLMError) as e:
+            logger.warning(f"⚠ Petición {request.custom_id} del batch sin respuesta: {e}")
+            return None
+
+    async def run_batch(self, requests: List[LLMRequest], poll_interval: float = 30,
+                        scopes: Optional[List[Scope]] = None) -> List[Optional[LLMResponse]]:
+        """
+        Ejecuta ``requests`` como batch job (OpenAI) o en paralelo (Ollama).
+        ``scopes`` (una por petición; default: el contexto actual) fija el
+        presupuesto que se comprueba y al que se imputa cada una. Las
+        peticiones ya cacheadas no se envían; las que no caben en su
+        presupuesto o fallan devuelven None.
+        """
+        scopes = scopes or [current_scope()] * len(requests)
+        for i, request in enumerate(requests):
+            request.custom_id = request.custom_id or str(i)
+
+        cache = get_llm_cache()
+        responses: Dict[str, LLMResponse] = {}
+        pending, pending_scopes = [], []
+        for request, call_scope in zip(requests, scopes):
+            model = request.model or self.model_for(request.phase)
+            cached = cache.get(model, request.prompt, **self._cache_params(request)) if cache else None
+            if cached is not None:
+                responses[request.custom_id] = LLMResponse(cached, model, cached=True, custom_id=request.custom_id)
+            elif not self.scheduler.allows(request.phase, call_scope):
+                metrics.inc("budget_rejections_total", phase=request.phase)
+                logger.warning(f"⚠ Petición {request.custom_id} fuera del batch: presupuesto agotado")
+            else:
+                pending.append(request)
+                pending_scopes.append(call_scope)
+
+        if pending and self.provider == "openai":
+            batch_id = await self.submit_batch(pending, scopes=pending_scopes)
+            results = await self.wait_batch(batch_id, poll_interval=poll_interval)
+            for request, call_scope in zip(pending, pending_scopes):
+                response = results.get(request.custom_id)
+                if response is None:
+                    continue
+                responses[request.custom_id] = response
+                record_usage(response, request.phase)
+                # Precio por el modelo pedido (la respuesta trae el nombre con fecha)
+                model = request.model or self.model_for(request.phase)
+                self.scheduler.charge(request.phase, self.provider, model,
+                                      response.prompt_tokens, response.completion_tokens, call_scope)
+                if cache and response.text:
+                    cache.put(model, request.prompt, response.text, **self._cache_params(request))
+        elif pending:
+            # complete() ya comprueba e imputa el presupuesto y guarda en cache
+            results = await asyncio.gather(*(self._complete_or_none(r, s) for r, s in zip(pending, pending_scopes)))
+            for request, response in zip(pending, results):
+                if response is not None:
+                    responses[request.custom_id] = response
+
+        return [responses.get(r.custom_id) for r in requests]
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+class LLMClient:
+    """
+    Fachada síncrona sobre AsyncLLMClient para código basado en hilos.
+    El cliente async vive en un event loop propio en segundo plano, así el pool
+    de conexiones y los límites se comparten entre todos los hilos.
+    """
+
+    def __init__(self, provider: Optional[str] = None):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+        self.client: AsyncLLMClient = self._run(self._create(provider))
+
+    @staticmethod
+    async def _create(provider):
+        return AsyncLLMClient(provider)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    # El scope (carril, run, dominio) es el del hilo que llama, no el del event loop
+
+    def complete(self, request: LLMRequest, on_delta: Optional[Callable[[str], None]] = None) -> LLMResponse:
+        return self._run(self.client.complete(request, on_delta, current_scope()))
+
+    def complete_many(self, requests: List[LLMRequest]) -> List[LLMResponse]:
+        return self._run(self.client.complete_many(requests, current_scope()))
+
+    def run_batch(self, requests: List[LLMRequest], poll_interval: float = 30,
+                  scopes: Optional[List[Scope]] = None) -> List[Optional[LLMResponse]]:
+        scopes = scopes or [current_scope()] * len(requests)
+        return self._run(self.client.run_batch(requests, poll_interval=poll_interval, scopes=scopes))
+
+    def warm_up(self, wait: bool = True):
+        """Precarga el modelo local; con ``wait=False`` en segundo plano (solapado con el scraping)"""
+        future = asyncio.run_coroutine_threadsafe(self.client.warm_up(), self._loop)
+        return future.result() if wait else future
+
+    def close(self):
+        try:
+            self._run(self.client.aclose())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """LLMClient compartido del proceso"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
+
+
+def warm_up_llm(wait: bool = False):
+    """Precarga el modelo local (sólo LLM_PROVIDER=ollama); sin esperar por defecto"""
+    if os.getenv("LLM_PROVIDER", "openai").lower() != "ollama":
+        return None
+    return get_llm_client().warm_up(wait=wait)
+
+
+def close_llm_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
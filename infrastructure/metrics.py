@@ -0,0 +1,269 @@
+"""
+Métricas de Ejecución
+Contadores e histogramas en proceso para saber dónde se va el tiempo de un
+run: fases, Playwright, LLM, embeddings, cache y Postgres.
+
+- ``metrics.inc(name, value, **labels)`` y ``metrics.observe(name, seconds, **labels)``
+- ``metrics.phase("scoring")``: context manager que mide una fase
+- ``write_run_report(path)``: informe JSON del run (percentiles incluidos)
+- ``metrics.render_prometheus()``: formato de exposición de Prometheus
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PREFIX = "cia_"
+
+# Segundos: desde una lectura de cache hasta un render lento
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Muestras guardadas por histograma para los percentiles exactos del informe
+_MAX_SAMPLES = 10000
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + ",".join(escaped) + "}"
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count", "samples")
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0.0
+        self.count = 0
+        self.samples: List[float] = []
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+        if len(self.samples) < _MAX_SAMPLES:
+            self.samples.append(value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class MetricsRegistry:
+    """Registro de métricas thread-safe del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets=DEFAULT_BUCKETS, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observa la duración del bloque en segundos (también si falla)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def phase(self, name: str, **labels) -> Iterator[None]:
+        """Mide una fase del análisis (extraction, scoring, insights, persistence, ...)"""
+        start = time.perf_counter()
+        status = "error"
+        try:
+            yield
+            status = "ok"
+        finally:
+            self.observe("phase_seconds", time.perf_counter() - start, phase=name, **labels)
+            self.inc("phase_runs_total", phase=name, status=status)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+    # ------------------------------------------------------------------
+    # Exportación
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> Dict:
+        """Estado actual como dict serializable (base del informe JSON)"""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in sorted(self._counters.items())
+            }
+            histograms = {
+                name: [
+                    {
+                        "labels": dict(key),
+                        "count": h.count,
+                        "sum": round(h.total, 6),
+                        "mean": round(h.total / h.count, 6) if h.count else None,
+                        "p50": h.percentile(0.50),
+                        "p95": h.percentile(0.95),
+                        "max": max(h.samples) if h.samples else None,
+                    }
+                    for key, h in series.items()
+                ]
+                for name, series in sorted(self._histograms.items())
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric = f"{PREFIX}{name}"
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in series.items():
+                    lines.append(f"{metric}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                metric = f"{PREFIX}{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for key, h in series.items():
+                    for bound, count in zip(h.buckets, h.counts):
+                        lines.append(f"{metric}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {count}")
+                    lines.append(f"{metric}_bucket{_format_labels(key, ('le', '+Inf'))} {h.count}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {h.total:.6f}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def counter_total(self, name: str, **labels) -> float:
+        """Suma de las series de ``name`` que coinciden con ``labels``"""
+        wanted = set(_label_key(labels))
+        with self._lock:
+            return sum(v for k, v in self._counters.get(name, {}).items() if wanted <= set(k))
+
+
+metrics = MetricsRegistry()
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_report(extra: Optional[Dict] = None) -> Dict:
+    report = {
+        "started_at": datetime.fromtimestamp(metrics.started_at, timezone.utc).isoformat(),
+        "duration_seconds": round(time.time() - metrics.started_at, 3),
+        "argv": sys.argv,
+        "peak_rss_bytes": _peak_rss_bytes(),
+        **metrics.snapshot(),
+    }
+    throughput = llm_throughput(report)
+    if throughput:
+        report["llm_throughput"] = throughput
+    if extra:
+        report.update(extra)
+    return report
+
+
+def write_run_report(path: str, extra: Optional[Dict] = None) -> Dict:
+    """Escribe el informe JSON del run y lo devuelve"""
+    report = run_report(extra)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    return report
+
+
+def write_prometheus(path: str):
+    """Formato textfile (node_exporter --collector.textfile) en escritura atómica"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(metrics.render_prometheus())
+    os.replace(tmp, path)
+
+
+def llm_throughput(snapshot: Dict) -> Dict[str, Dict[str, float]]:
+    """Tokens/s por fase del modelo local, a partir de los tiempos que reporta Ollama"""
+    totals: Dict[str, Dict[str, float]] = {}
+    for name in ("llm_generation_seconds_total", "llm_generation_tokens_total",
+                 "llm_prompt_eval_seconds_total", "llm_prompt_eval_tokens_total"):
+        for series in snapshot["counters"].get(name, []):
+            phase = series["labels"].get("phase", "-")
+            totals.setdefault(phase, {}).setdefault(name, 0.0)
+            totals[phase][name] += series["value"]
+    rates = {}
+    for phase, values in sorted(totals.items()):
+        gen_s = values.get("llm_generation_seconds_total", 0.0)
+        prompt_s = values.get("llm_prompt_eval_seconds_total", 0.0)
+        rates[phase] = {
+            "generation_tokens_per_s": round(values.get("llm_generation_tokens_total", 0.0) / gen_s, 2) if gen_s else 0.0,
+            "prompt_tokens_per_s": round(values.get("llm_prompt_eval_tokens_total", 0.0) / prompt_s, 2) if prompt_s else 0.0,
+        }
+    return rates
+
+
+def log_phase_summary(logger):
+    """Tabla de tiempos por fase y principales contadores al final del run"""
+    snapshot = metrics.snapshot()
+    phases = snapshot["histograms"].get("phase_seconds", [])
+    if not phases:
+        return
+    logger.info("⏱ Tiempos por fase:")
+    for series in sorted(phases, key=lambda s: -s["sum"]):
+        logger.info(
+            f"  {series['labels'].get('phase', '-'):<14} total {series['sum']:>8.2f}s | "
+            f"n={series['count']:<4} p50 {series['p50']:.2f}s | p95 {series['p95']:.2f}s"
+        )
+    tokens_in = metrics.counter_total("llm_tokens_total", direction="in")
+    tokens_out = metrics.counter_total("llm_tokens_total", direction="out")
+    logger.info(
+        f"  LLM tokens {tokens_in:.0f} in / {tokens_out:.0f} out | "
+        f"páginas renderizadas {metrics.counter_total('pages_rendered_total'):.0f} | "
+        f"bytes descargados {metrics.counter_total('http_bytes_total'):.0f} | "
+        f"round trips BD {metrics.counter_total('db_round_trips_total'):.0f}"
+    )
+    for phase, rates in llm_throughput(snapshot).items():
+        logger.info(
+            f"  {phase:<14} modelo local: {rates['generation_tokens_per_s']:.1f} tok/s generación | "
+            f"{rates['prompt_tokens_per_s']:.1f} tok/s prompt"
+        )
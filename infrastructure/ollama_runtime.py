@@ -0,0 +1,93 @@
+"""
+Runtime de Ollama (modo throughput local)
+Parámetros para ejecutar sweeps completos con un modelo local en CPU a una
+velocidad predecible, sin OpenAI.
+
+- keep_alive (OLLAMA_KEEP_ALIVE, default -1 = fijo en memoria): el modelo no
+  se expulsa entre competidores y no se paga una carga en frío por fase.
+- Peticiones en paralelo ajustadas a los núcleos (OLLAMA_NUM_PARALLEL, el
+  mismo nombre que usa el servidor) y num_thread repartido entre ellas.
+- num_ctx fijo (OLLAMA_NUM_CTX): cambiarlo entre peticiones obliga a Ollama a
+  recargar el modelo, así que el límite de contexto por fase se aplica
+  recortando el prompt (OLLAMA_PROMPT_TOKENS_<FASE>), no con num_ctx.
+"""
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+# Caracteres por token (estimación, la misma que LLMRequest.estimated_tokens)
+CHARS_PER_TOKEN = 4
+# Parte final del prompt que nunca se recorta: instrucciones y formato de salida
+PROMPT_TAIL_CHARS = 2000
+
+
+def ollama_base_url(url: Optional[str] = None) -> str:
+    """Raíz del servidor a partir de OLLAMA_URL (acepta .../api/generate, .../api/chat o la raíz)"""
+    url = url or os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+    return url.rsplit("/api/", 1)[0].rstrip("/")
+
+
+def recommended_parallel(cores: Optional[int] = None) -> int:
+    """
+    Peticiones simultáneas para inferencia en CPU: la generación está limitada
+    por el ancho de banda de memoria, así que más de un slot por cada ~4
+    núcleos sólo reparte el mismo throughput entre más peticiones.
+    """
+    cores = cores or os.cpu_count() or 1
+    return max(1, min(8, cores // 4))
+
+
+def _keep_alive(value: str) -> Union[int, str]:
+    """Ollama acepta segundos (int, -1 = sin expiración) o duraciones ("30m")"""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+@dataclass
+class OllamaSettings:
+    """Opciones comunes a todas las peticiones (deben ser idénticas para no recargar el modelo)"""
+    keep_alive: Union[int, str] = -1
+    num_ctx: int = 8192
+    parallel: int = 1
+    num_thread: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "OllamaSettings":
+        parallel = int(os.getenv("OLLAMA_NUM_PARALLEL") or recommended_parallel())
+        num_thread = os.getenv("OLLAMA_NUM_THREAD")
+        return cls(
+            keep_alive=_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "-1")),
+            num_ctx=int(os.getenv("OLLAMA_NUM_CTX", "8192")),
+            parallel=max(1, parallel),
+            num_thread=int(num_thread) if num_thread else None,
+        )
+
+    def options(self, **extra) -> Dict:
+        """``options`` de /api/chat con los parámetros que fijan la instancia del modelo"""
+        options = {"num_ctx": self.num_ctx}
+        if self.num_thread:
+            options["num_thread"] = self.num_thread
+        options.update({k: v for k, v in extra.items() if v is not None})
+        return options
+
+    def prompt_budget(self, phase: str, completion_tokens: Optional[int]) -> int:
+        """Tokens de prompt permitidos en ``phase`` (OLLAMA_PROMPT_TOKENS_<FASE> o lo que cabe en num_ctx)"""
+        fits = self.num_ctx - (completion_tokens or 512)
+        configured = os.getenv(f"OLLAMA_PROMPT_TOKENS_{phase.upper()}")
+        return max(256, min(int(configured), fits) if configured else fits)
+
+
+def fit_prompt(prompt: str, max_tokens: int, system: Optional[str] = None) -> str:
+    """
+    Recorta el centro del prompt (la evidencia) para que quepa en ``max_tokens``
+    conservando el encabezado y el final (instrucciones y formato de salida).
+    """
+    budget = max_tokens * CHARS_PER_TOKEN - len(system or "")
+    if len(prompt) <= budget:
+        return prompt
+    marker = "\n[...]\n"
+    tail = min(PROMPT_TAIL_CHARS, budget // 2)
+    head = max(0, budget - tail - len(marker))
+    return prompt[:head] + marker + prompt[-tail:]
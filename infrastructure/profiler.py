@@ -0,0 +1,89 @@
+"""
+Perfilado del Run (--profile)
+Genera dos artefactos para un run completo:
+
+- ``<prefijo>.prof``: cProfile del hilo principal (pstats, snakeviz, ...).
+- ``<prefijo>.folded``: pilas muestreadas de TODOS los hilos en formato
+  "collapsed stacks" (el mismo que ``py-spy record --format raw``), para
+  flamegraph.pl o speedscope. Necesario en modo batch, donde el trabajo
+  ocurre en hilos que cProfile no ve.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from infrastructure.logging_config import get_logger
+
+logger = get_logger("Profiler")
+
+
+class RunProfiler:
+    """cProfile + muestreo de pilas de todos los hilos cada ``interval`` segundos"""
+
+    def __init__(self, output_prefix: str = "profile", interval: Optional[float] = None):
+        self.output_prefix = output_prefix
+        self.interval = interval or float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.01"))
+        self._profile = cProfile.Profile()
+        self._samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._sampler.start()
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join(timeout=5)
+
+        directory = os.path.dirname(self.output_prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._profile.dump_stats(f"{self.output_prefix}.prof")
+        with open(f"{self.output_prefix}.folded", "w", encoding="utf-8") as f:
+            for stack, count in self._samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        summary = io.StringIO()
+        pstats.Stats(self._profile, stream=summary).sort_stats("cumulative").print_stats(15)
+        logger.info(f"🔬 Perfil guardado en {self.output_prefix}.prof y {self.output_prefix}.folded "
+                    f"({sum(self._samples.values())} muestras)")
+        logger.debug(summary.getvalue())
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def default_profile_prefix() -> str:
+    return os.path.join("profiles", time.strftime("run-%Y%m%d-%H%M%S"))
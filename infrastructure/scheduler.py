@@ -0,0 +1,493 @@
+"""
+Scheduler
+Punto único por el que pasan las llamadas LLM, de embeddings y de scraping.
+
+- Límites por (tipo, proveedor, modelo): token buckets de requests/min y
+  tokens/min más un límite de concurrencia adaptativo (AIMD). El límite sube
+  de uno en uno mientras las respuestas llegan a tiempo. Un 429 lo reduce a
+  la mitad y pausa el bucket durante el Retry-After; si la latencia se
+  dispara frente a la mejor observada, se reduce un 15%.
+- Presupuestos de tokens y coste por run y por dominio. A partir de
+  BUDGET_DEGRADE_AT se rechazan las fases opcionales (insights, embeddings):
+  el competidor conserva sus scores sin insights. Con el presupuesto agotado
+  se rechaza también el scoring.
+- Carriles de prioridad: mientras haya peticiones interactivas (API)
+  esperando, el carril batch no obtiene cupo. Además, el batch nunca ocupa
+  la reserva SCHEDULER_INTERACTIVE_RESERVE de la concurrencia.
+
+El carril, el run y el dominio de cada llamada se toman del contexto del
+hilo que la origina (``scope``).
+"""
+import contextlib
+import contextvars
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+
+logger = get_logger("Scheduler")
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANES = (INTERACTIVE, BATCH)
+
+# Fases que se sacrifican primero al acercarse al presupuesto
+OPTIONAL_PHASES = {"insights", "embedding"}
+
+# USD por millón de tokens (entrada, salida); LLM_PRICES sobreescribe o añade modelos
+DEFAULT_PRICES = {
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+
+# Proveedores locales: sin coste por token
+FREE_PROVIDERS = {"ollama", "fallback", "web"}
+
+# AIMD
+_DECREASE_ON_THROTTLE = 0.5
+_DECREASE_ON_LATENCY = 0.85
+_LATENCY_TOLERANCE = 2.0
+# Espera máxima entre reintentos de admisión (se re-evalúan carril y pausas)
+_MAX_SLEEP = 0.25
+_POLL = 0.01
+
+
+class BudgetExceeded(Exception):
+    """La llamada superaría el presupuesto de tokens/coste del run o del dominio"""
+
+    def __init__(self, budget: str, phase: str):
+        super().__init__(f"presupuesto agotado ({budget}) para {phase}")
+        self.budget = budget
+        self.phase = phase
+
+
+# ----------------------------------------------------------------------
+# Contexto de la llamada
+# ----------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Scope:
+    """Carril, run y dominio a los que se atribuye una llamada"""
+    lane: str = INTERACTIVE
+    run: Optional[str] = None
+    domain: Optional[str] = None
+
+
+_scope: contextvars.ContextVar = contextvars.ContextVar("scheduler_scope", default=Scope())
+
+
+def current_scope() -> Scope:
+    return _scope.get()
+
+
+@contextlib.contextmanager
+def scope(lane: Optional[str] = None, run: Optional[str] = None, domain: Optional[str] = None) -> Iterator[Scope]:
+    """Fija carril/run/dominio para las llamadas de este hilo (los no indicados se heredan)"""
+    current = _scope.get()
+    if lane is not None and lane not in LANES:
+        raise ValueError(f"Carril no soportado: {lane} (usar {', '.join(LANES)})")
+    token = _scope.set(Scope(
+        lane=lane or current.lane,
+        run=run if run is not None else current.run,
+        domain=domain if domain is not None else current.domain,
+    ))
+    try:
+        yield _scope.get()
+    finally:
+        _scope.reset(token)
+
+
+# ----------------------------------------------------------------------
+# Límites de un proveedor/modelo
+# ----------------------------------------------------------------------
+
+class Permit:
+    """Cupo concedido por un Gate; ``release`` informa del resultado a AIMD (una sola vez)"""
+
+    def __init__(self, gate: "Gate", tokens: int):
+        self.gate = gate
+        self.tokens = tokens
+        self.start = time.monotonic()
+        self.released = False
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False,
+                retry_after: Optional[float] = None, tokens_used: Optional[int] = None):
+        if self.released:
+            return
+        self.released = True
+        if latency is None and not throttled:
+            latency = time.monotonic() - self.start
+        self.gate._release(latency, throttled, retry_after, self.tokens, tokens_used)
+
+
+class Gate:
+    """Token buckets (requests/min, tokens/min) y concurrencia AIMD de un (tipo, proveedor, modelo)"""
+
+    def __init__(self, name: str, rpm: float, tpm: float, max_concurrency: int, reserve: float):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max(1, max_concurrency)
+        self.reserve = reserve
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.waiting = {lane: 0 for lane in LANES}
+        self.throttled = 0
+        self._requests = rpm
+        self._tokens = tpm
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._latency: Optional[float] = None
+        self._baseline: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def capacity(self, lane: str) -> int:
+        """Llamadas simultáneas permitidas al carril (el batch deja libre la reserva interactiva)"""
+        limit = max(1, int(self.limit))
+        if lane == BATCH and limit > 1:
+            return max(1, limit - math.ceil(limit * self.reserve))
+        return limit
+
+    def _try_acquire(self, tokens: int, lane: str) -> float:
+        """0 si concede el cupo; si no, segundos hasta el próximo intento"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if lane == BATCH and self.waiting[INTERACTIVE]:
+                return _POLL
+            if self.in_flight >= self.capacity(lane):
+                return _POLL
+            waits = []
+            if self.rpm and self._requests < 1:
+                waits.append((1 - self._requests) * 60 / self.rpm)
+            if self.tpm:
+                tokens = min(tokens, self.tpm)
+                if self._tokens < tokens:
+                    waits.append((tokens - self._tokens) * 60 / self.tpm)
+            if waits:
+                return max(waits)
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+            self.in_flight += 1
+            return 0.0
+
+    def _waiting(self, lane: str, delta: int):
+        with self._lock:
+            self.waiting[lane] += delta
+
+    def _admitted(self, lane: str, start: float):
+        waited = time.monotonic() - start
+        metrics.observe("scheduler_wait_seconds", waited, gate=self.name.split(":", 1)[0], lane=lane)
+
+    def acquire(self, tokens: int = 0, lane: str = INTERACTIVE) -> Permit:
+        """Bloquea el hilo hasta obtener cupo"""
+        start = time.monotonic()
+        self._waiting(lane, 1)
+        try:
+            while True:
+                wait = self._try_acquire(tokens, lane)
+                if not wait:
+                    break
+                time.sleep(min(wait, _MAX_SLEEP))
+        finally:
+            self._waiting(lane, -1)
+        self._admitted(lane, start)
+        return Permit(self, tokens)
+
+    async def acquire_async(self, tokens: int = 0, lane: str = INTERACTIVE) -> Permit:
+        """Como ``acquire`` sin bloquear el event loop"""
+        # asyncio sólo lo usan los clientes async: fuera del import del pipeline batch
+        import asyncio
+
+        start = time.monotonic()
+        self._waiting(lane, 1)
+        try:
+            while True:
+                wait = self._try_acquire(tokens, lane)
+                if not wait:
+                    break
+                await asyncio.sleep(min(wait, _MAX_SLEEP))
+        finally:
+            self._waiting(lane, -1)
+        self._admitted(lane, start)
+        return Permit(self, tokens)
+
+    def _release(self, latency: Optional[float], throttled: bool, retry_after: Optional[float],
+                 tokens_estimated: int, tokens_used: Optional[int]):
+        with self._lock:
+            now = time.monotonic()
+            self.in_flight = max(0, self.in_flight - 1)
+            if tokens_used is not None and self.tpm:
+                # Devuelve al bucket la diferencia entre tokens estimados y reales
+                self._tokens = min(self.tpm, self._tokens + tokens_estimated - tokens_used)
+            # Una sola reducción por ventana: varios 429 simultáneos son la misma señal
+            window = max(self._latency or 1.0, 1.0)
+            if throttled:
+                self.throttled += 1
+                self._paused_until = max(self._paused_until, now + (retry_after or 1.0))
+                if now - self._last_decrease >= window:
+                    self.limit = max(1.0, self.limit * _DECREASE_ON_THROTTLE)
+                    self._last_decrease = now
+                    logger.warning(f"⚠ {self.name}: límite de cuota (429), concurrencia → {int(self.limit)}")
+                metrics.inc("scheduler_throttled_total", gate=self.name)
+                return
+            if latency is not None:
+                self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+                # La mejor latencia observada sube lentamente para adaptarse a cambios de carga del proveedor
+                self._baseline = self._latency if self._baseline is None else min(self._baseline * 1.01, self._latency)
+                if self._latency > self._baseline * _LATENCY_TOLERANCE:
+                    if now - self._last_decrease >= window:
+                        self.limit = max(1.0, self.limit * _DECREASE_ON_LATENCY)
+                        self._last_decrease = now
+                    return
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / max(self.limit, 1.0))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "waiting": dict(self.waiting),
+                "throttled": self.throttled,
+                "latency_ewma": round(self._latency, 3) if self._latency is not None else None,
+            }
+
+
+# ----------------------------------------------------------------------
+# Presupuestos
+# ----------------------------------------------------------------------
+
+class Budget:
+    """Tokens y coste acumulados de un run o un dominio frente a su límite (0 = sin límite)"""
+
+    def __init__(self, name: str, max_tokens: int, max_cost: float, degrade_at: float):
+        self.name = name
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.degrade_at = degrade_at
+        self.tokens = 0
+        self.cost = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def limited(self) -> bool:
+        return bool(self.max_tokens or self.max_cost)
+
+    def usage(self) -> float:
+        """Fracción consumida del límite más cercano"""
+        used = 0.0
+        if self.max_tokens:
+            used = self.tokens / self.max_tokens
+        if self.max_cost:
+            used = max(used, self.cost / self.max_cost)
+        return used
+
+    def allows(self, phase: str) -> bool:
+        """Las fases opcionales se cortan en ``degrade_at``; el resto, al agotar el presupuesto"""
+        if not self.limited:
+            return True
+        return self.usage() < (self.degrade_at if phase in OPTIONAL_PHASES else 1.0)
+
+    def charge(self, tokens: int, cost: float):
+        with self._lock:
+            self.tokens += tokens
+            self.cost += cost
+
+    def snapshot(self) -> Dict:
+        return {"tokens": self.tokens, "cost_usd": round(self.cost, 6), "max_tokens": self.max_tokens,
+                "max_cost_usd": self.max_cost, "usage": round(self.usage(), 4)}
+
+
+# ----------------------------------------------------------------------
+# Scheduler
+# ----------------------------------------------------------------------
+
+def _parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    """``modelo=entrada:salida,...`` en USD por millón de tokens"""
+    prices = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, values = item.partition("=")
+        price_in, _, price_out = values.partition(":")
+        prices[model.strip()] = (float(price_in or 0), float(price_out or 0))
+    return prices
+
+
+def _parse_limits(spec: str) -> Dict[str, Tuple[Optional[float], Optional[float], Optional[int]]]:
+    """``tipo[:proveedor[:modelo]]=rpm:tpm:concurrencia,...`` (un campo vacío conserva el default)"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, values = item.partition("=")
+        rpm, tpm, concurrency = (values.split(":") + ["", "", ""])[:3]
+        limits[key.strip()] = (
+            float(rpm) if rpm else None,
+            float(tpm) if tpm else None,
+            int(concurrency) if concurrency else None,
+        )
+    return limits
+
+
+# Límites por tipo de llamada: (rpm, tpm, concurrencia) y sus variables de entorno
+_KIND_DEFAULTS = {
+    "llm": (("LLM_RPM", "500"), ("LLM_TPM", "200000"), ("LLM_MAX_CONCURRENCY", "16")),
+    "embedding": (("EMBEDDING_RPM", "3000"), ("EMBEDDING_TPM", "1000000"), ("EMBEDDING_MAX_CONCURRENCY", "4")),
+    # Scraping: un gate por host (sin tokens)
+    "scrape": (("SCRAPE_HOST_RPM", "120"), (None, "0"), ("SCRAPE_HOST_CONCURRENCY", "4")),
+}
+
+
+class Scheduler:
+    """Gates por (tipo, proveedor, modelo) y presupuestos por run/dominio del proceso"""
+
+    def __init__(self):
+        self.reserve = float(os.getenv("SCHEDULER_INTERACTIVE_RESERVE", "0.25"))
+        self.degrade_at = float(os.getenv("BUDGET_DEGRADE_AT", "0.8"))
+        self.run_limits = (int(os.getenv("BUDGET_RUN_TOKENS", "0")), float(os.getenv("BUDGET_RUN_COST_USD", "0")))
+        self.domain_limits = (int(os.getenv("BUDGET_DOMAIN_TOKENS", "0")),
+                              float(os.getenv("BUDGET_DOMAIN_COST_USD", "0")))
+        self.prices = {**DEFAULT_PRICES, **_parse_prices(os.getenv("LLM_PRICES", ""))}
+        self.limits = _parse_limits(os.getenv("SCHEDULER_LIMITS", ""))
+        self._gates: Dict[str, Gate] = {}
+        self._budgets: Dict[Tuple[str, Optional[str], Optional[str]], Budget] = {}
+        self._unpriced = set()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Gates
+    # ------------------------------------------------------------------
+
+    def _limits_for(self, kind: str, provider: str, model: Optional[str]) -> Tuple[float, float, int]:
+        (rpm_env, rpm), (tpm_env, tpm), (concurrency_env, concurrency) = _KIND_DEFAULTS[kind]
+        values = [
+            float(os.getenv(rpm_env, rpm)),
+            float(os.getenv(tpm_env, tpm)) if tpm_env else float(tpm),
+            int(os.getenv(concurrency_env, concurrency)),
+        ]
+        # De lo general a lo específico: tipo, tipo:proveedor, tipo:proveedor:modelo
+        for key in (kind, f"{kind}:{provider}", f"{kind}:{provider}:{model}"):
+            for i, value in enumerate(self.limits.get(key, ())):
+                if value is not None:
+                    values[i] = value
+        return values[0], values[1], int(values[2])
+
+    def gate(self, kind: str, provider: str, model: Optional[str] = None,
+             max_concurrency: Optional[int] = None) -> Gate:
+        """
+        Gate compartido de (tipo, proveedor, modelo). ``max_concurrency`` fija
+        el techo de AIMD al crearlo (p. ej. OLLAMA_NUM_PARALLEL), salvo que
+        SCHEDULER_LIMITS lo indique para ese modelo.
+        """
+        name = f"{kind}:{provider}:{model}" if model else f"{kind}:{provider}"
+        with self._lock:
+            gate = self._gates.get(name)
+            if gate is None:
+                rpm, tpm, concurrency = self._limits_for(kind, provider, model)
+                explicit = (self.limits.get(f"{kind}:{provider}:{model}") or (None, None, None))[2]
+                if max_concurrency and explicit is None:
+                    concurrency = max_concurrency
+                gate = self._gates[name] = Gate(name, rpm, tpm, concurrency, self.reserve)
+            return gate
+
+    # ------------------------------------------------------------------
+    # Presupuestos
+    # ------------------------------------------------------------------
+
+    def _budgets_for(self, call_scope: Scope) -> List[Budget]:
+        budgets = []
+        with self._lock:
+            if call_scope.run and any(self.run_limits):
+                key = ("run", call_scope.run, None)
+                if key not in self._budgets:
+                    self._budgets[key] = Budget(f"run {call_scope.run}", *self.run_limits, self.degrade_at)
+                budgets.append(self._budgets[key])
+            if call_scope.domain and any(self.domain_limits):
+                key = ("domain", call_scope.run, call_scope.domain)
+                if key not in self._budgets:
+                    self._budgets[key] = Budget(f"dominio {call_scope.domain}", *self.domain_limits, self.degrade_at)
+                budgets.append(self._budgets[key])
+        return budgets
+
+    def allows(self, phase: str, call_scope: Optional[Scope] = None) -> bool:
+        return all(b.allows(phase) for b in self._budgets_for(call_scope or current_scope()))
+
+    def check_budget(self, phase: str, call_scope: Optional[Scope] = None):
+        """Lanza BudgetExceeded si algún presupuesto del contexto no admite ``phase``"""
+        for budget in self._budgets_for(call_scope or current_scope()):
+            if not budget.allows(phase):
+                metrics.inc("budget_rejections_total", phase=phase)
+                raise BudgetExceeded(budget.name, phase)
+
+    def cost(self, provider: str, model: str, tokens_in: int, tokens_out: int) -> float:
+        if provider in FREE_PROVIDERS:
+            return 0.0
+        price = self.prices.get(model)
+        if price is None:
+            if model not in self._unpriced:
+                self._unpriced.add(model)
+                logger.warning(f"⚠ Sin precio para {model}: su coste no cuenta en el presupuesto (LLM_PRICES)")
+            return 0.0
+        return (tokens_in * price[0] + tokens_out * price[1]) / 1_000_000
+
+    def charge(self, phase: str, provider: str, model: str, tokens_in: int, tokens_out: int,
+               call_scope: Optional[Scope] = None) -> float:
+        """Imputa el consumo real de una llamada a los presupuestos de su contexto"""
+        cost = self.cost(provider, model, tokens_in, tokens_out)
+        if cost:
+            metrics.inc("llm_cost_usd_total", cost, phase=phase, model=model)
+        for budget in self._budgets_for(call_scope or current_scope()):
+            budget.charge(tokens_in + tokens_out, cost)
+        return cost
+
+    def run_budget(self, run: str) -> Optional[Budget]:
+        with self._lock:
+            return self._budgets.get(("run", run, None))
+
+    def forget(self, run: Optional[str], domain: str):
+        """Descarta el presupuesto de un dominio ya terminado"""
+        with self._lock:
+            self._budgets.pop(("domain", run, domain), None)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            gates = dict(self._gates)
+            runs = {key[1]: budget for key, budget in self._budgets.items() if key[0] == "run"}
+        return {
+            "gates": {name: gate.snapshot() for name, gate in sorted(gates.items())},
+            "run_budgets": {run: budget.snapshot() for run, budget in runs.items()},
+        }
+
+
+_scheduler: Optional[Scheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """Scheduler compartido del proceso"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
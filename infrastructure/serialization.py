@@ -0,0 +1,149 @@
+"""
+Serialización JSON con tipos
+Sustituye a pickle para los datos intermedios que se guardan en almacenes
+compartidos (checkpoints de la cola de trabajos, biblioteca de insights,
+snapshots incrementales): cargar un pickle permite ejecutar código arbitrario.
+
+- Modelos pydantic: ``model_dump(mode="json")`` y ``model_validate``.
+- Dataclasses: sus campos, codificados recursivamente.
+- Sets, tuplas, bytes y fechas se marcan para reconstruirse igual.
+
+Al cargar sólo se reconstruyen las clases del registro CHECKPOINT_TYPES
+(ampliable con ``register_type``), cada una por la vía que le corresponde:
+``fields`` sólo para dataclasses y ``model`` sólo para modelos pydantic. Los
+objetos de clases no registradas se guardan como ``types.SimpleNamespace``
+con sus atributos, de modo que un payload nunca puede instanciar otra clase.
+"""
+import base64
+import dataclasses
+import importlib
+import json
+from datetime import date, datetime
+from types import SimpleNamespace
+from typing import Any, Dict
+
+_NAMESPACE = "types:SimpleNamespace"
+
+# Clases de los checkpoints que se reconstruyen con su tipo ("módulo:clase")
+CHECKPOINT_TYPES = {
+    _NAMESPACE,
+    "services.incremental_service:AnalysisSnapshot",
+    "services.incremental_service:SourceDiff",
+    "services.multi_attribute_scoring_service:AttributeScore",
+    "services.multi_attribute_scoring_service:MultiAttributeScores",
+}
+
+_TYPE = "__type__"
+_MARKERS = ("__set__", "__tuple__", "__bytes__", "__datetime__", "__date__")
+
+_resolved: Dict[str, type] = {_NAMESPACE: SimpleNamespace}
+
+
+def _type_name(cls: type) -> str:
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def register_type(cls: type) -> type:
+    """Permite reconstruir ``cls`` al cargar (usable como decorador)"""
+    name = _type_name(cls)
+    CHECKPOINT_TYPES.add(name)
+    _resolved[name] = cls
+    return cls
+
+
+def _resolve(name: str) -> type:
+    if name not in CHECKPOINT_TYPES:
+        raise ValueError(f"Tipo no permitido al deserializar: {name}")
+    if name not in _resolved:
+        module_name, _, qualname = name.partition(":")
+        target: Any = importlib.import_module(module_name)
+        for part in qualname.split("."):
+            target = getattr(target, part)
+        if not isinstance(target, type) or _type_name(target) != name:
+            raise ValueError(f"{name} no es una clase registrada")
+        _resolved[name] = target
+    return _resolved[name]
+
+
+def _is_model(cls: type) -> bool:
+    from pydantic import BaseModel
+
+    return issubclass(cls, BaseModel)
+
+
+def encode(obj):
+    """Objeto → estructura JSON con marcas de tipo"""
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, dict):
+        return {str(key): encode(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [encode(value) for value in obj]
+    if isinstance(obj, tuple):
+        return {"__tuple__": [encode(value) for value in obj]}
+    if isinstance(obj, (set, frozenset)):
+        return {"__set__": [encode(value) for value in sorted(obj, key=repr)]}
+    if isinstance(obj, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(bytes(obj)).decode("ascii")}
+    if isinstance(obj, datetime):
+        return {"__datetime__": obj.isoformat()}
+    if isinstance(obj, date):
+        return {"__date__": obj.isoformat()}
+
+    name = _type_name(type(obj))
+    if name in CHECKPOINT_TYPES and name != _NAMESPACE:
+        if hasattr(obj, "model_dump") and _is_model(type(obj)):
+            return {_TYPE: name, "model": obj.model_dump(mode="json")}
+        if dataclasses.is_dataclass(obj):
+            fields = {f.name: encode(getattr(obj, f.name)) for f in dataclasses.fields(obj) if f.init}
+            return {_TYPE: name, "fields": fields}
+    if hasattr(obj, "__dict__"):
+        # Clase no registrada: se conserva el acceso por atributo, no el tipo
+        return {_TYPE: _NAMESPACE, "attrs": {k: encode(v) for k, v in vars(obj).items()}}
+    raise TypeError(f"No serializable: {type(obj).__name__}")
+
+
+def _decode_object(data: Dict):
+    cls = _resolve(data[_TYPE])
+    if "model" in data:
+        if not _is_model(cls):
+            raise ValueError(f"{data[_TYPE]} no es un modelo pydantic")
+        return cls.model_validate(data["model"])
+    if "fields" in data:
+        if not dataclasses.is_dataclass(cls):
+            raise ValueError(f"{data[_TYPE]} no es una dataclass")
+        return cls(**{key: decode(value) for key, value in data["fields"].items()})
+    if cls is not SimpleNamespace or not isinstance(data.get("attrs"), dict):
+        raise ValueError(f"Objeto no válido para {data[_TYPE]}")
+    return SimpleNamespace(**{str(key): decode(value) for key, value in data["attrs"].items()})
+
+
+def decode(data):
+    """Inversa de ``encode``"""
+    if isinstance(data, list):
+        return [decode(value) for value in data]
+    if not isinstance(data, dict):
+        return data
+    if _TYPE in data:
+        return _decode_object(data)
+    if len(data) == 1:
+        (key, value), = data.items()
+        if key in _MARKERS:
+            if key == "__set__":
+                return {decode(v) for v in value}
+            if key == "__tuple__":
+                return tuple(decode(v) for v in value)
+            if key == "__bytes__":
+                return base64.b64decode(value)
+            if key == "__datetime__":
+                return datetime.fromisoformat(value)
+            return date.fromisoformat(value)
+    return {key: decode(value) for key, value in data.items()}
+
+
+def dumps(obj) -> bytes:
+    return json.dumps(encode(obj), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(blob) -> Any:
+    return decode(json.loads(bytes(blob).decode("utf-8")))
@@ -0,0 +1,500 @@
+"""
+Índice Vectorial Local (IVF)
+Búsqueda aproximada de vecinos para el contexto RAG sin recorrer todos los
+embeddings en cada consulta. No requiere MongoDB: los vectores viven en un
+array float32 contiguo (opcionalmente memory-mapped) dentro de VECTOR_INDEX_DIR.
+
+- Hasta VECTOR_INDEX_TRAIN_SIZE vectores la búsqueda es exacta (fuerza bruta).
+- A partir de ahí se entrena un IVF (k-means esférico, ~sqrt(n) listas) y cada
+  consulta sólo puntúa las VECTOR_INDEX_NPROBE listas más cercanas.
+- Las inserciones son incrementales: cada vector nuevo se asigna a su lista.
+  Cuando el índice crece 4x desde el último entrenamiento se re-entrena.
+- Filtros por context_type y domain; re-insertar un doc_id reemplaza el anterior.
+- VECTOR_INDEX_STORAGE=float16|int8 reduce memoria y disco 2x/4x; las
+  consultas decodifican a float32 sólo las filas candidatas.
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from infrastructure.logging_config import get_logger
+
+logger = get_logger("VectorIndex")
+
+VECTORS_FILE = "vectors.npy"
+ARRAYS_FILE = "index.npz"
+META_FILE = "meta.json"
+
+STORAGE_FORMATS = ("float32", "float16", "int8")
+
+
+@dataclass
+class SearchHit:
+    """Resultado de una búsqueda (similitud coseno)"""
+    doc_id: str
+    similarity: float
+    context_type: Optional[str]
+    domain: Optional[str]
+    payload: Dict = field(default_factory=dict)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def encode_vectors(vectors, storage: str = "float32"):
+    """
+    Codifica vectores float32 en el formato compacto indicado.
+    Devuelve (array, scales): int8 usa una escala por vector (max|v| / 127);
+    en los formatos float las escalas son 1.
+    """
+    if storage not in STORAGE_FORMATS:
+        raise ValueError(f"Formato de almacenamiento inválido: {storage} (opciones: {', '.join(STORAGE_FORMATS)})")
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.ones(len(vectors), dtype=np.float32)
+    if storage == "int8":
+        peaks = np.abs(vectors).max(axis=1)
+        scales = np.where(peaks > 0, peaks / 127.0, 1.0).astype(np.float32)
+        encoded = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return encoded, scales
+    return vectors.astype(storage, copy=False), scales
+
+
+def decode_vectors(encoded: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """Inversa de encode_vectors (float32)"""
+    vectors = np.asarray(encoded, dtype=np.float32)
+    if encoded.dtype == np.int8 and scales is not None:
+        vectors *= np.asarray(scales, dtype=np.float32)[..., None]
+    return vectors
+
+
+class _Vocabulary:
+    """Mapea context_type/domain a enteros para filtrar con comparaciones vectorizadas"""
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values: List[str] = list(values or [])
+        self._codes = {value: i for i, value in enumerate(self.values)}
+
+    def code(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        if value not in self._codes:
+            self._codes[value] = len(self.values)
+            self.values.append(value)
+        return self._codes[value]
+
+    def lookup(self, value: str) -> Optional[int]:
+        return self._codes.get(value)
+
+    def value(self, code: int) -> Optional[str]:
+        return self.values[code] if code >= 0 else None
+
+
+class VectorIndex:
+    """Índice IVF sobre embeddings normalizados (similitud = producto punto)"""
+
+    def __init__(
+        self,
+        dimension: Optional[int] = None,
+        index_dir: Optional[str] = None,
+        nprobe: Optional[int] = None,
+        train_size: Optional[int] = None,
+        mmap: bool = True,
+        storage: Optional[str] = None,
+    ):
+        self.dimension = dimension or int(os.getenv("EMBEDDING_DIMENSION", "1536"))
+        self.storage = storage or os.getenv("VECTOR_INDEX_STORAGE", "float32")
+        if self.storage not in STORAGE_FORMATS:
+            raise ValueError(f"VECTOR_INDEX_STORAGE inválido: {self.storage}")
+        self.index_dir = Path(index_dir or os.getenv(
+            "VECTOR_INDEX_DIR", os.path.join(os.getenv("CACHE_DIR", ".cache"), "vector_index")
+        ))
+        self.nprobe = nprobe or int(os.getenv("VECTOR_INDEX_NPROBE", "8"))
+        self.train_size = train_size or int(os.getenv("VECTOR_INDEX_TRAIN_SIZE", "4096"))
+        self._lock = threading.RLock()
+
+        # Almacenamiento por fila (capacidad con crecimiento geométrico)
+        self._vectors = np.empty((0, self.dimension), dtype=self.storage)
+        self._scales = np.empty(0, dtype=np.float32)
+        self._size = 0
+        self._context_types = np.empty(0, dtype=np.int32)
+        self._domains = np.empty(0, dtype=np.int32)
+        self._alive = np.empty(0, dtype=bool)
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._doc_ids: List[str] = []
+        self._payloads: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self._context_vocab = _Vocabulary()
+        self._domain_vocab = _Vocabulary()
+
+        # IVF
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._list_arrays: Dict[int, np.ndarray] = {}
+        self._trained_size = 0
+
+        if mmap and (self.index_dir / META_FILE).exists():
+            self.load(mmap=True)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # ------------------------------------------------------------------
+    # Almacenamiento
+    # ------------------------------------------------------------------
+
+    def _reserve(self, extra: int):
+        """Asegura capacidad para ``extra`` filas; un memmap se copia a memoria al escribir"""
+        needed = self._size + extra
+        capacity = self._vectors.shape[0]
+        if needed <= capacity and not isinstance(self._vectors, np.memmap):
+            return
+        new_capacity = max(needed, capacity * 2 if needed > capacity else capacity, 1024)
+        vectors = np.empty((new_capacity, self.dimension), dtype=self._vectors.dtype)
+        vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+        for name, dtype, fill in (
+            ("_scales", np.float32, 1.0),
+            ("_context_types", np.int32, -1),
+            ("_domains", np.int32, -1),
+            ("_alive", bool, False),
+            ("_assignments", np.int32, -1),
+        ):
+            array = np.full(new_capacity, fill, dtype=dtype)
+            array[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, array)
+
+    def add(
+        self,
+        doc_ids: Iterable[str],
+        embeddings,
+        context_types: Optional[Iterable[Optional[str]]] = None,
+        domains: Optional[Iterable[Optional[str]]] = None,
+        payloads: Optional[Iterable[Dict]] = None,
+    ) -> int:
+        """
+        Inserta (o reemplaza por doc_id) un lote de embeddings.
+        Devuelve el número de vectores insertados.
+        """
+        doc_ids = [str(d) for d in doc_ids]
+        if not doc_ids:
+            return 0
+        vectors = _normalize(np.atleast_2d(embeddings))
+        if vectors.shape != (len(doc_ids), self.dimension):
+            raise ValueError(
+                f"Se esperaban {len(doc_ids)} embeddings de dimensión {self.dimension}, "
+                f"recibido {vectors.shape}"
+            )
+        context_types = list(context_types) if context_types is not None else [None] * len(doc_ids)
+        domains = list(domains) if domains is not None else [None] * len(doc_ids)
+        payloads = list(payloads) if payloads is not None else [{}] * len(doc_ids)
+
+        with self._lock:
+            self._reserve(len(doc_ids))
+            start = self._size
+            rows = np.arange(start, start + len(doc_ids))
+            for doc_id in doc_ids:
+                previous = self._rows.get(doc_id)
+                if previous is not None:
+                    self._alive[previous] = False
+
+            self._vectors[rows], self._scales[rows] = encode_vectors(vectors, self.storage)
+            self._context_types[rows] = [self._context_vocab.code(c) for c in context_types]
+            self._domains[rows] = [self._domain_vocab.code(d) for d in domains]
+            self._doc_ids.extend(doc_ids)
+            self._payloads.extend(dict(p or {}) for p in payloads)
+            self._rows.update(zip(doc_ids, rows.tolist()))
+            # Un doc_id repetido dentro del lote: sólo vive la última fila
+            self._alive[rows] = [self._rows[doc_id] == row for doc_id, row in zip(doc_ids, rows.tolist())]
+            self._size += len(doc_ids)
+
+            if self._centroids is not None:
+                self._assign(rows)
+            if len(self) >= self.train_size and len(self) >= 4 * max(self._trained_size, 1):
+                self.train()
+        return len(doc_ids)
+
+    def remove(self, doc_ids: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for doc_id in doc_ids:
+                row = self._rows.pop(str(doc_id), None)
+                if row is not None:
+                    self._alive[row] = False
+                    removed += 1
+        return removed
+
+    # ------------------------------------------------------------------
+    # IVF
+    # ------------------------------------------------------------------
+
+    def _decode(self, rows) -> np.ndarray:
+        """Filas en float32 (copia sólo de las filas pedidas)"""
+        return decode_vectors(self._vectors[rows], self._scales[rows])
+
+    def _assign(self, rows: np.ndarray):
+        """Asigna filas a la lista de su centroide más cercano"""
+        for start in range(0, len(rows), 8192):
+            chunk = rows[start:start + 8192]
+            nearest = np.argmax(self._decode(chunk) @ self._centroids.T, axis=1)
+            self._assignments[chunk] = nearest
+            for row, list_id in zip(chunk.tolist(), nearest.tolist()):
+                self._lists[list_id].append(row)
+                self._list_arrays.pop(list_id, None)
+
+    def train(self, nlist: Optional[int] = None, iterations: int = 10, sample_per_list: int = 64):
+        """
+        Entrena (o re-entrena) los centroides con k-means esférico sobre una
+        muestra y reconstruye las listas invertidas. Elimina filas borradas.
+        """
+        with self._lock:
+            self._compact()
+            n = self._size
+            if n == 0:
+                return
+            start = time.perf_counter()
+            nlist = nlist or max(1, int(np.sqrt(n)))
+            rng = np.random.default_rng(0)
+            sample_rows = rng.choice(n, size=min(n, max(nlist * sample_per_list, 8192)), replace=False)
+            sample = self._decode(sample_rows)
+            centroids = sample[rng.choice(len(sample), size=min(nlist, len(sample)), replace=False)].copy()
+
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                counts = np.bincount(labels, minlength=len(centroids))
+                empty = counts == 0
+                # Centroides vacíos: se re-siembran con puntos al azar
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+                centroids = _normalize(sums)
+
+            self._centroids = centroids
+            self._lists = [[] for _ in range(len(centroids))]
+            self._list_arrays = {}
+            self._assign(np.arange(n))
+            self._trained_size = n
+            logger.info(
+                f"🧭 Índice vectorial entrenado: {n} vectores | {len(centroids)} listas | "
+                f"{time.perf_counter() - start:.2f}s"
+            )
+
+    def _compact(self):
+        """
+        Elimina físicamente las filas borradas o reemplazadas.
+        Las filas se renumeran: cada una conserva su lista y las listas
+        invertidas se reconstruyen con los nuevos números de fila.
+        """
+        live = np.flatnonzero(self._alive[:self._size])
+        if len(live) == self._size:
+            return
+        self._vectors = np.ascontiguousarray(self._vectors[live])
+        self._scales = self._scales[live]
+        self._context_types = self._context_types[live]
+        self._domains = self._domains[live]
+        self._alive = np.ones(len(live), dtype=bool)
+        self._assignments = self._assignments[live]
+        self._doc_ids = [self._doc_ids[i] for i in live]
+        self._payloads = [self._payloads[i] for i in live]
+        self._rows = {doc_id: i for i, doc_id in enumerate(self._doc_ids)}
+        self._size = len(live)
+        self._rebuild_lists()
+
+    def _rebuild_lists(self):
+        """Listas invertidas a partir de ``_assignments``"""
+        self._list_arrays = {}
+        if self._centroids is None:
+            self._lists = []
+            return
+        assignments = self._assignments[:self._size]
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(len(self._centroids) + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]].tolist() for i in range(len(self._centroids))]
+
+    def _list_rows(self, list_id: int) -> np.ndarray:
+        array = self._list_arrays.get(list_id)
+        if array is None:
+            array = np.asarray(self._lists[list_id], dtype=np.int64)
+            self._list_arrays[list_id] = array
+        return array
+
+    # ------------------------------------------------------------------
+    # Búsqueda
+    # ------------------------------------------------------------------
+
+    def _filter_mask(self, rows: np.ndarray, context_type: Optional[str], domain: Optional[str]) -> Optional[np.ndarray]:
+        mask = self._alive[rows]
+        if context_type is not None:
+            code = self._context_vocab.lookup(context_type)
+            if code is None:
+                return None
+            mask &= self._context_types[rows] == code
+        if domain is not None:
+            code = self._domain_vocab.lookup(domain)
+            if code is None:
+                return None
+            mask &= self._domains[rows] == code
+        return mask
+
+    def search(
+        self,
+        query,
+        k: int = 5,
+        context_type: Optional[str] = None,
+        domain: Optional[str] = None,
+        min_similarity: Optional[float] = None,
+        exact: bool = False,
+    ) -> List[SearchHit]:
+        """Los ``k`` documentos más similares a ``query`` que cumplen los filtros"""
+        query = _normalize(np.asarray(query).reshape(-1))
+        if query.shape[0] != self.dimension:
+            raise ValueError(f"Dimensión de consulta {query.shape[0]} != {self.dimension}")
+
+        with self._lock:
+            if self._size == 0:
+                return []
+            if exact or self._centroids is None:
+                candidates = np.arange(self._size)
+            else:
+                nprobe = min(self.nprobe, len(self._centroids))
+                closest = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+                candidates = np.concatenate([self._list_rows(i) for i in closest.tolist()])
+
+            mask = self._filter_mask(candidates, context_type, domain)
+            if mask is None:
+                return []
+            candidates = candidates[mask]
+            if len(candidates) < k and not exact and self._centroids is not None:
+                # Filtro muy selectivo: las listas sondeadas no bastan
+                return self.search(query, k, context_type, domain, min_similarity, exact=True)
+            if len(candidates) == 0:
+                return []
+
+            similarities = self._decode(candidates) @ query
+            top = min(k, len(candidates))
+            best = np.argpartition(-similarities, top - 1)[:top]
+            best = best[np.argsort(-similarities[best])]
+
+            hits = []
+            for i in best.tolist():
+                similarity = float(similarities[i])
+                if min_similarity is not None and similarity < min_similarity:
+                    break
+                row = int(candidates[i])
+                hits.append(SearchHit(
+                    doc_id=self._doc_ids[row],
+                    similarity=similarity,
+                    context_type=self._context_vocab.value(int(self._context_types[row])),
+                    domain=self._domain_vocab.value(int(self._domains[row])),
+                    payload=self._payloads[row],
+                ))
+            return hits
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def save(self):
+        """Guarda vectores (.npy, memory-mappable), listas y metadatos en index_dir"""
+        with self._lock:
+            self._compact()
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            np.save(self.index_dir / VECTORS_FILE, np.ascontiguousarray(self._vectors[:self._size]))
+            arrays = {
+                "scales": self._scales[:self._size],
+                "context_types": self._context_types[:self._size],
+                "domains": self._domains[:self._size],
+                "assignments": self._assignments[:self._size],
+            }
+            if self._centroids is not None:
+                arrays["centroids"] = self._centroids
+            np.savez(self.index_dir / ARRAYS_FILE, **arrays)
+            meta = {
+                "dimension": self.dimension,
+                "storage": self.storage,
+                "doc_ids": self._doc_ids,
+                "payloads": self._payloads,
+                "context_types": self._context_vocab.values,
+                "domains": self._domain_vocab.values,
+                "trained_size": self._trained_size,
+            }
+            tmp = self.index_dir / f"{META_FILE}.tmp"
+            tmp.write_text(json.dumps(meta, ensure_ascii=False, default=str), encoding="utf-8")
+            os.replace(tmp, self.index_dir / META_FILE)
+
+    def load(self, mmap: bool = True):
+        """Carga el índice; con ``mmap`` los vectores se leen bajo demanda desde disco"""
+        with self._lock:
+            meta = json.loads((self.index_dir / META_FILE).read_text(encoding="utf-8"))
+            if meta["dimension"] != self.dimension:
+                raise ValueError(f"Índice de dimensión {meta['dimension']}, se esperaba {self.dimension}")
+            self._vectors = np.load(self.index_dir / VECTORS_FILE, mmap_mode="r" if mmap else None)
+            arrays = np.load(self.index_dir / ARRAYS_FILE)
+            self._size = self._vectors.shape[0]
+            self.storage = meta.get("storage", str(self._vectors.dtype))
+            self._scales = arrays["scales"].copy() if "scales" in arrays.files else np.ones(self._size, dtype=np.float32)
+            self._context_types = arrays["context_types"].copy()
+            self._domains = arrays["domains"].copy()
+            self._assignments = arrays["assignments"].copy()
+            self._alive = np.ones(self._size, dtype=bool)
+            self._doc_ids = meta["doc_ids"]
+            self._payloads = meta["payloads"]
+            self._rows = {doc_id: i for i, doc_id in enumerate(self._doc_ids)}
+            self._context_vocab = _Vocabulary(meta["context_types"])
+            self._domain_vocab = _Vocabulary(meta["domains"])
+            self._trained_size = meta["trained_size"]
+            self._centroids = arrays["centroids"] if "centroids" in arrays.files else None
+            self._rebuild_lists()
+            logger.info(f"🧭 Índice vectorial cargado: {self._size} vectores desde {self.index_dir}")
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict], embedding_field: str = "embedding", **kwargs) -> "VectorIndex":
+        """
+        Construye el índice desde documentos estilo MongoDB
+        ({_id, embedding, context_type, domain, ...}); el resto de campos
+        queda como payload.
+        """
+        index = cls(mmap=False, **kwargs)
+        batch: List[Dict] = []
+        for document in documents:
+            if document.get(embedding_field) is not None:
+                batch.append(document)
+            if len(batch) >= 4096:
+                index._add_documents(batch, embedding_field)
+                batch = []
+        index._add_documents(batch, embedding_field)
+        return index
+
+    def _add_documents(self, documents: List[Dict], embedding_field: str):
+        if not documents:
+            return
+        skip = {embedding_field, "_id", "context_type", "domain"}
+        self.add(
+            [d.get("_id") for d in documents],
+            np.asarray([d[embedding_field] for d in documents], dtype=np.float32),
+            context_types=[d.get("context_type") for d in documents],
+            domains=[d.get("domain") for d in documents],
+            payloads=[{k: v for k, v in d.items() if k not in skip} for d in documents],
+        )
+
+
+_index: Optional[VectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index() -> VectorIndex:
+    """Índice compartido del proceso (se carga desde VECTOR_INDEX_DIR si existe)"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = VectorIndex()
+        return _index
@@ -1,15 +1,19 @@
 """
 Main Entry Point - Refactorizado
 Orquesta el flujo completo según reglas de negocio.
+
+Los agentes y servicios con dependencias pesadas (playwright, openai,
+pandas, psycopg2...) se importan en la fase que los usa: `--help`, un
+error de argumentos o `--server` no los cargan. Presupuesto de arranque
+en benchmarks/import_time.py.
 """
 import argparse
 import os
+import sys
 from dotenv import load_dotenv
-from agents.scraper_agent import ScraperAgent
-from agents.scoring_agent import ScoringAgent
-from agents.db_writer_agent import DBWriterAgent
-from agents.insights_agent import InsightsAgent
+from domain.attributes import SCORING_MODES
 from infrastructure.logging_config import get_logger
+from infrastructure.metrics import log_phase_summary, metrics, write_prometheus, write_run_report
 
 # Load environment variables
 load_dotenv()
@@ -22,11 +26,106 @@ def main():
     parser.add_argument("url", nargs="?", help="URL del competidor a analizar")
     parser.add_argument("--dry-run", action="store_true", help="Ejecutar sin guardar en base de datos")
     parser.add_argument("--log-file", help="Archivo de log (opcional)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Re-analizar sólo lo que cambió desde el último snapshot")
+    parser.add_argument("--scoring-mode", choices=SCORING_MODES,
+                        help="Modo de scoring (default: SCORING_MODE o per_attribute)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignorar la cache de páginas y respuestas LLM")
+    parser.add_argument("--reuse-insights", action="store_true",
+                        help="Adaptar insights de competidores casi idénticos en lugar de generarlos (INSIGHTS_REUSE)")
+    parser.add_argument("--export", action="store_true",
+                        help="Añadir los resultados persistidos al snapshot Parquet/Arrow (ANALYTICS_EXPORT)")
+    parser.add_argument("--no-validation", action="store_true",
+                        help="Omitir la validación de esquema y URLs de evidencia (VALIDATION_ENABLED)")
+    parser.add_argument("--batch", metavar="ARCHIVO",
+                        help="Archivo con una URL por línea ('-' para leer de stdin)")
+    parser.add_argument("--workers", type=int,
+                        help="Hilos por fase del batch si no se indican límites específicos")
+    parser.add_argument("--scrape-concurrency", type=int,
+                        help="Scrapes simultáneos (default: BATCH_SCRAPE_CONCURRENCY)")
+    parser.add_argument("--llm-concurrency", type=int,
+                        help="Llamadas LLM simultáneas (default: BATCH_LLM_CONCURRENCY)")
+    parser.add_argument("--queue-size", type=int,
+                        help="Capacidad de las colas entre fases (default: BATCH_QUEUE_SIZE)")
+    parser.add_argument("--llm-batch", action="store_true",
+                        help="Puntuar el batch con la Batch API del LLM (LLM_BATCH, requiere --scoring-mode single_call)")
+    parser.add_argument("--run-id", metavar="ID",
+                        help="Run persistente y reanudable: con --batch crea o reanuda el run, "
+                             "sin --batch se suma como worker a un run existente")
+    parser.add_argument("--job-queue", metavar="URL",
+                        help="Cola del run: sqlite:///ruta o postgres (default: JOB_QUEUE_URL o $CACHE_DIR/jobs.db)")
+    parser.add_argument("--market-map", action="store_true",
+                        help="Calcular cuadrantes, percentiles y movimientos de todo el mercado")
+    parser.add_argument("--movers", nargs="?", const=0, type=float, metavar="DIAS",
+                        help="Mayores movimientos de X/Y y cambios de pricing del histórico "
+                             "(respecto al análisis anterior o a hace DIAS días)")
+    parser.add_argument("--report", metavar="ARCHIVO",
+                        help="Guardar informe JSON del run (tiempos por fase, tokens, cache, BD)")
+    parser.add_argument("--prometheus", metavar="ARCHIVO",
+                        help="Guardar métricas en formato Prometheus (textfile collector)")
+    parser.add_argument("--profile", nargs="?", const="", metavar="PREFIJO",
+                        help="Perfilar el run: PREFIJO.prof (cProfile) y PREFIJO.folded (pilas de todos los hilos)")
+    parser.add_argument("--serve", action="store_true",
+                        help="Modo daemon: servicio persistente con navegador, LLM y BD ya inicializados")
+    parser.add_argument("--server", metavar="URL", default=os.getenv("ANALYSIS_SERVER_URL"),
+                        help="Delegar el análisis en un daemon ya arrancado (default: ANALYSIS_SERVER_URL)")
     args = parser.parse_args()
     
+    if args.no_cache:
+        os.environ["CACHE_ENABLED"] = "false"
+    if args.scoring_mode:
+        os.environ["SCORING_MODE"] = args.scoring_mode
+    if args.reuse_insights:
+        os.environ["INSIGHTS_REUSE"] = "true"
+    if args.export:
+        os.environ["ANALYTICS_EXPORT"] = "true"
+    if args.no_validation:
+        os.environ["VALIDATION_ENABLED"] = "false"
+    if args.llm_batch:
+        os.environ["LLM_BATCH"] = "true"
+    
     # Configurar logger
     logger = get_logger("Main", args.log_file)
     
+    if args.serve:
+        serve(args, logger)
+        return
+    if args.server:
+        sys.exit(run_remote(args, logger))
+    
+    profiler = None
+    if args.profile is not None:
+        from infrastructure.profiler import RunProfiler, default_profile_prefix
+        profiler = RunProfiler(args.profile or default_profile_prefix())
+        profiler.start()
+    try:
+        analyze(args, logger)
+    finally:
+        if profiler:
+            profiler.stop()
+        write_metrics(args, logger)
+
+def analyze(args, logger):
+    """Ejecuta el modo pedido: batch, mapa de mercado o análisis de una URL"""
+    if args.batch or args.run_id:
+        try:
+            run_batch(args, logger)
+            if args.market_map and not args.dry_run:
+                run_market_map(logger)
+            if args.movers is not None and not args.dry_run:
+                run_movers(args, logger)
+        finally:
+            release_resources()
+        return
+    
+    if (args.market_map or args.movers is not None) and not args.url:
+        if args.market_map:
+            run_market_map(logger)
+        if args.movers is not None:
+            run_movers(args, logger)
+        return
+    
     logger.info("=" * 80)
     logger.info("🚀 INICIANDO ANÁLISIS DE COMPETIDOR")
     logger.info("=" * 80)
@@ -40,19 +139,45 @@ def main():
     
     logger.info(f"📋 URL objetivo: {args.url}")
     
+    from services.incremental_service import (
+        IncrementalAnalysisService,
+        current_source_urls,
+        domain_from_url,
+    )
+    
     try:
+        incremental = IncrementalAnalysisService() if args.incremental else None
+        snapshot = diff = None
+        if incremental:
+            snapshot = incremental.load_snapshot(domain_from_url(args.url))
+            if snapshot:
+                diff = incremental.diff_sources(snapshot)
+                if not diff.has_changes:
+                    logger.info("✓ Modo incremental: las fuentes no cambiaron desde el último análisis")
+                    return
+                logger.info(f"🔄 Modo incremental: {len(diff.changed)} fuentes cambiadas, "
+                            f"{len(diff.removed)} eliminadas")
+        
+        from infrastructure.llm_client import warm_up_llm
+        warm_up_llm()  # modelo local cargándose en paralelo a la extracción
+        
         # 1. Extracción de datos
         logger.info("\n" + "=" * 80)
         logger.info("FASE 1: EXTRACCIÓN DE DATOS")
         logger.info("=" * 80)
         
-        scraper = ScraperAgent()
-        competitor_data = scraper.scrape(args.url)
+        with metrics.phase("extraction"):
+            from agents.scraper_agent import ScraperAgent
+            scraper = ScraperAgent()
+            competitor_data = scraper.scrape(args.url)
         
         if not competitor_data:
             logger.error("❌ No se pudieron extraer datos del competidor")
             return
         
+        if snapshot:
+            incremental.add_current_sources(diff, snapshot, current_source_urls(competitor_data))
+        
         logger.info(f"✓ Datos extraídos para: {competitor_data.name} ({competitor_data.domain})")
         logger.info(f"  - Fuentes: {len(competitor_data.sources)}")
         logger.info(f"  - Servicios: {len(competitor_data.servicios) if competitor_data.servicios else 0}")
@@ -64,8 +189,15 @@ def main():
         logger.info("FASE 2: SCORING Y EVALUACIÓN")
         logger.info("=" * 80)
         
-        scorer = ScoringAgent()
-        scores = scorer.calculate_scores(competitor_data)
+        with metrics.phase("scoring"):
+            from services.multi_attribute_scoring_service import build_scorer
+            scorer = build_scorer()
+            if snapshot:
+                attributes = incremental.attributes_to_rescore(snapshot, diff)
+                logger.info(f"  Re-puntuando {len(attributes)} atributos: {', '.join(attributes) or 'ninguno'}")
+                scores = incremental.rescore(scorer, competitor_data, snapshot, attributes)
+            else:
+                scores = scorer.calculate_scores(competitor_data)
         
         if not scores:
             logger.error("❌ No se pudieron calcular scores")
@@ -79,13 +211,34 @@ def main():
         scores_with_evidence = sum(1 for attr in scores.attributes.values() if attr.raw_score is not None)
         logger.info(f"  - Atributos con score: {scores_with_evidence}/{len(scores.attributes)}")
         
+        from services.validation_service import ValidationService, validation_enabled
+        if validation_enabled():
+            logger.info("\n" + "=" * 80)
+            logger.info("VALIDACIÓN DE EVIDENCIA")
+            logger.info("=" * 80)
+            
+            with metrics.phase("validation"):
+                validator = ValidationService()
+                report = validator.validate(competitor_data, scores)
+            validator.log_report(report, limit=20)
+        
         # 3. Insights estratégicos
         logger.info("\n" + "=" * 80)
         logger.info("FASE 3: INSIGHTS ESTRATÉGICOS")
         logger.info("=" * 80)
         
-        insights_agent = InsightsAgent()
-        insights = insights_agent.generate_insights(competitor_data, scores)
+        if snapshot and not incremental.needs_insights(snapshot, competitor_data, scores):
+            logger.info("  X/Y y datos de entrada sin cambios: reutilizando insights anteriores")
+            insights = snapshot.insights
+        else:
+            with metrics.phase("insights"):
+                from services.insights_reuse_service import build_insights_generator
+                insights_agent = build_insights_generator()
+                insights = insights_agent.generate_insights(competitor_data, scores)
+            reuse = getattr(insights_agent, "last_reuse", None)
+            if reuse and reuse.mode != "full":
+                logger.info(f"  Insights ({reuse.mode}) desde {reuse.source_domain}: {reuse.reused_items} reutilizados, "
+                            f"{reuse.regenerated_items} regenerados")
         
         if not insights:
             logger.error("❌ No se pudieron generar insights")
@@ -108,14 +261,48 @@ def main():
             logger.info("FASE 4: PERSISTENCIA EN BASE DE DATOS")
             logger.info("=" * 80)
             
+            from agents.db_writer_agent import DBWriterAgent
             db_writer = DBWriterAgent()
             try:
-                competitor_id = db_writer.save_competitor(competitor_data, scores, insights)
+                with metrics.phase("persistence"):
+                    competitor_id = db_writer.save_competitor(competitor_data, scores, insights)
                 
                 if competitor_id:
                     logger.log_db_save(competitor_data.domain, competitor_id, True)
                     logger.info(f"✓ Competidor guardado con ID: {competitor_id}")
                     
+                    if incremental:
+                        fingerprints = incremental.fingerprint_sources(
+                            current_source_urls(competitor_data),
+                            known=diff.fingerprints if diff else None,
+                        )
+                        incremental.save_snapshot(competitor_data, scores, insights, fingerprints)
+                    
+                    from services.score_history_service import history_enabled, record_history
+                    if history_enabled():
+                        try:
+                            record_history([(competitor_data, scores, insights)], {competitor_data.domain: competitor_id})
+                        except Exception as e:
+                            logger.error(f"❌ Error al guardar histórico de scores: {e}", exc_info=True)
+                    
+                    if os.getenv("ANALYTICS_EXPORT", "false").lower() == "true":
+                        from services.analytics_export_service import AnalyticsExporter
+                        try:
+                            AnalyticsExporter().export_competitor(competitor_data, scores, insights, competitor_id)
+                        except Exception as e:
+                            logger.error(f"❌ Error al exportar snapshot analítico: {e}", exc_info=True)
+                    
+                    from services.context_index_service import get_context_indexer
+                    indexer = get_context_indexer()
+                    if indexer:
+                        try:
+                            embedding = indexer.embed(competitor_data)
+                            if embedding:
+                                indexer.add(embedding, competitor_id)
+                                logger.info(f"  ✓ Extracción indexada: {len(embedding.chunks)} chunks")
+                        except Exception as e:
+                            logger.error(f"❌ Error al indexar la extracción: {e}", exc_info=True)
+                    
                     # Guardar productos si hay
                     if competitor_data.pricing and competitor_data.pricing.get('products'):
                         logger.info("  Guardando productos y pricing...")
@@ -143,11 +330,171 @@ def main():
             logger.info(f"Posición estratégica: X={scores.x_score:.2f}, Y={scores.y_score:.2f}")
         logger.info("=" * 80)
         
+        if args.market_map and not args.dry_run:
+            run_market_map(logger)
+        if args.movers is not None and not args.dry_run:
+            run_movers(args, logger)
+        
     except KeyboardInterrupt:
         logger.warning("\n⚠ Análisis interrumpido por el usuario")
     except Exception as e:
         logger.error(f"❌ Error fatal: {e}", exc_info=True)
         raise
+    finally:
+        release_resources()
+
+def release_resources():
+    """
+    Cierra navegador y cliente LLM compartidos y aplica la política de la cache.
+    Sólo toca los módulos que el run llegó a importar.
+    """
+    for module, close in (
+        ("infrastructure.browser_pool", "close_browser_pool"),
+        ("infrastructure.llm_client", "close_llm_client"),
+        ("services.validation_service", "close_url_verifier"),
+        ("services.context_index_service", "close_context_indexer"),
+        ("infrastructure.cache", "evict_caches"),
+    ):
+        if module in sys.modules:
+            getattr(sys.modules[module], close)()
+
+def write_metrics(args, logger):
+    """Resumen de tiempos en el log y, si se pidieron, informe JSON y métricas Prometheus"""
+    log_phase_summary(logger)
+    if args.report:
+        from infrastructure.scheduler import get_scheduler
+        # Límites adaptados (AIMD) y consumo del presupuesto al terminar
+        write_run_report(args.report, extra={"scheduler": get_scheduler().snapshot()})
+        logger.info(f"📄 Informe del run: {args.report}")
+    if args.prometheus:
+        write_prometheus(args.prometheus)
+
+def run_batch(args, logger):
+    """
+    Analiza en paralelo todas las URLs del archivo indicado en --batch.
+    Con --run-id el progreso se guarda en la cola persistente y relanzar el
+    mismo comando (o lanzar más workers con --run-id) continúa el run.
+    """
+    from agents.batch_agent import BatchAgent, read_urls
+
+    urls = read_urls(args.batch) if args.batch else []
+    if args.batch and not urls:
+        logger.error("❌ No se encontraron URLs en el batch")
+        return
+
+    job_queue = None
+    if args.run_id:
+        from infrastructure.job_queue import get_job_queue
+        job_queue = get_job_queue(args.job_queue)
+
+    batch = BatchAgent(
+        workers=args.workers,
+        scrape_concurrency=args.scrape_concurrency,
+        llm_concurrency=args.llm_concurrency,
+        queue_size=args.queue_size,
+        incremental=args.incremental,
+        dry_run=args.dry_run,
+        log_file=args.log_file,
+        job_queue=job_queue,
+        run_id=args.run_id,
+    )
+    try:
+        results = batch.run(urls)
+        batch.print_summary(results)
+    except KeyboardInterrupt:
+        logger.warning("\n⚠ Batch interrumpido por el usuario")
+    finally:
+        if job_queue:
+            job_queue.close()
+
+def serve(args, logger):
+    """
+    Modo daemon: API de análisis (api/server.py) con navegador, cliente LLM y
+    pool de BD inicializados una vez. Los flags del CLI configuran el daemon.
+    """
+    if args.dry_run:
+        os.environ["API_DRY_RUN"] = "true"
+    if args.incremental:
+        os.environ["API_INCREMENTAL"] = "true"
+    if args.workers:
+        os.environ["API_MAX_CONCURRENT_ANALYSES"] = str(args.workers)
+    from api.server import serve as serve_api
+    
+    logger.info("🛰 Daemon de análisis: usa `python main.py --server http://host:puerto <url>` para delegar")
+    serve_api()
+
+def run_remote(args, logger) -> int:
+    """
+    Delega el análisis en un daemon ya arrancado (--serve) y sigue el progreso
+    por fase. Devuelve el código de salida: 1 si algún análisis falló.
+    """
+    from api.client import AnalysisClient, AnalysisClientError
+    
+    ignored = [flag for flag, value in (("--dry-run", args.dry_run), ("--incremental", args.incremental),
+                                        ("--scoring-mode", args.scoring_mode), ("--run-id", args.run_id),
+                                        ("--market-map", args.market_map), ("--export", args.export),
+                                        ("--no-validation", args.no_validation), ("--llm-batch", args.llm_batch),
+                                        ("--movers", args.movers is not None)) if value]
+    if ignored:
+        logger.warning(f"⚠ Con --server se ignoran {', '.join(ignored)}: se configuran al arrancar el daemon (--serve)")
+    
+    if args.batch:
+        from agents.batch_agent import read_urls
+        urls = read_urls(args.batch)
+    else:
+        urls = [args.url or input("Por favor ingresa la URL del competidor: ").strip()]
+    urls = [url if url.startswith(("http://", "https://")) else f"https://{url}" for url in urls if url]
+    if not urls:
+        logger.error("❌ URL es requerida")
+        return 1
+    
+    client = AnalysisClient(args.server)
+    failed = 0
+    try:
+        # Se encola todo primero: el daemon analiza en paralelo según su límite
+        # Un --batch remoto va al carril batch: no retrasa las peticiones interactivas
+        jobs = [client.submit(url, force=args.no_cache, priority="batch" if args.batch else "interactive")
+                for url in urls]
+        logger.info(f"🛰 {len(jobs)} análisis enviados a {args.server}")
+        for job in jobs:
+            for event in client.events(job["id"]):
+                if event["type"] == "phase":
+                    logger.info(f"  {job['domain']} | {event['phase']}: {event['status']}")
+                elif event["type"] == "failed":
+                    failed += 1
+                    logger.error(f"❌ {job['domain']}: {event.get('error')}")
+                elif event["type"] in ("completed", "cached"):
+                    scores = (event.get("result") or {}).get("scores") or {}
+                    origin = " (resultado reciente)" if event["type"] == "cached" else ""
+                    logger.info(f"✓ {job['domain']}{origin}: X={scores.get('x_score')}, Y={scores.get('y_score')}")
+    except AnalysisClientError as e:
+        logger.error(f"❌ {e}")
+        return 1
+    except KeyboardInterrupt:
+        logger.warning("\n⚠ Seguimiento interrumpido; los análisis continúan en el daemon")
+        return 130
+    return 1 if failed else 0
+
+def run_market_map(logger):
+    """Posicionamiento de todos los competidores guardados en el plano X/Y"""
+    from services.market_map_service import market_map_report
+
+    logger.info("=" * 80)
+    logger.info("📈 MAPA DE MERCADO")
+    logger.info("=" * 80)
+    market_map_report()
+
+
+def run_movers(args, logger):
+    """Alertas del histórico de scores: movimientos en el plano y cambios de pricing"""
+    from datetime import datetime, timedelta, timezone
+    from services.score_history_service import history_report
+
+    since = datetime.now(timezone.utc) - timedelta(days=args.movers) if args.movers else None
+    logger.info("=" * 80)
+    logger.info("📉 MOVIMIENTOS DEL MERCADO" + (f" (últimos {args.movers:g} días)" if since else ""))
+    logger.info("=" * 80)
+    history_report(since=since)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,40 @@
+-- ============================================
+-- Migración 004: Restricciones para escritura por lotes
+-- ============================================
+-- INSERT ... ON CONFLICT necesita un índice único sobre cada clave de conflicto.
+-- Usado por agents/bulk_db_writer_agent.py y seed_db.py.
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_dim_source_name ON dim_source (name);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_dim_attribute_code ON dim_attribute (code);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_competitors_domain ON competitors (domain);
+
+ALTER TABLE competitors ADD COLUMN IF NOT EXISTS x_score NUMERIC;
+ALTER TABLE competitors ADD COLUMN IF NOT EXISTS y_score NUMERIC;
+ALTER TABLE competitors ADD COLUMN IF NOT EXISTS extracted_data JSONB;
+ALTER TABLE competitors ADD COLUMN IF NOT EXISTS insights JSONB;
+ALTER TABLE competitors ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+
+-- Score vigente por competidor y atributo (NULL = sin evidencia)
+CREATE TABLE IF NOT EXISTS competitor_attribute_scores (
+    competitor_id INTEGER NOT NULL REFERENCES competitors (id) ON DELETE CASCADE,
+    attribute_id INTEGER NOT NULL REFERENCES dim_attribute (id),
+    raw_score NUMERIC,
+    evidence_urls TEXT[] NOT NULL DEFAULT '{}',
+    scored_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (competitor_id, attribute_id)
+);
+
+-- Fuentes (URLs) utilizadas en la extracción
+CREATE TABLE IF NOT EXISTS competitor_sources (
+    competitor_id INTEGER NOT NULL REFERENCES competitors (id) ON DELETE CASCADE,
+    url TEXT NOT NULL,
+    first_seen_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_seen_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (competitor_id, url)
+);
+
+-- Productos (migración 002): un producto por nombre y competidor
+ALTER TABLE products ADD COLUMN IF NOT EXISTS pricing JSONB;
+ALTER TABLE products ADD COLUMN IF NOT EXISTS source_url TEXT;
+ALTER TABLE products ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+CREATE UNIQUE INDEX IF NOT EXISTS ux_products_competitor_name ON products (competitor_id, name);
@@ -0,0 +1,37 @@
+-- ============================================
+-- Migración 005: Cola de trabajos persistente
+-- ============================================
+-- Runs de batch reanudables con workers en varias máquinas.
+-- Usado por infrastructure/job_queue.py (JOB_QUEUE_URL=postgres).
+-- Los tiempos son epoch en segundos (igual que el backend SQLite).
+
+CREATE TABLE IF NOT EXISTS batch_jobs (
+    run_id TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    url TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'leased', 'done', 'failed')),
+    phase TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires DOUBLE PRECISION,
+    competitor_id INTEGER,
+    error TEXT,
+    updated_at DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (run_id, domain)
+);
+
+-- Lease: siguiente job pendiente (o con lease caducado) por orden de entrada
+CREATE INDEX IF NOT EXISTS ix_batch_jobs_lease ON batch_jobs (run_id, status, position);
+
+-- Estado intermedio (JSON) tras cada fase; se borra al completar el job
+CREATE TABLE IF NOT EXISTS batch_checkpoints (
+    run_id TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    payload BYTEA NOT NULL,
+    created_at DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (run_id, domain, phase),
+    FOREIGN KEY (run_id, domain) REFERENCES batch_jobs (run_id, domain) ON DELETE CASCADE
+);
@@ -0,0 +1,56 @@
+-- ============================================
+-- Migración 006: Histórico de scores
+-- ============================================
+-- competitors y competitor_attribute_scores guardan sólo el último análisis.
+-- Estas tablas son append-only: cada análisis persistido añade una fila por
+-- competidor (X/Y y pricing) y una por atributo, con el delta respecto al
+-- análisis anterior calculado al insertar (la detección de cambios no
+-- necesita re-consultar ni comparar en Python).
+-- Usado por services/score_history_service.py y agents/bulk_db_writer_agent.py.
+
+-- Un análisis de un competidor
+CREATE TABLE IF NOT EXISTS competitor_score_runs (
+    competitor_id INTEGER NOT NULL REFERENCES competitors (id) ON DELETE CASCADE,
+    run_at TIMESTAMPTZ NOT NULL,
+    x_score NUMERIC,
+    y_score NUMERIC,
+    attributes_scored SMALLINT NOT NULL DEFAULT 0,
+    -- Productos/precios extraídos y su huella (incluye la evidencia de price_competitiveness)
+    pricing JSONB,
+    pricing_hash TEXT,
+    -- Análisis anterior del mismo competidor (NULL en el primero)
+    prev_run_at TIMESTAMPTZ,
+    delta_x NUMERIC,
+    delta_y NUMERIC,
+    pricing_changed BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (competitor_id, run_at)
+);
+
+-- Alertas por ventana de tiempo
+CREATE INDEX IF NOT EXISTS ix_score_runs_run_at ON competitor_score_runs (run_at);
+CREATE INDEX IF NOT EXISTS ix_score_runs_pricing_changed
+    ON competitor_score_runs (run_at) WHERE pricing_changed;
+
+-- Score de cada atributo en cada análisis (NULL = sin evidencia)
+CREATE TABLE IF NOT EXISTS competitor_score_history (
+    competitor_id INTEGER NOT NULL,
+    attribute_id INTEGER NOT NULL REFERENCES dim_attribute (id),
+    run_at TIMESTAMPTZ NOT NULL,
+    raw_score NUMERIC,
+    evidence_urls TEXT[] NOT NULL DEFAULT '{}',
+    delta NUMERIC,
+    evidence_changed BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (competitor_id, attribute_id, run_at),
+    FOREIGN KEY (competitor_id, run_at)
+        REFERENCES competitor_score_runs (competitor_id, run_at) ON DELETE CASCADE
+);
+
+-- Movimientos de un atributo en todo el mercado
+CREATE INDEX IF NOT EXISTS ix_score_history_attribute ON competitor_score_history (attribute_id, run_at);
+
+-- Último análisis de cada competidor. Ambas columnas en DESC: recorre la clave
+-- primaria (competitor_id, run_at) hacia atrás, sin ordenar
+CREATE OR REPLACE VIEW competitor_score_latest AS
+SELECT DISTINCT ON (competitor_id) *
+FROM competitor_score_runs
+ORDER BY competitor_id DESC, run_at DESC;
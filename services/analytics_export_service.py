@@ -0,0 +1,339 @@
+"""
+Analytics Export Service
+Snapshot columnar de cada run para analítica: competidores (con X/Y), scores
+por atributo con sus URLs de evidencia, insights y productos se escriben en
+ficheros Parquet o Arrow IPC particionados, de modo que los dashboards y el
+análisis histórico no consultan la BD transaccional.
+
+Cada lote persistido añade un fichero por tabla (escritura atómica) en:
+
+    $ANALYTICS_EXPORT_DIR/<tabla>/run_date=YYYY-MM-DD/run_id=<run>/part-*.parquet|arrow
+
+Lectura:
+- ``read_table``/``read_frame``: pyarrow.dataset con memory-map (Arrow IPC sin
+  compresión se lee sin copias).
+- ``duckdb_connection``: una vista por tabla para consultas SQL ad-hoc.
+
+    python -m services.analytics_export_service "SELECT domain, x_score FROM competitors"
+"""
+import argparse
+import dataclasses
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from domain.attributes import ATTRIBUTE_AXIS
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+from services.incremental_service import current_source_urls, evidence_urls
+
+EXPORT_FORMATS = {"parquet": "parquet", "arrow": "arrow"}  # formato → extensión
+
+# Campos extraídos que ya tienen columna o tabla propia
+_EXCLUDED_FIELDS = {"sources", "pricing"}
+
+_TIMESTAMP = pa.timestamp("us", tz="UTC")
+
+# run_date y run_id no se guardan en los ficheros: son las claves de partición
+SCHEMAS = {
+    "competitors": pa.schema([
+        ("exported_at", _TIMESTAMP),
+        ("domain", pa.string()),
+        ("competitor_id", pa.int64()),
+        ("name", pa.string()),
+        ("x_score", pa.float64()),
+        ("y_score", pa.float64()),
+        ("attributes_scored", pa.int32()),
+        ("sources", pa.list_(pa.string())),
+        ("extracted_data", pa.string()),  # JSON
+    ]),
+    "attribute_scores": pa.schema([
+        ("exported_at", _TIMESTAMP),
+        ("domain", pa.string()),
+        ("competitor_id", pa.int64()),
+        ("attribute_code", pa.string()),
+        ("axis", pa.string()),
+        ("raw_score", pa.float64()),
+        ("evidence_urls", pa.list_(pa.string())),
+        ("justification", pa.string()),
+    ]),
+    "insights": pa.schema([
+        ("exported_at", _TIMESTAMP),
+        ("domain", pa.string()),
+        ("competitor_id", pa.int64()),
+        ("category", pa.string()),
+        ("position", pa.int32()),
+        ("text", pa.string()),
+    ]),
+    "products": pa.schema([
+        ("exported_at", _TIMESTAMP),
+        ("domain", pa.string()),
+        ("competitor_id", pa.int64()),
+        ("name", pa.string()),
+        ("source_url", pa.string()),
+        ("pricing", pa.string()),  # JSON
+    ]),
+}
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("run_date", pa.date32()), ("run_id", pa.string())]), flavor="hive"
+)
+
+
+def _as_dict(obj) -> Dict:
+    if obj is None:
+        return {}
+    if isinstance(obj, dict):
+        return dict(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    return {k: v for k, v in vars(obj).items() if not k.startswith("_")}
+
+
+def _json(value) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _partition_value(value: str) -> str:
+    """Valor seguro como nombre de directorio de partición"""
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", value)
+
+
+def export_dir(base_dir: Optional[str] = None) -> Path:
+    return Path(base_dir or os.getenv("ANALYTICS_EXPORT_DIR", "exports"))
+
+
+def export_format(fmt: Optional[str] = None) -> str:
+    fmt = (fmt or os.getenv("ANALYTICS_EXPORT_FORMAT", "parquet")).lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"ANALYTICS_EXPORT_FORMAT inválido: {fmt} (opciones: {', '.join(EXPORT_FORMATS)})")
+    return fmt
+
+
+class AnalyticsExporter:
+    """Escribe los resultados de un run como tablas columnares particionadas"""
+
+    def __init__(self, base_dir: Optional[str] = None, fmt: Optional[str] = None, run_id: Optional[str] = None):
+        self.logger = get_logger("AnalyticsExport")
+        self.base_dir = export_dir(base_dir)
+        self.format = export_format(fmt)
+        self.run_id = _partition_value(
+            run_id or f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+        )
+        self._lock = threading.Lock()
+        self._part = 0
+
+    # ------------------------------------------------------------------
+    # Filas por tabla
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _rows(competitor_data, scores, insights, competitor_id, now) -> Dict[str, List[Dict]]:
+        domain = competitor_data.domain
+        base = {"exported_at": now, "domain": domain, "competitor_id": competitor_id}
+        attributes = getattr(scores, "attributes", None) or {}
+        extracted = {k: v for k, v in _as_dict(competitor_data).items() if k not in _EXCLUDED_FIELDS}
+
+        rows = {name: [] for name in SCHEMAS}
+        rows["competitors"].append({
+            **base,
+            "name": competitor_data.name,
+            "x_score": getattr(scores, "x_score", None),
+            "y_score": getattr(scores, "y_score", None),
+            "attributes_scored": sum(1 for a in attributes.values() if getattr(a, "raw_score", None) is not None),
+            "sources": current_source_urls(competitor_data),
+            "extracted_data": _json(extracted),
+        })
+        for code, attribute in attributes.items():
+            rows["attribute_scores"].append({
+                **base,
+                "attribute_code": code,
+                "axis": ATTRIBUTE_AXIS.get(code),
+                "raw_score": getattr(attribute, "raw_score", None),
+                "evidence_urls": evidence_urls(attribute),
+                "justification": getattr(attribute, "justification", None),
+            })
+        for category, items in _as_dict(insights).items():
+            if not isinstance(items, (list, tuple)):
+                continue
+            for position, text in enumerate(items):
+                rows["insights"].append({
+                    **base,
+                    "category": category,
+                    "position": position,
+                    "text": text if isinstance(text, str) else _json(text),
+                })
+        pricing = getattr(competitor_data, "pricing", None) or {}
+        for product in pricing.get("products", []) if isinstance(pricing, dict) else []:
+            product = _as_dict(product)
+            if not product.get("name"):
+                continue
+            rows["products"].append({
+                **base,
+                "name": product["name"],
+                "source_url": product.get("source_url") or product.get("url"),
+                "pricing": _json(product),
+            })
+        return rows
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def _write(self, name: str, table: "pa.Table", now: datetime) -> Path:
+        """Un fichero nuevo por tabla y lote; se escribe en .tmp y se renombra"""
+        directory = self.base_dir / name / f"run_date={now:%Y-%m-%d}" / f"run_id={self.run_id}"
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"part-{self._part:05d}-{uuid.uuid4().hex[:8]}.{EXPORT_FORMATS[self.format]}"
+        tmp = path.with_name(path.name + ".tmp")
+        if self.format == "parquet":
+            pq.write_table(table, tmp, compression="zstd")
+        else:
+            # Sin compresión: los buffers del fichero se usan tal cual al mapearlo en memoria
+            with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+        return path
+
+    def export_batch(self, items: Iterable[Tuple[object, object, object]],
+                     ids: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """
+        Exporta ``(competitor_data, scores, insights)`` (la misma entrada que
+        BulkDBWriterAgent.save_batch) con los IDs asignados por la BD.
+        Devuelve las filas escritas por tabla.
+        """
+        ids = ids or {}
+        now = datetime.now(timezone.utc)
+        rows = {name: [] for name in SCHEMAS}
+        for competitor_data, scores, insights in items:
+            if competitor_data is None:
+                continue
+            for name, table_rows in self._rows(
+                competitor_data, scores, insights, ids.get(competitor_data.domain), now
+            ).items():
+                rows[name].extend(table_rows)
+        if not rows["competitors"]:
+            return {}
+
+        counts = {}
+        with self._lock, metrics.phase("export"):
+            for name, table_rows in rows.items():
+                if not table_rows:
+                    continue
+                self._write(name, pa.Table.from_pylist(table_rows, schema=SCHEMAS[name]), now)
+                counts[name] = len(table_rows)
+                metrics.inc("analytics_rows_exported_total", len(table_rows), table=name, format=self.format)
+            self._part += 1
+        self.logger.info(
+            f"📦 Snapshot analítico | run {self.run_id} | "
+            + " | ".join(f"{name}: {count}" for name, count in counts.items())
+        )
+        return counts
+
+    def export_competitor(self, competitor_data, scores, insights,
+                          competitor_id: Optional[int] = None) -> Dict[str, int]:
+        """Lote de uno (análisis individual)"""
+        ids = {competitor_data.domain: competitor_id} if competitor_id else None
+        return self.export_batch([(competitor_data, scores, insights)], ids)
+
+
+# ----------------------------------------------------------------------
+# Lectura
+# ----------------------------------------------------------------------
+
+def open_dataset(name: str, base_dir: Optional[str] = None, fmt: Optional[str] = None) -> Optional["ds.Dataset"]:
+    """
+    Dataset de todas las particiones de ``name`` (None si aún no hay ficheros).
+    Los ficheros se abren con memory-map; run_date y run_id se leen de la ruta.
+    """
+    if name not in SCHEMAS:
+        raise ValueError(f"tabla desconocida: {name} (opciones: {', '.join(SCHEMAS)})")
+    fmt = export_format(fmt)
+    root = export_dir(base_dir) / name
+    # Sólo ficheros terminados: los .tmp de una escritura en curso no cuentan
+    files = sorted(str(p) for p in root.rglob(f"*.{EXPORT_FORMATS[fmt]}")) if root.exists() else []
+    if not files:
+        return None
+    return ds.dataset(
+        files,
+        schema=SCHEMAS[name].append(pa.field("run_date", pa.date32())).append(pa.field("run_id", pa.string())),
+        format="parquet" if fmt == "parquet" else "ipc",
+        partitioning=PARTITIONING,
+        partition_base_dir=str(root),
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+    )
+
+
+def read_table(name: str, filter=None, columns: Optional[List[str]] = None,
+               base_dir: Optional[str] = None, fmt: Optional[str] = None) -> "pa.Table":
+    """
+    Tabla Arrow con filtro y proyección aplicados al escanear, p. ej.
+    ``read_table("attribute_scores", filter=ds.field("attribute_code") == "market_reach")``
+    """
+    dataset = open_dataset(name, base_dir, fmt)
+    if dataset is None:
+        return SCHEMAS[name].empty_table()
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+def read_frame(name: str, filter=None, columns: Optional[List[str]] = None,
+               base_dir: Optional[str] = None, fmt: Optional[str] = None):
+    """Igual que read_table pero como DataFrame de pandas"""
+    return read_table(name, filter, columns, base_dir, fmt).to_pandas()
+
+
+def duckdb_connection(base_dir: Optional[str] = None, fmt: Optional[str] = None):
+    """
+    Conexión DuckDB en memoria con una vista por tabla exportada. Parquet se
+    lee directamente (con poda por run_date/run_id); Arrow IPC a través del
+    dataset de pyarrow.
+    """
+    import duckdb
+
+    fmt = export_format(fmt)
+    connection = duckdb.connect()
+    for name in SCHEMAS:
+        dataset = open_dataset(name, base_dir, fmt)
+        if dataset is None:
+            continue
+        if fmt == "parquet":
+            pattern = str(export_dir(base_dir) / name / "**" / "*.parquet").replace("'", "''")
+            connection.execute(
+                f"CREATE VIEW {name} AS SELECT * FROM read_parquet('{pattern}', hive_partitioning = true)"
+            )
+        else:
+            connection.register(name, dataset)
+    return connection
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Consultas SQL (DuckDB) sobre los snapshots analíticos")
+    parser.add_argument("query", help="SQL sobre competitors, attribute_scores, insights y products")
+    parser.add_argument("--dir", help="Directorio de exportación (default: ANALYTICS_EXPORT_DIR)")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), help="Formato de los ficheros")
+    parser.add_argument("--output", help="Guardar el resultado (.csv o .parquet)")
+    args = parser.parse_args(argv)
+
+    frame = duckdb_connection(args.dir, args.format).execute(args.query).df()
+    if args.output:
+        if args.output.endswith(".parquet"):
+            frame.to_parquet(args.output, index=False)
+        else:
+            frame.to_csv(args.output, index=False)
+    print(frame.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Context Index Service
+Mantiene el índice vectorial local (infrastructure/vector_index.py) al día
+con cada extracción persistida, para que el contexto RAG incluya a los
+competidores recién analizados sin reconstruir el índice.
+
+- ``embed``: el posicionamiento de CompetitorData se divide en chunks y se
+  embebe (EmbeddingService, con cache). Es I/O de red: va en las fases con
+  varios hilos, nunca en el escritor único.
+- ``add``: inserción incremental tras guardar (context_type="extraction",
+  dominio del competidor); sustituye los chunks anteriores del dominio.
+- ``save``: persiste el índice en VECTOR_INDEX_DIR cada
+  VECTOR_INDEX_SAVE_EVERY inserciones y al cerrar el proceso.
+
+Se activa con VECTOR_INDEX_ENABLED=true.
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional
+
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+from services.incremental_service import INSIGHTS_INPUT_FIELDS
+
+if TYPE_CHECKING:
+    import numpy as np
+
+CONTEXT_TYPE = "extraction"
+
+
+@dataclass
+class ExtractionEmbedding:
+    """Chunks y embeddings de una extracción, pendientes de insertar"""
+    domain: str
+    name: Optional[str]
+    chunks: List[str]
+    vectors: "np.ndarray"
+
+
+def extraction_text(competitor_data) -> str:
+    """Texto canónico de una extracción (campos de posicionamiento)"""
+    lines = []
+    for name in INSIGHTS_INPUT_FIELDS:
+        value = getattr(competitor_data, name, None)
+        if value in (None, "", [], {}):
+            continue
+        if not isinstance(value, str):
+            value = json.dumps(value, ensure_ascii=False, default=str, sort_keys=True)
+        lines.append(f"{name}: {value}")
+    return "\n\n".join(lines)
+
+
+def chunk_doc_id(domain: str, position: int) -> str:
+    return f"{CONTEXT_TYPE}:{domain}:{position}"
+
+
+class ContextIndexer:
+    """Inserciones incrementales de extracciones en el índice vectorial compartido"""
+
+    def __init__(self, index=None, embeddings=None, save_every: Optional[int] = None):
+        self._index = index
+        self._embeddings = embeddings
+        self.save_every = save_every or int(os.getenv("VECTOR_INDEX_SAVE_EVERY", "50"))
+        self.logger = get_logger("ContextIndex")
+        self._lock = threading.Lock()
+        self._unsaved = 0
+
+    @property
+    def index(self):
+        if self._index is None:
+            from infrastructure.vector_index import get_vector_index
+            self._index = get_vector_index()
+        return self._index
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            from services.embedding_service import EmbeddingService
+            self._embeddings = EmbeddingService()
+        return self._embeddings
+
+    def embed(self, competitor_data) -> Optional[ExtractionEmbedding]:
+        """Embeddings de una extracción (None si no hay texto que indexar)"""
+        text = extraction_text(competitor_data)
+        if not text:
+            return None
+        chunks, _, vectors = self.embeddings.embed_document(text)
+        return ExtractionEmbedding(
+            domain=competitor_data.domain,
+            name=getattr(competitor_data, "name", None),
+            chunks=chunks,
+            vectors=vectors,
+        )
+
+    def add(self, embedding: ExtractionEmbedding, competitor_id: Optional[int] = None) -> int:
+        """Inserta los chunks de una extracción guardada y descarta los que sobran del análisis anterior"""
+        if not embedding.chunks:
+            return 0
+        index = self.index
+        domain = embedding.domain
+        payload = {"name": embedding.name, "competitor_id": competitor_id}
+        added = index.add(
+            [chunk_doc_id(domain, i) for i in range(len(embedding.chunks))],
+            embedding.vectors,
+            context_types=[CONTEXT_TYPE] * len(embedding.chunks),
+            domains=[domain] * len(embedding.chunks),
+            payloads=[dict(payload, text=chunk) for chunk in embedding.chunks],
+        )
+        position = len(embedding.chunks)
+        while index.remove([chunk_doc_id(domain, position)]):
+            position += 1
+        metrics.inc("context_index_chunks_total", added)
+
+        with self._lock:
+            self._unsaved += added
+            due = self._unsaved >= self.save_every
+        if due:
+            self.save()
+        return added
+
+    def save(self):
+        """Persiste el índice si hay inserciones sin guardar"""
+        with self._lock:
+            if not self._unsaved:
+                return
+            self._unsaved = 0
+        self.index.save()
+        self.logger.debug(f"🧭 Índice vectorial guardado: {len(self.index)} vectores")
+
+
+_indexer: Optional[ContextIndexer] = None
+_indexer_lock = threading.Lock()
+
+
+def context_index_enabled() -> bool:
+    return os.getenv("VECTOR_INDEX_ENABLED", "false").lower() == "true"
+
+
+def get_context_indexer() -> Optional[ContextIndexer]:
+    """Indexador compartido del proceso (None si VECTOR_INDEX_ENABLED no está activo)"""
+    global _indexer
+    if not context_index_enabled():
+        return None
+    with _indexer_lock:
+        if _indexer is None:
+            _indexer = ContextIndexer()
+        return _indexer
+
+
+def close_context_indexer():
+    """Guarda las inserciones pendientes (al cerrar el proceso)"""
+    global _indexer
+    with _indexer_lock:
+        indexer, _indexer = _indexer, None
+    if indexer is not None:
+        try:
+            indexer.save()
+        except Exception as e:
+            indexer.logger.error(f"❌ No se pudo guardar el índice vectorial: {e}", exc_info=True)
@@ -0,0 +1,477 @@
+"""
+Crawl Frontier
+Descubrimiento de páginas con evidencia (pricing, integraciones, seguridad,
+API, ...) sin sondear candidatos uno a uno.
+
+- Lee robots.txt (reglas y Crawl-delay) y los sitemaps que declara.
+- Puntúa cada enlace por URL y texto del ancla según los atributos que aún
+  necesitan evidencia; los enlaces irrelevantes (blog, legal, login,
+  otros idiomas) no se descargan.
+- Descarga los K mejores en paralelo con límite de conexiones e intervalo
+  mínimo por host (cortesía).
+- Se detiene en cuanto cada atributo tiene CRAWL_MIN_EVIDENCE segmentos de
+  evidencia, o al agotar CRAWL_MAX_PAGES.
+"""
+import gzip
+import heapq
+import io
+import itertools
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urldefrag, urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+from lxml import etree
+from lxml import html as lxml_html
+
+from domain.attributes import ATTRIBUTE_CODES
+from infrastructure.browser_pool import RenderedPage, _static_session, fetch_page
+from infrastructure.cache import DEFAULT_USER_AGENT, decode_html, get_page_cache
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+from services.evidence_extractor import EvidenceExtractor, iter_segments
+
+logger = get_logger("CrawlFrontier")
+
+# (tema, patrón de URL/ancla, atributos que aporta, peso)
+LINK_TOPICS = [
+    ("pricing", re.compile(r"pric|precio|\bplan(s|es)?\b|tarifa|cost|quote|cotiza", re.I),
+     ("price_competitiveness",), 3.0),
+    ("integrations", re.compile(r"integra|marketplace|partner|connect|app-?store|\bapps\b", re.I),
+     ("integration_capabilities",), 2.5),
+    ("api", re.compile(r"\bapi\b|developer|\bdocs?\b|documentation|reference", re.I),
+     ("integration_capabilities",), 1.5),
+    ("security", re.compile(r"secur|segurid|complian|gdpr|rgpd|trust|\bpci\b|\biso\b|soc-?2", re.I),
+     ("security_compliance",), 2.0),
+    ("features", re.compile(r"feature|funcionalidad|product|modul|platform|plataforma|solution|solucion", re.I),
+     ("feature_set_completeness", "ease_of_use", "innovation_score"), 2.0),
+    ("support", re.compile(r"support|soporte|\bhelp\b|ayuda|onboarding|academy|training|formaci", re.I),
+     ("support_quality",), 1.5),
+    ("customers", re.compile(r"customer|cliente|case-?stud|casos|testimon|review|opiniones|success", re.I),
+     ("customer_satisfaction", "brand_sentiment", "market_reach"), 1.5),
+    ("about", re.compile(r"about|nosotros|company|empresa|quienes", re.I),
+     ("market_reach",), 1.0),
+    ("innovation", re.compile(r"\bai\b|\bia\b|artificial|machine-?learning|innova", re.I),
+     ("innovation_score",), 1.0),
+]
+
+# Evidencia en el texto de un segmento, por atributo
+ATTRIBUTE_EVIDENCE = {
+    "price_competitiveness": re.compile(
+        r"€|\$|£|precio|price|pricing|/ ?mes|/ ?month|por habitación|per room|gratis|free trial", re.I),
+    "feature_set_completeness": re.compile(
+        r"\bpms\b|channel manager|booking engine|motor de reservas|revenue management|\bcrm\b|\bpos\b|"
+        r"housekeeping|módulo|module|funcionalidad|feature", re.I),
+    "brand_sentiment": re.compile(
+        r"opiniones|reviews?|rating|valoraci|premio|award|capterra|\bg2\b|tripadvisor|★|estrellas|stars", re.I),
+    "market_reach": re.compile(
+        r"\d[\d.,]*\s?\+?\s?(hoteles|hotels|propiedades|properties|clientes|customers|países|countries)", re.I),
+    "innovation_score": re.compile(
+        r"inteligencia artificial|\bia\b|\bai\b|machine learning|predic|forecast|automatiza|automat", re.I),
+    "customer_satisfaction": re.compile(
+        r"testimoni|caso de éxito|case stud|satisf|\bnps\b|recomiend|recommend", re.I),
+    "ease_of_use": re.compile(
+        r"fácil|intuitiv|easy|user-friendly|sin formación|en minutos|in minutes|onboarding", re.I),
+    "integration_capabilities": re.compile(
+        r"integra|\bapi\b|conector|connector|webhook|marketplace|partners?", re.I),
+    "support_quality": re.compile(
+        r"soporte|support|24/7|24h|chat en vivo|live chat|help ?center|centro de ayuda|account manager", re.I),
+    "security_compliance": re.compile(
+        r"gdpr|rgpd|\bpci\b|iso ?27001|soc ?2|cifrado|encrypt|segurid|security|complian", re.I),
+}
+
+# Enlaces que casi nunca contienen evidencia de scoring
+_IRRELEVANT = re.compile(
+    r"/blog/.+|/news/.+|/noticias/.+|/press|/prensa|career|/jobs?\b|empleo|trabaja|login|signin|sign-in|"
+    r"signup|register|registro|/cart|checkout|/legal|terms|terminos|cookie|aviso-legal|/tag/|/author/|"
+    r"/category/|/page/\d+|/wp-(content|admin|json)|/feed\b",
+    re.I,
+)
+_BINARY = re.compile(r"\.(pdf|jpe?g|png|gif|svg|webp|zip|mp4|mp3|css|js|json|xml|ico|woff2?)$", re.I)
+_LOCALE = re.compile(r"^/([a-z]{2}(?:[-_][a-z]{2})?)(?=/|$)", re.I)
+# Prefijos de idioma reconocidos sin hreflang; otros (/ai, /go, /hr...) sólo
+# cuentan como idioma si el sitio los declara en <link rel="alternate" hreflang>
+_KNOWN_LOCALES = frozenset((
+    "ar", "ca", "cs", "da", "de", "el", "en", "es", "eu", "fi", "fr", "gl", "he", "it",
+    "ja", "ko", "nb", "nl", "no", "pl", "pt", "ro", "ru", "sv", "tr", "uk", "zh",
+))
+
+_counter = itertools.count()
+
+
+@dataclass(order=True)
+class _Candidate:
+    priority: float
+    seq: int
+    url: str = field(compare=False)
+    anchor: str = field(compare=False, default="")
+    depth: int = field(compare=False, default=1)
+    source: str = field(compare=False, default="link")
+
+
+@dataclass
+class CrawlResult:
+    """Páginas descargadas y cobertura de evidencia por atributo"""
+    start_url: str
+    pages: List[RenderedPage]
+    evidence: EvidenceExtractor
+    coverage: Dict[str, int]
+    pricing_urls: List[str]
+    stop_reason: str
+    discovered: int = 0
+    skipped: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def missing_attributes(self) -> List[str]:
+        return [code for code, count in self.coverage.items() if count == 0]
+
+
+class _HostGate:
+    """Máximo de peticiones simultáneas e intervalo mínimo entre inicios, por host"""
+
+    def __init__(self, concurrency: int, delay: float):
+        self._semaphore = threading.Semaphore(concurrency)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+        self.delay = delay
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        with self._lock:
+            now = time.monotonic()
+            wait_for = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.delay
+        if wait_for > 0:
+            time.sleep(wait_for)
+        return self
+
+    def __exit__(self, *exc):
+        self._semaphore.release()
+        return False
+
+
+def _site(url: str) -> str:
+    return urlparse(url).netloc.lower().removeprefix("www.")
+
+
+def _normalize(url: str) -> str:
+    url, _ = urldefrag(url)
+    parsed = urlparse(url)
+    path = parsed.path.rstrip("/") or "/"
+    return parsed._replace(path=path, params="", query="").geturl()
+
+
+class CrawlFrontier:
+    """Frontera de crawl priorizada por la evidencia que falta"""
+
+    def __init__(
+        self,
+        start_url: str,
+        max_pages: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        per_host: Optional[int] = None,
+        delay: Optional[float] = None,
+        min_evidence: Optional[int] = None,
+        min_score: Optional[float] = None,
+        attributes: Optional[List[str]] = None,
+        render: bool = True,
+    ):
+        self.start_url = _normalize(start_url)
+        self.site = _site(start_url)
+        self.max_pages = max_pages or int(os.getenv("CRAWL_MAX_PAGES", "12"))
+        self.concurrency = concurrency or int(os.getenv("CRAWL_CONCURRENCY", "4"))
+        self.per_host = per_host or int(os.getenv("CRAWL_PER_HOST", "2"))
+        self.delay = float(os.getenv("CRAWL_DELAY", "0.25")) if delay is None else delay
+        self.min_evidence = min_evidence or int(os.getenv("CRAWL_MIN_EVIDENCE", "2"))
+        self.min_score = float(os.getenv("CRAWL_MIN_SCORE", "0.5")) if min_score is None else min_score
+        self.render = render
+        self.coverage = {code: 0 for code in (attributes or ATTRIBUTE_CODES)}
+        # Prefijos de ruta de las versiones en otros idiomas (hreflang)
+        self.locale_prefixes: Set[str] = set()
+        self.locale = self._locale(urlparse(self.start_url).path)
+
+        self.robots: Optional[RobotFileParser] = None
+        self._heap: List[_Candidate] = []
+        self._seen: Set[str] = set()
+        self.skipped: Dict[str, int] = {}
+
+    # ------------------------------------------------------------------
+    # robots.txt / sitemap
+    # ------------------------------------------------------------------
+
+    def _get(self, url: str) -> Tuple[Optional[int], bytes, Optional[str]]:
+        """(status, contenido, Content-Type) de una descarga estática"""
+        try:
+            cache = get_page_cache()
+            if cache:
+                page = cache.fetch(url, session=_static_session, timeout=15)
+                return page.status_code, page.content or b"", page.content_type
+            response = _static_session.get(url, timeout=15)
+            metrics.inc("http_bytes_total", len(response.content), kind="crawl")
+            return response.status_code, response.content, response.headers.get("Content-Type")
+        except Exception as e:
+            logger.debug(f"No se pudo descargar {url}: {e}")
+            return None, b"", None
+
+    def load_robots(self) -> List[str]:
+        """Carga robots.txt; devuelve los sitemaps declarados (o /sitemap.xml)"""
+        robots_url = urljoin(self.start_url, "/robots.txt")
+        status, content, _ = self._get(robots_url)
+        sitemaps = []
+        if status == 200 and content:
+            self.robots = RobotFileParser(robots_url)
+            self.robots.parse(content.decode("utf-8", errors="replace").splitlines())
+            delay = self.robots.crawl_delay(DEFAULT_USER_AGENT)
+            if delay:
+                self.delay = max(self.delay, float(delay))
+            sitemaps = [urljoin(robots_url, s) for s in (self.robots.site_maps() or [])]
+        return sitemaps or [urljoin(self.start_url, "/sitemap.xml")]
+
+    def allowed(self, url: str) -> bool:
+        return self.robots is None or self.robots.can_fetch(DEFAULT_USER_AGENT, url)
+
+    def read_sitemap(self, url: str, max_urls: Optional[int] = None, _depth: int = 0) -> int:
+        """Añade las URLs de un sitemap (o índice de sitemaps) a la frontera, en streaming"""
+        max_urls = max_urls or int(os.getenv("SITEMAP_MAX_URLS", "5000"))
+        status, content, _ = self._get(url)
+        if status != 200 or not content:
+            return 0
+        if content[:2] == b"\x1f\x8b":
+            content = gzip.decompress(content)
+
+        added, children = 0, []
+        try:
+            for _, element in etree.iterparse(io.BytesIO(content), events=("end",), tag="{*}loc",
+                                              recover=True, resolve_entities=False, no_network=True):
+                loc = (element.text or "").strip()
+                parent = element.getparent()
+                is_index = parent is not None and etree.QName(parent).localname == "sitemap"
+                element.clear()
+                if not loc:
+                    continue
+                loc = urljoin(url, loc)
+                if is_index:
+                    children.append(loc)
+                elif self.push(loc, depth=max(1, urlparse(loc).path.count("/")), source="sitemap"):
+                    added += 1
+                if added >= max_urls:
+                    break
+        except etree.XMLSyntaxError as e:
+            logger.debug(f"Sitemap inválido {url}: {e}")
+
+        if _depth < 2:
+            # Índices: primero los sitemaps de páginas/productos, no los de posts
+            children.sort(key=lambda loc: -self.score_link(loc))
+            for child in children[:3]:
+                added += self.read_sitemap(child, max_urls - added, _depth + 1)
+        return added
+
+    # ------------------------------------------------------------------
+    # Puntuación
+    # ------------------------------------------------------------------
+
+    def _needed(self, codes) -> float:
+        """Fracción de los atributos ``codes`` que aún necesitan evidencia"""
+        codes = [code for code in codes if code in self.coverage]
+        if not codes:
+            return 0.0
+        return sum(1 for code in codes if self.coverage[code] < self.min_evidence) / len(codes)
+
+    def score_link(self, url: str, anchor: str = "", depth: int = 1) -> float:
+        path = urlparse(url).path.lower()
+        score = 0.0
+        for _, pattern, codes, weight in LINK_TOPICS:
+            need = self._needed(codes)
+            if not need:
+                continue
+            if pattern.search(path):
+                score += weight * need
+            elif anchor and pattern.search(anchor):
+                score += 0.75 * weight * need
+        if _IRRELEVANT.search(url):
+            score -= 3.0
+        return score - 0.3 * max(0, depth - 1)
+
+    def _locale(self, path: str) -> Optional[str]:
+        """Idioma del primer segmento de la ruta, sólo si es un locale conocido o declarado"""
+        match = _LOCALE.match(path)
+        if not match:
+            return None
+        locale = match[1].lower().replace("_", "-")
+        if locale in self.locale_prefixes or locale.split("-")[0] in _KNOWN_LOCALES:
+            return locale
+        return None
+
+    def _reject(self, url: str) -> Optional[str]:
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https"):
+            return "scheme"
+        if _site(url) != self.site:
+            return "external"
+        if _BINARY.search(parsed.path):
+            return "binary"
+        locale = self._locale(parsed.path)
+        if locale and locale != self.locale:
+            return "locale"
+        if not self.allowed(url):
+            return "robots"
+        return None
+
+    def push(self, url: str, anchor: str = "", depth: int = 1, source: str = "link") -> bool:
+        url = _normalize(url)
+        if url in self._seen:
+            return False
+        self._seen.add(url)
+        reason = self._reject(url)
+        if reason:
+            self.skipped[reason] = self.skipped.get(reason, 0) + 1
+            return False
+        anchor = re.sub(r"\s+", " ", anchor or "").strip()[:120]
+        # La portada siempre primero
+        score = float("inf") if source == "seed" else self.score_link(url, anchor, depth)
+        heapq.heappush(self._heap, _Candidate(-score, next(_counter), url, anchor, depth, source))
+        return True
+
+    def pop(self) -> Optional[_Candidate]:
+        """
+        Mejor candidato según la cobertura ACTUAL: las prioridades se recalculan
+        al extraer (los temas ya cubiertos dejan de sumar) y se reinserta si
+        deja de ser el mejor.
+        """
+        while self._heap:
+            candidate = heapq.heappop(self._heap)
+            if candidate.source == "seed":
+                return candidate
+            score = self.score_link(candidate.url, candidate.anchor, candidate.depth)
+            if self._heap and -score > self._heap[0].priority + 1e-9:
+                candidate.priority = -score
+                heapq.heappush(self._heap, candidate)
+                continue
+            if score < self.min_score:
+                self.skipped["low_score"] = self.skipped.get("low_score", 0) + 1 + len(self._heap)
+                self._heap.clear()
+                return None
+            candidate.priority = -score
+            return candidate
+        return None
+
+    # ------------------------------------------------------------------
+    # Crawl
+    # ------------------------------------------------------------------
+
+    def _fetch(self, gate: _HostGate, candidate: _Candidate) -> Optional[RenderedPage]:
+        pricing = bool(LINK_TOPICS[0][1].search(urlparse(candidate.url).path))
+        with gate, metrics.timer("crawl_fetch_seconds"):
+            if self.render:
+                return fetch_page(candidate.url, pricing=pricing)
+            status, content, content_type = self._get(candidate.url)
+            if status not in (200, 304) or not content:
+                return None
+            return RenderedPage(candidate.url, candidate.url, decode_html(content, content_type),
+                                status, rendered=False)
+
+    def _links(self, page: RenderedPage, depth: int):
+        try:
+            tree = lxml_html.fromstring(page.html)
+        except Exception:
+            return
+        for element in tree.xpath("//link[@hreflang][@href]"):
+            alternate = urljoin(page.final_url, element.get("href"))
+            match = _LOCALE.match(urlparse(alternate).path)
+            if match and _site(alternate) == self.site:
+                self.locale_prefixes.add(match[1].lower().replace("_", "-"))
+        if self.locale is None and self.locale_prefixes:
+            self.locale = self._locale(urlparse(self.start_url).path)
+        for element in tree.iter("a"):
+            href = element.get("href")
+            if href and not href.startswith(("mailto:", "tel:", "javascript:")):
+                self.push(urljoin(page.final_url, href), element.text_content(), depth + 1)
+
+    def _record_evidence(self, page: RenderedPage, extractor: EvidenceExtractor):
+        for segment in iter_segments(page.html, page.final_url, extractor.min_chars):
+            # Sólo cuenta la evidencia nueva: nav/footer repetidos en cada página no cubren nada
+            if not extractor.add(segment):
+                continue
+            for code, pattern in ATTRIBUTE_EVIDENCE.items():
+                if code in self.coverage and pattern.search(segment.text):
+                    self.coverage[code] += 1
+
+    def covered(self) -> bool:
+        return all(count >= self.min_evidence for count in self.coverage.values())
+
+    def crawl(self, extractor: Optional[EvidenceExtractor] = None) -> CrawlResult:
+        extractor = extractor or EvidenceExtractor()
+        sitemaps = self.load_robots()
+        self.push(self.start_url, depth=0, source="seed")
+        discovered = sum(self.read_sitemap(url) for url in sitemaps)
+
+        gate = _HostGate(self.per_host, self.delay)
+        pages: List[RenderedPage] = []
+        pricing_urls: List[str] = []
+        pending = {}
+        stop_reason = "exhausted"
+        pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="crawl")
+        try:
+            while True:
+                while len(pending) < self.concurrency and len(pages) + len(pending) < self.max_pages:
+                    candidate = self.pop()
+                    if candidate is None:
+                        break
+                    pending[pool.submit(self._fetch, gate, candidate)] = candidate
+                if not pending:
+                    if len(pages) >= self.max_pages:
+                        stop_reason = "max_pages"
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    candidate = pending.pop(future)
+                    try:
+                        page = future.result()
+                    except Exception as e:
+                        logger.debug(f"Error descargando {candidate.url}: {e}")
+                        page = None
+                    if page is None or not page.html:
+                        metrics.inc("crawl_pages_total", result="failed")
+                        continue
+                    metrics.inc("crawl_pages_total", result="fetched", source=candidate.source)
+                    pages.append(page)
+                    if LINK_TOPICS[0][1].search(urlparse(candidate.url).path):
+                        pricing_urls.append(page.final_url)
+                    self._record_evidence(page, extractor)
+                    self._links(page, candidate.depth)
+
+                if self.covered():
+                    stop_reason = "coverage"
+                    break
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        metrics.inc("crawl_stop_total", reason=stop_reason)
+        if pending:
+            metrics.inc("crawl_pages_total", len(pending), result="cancelled")
+        result = CrawlResult(
+            start_url=self.start_url,
+            pages=pages,
+            evidence=extractor,
+            coverage=dict(self.coverage),
+            pricing_urls=pricing_urls,
+            stop_reason=stop_reason,
+            discovered=discovered,
+            skipped=dict(self.skipped),
+        )
+        logger.info(
+            f"🕸️ {self.site}: {len(pages)} páginas ({stop_reason}); "
+            f"sin evidencia: {', '.join(result.missing_attributes) or 'ninguno'}"
+        )
+        return result
+
+
+def discover_pages(url: str, **kwargs) -> CrawlResult:
+    """Atajo: crawl priorizado de ``url`` con la configuración por defecto"""
+    return CrawlFrontier(url, **kwargs).crawl()
@@ -0,0 +1,241 @@
+"""
+Embedding Service
+Embeddings de páginas y consultas para RAG, por lotes y con cache.
+
+- Chunking determinista: el mismo texto produce siempre los mismos chunks.
+- Chunks deduplicados por hash (sha256 del texto normalizado).
+- Sólo los chunks que no están en la cache se envían, en llamadas por lotes
+  de EMBEDDING_BATCH_SIZE entradas.
+- Cache persistente por (modelo, hash del chunk) en float32, float16 o int8
+  (EMBEDDING_STORAGE).
+- Llamadas limitadas y presupuestadas por el scheduler compartido
+  (infrastructure/scheduler.py, fase ``embedding``).
+
+Proveedores (EMBEDDING_PROVIDER): openai, ollama o fallback (hashing local,
+sin red, útil para desarrollo).
+"""
+import hashlib
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from infrastructure.cache import get_embedding_cache
+from infrastructure.llm_client import RETRYABLE_STATUS, LLMError, retry_after_seconds, retry_delay
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+from infrastructure.ollama_runtime import OllamaSettings
+from infrastructure.scheduler import current_scope, get_scheduler
+
+EMBEDDING_PROVIDERS = ("openai", "ollama", "fallback")
+
+_WHITESPACE = re.compile(r"[ \t\r\f\v]+")
+_PARAGRAPHS = re.compile(r"\n\s*\n+")
+_SENTENCES = re.compile(r"(?<=[.!?])\s+")
+_TOKENS = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza espacios para que el hash no dependa del formato"""
+    lines = (_WHITESPACE.sub(" ", line).strip() for line in (text or "").split("\n"))
+    return "\n".join(lines).strip()
+
+
+def chunk_hash(chunk: str) -> str:
+    return hashlib.sha256(normalize_text(chunk).encode("utf-8")).hexdigest()
+
+
+def chunk_text(text: str, max_chars: int = 2000) -> List[str]:
+    """
+    Divide el texto en chunks de hasta ``max_chars`` respetando párrafos y,
+    si un párrafo es demasiado largo, frases. Sin solapamiento: un cambio en
+    un párrafo sólo invalida su chunk, el resto conserva su hash.
+    """
+    chunks: List[str] = []
+    current = ""
+    for paragraph in _PARAGRAPHS.split(normalize_text(text)):
+        pieces = [paragraph] if len(paragraph) <= max_chars else _SENTENCES.split(paragraph)
+        for piece in pieces:
+            while len(piece) > max_chars:
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(piece[:max_chars])
+                piece = piece[max_chars:]
+            if not piece:
+                continue
+            if current and len(current) + 2 + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class EmbeddingService:
+    """Genera embeddings con dedupe por hash, cache persistente y llamadas por lotes"""
+
+    def __init__(
+        self,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        dimension: Optional[int] = None,
+    ):
+        self.logger = get_logger("EmbeddingService")
+        self.provider = (provider or os.getenv("EMBEDDING_PROVIDER", "openai")).lower()
+        if self.provider not in EMBEDDING_PROVIDERS:
+            raise ValueError(f"EMBEDDING_PROVIDER inválido: {self.provider} (opciones: {', '.join(EMBEDDING_PROVIDERS)})")
+        self.model = model or os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+        if self.provider == "fallback":
+            self.model = "fallback-hashing"
+        self.dimension = dimension or int(os.getenv("EMBEDDING_DIMENSION", "1536"))
+        self.batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+        self.chunk_chars = int(os.getenv("EMBEDDING_CHUNK_CHARS", "2000"))
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "5"))
+
+        if self.provider == "ollama":
+            base = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+            self.url = base.rsplit("/api/", 1)[0] + "/api/embed"
+            self.keep_alive = OllamaSettings.from_env().keep_alive
+            headers = {}
+        else:
+            self.url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/") + "/embeddings"
+            headers = {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', '')}"}
+        self._http = httpx.Client(
+            headers=headers,
+            timeout=httpx.Timeout(float(os.getenv("LLM_TIMEOUT", "120")), connect=10),
+        ) if self.provider != "fallback" else None
+
+        self.api_calls = 0
+        self.embedded_chunks = 0
+
+    # ------------------------------------------------------------------
+    # Proveedores
+    # ------------------------------------------------------------------
+
+    def _fallback_embed(self, texts: List[str]) -> np.ndarray:
+        """Feature hashing de tokens: determinista, sin red"""
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in _TOKENS.findall(text.lower()):
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                vectors[i, value % self.dimension] += 1.0 if value >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _request(self, texts: List[str]) -> np.ndarray:
+        """
+        Una llamada al proveedor con reintentos (mismo backoff que el cliente LLM).
+        Lanza BudgetExceeded si el presupuesto del contexto ya no admite embeddings.
+        """
+        scheduler = get_scheduler()
+        call_scope = current_scope()
+        scheduler.check_budget("embedding", call_scope)
+        gate = scheduler.gate("embedding", self.provider, self.model)
+        estimated = sum(len(text) for text in texts) // 4
+        if self.provider == "ollama":
+            payload = {"model": self.model, "input": texts,
+                       "keep_alive": self.keep_alive}
+        else:
+            payload = {"model": self.model, "input": texts, "encoding_format": "float"}
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            permit = gate.acquire(estimated, call_scope.lane)
+            try:
+                with metrics.timer("embedding_request_seconds", provider=self.provider):
+                    response = self._http.post(self.url, json=payload)
+                response.raise_for_status()
+                body = response.json()
+                self.api_calls += 1
+                metrics.inc("embedding_requests_total", provider=self.provider)
+                tokens = (body.get("usage") or {}).get("prompt_tokens")
+                permit.release(tokens_used=tokens)
+                if tokens:
+                    metrics.inc("embedding_tokens_total", tokens, model=self.model)
+                scheduler.charge("embedding", self.provider, self.model, tokens or estimated, 0, call_scope)
+                if self.provider == "ollama":
+                    vectors = body["embeddings"]
+                else:
+                    vectors = [item["embedding"] for item in sorted(body["data"], key=lambda d: d["index"])]
+                return np.asarray(vectors, dtype=np.float32)
+            except httpx.HTTPStatusError as e:
+                retry_after = e.response.headers.get("Retry-After")
+                permit.release(throttled=e.response.status_code == 429,
+                               retry_after=retry_after_seconds(retry_after))
+                if e.response.status_code not in RETRYABLE_STATUS:
+                    raise LLMError(f"{e.response.status_code}: {e.response.text[:300]}") from e
+                last_error = e
+            except httpx.TransportError as e:
+                last_error = e
+            finally:
+                permit.release()
+            if attempt < self.max_retries:
+                delay = retry_delay(attempt, retry_after)
+                self.logger.warning(f"⚠ Embeddings reintento {attempt + 1}/{self.max_retries} en {delay:.1f}s: {last_error}")
+                time.sleep(delay)
+        raise LLMError(f"Embeddings fallaron tras {self.max_retries} reintentos: {last_error}")
+
+    def _embed_uncached(self, texts: List[str]) -> np.ndarray:
+        if self.provider == "fallback":
+            return self._fallback_embed(texts)
+        batches = [self._request(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        return np.vstack(batches)
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def embed_chunks(self, chunks: List[str]) -> np.ndarray:
+        """
+        Embeddings float32 (n, dimension) alineados con ``chunks``.
+        Los chunks repetidos y los ya cacheados no se vuelven a enviar.
+        """
+        if not chunks:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        hashes = [chunk_hash(chunk) for chunk in chunks]
+        unique: Dict[str, str] = {}
+        for digest, chunk in zip(hashes, chunks):
+            unique.setdefault(digest, chunk)
+
+        cache = get_embedding_cache()
+        vectors = cache.get_many(self.model, unique) if cache else {}
+        missing = [digest for digest in unique if digest not in vectors]
+        if missing:
+            embedded = self._embed_uncached([normalize_text(unique[d]) for d in missing])
+            new_vectors = dict(zip(missing, embedded))
+            vectors.update(new_vectors)
+            self.embedded_chunks += len(missing)
+            metrics.inc("embedding_chunks_total", len(missing), result="embedded")
+            if cache:
+                cache.put_many(self.model, new_vectors)
+
+        metrics.inc("embedding_chunks_total", len(chunks) - len(unique), result="duplicate")
+        self.logger.debug(
+            f"Embeddings: {len(chunks)} chunks | {len(unique)} únicos | "
+            f"{len(unique) - len(missing)} en cache | {len(missing)} enviados"
+        )
+        return np.stack([vectors[digest] for digest in hashes]).astype(np.float32, copy=False)
+
+    def embed_document(self, text: str) -> Tuple[List[str], List[str], np.ndarray]:
+        """Chunking + embeddings de una página: (chunks, hashes, vectores)"""
+        chunks = chunk_text(text, self.chunk_chars)
+        return chunks, [chunk_hash(c) for c in chunks], self.embed_chunks(chunks)
+
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_chunks(list(texts)).tolist()
+
+    def generate_embedding(self, text: str) -> List[float]:
+        """Embedding de un texto corto (consultas RAG)"""
+        return self.embed_chunks([text])[0].tolist()
+
+    def close(self):
+        if self._http is not None:
+            self._http.close()
@@ -0,0 +1,361 @@
+"""
+Evidence Extractor
+Extracción en streaming de HTML a segmentos de evidencia.
+
+- El HTML se procesa por trozos con ``lxml.etree.HTMLPullParser``: cada
+  bloque (párrafo, ítem, título, celda) se emite al cerrarse y se libera, así
+  que nunca se mantiene el DOM ni el texto completo de la página.
+- Sin boilerplate: nav, header, footer, aside, formularios, scripts y
+  contenedores de cookies/menús/redes sociales se descartan sin emitir texto.
+- Segmentos deduplicados por competidor (el mismo CTA o footer en 300
+  páginas cuenta una vez) y etiquetados con su URL (regla de trazabilidad).
+- Presupuesto de tokens por competidor (EVIDENCE_MAX_TOKENS): se conservan
+  los segmentos más relevantes en un heap acotado, por lo que la memoria por
+  worker no crece con el tamaño del sitio.
+"""
+import codecs
+import hashlib
+import heapq
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+from urllib.parse import urlparse
+
+from lxml import etree
+
+from infrastructure.cache import sniff_charset
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+
+logger = get_logger("EvidenceExtractor")
+
+# Etiquetas cuyo contenido nunca es evidencia
+SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "iframe", "canvas", "form",
+    "nav", "header", "footer", "aside", "button", "select", "head",
+}
+# Bloques que se emiten como segmento al cerrarse
+BLOCK_TAGS = {
+    "p", "li", "dt", "dd", "blockquote", "pre", "figcaption", "td", "th", "caption",
+    "div", "section", "article", "main", "body",
+}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6", "title"}
+
+_BOILERPLATE = re.compile(
+    r"cookie|consent|gdpr|banner|navbar|menu|breadcrumb|footer|sidebar|social|share|"
+    r"newsletter|subscribe|popup|modal|skip-link|language-switch",
+    re.IGNORECASE,
+)
+_WHITESPACE = re.compile(r"\s+")
+
+# Temas con evidencia para los atributos de scoring (ES/EN)
+RELEVANCE_KEYWORDS = re.compile(
+    r"precio|pricing|price|plan(es)?|tarifa|€|\$|/ ?mes|/ ?month|gratis|free|trial|demo|"
+    r"integra\w*|api|conector|connect\w*|partner\w*|marketplace|"
+    r"pms|channel manager|booking engine|revenue|crm|pos|motor de reservas|"
+    r"funcionalidad\w*|feature\w*|módulo\w*|module\w*|automatiza\w*|dashboard\w*|report\w*|"
+    r"ia\b|ai\b|inteligencia artificial|machine learning|predic\w*|forecast\w*|"
+    r"hotel\w*|cadena\w*|resort\w*|propiedad\w*|clientes|customers|países|countries|"
+    r"soporte|support|24/7|onboarding|formación|training|"
+    r"seguridad|security|gdpr|pci|iso ?27001|soc ?2|certifica\w*|"
+    r"opiniones|reviews|rating|valoración|testimoni\w*|premio\w*|award\w*",
+    re.IGNORECASE,
+)
+# Rutas de página con más densidad de evidencia
+_KEY_PATHS = re.compile(r"pricing|precios|plans|planes|features|funcionalidades|producto|product|"
+                        r"integra|partners|security|seguridad|about|nosotros|clientes|customers", re.I)
+
+Source = Union[bytes, str, Iterable[bytes]]
+
+
+@dataclass(order=True)
+class EvidenceSegment:
+    """Bloque de texto visible de una página, con su URL de origen"""
+    score: float
+    position: int
+    url: str = field(compare=False)
+    text: str = field(compare=False)
+    kind: str = field(compare=False, default="text")
+    section: Optional[str] = field(compare=False, default=None)
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+    def to_dict(self) -> Dict[str, str]:
+        data = {"url": self.url, "text": self.text}
+        if self.section:
+            data["section"] = self.section
+        return data
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _is_boilerplate(element) -> bool:
+    if not isinstance(element.tag, str):
+        return True
+    tag = element.tag.lower()
+    if tag in SKIP_TAGS:
+        return True
+    if element.get("hidden") is not None or element.get("aria-hidden") == "true":
+        return True
+    role = element.get("role") or ""
+    if role in ("navigation", "banner", "contentinfo", "dialog", "search"):
+        return True
+    marker = f"{element.get('id') or ''} {element.get('class') or ''}"
+    return bool(marker.strip()) and bool(_BOILERPLATE.search(marker))
+
+
+def _release(element):
+    """Libera un elemento ya procesado y los hermanos previos que ya no aportan texto"""
+    element.clear(keep_tail=True)
+    parent = element.getparent()
+    if parent is None:
+        return
+    previous = element.getprevious()
+    while previous is not None and len(previous) == 0 and not previous.text and not (previous.tail or "").strip():
+        older = previous.getprevious()
+        parent.remove(previous)
+        previous = older
+
+
+def _chunks(source: Source, chunk_size: int, content_type: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Trozos en UTF-8 para el parser. Los bytes se decodifican con el charset de
+    la página (BOM, ``content_type`` o ``<meta charset>`` del primer KB).
+    """
+    if isinstance(source, str):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size].encode("utf-8")
+        return
+    chunks = source
+    if isinstance(source, (bytes, bytearray)):
+        chunks = (source[start:start + chunk_size] for start in range(0, len(source), chunk_size))
+    decoder = None
+    head = b""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if isinstance(chunk, str):
+            yield chunk.encode("utf-8")
+            continue
+        if decoder is None:
+            head += chunk
+            if len(head) < 1024:
+                continue
+            decoder = codecs.getincrementaldecoder(sniff_charset(head, content_type))(errors="replace")
+            chunk, head = head, b""
+        text = decoder.decode(chunk)
+        if text:
+            yield text.encode("utf-8")
+    if decoder is None and head:
+        decoder = codecs.getincrementaldecoder(sniff_charset(head, content_type))(errors="replace")
+        yield decoder.decode(head).encode("utf-8")
+    if decoder is not None:
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail.encode("utf-8")
+
+
+def iter_segments(source: Source, url: str, min_chars: int = 30,
+                  chunk_size: int = 64 * 1024, content_type: Optional[str] = None) -> Iterator[EvidenceSegment]:
+    """
+    Segmentos de texto visible de una página, en orden de documento.
+
+    ``source`` puede ser el HTML completo o un iterable de trozos de bytes
+    (p.ej. ``response.iter_content()``): el parser consume y libera cada
+    trozo, por lo que la memoria depende del bloque más grande, no de la página.
+    ``content_type`` (cabecera HTTP) aporta el charset de los bytes.
+    Los segmentos salen sin score; la relevancia la asigna EvidenceExtractor.
+    """
+    # _chunks entrega siempre UTF-8, sea cual sea la codificación de la página
+    parser = etree.HTMLPullParser(events=("start", "end"), encoding="utf-8",
+                                  remove_comments=True, remove_pis=True)
+    skip_depth = 0
+    skipped = []
+    section = None
+    position = 0
+
+    def drain() -> Iterator[EvidenceSegment]:
+        nonlocal skip_depth, section, position
+        for event, element in parser.read_events():
+            if event == "start":
+                if skip_depth or _is_boilerplate(element):
+                    skip_depth += 1
+                    skipped.append(element)
+                continue
+
+            if skip_depth:
+                if skipped and skipped[-1] is element:
+                    skipped.pop()
+                    skip_depth -= 1
+                element.clear(keep_tail=True)
+                continue
+
+            tag = element.tag.lower() if isinstance(element.tag, str) else ""
+            if tag not in BLOCK_TAGS and tag not in HEADING_TAGS:
+                continue
+            text = _WHITESPACE.sub(" ", "".join(element.itertext())).strip()
+            _release(element)
+            if not text:
+                continue
+            if tag in HEADING_TAGS:
+                section = text[:200]
+                if tag != "title":
+                    position += 1
+                    yield EvidenceSegment(0.0, position, url, text, "heading", section)
+            elif len(text) >= min_chars:
+                position += 1
+                yield EvidenceSegment(0.0, position, url, text, "list" if tag in ("li", "dt", "dd") else "text", section)
+            else:
+                metrics.inc("evidence_segments_total", result="short")
+
+    for chunk in _chunks(source, chunk_size, content_type):
+        parser.feed(chunk)
+        yield from drain()
+    parser.close()
+    yield from drain()
+
+
+def _segment_hash(text: str) -> str:
+    return hashlib.sha1(_WHITESPACE.sub(" ", text.lower()).strip().encode("utf-8")).hexdigest()
+
+
+class EvidenceExtractor:
+    """
+    Acumula evidencia de todas las páginas de un competidor con memoria
+    acotada: segmentos deduplicados y sólo los más relevantes dentro del
+    presupuesto de tokens.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, min_chars: Optional[int] = None,
+                 keywords: Optional[re.Pattern] = None):
+        self.max_tokens = max_tokens or int(os.getenv("EVIDENCE_MAX_TOKENS", "6000"))
+        self.min_chars = min_chars or int(os.getenv("EVIDENCE_MIN_CHARS", "30"))
+        self.keywords = keywords or RELEVANCE_KEYWORDS
+        self._seen = set()
+        self._heap: List[EvidenceSegment] = []
+        self._tokens = 0
+        self._position = 0
+        self.stats = {"pages": 0, "segments": 0, "duplicates": 0, "dropped": 0, "bytes": 0}
+
+    def score(self, segment: EvidenceSegment) -> float:
+        """Densidad de términos con evidencia, con bonus por título y por página clave"""
+        text = segment.text
+        hits = len(self.keywords.findall(text))
+        if segment.section:
+            hits += 0.5 * len(self.keywords.findall(segment.section))
+        score = hits / (1 + estimate_tokens(text) / 50)
+        if segment.kind == "heading":
+            score += 0.5
+        if any(ch.isdigit() for ch in text):
+            score += 0.25
+        if _KEY_PATHS.search(urlparse(segment.url).path):
+            score *= 1.5
+        # Páginas antiguas del crawl no desplazan a las primeras (home, pricing...)
+        return score - segment.position * 1e-6
+
+    def add(self, segment: EvidenceSegment) -> bool:
+        """Añade un segmento; False si es un duplicado (nav, footer, banners repetidos)"""
+        digest = _segment_hash(segment.text)
+        if digest in self._seen:
+            self.stats["duplicates"] += 1
+            metrics.inc("evidence_segments_total", result="duplicate")
+            return False
+        self._seen.add(digest)
+        self._position += 1
+        segment.position = self._position
+        segment.score = self.score(segment)
+        heapq.heappush(self._heap, segment)
+        self._tokens += segment.tokens
+        self.stats["segments"] += 1
+        while self._tokens > self.max_tokens and self._heap:
+            dropped = heapq.heappop(self._heap)
+            self._tokens -= dropped.tokens
+            self.stats["dropped"] += 1
+            metrics.inc("evidence_segments_total", result="dropped")
+        return True
+
+    def feed_page(self, url: str, source: Source, content_type: Optional[str] = None) -> int:
+        """Procesa una página (HTML o iterable de trozos); devuelve los segmentos nuevos"""
+        before = self.stats["segments"]
+        self.stats["pages"] += 1
+        if isinstance(source, (bytes, str)):
+            self.stats["bytes"] += len(source)
+        for segment in iter_segments(source, url, self.min_chars, content_type=content_type):
+            self.add(segment)
+        added = self.stats["segments"] - before
+        metrics.inc("evidence_segments_total", added, result="kept")
+        return added
+
+    def feed_url(self, url: str, session=None, timeout: float = 30) -> int:
+        """Descarga ``url`` en streaming (o desde la cache de páginas) y la procesa"""
+        from infrastructure.cache import get_page_cache
+
+        cache = get_page_cache()
+        if cache:
+            page = cache.fetch(url, session=session, timeout=timeout)
+            if page.status_code not in (200, 304):
+                return 0
+            return self.feed_page(url, page.content, page.content_type)
+
+        if session is None:
+            from infrastructure.browser_pool import _static_session as session
+        with metrics.timer("http_fetch_seconds", kind="stream"), \
+                session.get(url, timeout=timeout, stream=True) as response:
+            if response.status_code != 200 or "html" not in response.headers.get("Content-Type", "html"):
+                return 0
+            counted = self._counting(response.iter_content(64 * 1024))
+            return self.feed_page(response.url or url, counted, response.headers.get("Content-Type"))
+
+    def _counting(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            self.stats["bytes"] += len(chunk)
+            metrics.inc("http_bytes_total", len(chunk), kind="stream")
+            yield chunk
+
+    @property
+    def tokens(self) -> int:
+        return self._tokens
+
+    def segments(self) -> List[EvidenceSegment]:
+        """Segmentos conservados, en orden de aparición"""
+        return sorted(self._heap, key=lambda s: s.position)
+
+    def urls(self) -> List[str]:
+        return list(dict.fromkeys(segment.url for segment in self.segments()))
+
+    def evidence(self) -> List[Dict[str, str]]:
+        """Evidencia para CompetitorData.evidence: [{"url", "text", "section"}]"""
+        return [segment.to_dict() for segment in self.segments()]
+
+    def to_prompt(self) -> str:
+        """Texto agrupado por URL para el prompt de extracción"""
+        lines, current = [], None
+        for segment in self.segments():
+            if segment.url != current:
+                current = segment.url
+                lines.append(f"\n[{current}]")
+            prefix = "## " if segment.kind == "heading" else "- "
+            lines.append(prefix + segment.text)
+        return "\n".join(lines).strip()
+
+    def log_summary(self, domain: str):
+        logger.info(
+            f"🧾 {domain}: {self.stats['pages']} páginas → {len(self._heap)} segmentos "
+            f"(~{self._tokens} tokens; {self.stats['duplicates']} duplicados, "
+            f"{self.stats['dropped']} descartados por presupuesto)"
+        )
+
+
+def extract_evidence(pages: Iterable, max_tokens: Optional[int] = None) -> EvidenceExtractor:
+    """Atajo: ``pages`` son RenderedPage o tuplas (url, html)"""
+    extractor = EvidenceExtractor(max_tokens=max_tokens)
+    for page in pages:
+        url, html = (page.final_url, page.html) if hasattr(page, "html") else page
+        if html:
+            extractor.feed_page(url, html)
+    return extractor
@@ -0,0 +1,289 @@
+"""
+Incremental Analysis Service
+Compara las fuentes recién extraídas con el último snapshot almacenado y
+decide qué atributos re-puntuar y si hace falta regenerar insights.
+"""
+import copy
+import hashlib
+import inspect
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+from urllib.parse import urlparse
+
+from domain.attributes import ATTRIBUTE_CODES, axis_scores
+from infrastructure.logging_config import get_logger
+from infrastructure.serialization import dumps, loads
+
+# Campos de CompetitorData que alimentan a InsightsAgent además de los scores
+INSIGHTS_INPUT_FIELDS = (
+    "name", "servicios", "modelo_negocio", "segmento", "propuesta_valor",
+    "innovaciones", "integraciones", "diferenciadores", "casos_uso", "has_explicit_pricing",
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class AnalysisSnapshot:
+    """Último análisis completo guardado para un dominio"""
+    domain: str
+    fingerprints: Dict[str, str]
+    scores: object
+    insights: object
+    insights_input: str
+    created_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class SourceDiff:
+    """Resultado de comparar las fuentes actuales con el snapshot"""
+    changed: Set[str] = field(default_factory=set)
+    added: Set[str] = field(default_factory=set)
+    removed: Set[str] = field(default_factory=set)
+    fingerprints: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.changed or self.added or self.removed)
+
+
+def source_url(source) -> Optional[str]:
+    """URL de una fuente (str, dict o objeto con atributo url)"""
+    if isinstance(source, str):
+        return source
+    if isinstance(source, dict):
+        return source.get("url")
+    return getattr(source, "url", None)
+
+
+def domain_from_url(url: str) -> str:
+    """Dominio normalizado (sin www.) usado como clave del snapshot"""
+    if "://" not in url:
+        url = f"https://{url}"
+    return urlparse(url).netloc.lower().removeprefix("www.")
+
+
+def current_source_urls(competitor_data) -> List[str]:
+    """URLs de las fuentes de una extracción, sin duplicados"""
+    urls = (source_url(s) for s in (competitor_data.sources or []))
+    return list(dict.fromkeys(u for u in urls if u))
+
+
+def evidence_urls(attribute) -> List[str]:
+    """URLs de evidencia de un atributo puntuado"""
+    for name in ("evidence_urls", "source_urls", "evidence"):
+        urls = getattr(attribute, name, None)
+        if urls is None and isinstance(attribute, dict):
+            urls = attribute.get(name)
+        if urls:
+            return [u for u in (source_url(item) for item in urls) if u]
+    return []
+
+
+def _normalize_url(url: str) -> str:
+    parsed = urlparse(url)
+    path = parsed.path.rstrip("/") or "/"
+    return f"{parsed.netloc.lower().removeprefix('www.')}{path}"
+
+
+def page_fingerprint(content: bytes) -> str:
+    """
+    Hash del texto visible de una página.
+    Ignora scripts, estilos y espacios para no marcar como cambiada una página
+    cuyo único cambio es un nonce o un timestamp en el HTML.
+    """
+    from lxml import html as lxml_html
+
+    try:
+        tree = lxml_html.fromstring(content)
+        for element in tree.xpath("//script|//style|//noscript|//template"):
+            element.drop_tree()
+        text = _WHITESPACE.sub(" ", tree.text_content()).strip()
+    except Exception:
+        text = content.decode("utf-8", errors="replace")
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IncrementalAnalysisService:
+    """
+    Re-análisis incremental por dominio.
+
+    1. ``diff_sources`` revalida las URLs del snapshot con fetch_page
+       (peticiones condicionales vía PageCache, renderizado si la página es
+       una SPA) y detecta páginas cambiadas, nuevas o eliminadas.
+    2. ``attributes_to_rescore`` selecciona sólo los atributos cuya evidencia
+       apunta a páginas cambiadas (o sin evidencia previa si hay páginas nuevas).
+    3. ``needs_insights`` indica si X/Y o los datos de entrada de insights
+       se movieron lo suficiente como para regenerarlos.
+    """
+
+    def __init__(self, snapshot_dir: Optional[str] = None, score_epsilon: Optional[float] = None):
+        self.snapshot_dir = Path(snapshot_dir or os.getenv(
+            "SNAPSHOT_DIR", os.path.join(os.getenv("CACHE_DIR", ".cache"), "snapshots")
+        ))
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        self.score_epsilon = score_epsilon if score_epsilon is not None else float(
+            os.getenv("INCREMENTAL_SCORE_EPSILON", "0.01")
+        )
+        self.logger = get_logger("IncrementalAnalysis")
+
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+
+    def _snapshot_path(self, domain: str) -> Path:
+        return self.snapshot_dir / f"{domain}.json"
+
+    def load_snapshot(self, domain: str) -> Optional[AnalysisSnapshot]:
+        """Snapshot JSON del dominio; los antiguos ``.pkl`` no se cargan (análisis completo)"""
+        path = self._snapshot_path(domain)
+        if not path.exists():
+            return None
+        try:
+            snapshot = loads(path.read_bytes())
+            if not isinstance(snapshot, AnalysisSnapshot):
+                raise ValueError(f"contenido inesperado: {type(snapshot).__name__}")
+            return snapshot
+        except Exception as e:
+            self.logger.warning(f"⚠ Snapshot ilegible para {domain}, se hará análisis completo: {e}")
+            return None
+
+    def save_snapshot(self, competitor_data, scores, insights, fingerprints: Dict[str, str]):
+        """Guarda el análisis actual como referencia para la próxima ejecución"""
+        snapshot = AnalysisSnapshot(
+            domain=competitor_data.domain,
+            fingerprints=dict(fingerprints),
+            scores=scores,
+            insights=insights,
+            insights_input=self.insights_input_hash(competitor_data),
+        )
+        path = self._snapshot_path(competitor_data.domain)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(dumps(snapshot))
+        os.replace(tmp, path)
+
+    # ------------------------------------------------------------------
+    # Fuentes
+    # ------------------------------------------------------------------
+
+    def fingerprint_url(self, url: str) -> Optional[str]:
+        """
+        Fingerprint actual de una URL sobre el mismo HTML que usa el scraper
+        (fetch_page): descarga estática revalidada y, si la página es un shell
+        de SPA, el HTML renderizado. Así un cambio que sólo aparece tras
+        ejecutar JavaScript también marca la página como cambiada.
+        """
+        from infrastructure.browser_pool import fetch_page
+
+        page = fetch_page(url, max_age=0)
+        if page is None:
+            self.logger.warning(f"⚠ No se pudo revalidar {url}")
+            return None
+        if page.status not in (200, 304):
+            return None
+        return page_fingerprint(page.html.encode("utf-8"))
+
+    def fingerprint_sources(self, urls: Iterable[str], known: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Fingerprints de ``urls``, reutilizando los ya calculados en ``known``"""
+        known = known or {}
+        fingerprints = {}
+        for url in urls:
+            fingerprint = known.get(url) or self.fingerprint_url(url)
+            if fingerprint:
+                fingerprints[url] = fingerprint
+        return fingerprints
+
+    def diff_sources(self, snapshot: AnalysisSnapshot) -> SourceDiff:
+        """
+        Revalida las fuentes del snapshot.
+        Sin cambios aquí, el competidor puede saltarse por completo.
+        """
+        diff = SourceDiff()
+        for url, old_fingerprint in snapshot.fingerprints.items():
+            fingerprint = self.fingerprint_url(url)
+            if fingerprint is None:
+                diff.removed.add(url)
+                continue
+            diff.fingerprints[url] = fingerprint
+            if fingerprint != old_fingerprint:
+                diff.changed.add(url)
+        return diff
+
+    def add_current_sources(self, diff: SourceDiff, snapshot: AnalysisSnapshot, current_urls: Iterable[str]):
+        """Completa ``diff`` con las páginas nuevas y eliminadas de la nueva extracción"""
+        current = set(current_urls)
+        diff.removed |= set(snapshot.fingerprints) - current
+        diff.added |= current - set(snapshot.fingerprints)
+        diff.fingerprints.update(self.fingerprint_sources(diff.added))
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def attributes_to_rescore(self, snapshot: AnalysisSnapshot, diff: SourceDiff) -> List[str]:
+        """Atributos cuya evidencia cambió; las páginas nuevas pueden aportar evidencia a atributos NULL"""
+        touched = {_normalize_url(u) for u in diff.changed | diff.removed}
+        attributes = getattr(snapshot.scores, "attributes", {}) or {}
+
+        selected = []
+        for code in ATTRIBUTE_CODES:
+            attribute = attributes.get(code)
+            if attribute is None or getattr(attribute, "raw_score", None) is None:
+                if diff.added or diff.changed:
+                    selected.append(code)
+                continue
+            if any(_normalize_url(u) in touched for u in evidence_urls(attribute)):
+                selected.append(code)
+        return selected
+
+    def rescore(self, scorer, competitor_data, snapshot: AnalysisSnapshot, attributes: List[str]):
+        """
+        Re-puntúa sólo ``attributes`` y conserva el resto del snapshot.
+
+        Requiere que ``scorer.calculate_scores`` acepte el parámetro
+        ``attributes``; si no, se hace un scoring completo.
+        """
+        if not attributes:
+            return snapshot.scores
+        if "attributes" not in inspect.signature(scorer.calculate_scores).parameters:
+            self.logger.info("  Scorer sin soporte de subconjuntos: scoring completo")
+            return scorer.calculate_scores(competitor_data)
+
+        partial = scorer.calculate_scores(competitor_data, attributes=attributes)
+        if not partial:
+            return None
+        scores = copy.deepcopy(snapshot.scores)
+        for code in attributes:
+            if code in partial.attributes:
+                scores.attributes[code] = partial.attributes[code]
+        scores.x_score, scores.y_score = axis_scores(scores.attributes)
+        return scores
+
+    # ------------------------------------------------------------------
+    # Insights
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def insights_input_hash(competitor_data) -> str:
+        """Hash de los campos de CompetitorData que usa InsightsAgent"""
+        values = [repr(getattr(competitor_data, name, None)) for name in INSIGHTS_INPUT_FIELDS]
+        return hashlib.sha256("\x1f".join(values).encode("utf-8")).hexdigest()
+
+    def _moved(self, old: Optional[float], new: Optional[float]) -> bool:
+        if old is None or new is None:
+            return old is not new
+        return abs(old - new) > self.score_epsilon
+
+    def needs_insights(self, snapshot: AnalysisSnapshot, competitor_data, scores) -> bool:
+        """True si X/Y o las entradas de insights cambiaron desde el snapshot"""
+        if snapshot.insights is None:
+            return True
+        if self._moved(getattr(snapshot.scores, "x_score", None), scores.x_score):
+            return True
+        if self._moved(getattr(snapshot.scores, "y_score", None), scores.y_score):
+            return True
+        return snapshot.insights_input != self.insights_input_hash(competitor_data)
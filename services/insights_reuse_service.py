@@ -0,0 +1,439 @@
+"""
+Insights Reuse Service
+Reutiliza los insights de competidores con un posicionamiento casi idéntico
+(channel managers, PMS...) en lugar de generarlos desde cero.
+
+1. La entrada de InsightsAgent (campos de posicionamiento de CompetitorData)
+   se resume en un texto canónico y se embebe (EmbeddingService, con cache).
+2. Si el análisis guardado más parecido supera INSIGHTS_REUSE_THRESHOLD y su
+   X/Y está a menos de INSIGHTS_REUSE_MAX_SCORE_DELTA, un prompt delta corto
+   edita esos insights: cada item se conserva, se reescribe o se sustituye.
+3. Sin vecino suficientemente parecido (o si el delta no valida) se llama a
+   InsightsAgent como siempre.
+
+La procedencia de cada generación (qué items se reutilizaron y cuáles se
+regeneraron) queda en ``last_reuse``. La biblioteca de análisis previos vive
+en ``$CACHE_DIR/insights.db`` y crece con cada competidor analizado.
+"""
+import copy
+import dataclasses
+import json
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from infrastructure.cache import _SQLiteStore
+from infrastructure.llm_client import LLMRequest, extract_json, get_llm_client
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+from infrastructure.serialization import dumps, loads
+from services.incremental_service import INSIGHTS_INPUT_FIELDS, IncrementalAnalysisService
+
+REUSE_MODES = ("full", "delta", "exact")
+
+# Listas de InsightsAgent que el prompt delta edita item a item (prefijo de sus refs)
+INSIGHTS_FIELDS = {"fortalezas_clave": "F", "oportunidades_mercado": "O", "riesgos_debilidades": "R"}
+MAX_ITEMS = 5
+
+# El nombre identifica al competidor pero no describe su posicionamiento
+_POSITIONING_FIELDS = tuple(name for name in INSIGHTS_INPUT_FIELDS if name != "name")
+
+DELTA_SYSTEM_PROMPT = (
+    "Eres un analista de mercado hotel-tech. Adaptas los insights estratégicos de un competidor "
+    "similar a otro competidor: conservas literalmente lo que sigue siendo cierto, reescribes lo "
+    "que cambia y sustituyes lo que no aplica. Responde únicamente con JSON válido."
+)
+
+
+class DeltaItemModel(BaseModel):
+    """Item adaptado: ref del item previo del que parte (o null si es nuevo)"""
+    model_config = ConfigDict(extra="ignore")
+
+    ref: Optional[str] = None
+    text: str = Field(..., min_length=3)
+
+
+class DeltaInsightsModel(BaseModel):
+    """Respuesta del prompt delta"""
+    model_config = ConfigDict(extra="ignore")
+
+    fortalezas_clave: List[DeltaItemModel] = Field(..., min_length=1)
+    oportunidades_mercado: List[DeltaItemModel] = Field(..., min_length=1)
+    riesgos_debilidades: List[DeltaItemModel] = Field(..., min_length=1)
+
+
+@dataclass
+class InsightsReuse:
+    """Procedencia de unos insights: qué items se reutilizaron y cuáles se regeneraron"""
+    mode: str
+    source_domain: Optional[str] = None
+    similarity: Optional[float] = None
+    reused: Dict[str, List[str]] = field(default_factory=dict)
+    regenerated: Dict[str, List[str]] = field(default_factory=dict)
+    tokens: int = 0
+    latency: float = 0.0
+
+    @property
+    def reused_items(self) -> int:
+        return sum(len(items) for items in self.reused.values())
+
+    @property
+    def regenerated_items(self) -> int:
+        return sum(len(items) for items in self.regenerated.values())
+
+    def to_dict(self) -> Dict:
+        return dataclasses.asdict(self)
+
+
+@dataclass
+class _Prior:
+    """Análisis guardado en la biblioteca"""
+    domain: str
+    name: Optional[str]
+    input_hash: str
+    x_score: Optional[float]
+    y_score: Optional[float]
+    insights: object
+
+
+def _insight_items(insights) -> Dict[str, List[str]]:
+    """Listas de INSIGHTS_FIELDS de un objeto de insights (modelo, dataclass o dict)"""
+    if isinstance(insights, dict):
+        get = insights.get
+    else:
+        def get(name, default=None):
+            return getattr(insights, name, default)
+    return {name: [str(item) for item in (get(name, None) or [])] for name in INSIGHTS_FIELDS}
+
+
+def _with_items(prior, values: Dict[str, List[str]]):
+    """Copia de ``prior`` (mismo tipo) con las listas de ``values``"""
+    if hasattr(prior, "model_copy"):
+        return prior.model_copy(update=values, deep=True)
+    if dataclasses.is_dataclass(prior):
+        return dataclasses.replace(copy.deepcopy(prior), **values)
+    if isinstance(prior, dict):
+        return {**copy.deepcopy(prior), **values}
+    rebuilt = copy.deepcopy(prior)
+    for name, items in values.items():
+        setattr(rebuilt, name, items)
+    return rebuilt
+
+
+def _close(old: Optional[float], new: Optional[float], tolerance: float) -> bool:
+    if old is None or new is None:
+        return old is new
+    return abs(old - new) <= tolerance
+
+
+# ----------------------------------------------------------------------
+# Biblioteca de análisis previos
+# ----------------------------------------------------------------------
+
+class InsightsLibrary:
+    """
+    Último análisis de cada dominio con el embedding de su entrada.
+    La búsqueda es exacta (producto escalar sobre vectores normalizados):
+    incluso con miles de competidores es una multiplicación de matriz.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS insights_library (
+            domain TEXT PRIMARY KEY,
+            name TEXT,
+            model TEXT NOT NULL,
+            input_hash TEXT NOT NULL,
+            x_score REAL,
+            y_score REAL,
+            vector BLOB NOT NULL,
+            insights BLOB NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_insights_library_model ON insights_library(model);
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or os.path.join(os.getenv("CACHE_DIR", ".cache"), "insights.db"))
+        self._db = _SQLiteStore(self.path, self._SCHEMA)
+        self._lock = threading.Lock()
+        # modelo → (dominios, vectores, X/Y con NaN para NULL), cargado al primer uso
+        self._matrices: Dict[str, Tuple[List[str], np.ndarray, np.ndarray]] = {}
+
+    def _matrix(self, model: str) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        with self._lock:
+            if model not in self._matrices:
+                rows = self._db.execute(
+                    "SELECT domain, vector, x_score, y_score FROM insights_library WHERE model = ?", (model,)
+                )
+                domains = [row[0] for row in rows]
+                vectors = (np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                           if rows else np.zeros((0, 0), dtype=np.float32))
+                scores = np.array([[row[2], row[3]] for row in rows], dtype=np.float64).reshape(-1, 2)
+                self._matrices[model] = (domains, vectors, scores)
+            return self._matrices[model]
+
+    def nearest(self, model: str, vector: np.ndarray, x_score: Optional[float], y_score: Optional[float],
+                max_score_delta: float) -> Optional[Tuple[str, float]]:
+        """(dominio, similitud coseno) del análisis más parecido con X/Y compatibles"""
+        domains, vectors, scores = self._matrix(model)
+        if not domains or vectors.shape[1] != vector.shape[0]:
+            return None
+        similarity = vectors @ vector
+        target = np.array([np.nan if x_score is None else x_score, np.nan if y_score is None else y_score])
+        both_null = np.isnan(scores) & np.isnan(target)
+        with np.errstate(invalid="ignore"):
+            near = np.abs(scores - target) <= max_score_delta
+        similarity[~(both_null | near).all(axis=1)] = -np.inf
+        best = int(np.argmax(similarity))
+        if not math.isfinite(similarity[best]):
+            return None
+        return domains[best], float(similarity[best])
+
+    def get(self, domain: str) -> Optional[_Prior]:
+        rows = self._db.execute(
+            "SELECT domain, name, input_hash, x_score, y_score, insights FROM insights_library WHERE domain = ?",
+            (domain,),
+        )
+        if not rows:
+            return None
+        domain, name, input_hash, x_score, y_score, blob = rows[0]
+        try:
+            insights = loads(blob)
+        except Exception:
+            return None
+        return _Prior(domain, name, input_hash, x_score, y_score, insights)
+
+    def put(self, domain: str, name: Optional[str], model: str, input_hash: str,
+            x_score: Optional[float], y_score: Optional[float], vector: np.ndarray, insights):
+        self._db.execute(
+            "INSERT OR REPLACE INTO insights_library "
+            "(domain, name, model, input_hash, x_score, y_score, vector, insights, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (domain, name, model, input_hash, x_score, y_score,
+             vector.astype(np.float32).tobytes(), dumps(insights),
+             time.time()),
+        )
+        with self._lock:
+            self._matrices.pop(model, None)
+
+
+_library: Optional[InsightsLibrary] = None
+_library_lock = threading.Lock()
+
+
+def get_insights_library() -> InsightsLibrary:
+    """Biblioteca compartida del proceso"""
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = InsightsLibrary()
+        return _library
+
+
+# ----------------------------------------------------------------------
+# Generación con reutilización
+# ----------------------------------------------------------------------
+
+class InsightsReuseService:
+    """Compatible con InsightsAgent: ``generate_insights(competitor_data, scores)``"""
+
+    def __init__(self, agent=None, library: Optional[InsightsLibrary] = None, embeddings=None):
+        if agent is None:
+            from agents.insights_agent import InsightsAgent
+            agent = InsightsAgent()
+        self.agent = agent
+        self.library = library or get_insights_library()
+        self._embeddings = embeddings
+        self.threshold = float(os.getenv("INSIGHTS_REUSE_THRESHOLD", "0.92"))
+        self.max_score_delta = float(os.getenv("INSIGHTS_REUSE_MAX_SCORE_DELTA", "0.15"))
+        self.score_epsilon = float(os.getenv("INCREMENTAL_SCORE_EPSILON", "0.01"))
+        self.max_tokens = int(os.getenv("INSIGHTS_DELTA_MAX_TOKENS", "800"))
+        self.max_context_chars = int(os.getenv("INSIGHTS_DELTA_CONTEXT_CHARS", "8000"))
+        self.logger = get_logger("InsightsReuse")
+        self.last_reuse: Optional[InsightsReuse] = None
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            from services.embedding_service import EmbeddingService
+            self._embeddings = EmbeddingService()
+        return self._embeddings
+
+    # ------------------------------------------------------------------
+    # Entrada
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _input(competitor_data, fields) -> Dict:
+        values = {}
+        for name in fields:
+            value = getattr(competitor_data, name, None)
+            if value not in (None, "", [], {}):
+                values[name] = value
+        return values
+
+    def input_text(self, competitor_data) -> str:
+        """Texto canónico del posicionamiento (lo que se embebe)"""
+        values = self._input(competitor_data, _POSITIONING_FIELDS)
+        return "\n".join(
+            f"{name}: {json.dumps(value, ensure_ascii=False, default=str, sort_keys=True)}"
+            for name, value in values.items()
+        )
+
+    def _embed(self, competitor_data) -> Optional[np.ndarray]:
+        text = self.input_text(competitor_data)
+        if not text:
+            return None
+        try:
+            vector = np.asarray(self.embeddings.generate_embedding(text), dtype=np.float32)
+        except Exception as e:
+            self.logger.warning(f"⚠ Sin embedding para {competitor_data.domain}, generación completa: {e}")
+            return None
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    # ------------------------------------------------------------------
+    # API compatible con InsightsAgent
+    # ------------------------------------------------------------------
+
+    def generate_insights(self, competitor_data, scores):
+        start = time.monotonic()
+        domain = competitor_data.domain
+        input_hash = IncrementalAnalysisService.insights_input_hash(competitor_data)
+        x_score, y_score = getattr(scores, "x_score", None), getattr(scores, "y_score", None)
+
+        # 1. Mismo dominio, misma entrada y mismo X/Y: nada que generar
+        own = self.library.get(domain)
+        if (own and own.input_hash == input_hash and _close(own.x_score, x_score, self.score_epsilon)
+                and _close(own.y_score, y_score, self.score_epsilon)):
+            reuse = InsightsReuse("exact", domain, 1.0, reused=_insight_items(own.insights))
+            return self._finish(competitor_data, own.insights, reuse, start)
+
+        # 2. Vecino con posicionamiento casi idéntico: prompt delta
+        insights = reuse = None
+        vector = self._embed(competitor_data)
+        if vector is not None:
+            match = self.library.nearest(self.embeddings.model, vector, x_score, y_score, self.max_score_delta)
+            if match and match[1] >= self.threshold:
+                prior = self.library.get(match[0])
+                if prior is not None:
+                    insights, reuse = self._delta(competitor_data, scores, prior, match[1])
+
+        # 3. Generación completa
+        if insights is None:
+            insights = self.agent.generate_insights(competitor_data, scores)
+            reuse = InsightsReuse("full", regenerated=_insight_items(insights) if insights else {})
+
+        if insights and vector is not None:
+            self.library.put(domain, getattr(competitor_data, "name", None), self.embeddings.model,
+                             input_hash, x_score, y_score, vector, insights)
+        return self._finish(competitor_data, insights, reuse, start)
+
+    def _finish(self, competitor_data, insights, reuse: InsightsReuse, start: float):
+        reuse.latency = round(time.monotonic() - start, 3)
+        self.last_reuse = reuse
+        metrics.inc("insights_generated_total", mode=reuse.mode)
+        metrics.inc("insights_items_total", reuse.reused_items, status="reused")
+        metrics.inc("insights_items_total", reuse.regenerated_items, status="regenerated")
+        if reuse.mode != "full":
+            self.logger.info(
+                f"♻ Insights {reuse.mode} | {competitor_data.domain} ← {reuse.source_domain} "
+                f"(similitud {reuse.similarity:.2f}) | reutilizados {reuse.reused_items}, "
+                f"regenerados {reuse.regenerated_items} | {reuse.latency:.1f}s"
+            )
+        return insights
+
+    # ------------------------------------------------------------------
+    # Prompt delta
+    # ------------------------------------------------------------------
+
+    def build_delta_prompt(self, competitor_data, scores, prior: _Prior, similarity: float,
+                           refs: Dict[str, Tuple[str, str]]) -> str:
+        lines = []
+        current = None
+        for ref, (name, text) in refs.items():
+            if name != current:
+                lines.append(f"{name}:")
+                current = name
+            lines.append(f"  [{ref}] {text}")
+        competitor = self._input(competitor_data, INSIGHTS_INPUT_FIELDS)
+        competitor["x_score"] = getattr(scores, "x_score", None)
+        competitor["y_score"] = getattr(scores, "y_score", None)
+        evidence = json.dumps(competitor, ensure_ascii=False, default=str, indent=1)[:self.max_context_chars]
+        return (
+            f"INSIGHTS DE UN COMPETIDOR SIMILAR (similitud {similarity:.2f}):\n"
+            + "\n".join(lines)
+            + f"\n\nCOMPETIDOR A ANALIZAR (JSON):\n{evidence}\n\n"
+            "Adapta los insights al competidor a analizar. Cada item lleva la ref del item del que parte "
+            "(texto idéntico si sigue siendo cierto, reescrito si cambia) o ref null si es nuevo. "
+            f"Descarta lo que no aplique. Entre 3 y {MAX_ITEMS} items por lista. "
+            "No menciones al competidor similar.\n"
+            'Formato: {"fortalezas_clave": [{"ref": "F1", "text": "..."}], '
+            '"oportunidades_mercado": [{"ref": "O2", "text": "..."}], '
+            '"riesgos_debilidades": [{"ref": null, "text": "..."}]}'
+        )
+
+    def _delta(self, competitor_data, scores, prior: _Prior, similarity: float):
+        """Edita los insights de ``prior``; (None, None) si la respuesta no valida"""
+        refs: Dict[str, Tuple[str, str]] = {}
+        for name, items in _insight_items(prior.insights).items():
+            for i, text in enumerate(items, 1):
+                refs[f"{INSIGHTS_FIELDS[name]}{i}"] = (name, text)
+        prompt = self.build_delta_prompt(competitor_data, scores, prior, similarity, refs)
+        client = get_llm_client()
+
+        tokens = 0
+        last_error = None
+        for attempt in range(2):
+            request_prompt = prompt
+            if last_error:
+                request_prompt += f"\n\nTu respuesta anterior no era válida ({last_error}). Corrígela."
+            response = client.complete(LLMRequest(
+                prompt=request_prompt,
+                system=DELTA_SYSTEM_PROMPT,
+                phase="insights",
+                json_mode=True,
+                json_schema=DeltaInsightsModel.model_json_schema(),
+                max_tokens=self.max_tokens,
+            ))
+            tokens += response.prompt_tokens + response.completion_tokens
+            try:
+                parsed = DeltaInsightsModel.model_validate_json(extract_json(response.text))
+                break
+            except (ValidationError, ValueError) as e:
+                last_error = str(e).splitlines()[0]
+                self.logger.warning(f"⚠ Delta de insights inválido (intento {attempt + 1}): {last_error}")
+        else:
+            return None, None
+
+        name = getattr(competitor_data, "name", None)
+        rename = (lambda text: text.replace(prior.name, name)) if prior.name and name else (lambda text: text)
+        values: Dict[str, List[str]] = {}
+        reuse = InsightsReuse("delta", prior.domain, round(similarity, 4), tokens=tokens)
+        for field_name in INSIGHTS_FIELDS:
+            texts = []
+            for item in getattr(parsed, field_name)[:MAX_ITEMS]:
+                text = rename(item.text.strip())
+                # Un item que sólo cambia el nombre del competidor cuenta como reutilizado
+                original = refs.get(item.ref or "")
+                kept = original is not None and original[0] == field_name and rename(original[1]) == text
+                (reuse.reused if kept else reuse.regenerated).setdefault(field_name, []).append(text)
+                texts.append(text)
+            values[field_name] = texts
+        return _with_items(prior.insights, values), reuse
+
+
+def build_insights_generator():
+    """InsightsAgent, envuelto en InsightsReuseService si INSIGHTS_REUSE=true"""
+    from agents.insights_agent import InsightsAgent
+
+    if os.getenv("INSIGHTS_REUSE", "false").lower() == "true":
+        return InsightsReuseService(InsightsAgent())
+    return InsightsAgent()
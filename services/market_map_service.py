@@ -0,0 +1,305 @@
+"""
+Market Map Service
+Plano cartesiano estratégico y análisis comparativo sobre todo el mercado.
+
+Carga la matriz competidores × atributos en una sola consulta y calcula con
+operaciones vectorizadas (NumPy masked arrays, NULL = sin evidencia):
+X/Y, cuadrante, percentiles, competidores más cercanos y deltas respecto
+al historial de scores.
+"""
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from domain.attributes import ATTRIBUTE_AXIS, ATTRIBUTE_CODES
+from infrastructure.logging_config import get_logger
+
+logger = get_logger("MarketMap")
+
+# Cuadrantes del plano (ver README: Plano Cartesiano Estratégico)
+MARKET_LEADERS = "Market Leaders"                # X alto, Y alto
+MAGIC_QUADRANT = "Magic Quadrant Candidates"     # X alto, Y bajo
+NICHE_PLAYERS = "Niche Players"                  # X bajo, Y bajo
+ENTERPRISE_PLAYERS = "Enterprise Players"        # X bajo, Y alto
+UNPOSITIONED = "Sin posición"                    # X o Y NULL
+
+_X_MASK = np.array([ATTRIBUTE_AXIS[c] == "X" for c in ATTRIBUTE_CODES])
+_Y_MASK = ~_X_MASK
+
+MATRIX_QUERY = """
+    SELECT c.domain, a.code, s.raw_score
+    FROM competitors c
+    LEFT JOIN competitor_attribute_scores s ON s.competitor_id = c.id
+    LEFT JOIN dim_attribute a ON a.id = s.attribute_id
+"""
+
+# Scores de cada competidor en su análisis anterior (o el último antes de
+# %(since)s) según el historial de la migración 006
+BASELINE_MATRIX_QUERY = """
+    SELECT c.domain, a.code, h.raw_score
+    FROM competitor_score_latest l
+    JOIN competitors c ON c.id = l.competitor_id
+    JOIN LATERAL (
+        SELECT r.run_at
+        FROM competitor_score_runs r
+        WHERE r.competitor_id = l.competitor_id
+          AND r.run_at < COALESCE(%(since)s::timestamptz, l.run_at)
+        ORDER BY r.run_at DESC
+        LIMIT 1
+    ) b ON TRUE
+    LEFT JOIN competitor_score_history h ON h.competitor_id = l.competitor_id AND h.run_at = b.run_at
+    LEFT JOIN dim_attribute a ON a.id = h.attribute_id
+"""
+
+
+def load_attribute_matrix(conn=None, query: str = MATRIX_QUERY, params: Optional[Dict] = None) -> pd.DataFrame:
+    """
+    Matriz dominio × atributo (NaN = sin evidencia) en una sola consulta.
+    Sin ``conn`` usa el pool compartido.
+    """
+    if conn is None:
+        from infrastructure.db_pool import db_transaction
+
+        with db_transaction() as pooled:
+            return load_attribute_matrix(pooled, query, params)
+
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    frame = pd.DataFrame(rows, columns=["domain", "code", "raw_score"])
+    frame["raw_score"] = pd.to_numeric(frame["raw_score"], errors="coerce")
+    matrix = frame.pivot_table(index="domain", columns="code", values="raw_score", aggfunc="last", dropna=False)
+    return matrix.reindex(columns=ATTRIBUTE_CODES).sort_index()
+
+
+@dataclass
+class MarketMap:
+    """Posición de todos los competidores en el plano estratégico"""
+    domains: np.ndarray          # (n,)
+    scores: np.ma.MaskedArray    # (n, 10) máscara = NULL
+    x: np.ma.MaskedArray         # (n,)
+    y: np.ma.MaskedArray         # (n,)
+    x_split: float
+    y_split: float
+
+    # ------------------------------------------------------------------
+    # Construcción
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_matrix(cls, matrix: pd.DataFrame, split: Optional[float] = None) -> "MarketMap":
+        """
+        ``split`` fija el umbral alto/bajo de ambos ejes; por defecto la
+        mediana del mercado (MARKET_MAP_SPLIT=median) o un valor numérico.
+        """
+        matrix = matrix.reindex(columns=ATTRIBUTE_CODES)
+        scores = np.ma.masked_invalid(matrix.to_numpy(dtype=np.float64))
+        x = scores[:, _X_MASK].mean(axis=1)
+        y = scores[:, _Y_MASK].mean(axis=1)
+
+        if split is None:
+            configured = os.getenv("MARKET_MAP_SPLIT", "median")
+            split = None if configured == "median" else float(configured)
+        x_split = split if split is not None else float(np.ma.median(x)) if x.count() else 0.5
+        y_split = split if split is not None else float(np.ma.median(y)) if y.count() else 0.5
+
+        return cls(
+            domains=matrix.index.to_numpy(),
+            scores=scores,
+            x=np.ma.masked_invalid(np.ma.filled(x, np.nan)),
+            y=np.ma.masked_invalid(np.ma.filled(y, np.nan)),
+            x_split=x_split,
+            y_split=y_split,
+        )
+
+    @classmethod
+    def load(cls, conn=None, split: Optional[float] = None) -> "MarketMap":
+        start = time.perf_counter()
+        matrix = load_attribute_matrix(conn)
+        market_map = cls.from_matrix(matrix, split=split)
+        logger.info(f"📈 Mapa de mercado: {len(market_map.domains)} competidores en {time.perf_counter() - start:.3f}s")
+        return market_map
+
+    def baseline(self, since: Optional[datetime] = None, conn=None) -> "MarketMap":
+        """
+        Mapa con los scores del análisis anterior de cada competidor (o del
+        último antes de ``since``) leído de ``competitor_score_history``.
+        Usa los umbrales del mapa actual para que un cambio de cuadrante
+        refleje el movimiento del competidor y no el de la mediana.
+        """
+        matrix = load_attribute_matrix(conn, BASELINE_MATRIX_QUERY, {"since": since})
+        previous = MarketMap.from_matrix(matrix)
+        previous.x_split, previous.y_split = self.x_split, self.y_split
+        return previous
+
+    # ------------------------------------------------------------------
+    # Analítica
+    # ------------------------------------------------------------------
+
+    def quadrants(self) -> np.ndarray:
+        """Cuadrante de cada competidor (UNPOSITIONED si X o Y es NULL)"""
+        x = np.ma.filled(self.x, np.nan)
+        y = np.ma.filled(self.y, np.nan)
+        high_x = x >= self.x_split
+        high_y = y >= self.y_split
+        result = np.select(
+            [high_x & high_y, high_x & ~high_y, ~high_x & high_y],
+            [MARKET_LEADERS, MAGIC_QUADRANT, ENTERPRISE_PLAYERS],
+            default=NICHE_PLAYERS,
+        ).astype(object)
+        result[np.isnan(x) | np.isnan(y)] = UNPOSITIONED
+        return result
+
+    @staticmethod
+    def _percentile(values: np.ma.MaskedArray) -> np.ma.MaskedArray:
+        """Percentil (0-100) entre los valores no NULL; empates comparten rango medio"""
+        filled = np.ma.filled(values, np.nan)
+        ranks = pd.Series(filled).rank(pct=True, method="average").to_numpy() * 100
+        return np.ma.masked_invalid(ranks)
+
+    def percentiles(self) -> Dict[str, np.ma.MaskedArray]:
+        return {"x": self._percentile(self.x), "y": self._percentile(self.y)}
+
+    def attribute_distances(self, rows: Optional[np.ndarray] = None, min_shared: int = 3) -> np.ndarray:
+        """
+        Distancia RMS entre competidores usando sólo los atributos que ambos
+        tienen puntuados (NaN si comparten menos de ``min_shared``).
+
+        Con máscara m (1 = observado) y scores a (0 donde NULL):
+            Σ m_i m_j (a_i - a_j)² = (m a²)·mᵀ + m·(m a²)ᵀ - 2 (m a)·(m a)ᵀ
+        que son tres productos de matrices en lugar de un bucle por pares.
+        """
+        observed = (~np.ma.getmaskarray(self.scores)).astype(np.float64)
+        values = np.ma.filled(self.scores, 0.0) * observed
+        squares = values ** 2
+        if rows is None:
+            rows = np.arange(len(self.domains))
+
+        sq_dist = (
+            squares[rows] @ observed.T
+            + observed[rows] @ squares.T
+            - 2 * values[rows] @ values.T
+        )
+        shared = observed[rows] @ observed.T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            distances = np.sqrt(np.clip(sq_dist, 0, None) / shared)
+        distances[shared < max(min_shared, 1)] = np.nan
+        return distances
+
+    def nearest(self, k: int = 5, chunk_size: int = 256, min_shared: int = 3) -> np.ndarray:
+        """
+        Índices de los ``k`` competidores más cercanos a cada uno (-1 si no hay).
+
+        Mismo criterio que ``attribute_distances`` pero sin materializarlas:
+        por bloques de ``chunk_size`` filas se calcula en float32 la distancia
+        cuadrática media (la raíz no cambia el orden) con un único producto
+        [m a², m, -2 m a] · [m, m a², m a]ᵀ y se seleccionan los k menores con
+        argpartition, así la memoria queda acotada a chunk × n.
+        """
+        n = len(self.domains)
+        k = min(k, max(n - 1, 0))
+        result = np.full((n, k), -1, dtype=np.int64)
+        if k == 0:
+            return result
+
+        observed = (~np.ma.getmaskarray(self.scores)).astype(np.float32)
+        values = np.ma.filled(self.scores, 0.0).astype(np.float32) * observed
+        left = np.hstack([values ** 2, observed, -2 * values])
+        right = np.ascontiguousarray(np.hstack([observed, values ** 2, values]).T)
+        observed_t = np.ascontiguousarray(observed.T)
+        min_shared = max(min_shared, 1)
+
+        for start in range(0, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            sq_dist = left[start:stop] @ right
+            shared = observed[start:stop] @ observed_t
+            np.maximum(sq_dist, 0, out=sq_dist)
+            np.divide(sq_dist, shared, out=sq_dist, where=shared >= min_shared)
+            sq_dist[shared < min_shared] = np.inf
+            sq_dist[np.arange(stop - start), np.arange(start, stop)] = np.inf     # excluirse a sí mismo
+
+            candidates = np.argpartition(sq_dist, k - 1, axis=1)[:, :k]
+            candidate_dist = np.take_along_axis(sq_dist, candidates, axis=1)
+            order = candidate_dist.argsort(axis=1)
+            nearest = np.take_along_axis(candidates, order, axis=1)
+            valid = np.isfinite(np.take_along_axis(candidate_dist, order, axis=1))
+            result[start:stop] = np.where(valid, nearest, -1)
+        return result
+
+    def deltas(self, previous: "MarketMap") -> pd.DataFrame:
+        """
+        Variación de X, Y y de cada atributo respecto a un run anterior,
+        alineando por dominio. NULL en cualquiera de los dos runs → NaN.
+        """
+        current = self.to_frame(include_attributes=True).set_index("domain")
+        before = previous.to_frame(include_attributes=True).set_index("domain")
+        before = before.reindex(current.index)
+        columns = ["x", "y"] + ATTRIBUTE_CODES
+        delta = current[columns] - before[columns]
+        delta["quadrant_before"] = before["quadrant"]
+        delta["quadrant"] = current["quadrant"]
+        delta["quadrant_changed"] = delta["quadrant_before"].notna() & (delta["quadrant_before"] != delta["quadrant"])
+        return delta.reset_index()
+
+    # ------------------------------------------------------------------
+    # Exportación
+    # ------------------------------------------------------------------
+
+    def to_frame(self, include_attributes: bool = False, k_nearest: int = 0) -> pd.DataFrame:
+        percentiles = self.percentiles()
+        frame = pd.DataFrame({
+            "domain": self.domains,
+            "x": np.ma.filled(self.x, np.nan),
+            "y": np.ma.filled(self.y, np.nan),
+            "x_percentile": np.ma.filled(percentiles["x"], np.nan),
+            "y_percentile": np.ma.filled(percentiles["y"], np.nan),
+            "quadrant": self.quadrants(),
+            "attributes_scored": self.scores.count(axis=1),
+        })
+        if include_attributes:
+            attributes = pd.DataFrame(np.ma.filled(self.scores, np.nan), columns=ATTRIBUTE_CODES)
+            frame = pd.concat([frame, attributes], axis=1)
+        if k_nearest:
+            nearest = self.nearest(k_nearest)
+            frame["nearest"] = [
+                [self.domains[j] for j in row if j >= 0] for row in nearest
+            ]
+        return frame
+
+
+def market_map_report(k_nearest: int = 3, since: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Calcula el mapa de mercado actual, registra el resumen por cuadrante y
+    los movimientos respecto al análisis anterior de cada competidor (o al
+    último anterior a ``since``) según el historial de scores.
+    """
+    market_map = MarketMap.load()
+    frame = market_map.to_frame(k_nearest=k_nearest)
+
+    logger.info(f"  Umbrales: X={market_map.x_split:.2f} | Y={market_map.y_split:.2f}")
+    for quadrant, count in frame["quadrant"].value_counts().items():
+        logger.info(f"  {quadrant:<28} {count}")
+
+    from services.score_history_service import history_enabled
+
+    if not history_enabled():
+        return frame
+    try:
+        previous = market_map.baseline(since=since)
+    except Exception as e:
+        logger.warning(f"⚠ Historial de scores no disponible, sin movimientos: {e}")
+        return frame
+
+    deltas = market_map.deltas(previous)
+    moved = deltas[deltas["quadrant_changed"]]
+    for row in moved.itertuples():
+        logger.info(f"  ↪ {row.domain}: {row.quadrant_before} → {row.quadrant}")
+    top = deltas.assign(move=np.hypot(deltas["x"], deltas["y"])).nlargest(5, "move")
+    for row in top.dropna(subset=["move"]).itertuples():
+        logger.info(f"  Δ {row.domain}: X {row.x:+.2f} | Y {row.y:+.2f}")
+    return frame
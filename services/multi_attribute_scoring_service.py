@@ -0,0 +1,350 @@
+"""
+Multi-Attribute Scoring Service
+Puntúa los 10 atributos en una sola llamada LLM: la evidencia del competidor
+se envía una vez y la respuesta se valida contra un esquema estricto.
+
+Modos (SCORING_MODE / --scoring-mode):
+- per_attribute: ScoringAgent (un prompt por atributo), comportamiento original.
+- single_call:   MultiAttributeScoringService.
+- compare:       ejecuta ambos, registra diferencias y ahorro, persiste per_attribute.
+"""
+import inspect
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+from domain.attributes import ATTRIBUTES, ATTRIBUTE_CODES, SCORING_MODES, axis_scores
+from infrastructure.llm_client import LLMRequest, extract_json, get_llm_client
+from infrastructure.logging_config import get_logger
+from infrastructure.scheduler import Scope
+from services.incremental_service import current_source_urls
+from services.validation_service import url_key
+
+# Campos de CompetitorData enviados como evidencia compartida
+EVIDENCE_FIELDS = (
+    "name", "domain", "servicios", "modelo_negocio", "segmento", "capacidad_analitica",
+    "nivel_operativo", "propuesta_valor", "innovaciones", "integraciones", "pricing",
+    "diferenciadores", "casos_uso", "has_explicit_pricing",
+    # Segmentos del EvidenceExtractor: [{"url", "text", "section"}]
+    "evidence",
+)
+
+SYSTEM_PROMPT = (
+    "Eres un analista de mercado hotel-tech. Puntúas competidores SOLO con evidencia explícita. "
+    "Si no hay evidencia para un atributo, su score es null y evidence_urls queda vacío. "
+    "Prohibido inferir sin prueba. Responde únicamente con JSON válido."
+)
+
+
+class AttributeScoreModel(BaseModel):
+    """Score de un atributo tal como lo devuelve el LLM"""
+    model_config = ConfigDict(extra="ignore")
+
+    code: str
+    score: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    evidence_urls: List[str] = Field(default_factory=list)
+    justification: Optional[str] = None
+
+    @field_validator("code")
+    @classmethod
+    def _known_code(cls, value: str) -> str:
+        if value not in ATTRIBUTE_CODES:
+            raise ValueError(f"atributo desconocido: {value}")
+        return value
+
+
+class MultiAttributeResponseModel(BaseModel):
+    """Respuesta completa del scoring en una sola llamada"""
+    model_config = ConfigDict(extra="ignore")
+
+    attributes: List[AttributeScoreModel]
+
+
+@dataclass
+class AttributeScore:
+    """Score final de un atributo (NULL si no hay evidencia válida)"""
+    code: str
+    raw_score: Optional[float]
+    evidence_urls: List[str] = field(default_factory=list)
+    justification: Optional[str] = None
+
+
+@dataclass
+class MultiAttributeScores:
+    """Resultado compatible con ScoringAgent: attributes, x_score, y_score"""
+    attributes: Dict[str, AttributeScore]
+    x_score: Optional[float]
+    y_score: Optional[float]
+    usage: Dict[str, float] = field(default_factory=dict)
+
+
+class MultiAttributeScoringService:
+    """Scoring de todos (o un subconjunto de) los atributos en una llamada"""
+
+    def __init__(self):
+        self.logger = get_logger("MultiAttributeScoring")
+        self.max_context_chars = int(os.getenv("SCORING_CONTEXT_MAX_CHARS", "24000"))
+        self.max_tokens = int(os.getenv("SCORING_MAX_TOKENS", "2000"))
+
+    # ------------------------------------------------------------------
+    # Prompt
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _dumps(value) -> str:
+        return json.dumps(value, ensure_ascii=False, default=str, indent=1)
+
+    def _evidence(self, competitor_data) -> str:
+        """
+        JSON de evidencia: 'sources' y los campos extraídos van primero y los
+        segmentos del extractor se añaden enteros mientras quepan en
+        ``max_context_chars``. El JSON serializado nunca se corta.
+        """
+        evidence = {"sources": current_source_urls(competitor_data)}
+        for name in EVIDENCE_FIELDS:
+            value = getattr(competitor_data, name, None)
+            if name != "evidence" and value not in (None, "", [], {}):
+                evidence[name] = value
+        text = self._dumps(evidence)
+
+        budget = self.max_context_chars - len(text) - len(',\n "evidence": [\n ]')
+        segments = []
+        for segment in getattr(competitor_data, "evidence", None) or []:
+            serialized = self._dumps(segment)
+            # Anidado dos niveles: +2 espacios por línea y el separador ",\n  "
+            size = len(serialized) + 2 * serialized.count("\n") + 4
+            if size <= budget:
+                segments.append(segment)
+                budget -= size
+        while segments:
+            candidate = self._dumps({**evidence, "evidence": segments})
+            if len(candidate) <= self.max_context_chars:
+                return candidate
+            segments.pop()
+        return text
+
+    @staticmethod
+    def _attribute_definitions(codes: List[str]) -> str:
+        lines = []
+        for code, name, description, dimension in ATTRIBUTES:
+            if code in codes:
+                lines.append(f"- {code} ({name}, {dimension}): {description}")
+        return "\n".join(lines)
+
+    def build_prompt(self, competitor_data, codes: List[str]) -> str:
+        return (
+            "EVIDENCIA DEL COMPETIDOR (JSON):\n"
+            f"{self._evidence(competitor_data)}\n\n"
+            "ATRIBUTOS A PUNTUAR (score entre 0.0 y 1.0):\n"
+            f"{self._attribute_definitions(codes)}\n\n"
+            "Devuelve exactamente este formato, con un elemento por atributo:\n"
+            '{"attributes": [{"code": "<code>", "score": <0.0-1.0 o null>, '
+            '"evidence_urls": ["<url de sources>"], "justification": "<frase corta>"}]}\n'
+            "Reglas: evidence_urls sólo puede contener URLs de 'sources'. "
+            "Sin evidencia explícita → score null y evidence_urls []."
+        )
+
+    # ------------------------------------------------------------------
+    # Validación
+    # ------------------------------------------------------------------
+
+    def _parse(self, text: str, codes: List[str], allowed_urls: set) -> Dict[str, AttributeScore]:
+        """Valida la respuesta y aplica la regla NULL-sin-evidencia"""
+        response = MultiAttributeResponseModel.model_validate_json(extract_json(text))
+        by_code = {}
+        for item in response.attributes:
+            by_code.setdefault(item.code, item)
+        missing = [code for code in codes if code not in by_code]
+        if missing:
+            raise ValueError(f"faltan atributos en la respuesta: {', '.join(missing)}")
+
+        # El LLM suele citar la fuente con otra forma (www., barra final, http/https):
+        # se compara por url_key y se guarda la URL tal como figura en las fuentes
+        allowed = {url_key(u): u for u in allowed_urls}
+        attributes = {}
+        for code in codes:
+            item = by_code[code]
+            urls = list(dict.fromkeys(allowed[url_key(u)] for u in item.evidence_urls if url_key(u) in allowed))
+            score = item.score if urls else None
+            attributes[code] = AttributeScore(code, score, urls if score is not None else [], item.justification)
+        return attributes
+
+    def _request(self, prompt: str, custom_id: Optional[str] = None) -> LLMRequest:
+        return LLMRequest(
+            prompt=prompt,
+            system=SYSTEM_PROMPT,
+            phase="scoring",
+            json_mode=True,
+            json_schema=MultiAttributeResponseModel.model_json_schema(),
+            max_tokens=self.max_tokens,
+            custom_id=custom_id,
+        )
+
+    # ------------------------------------------------------------------
+    # API compatible con ScoringAgent
+    # ------------------------------------------------------------------
+
+    def calculate_scores(self, competitor_data, attributes: Optional[List[str]] = None) -> Optional[MultiAttributeScores]:
+        """
+        Puntúa ``attributes`` (default: todos) en una sola llamada.
+        Con un subconjunto, X/Y se calculan sólo con esos atributos; el modo
+        incremental los recombina con el snapshot.
+        """
+        codes = [c for c in ATTRIBUTE_CODES if attributes is None or c in attributes]
+        if not codes:
+            return None
+        allowed_urls = set(current_source_urls(competitor_data))
+        prompt = self.build_prompt(competitor_data, codes)
+        client = get_llm_client()
+
+        start = time.monotonic()
+        usage = {"prompt_tokens": 0, "completion_tokens": 0, "calls": 0}
+        last_error = None
+        for attempt in range(2):
+            request_prompt = prompt
+            if last_error:
+                # Segundo intento con el error de validación como feedback
+                request_prompt += f"\n\nTu respuesta anterior no era válida ({last_error}). Corrígela."
+            response = client.complete(self._request(request_prompt))
+            usage["prompt_tokens"] += response.prompt_tokens
+            usage["completion_tokens"] += response.completion_tokens
+            usage["calls"] += 0 if response.cached else 1
+            try:
+                scored = self._parse(response.text, codes, allowed_urls)
+                break
+            except (ValidationError, ValueError) as e:
+                last_error = str(e).splitlines()[0]
+                self.logger.warning(f"⚠ Respuesta de scoring inválida (intento {attempt + 1}): {last_error}")
+        else:
+            return None
+
+        usage["latency"] = time.monotonic() - start
+        x_score, y_score = axis_scores(scored)
+        scores = MultiAttributeScores(attributes=scored, x_score=x_score, y_score=y_score, usage=usage)
+        self._report_savings(competitor_data, prompt, codes, usage)
+        return scores
+
+    def calculate_scores_many(self, competitors: List, scopes: Optional[List[Scope]] = None) -> List[Optional[MultiAttributeScores]]:
+        """
+        Puntúa todos los atributos de ``competitors`` con un único batch job
+        (OpenAI Batch API; con Ollama, en paralelo). ``scopes`` atribuye cada
+        petición al presupuesto de su dominio. Devuelve None para los que no
+        tuvieron respuesta o no la tuvieron válida: el llamador puede
+        puntuarlos con ``calculate_scores``, que reintenta con feedback.
+        """
+        prompts = [self.build_prompt(competitor, list(ATTRIBUTE_CODES)) for competitor in competitors]
+        requests = [self._request(prompt, custom_id=str(i)) for i, prompt in enumerate(prompts)]
+        poll_interval = float(os.getenv("LLM_BATCH_POLL_SECONDS", "30"))
+
+        start = time.monotonic()
+        responses = get_llm_client().run_batch(requests, poll_interval=poll_interval, scopes=scopes)
+        latency = time.monotonic() - start
+
+        results: List[Optional[MultiAttributeScores]] = []
+        for competitor, prompt, response in zip(competitors, prompts, responses):
+            if response is None:
+                results.append(None)
+                continue
+            try:
+                scored = self._parse(response.text, list(ATTRIBUTE_CODES), set(current_source_urls(competitor)))
+            except (ValidationError, ValueError) as e:
+                self.logger.warning(f"⚠ Respuesta de scoring inválida en el batch | {competitor.domain}: "
+                                    f"{str(e).splitlines()[0]}")
+                results.append(None)
+                continue
+            usage = {"prompt_tokens": response.prompt_tokens, "completion_tokens": response.completion_tokens,
+                     "calls": 0 if response.cached else 1, "latency": latency}
+            x_score, y_score = axis_scores(scored)
+            results.append(MultiAttributeScores(attributes=scored, x_score=x_score, y_score=y_score, usage=usage))
+            self._report_savings(competitor, prompt, list(ATTRIBUTE_CODES), usage)
+        return results
+
+    def _report_savings(self, competitor_data, prompt: str, codes: List[str], usage: Dict[str, float]):
+        """
+        Estima lo que habría costado el modo por atributo: el mismo contexto
+        compartido se reenvía una vez por atributo.
+        """
+        if not usage["calls"]:
+            self.logger.info(f"📊 Scoring single-call servido desde cache | {competitor_data.domain}")
+            return
+        prompt_tokens = usage["prompt_tokens"] or len(SYSTEM_PROMPT + prompt) // 4
+        per_attribute_prompt = prompt_tokens * len(codes)
+        completion_tokens = usage["completion_tokens"]
+        saved = per_attribute_prompt - prompt_tokens
+        usage["estimated_per_attribute_prompt_tokens"] = per_attribute_prompt
+        usage["estimated_prompt_tokens_saved"] = saved
+        self.logger.info(
+            f"📊 Scoring single-call | {competitor_data.domain} | {len(codes)} atributos | "
+            f"tokens: {prompt_tokens}+{completion_tokens} | "
+            f"ahorro estimado vs por atributo: ~{saved} tokens de prompt, "
+            f"{len(codes) - usage['calls']} round trips | {usage['latency']:.1f}s"
+        )
+
+
+class ScoringComparison:
+    """
+    A/B entre ScoringAgent (por atributo) y el scoring en una llamada.
+    Devuelve los scores por atributo (los que se persisten) y registra
+    diferencias, latencia y tokens de ambos caminos.
+    """
+
+    def __init__(self, legacy_scorer, single_call: Optional[MultiAttributeScoringService] = None):
+        self.legacy = legacy_scorer
+        self.single_call = single_call or MultiAttributeScoringService()
+        self.logger = get_logger("ScoringComparison")
+
+    def calculate_scores(self, competitor_data, attributes: Optional[List[str]] = None):
+        codes = list(attributes) if attributes else list(ATTRIBUTE_CODES)
+        start = time.monotonic()
+        if attributes and "attributes" in inspect.signature(self.legacy.calculate_scores).parameters:
+            legacy = self.legacy.calculate_scores(competitor_data, attributes=attributes)
+        else:
+            legacy = self.legacy.calculate_scores(competitor_data)
+        legacy_latency = time.monotonic() - start
+
+        start = time.monotonic()
+        new = self.single_call.calculate_scores(competitor_data, attributes=attributes)
+        new_latency = time.monotonic() - start
+
+        if legacy and new:
+            self.logger.info(
+                f"🔬 A/B scoring | {competitor_data.domain} | {len(codes)} atributos | "
+                f"por atributo: {legacy_latency:.1f}s, {self._legacy_tokens(legacy, new.usage)} | "
+                f"single-call: {new_latency:.1f}s, "
+                f"{new.usage.get('prompt_tokens', 0)}+{new.usage.get('completion_tokens', 0)} tokens"
+            )
+            for code in codes:
+                old = getattr(legacy.attributes.get(code), "raw_score", None)
+                current = getattr(new.attributes.get(code), "raw_score", None)
+                if (old is None) != (current is None) or (old is not None and abs(old - current) > 0.1):
+                    self.logger.info(f"  {code:<26} por atributo={old} single-call={current}")
+        return legacy
+
+    @staticmethod
+    def _legacy_tokens(legacy, usage: Dict[str, float]) -> str:
+        """Tokens del camino por atributo: los que reporte el scorer o la estimación de single-call"""
+        legacy_usage = getattr(legacy, "usage", None)
+        if legacy_usage:
+            return f"{legacy_usage.get('prompt_tokens', 0)}+{legacy_usage.get('completion_tokens', 0)} tokens"
+        if "estimated_per_attribute_prompt_tokens" in usage:
+            return f"~{usage['estimated_per_attribute_prompt_tokens']} tokens de prompt (estimado)"
+        return "tokens n/d"
+
+
+def build_scorer(mode: Optional[str] = None):
+    """Scorer para el modo indicado (default: SCORING_MODE)"""
+    mode = (mode or os.getenv("SCORING_MODE", "per_attribute")).lower()
+    if mode not in SCORING_MODES:
+        raise ValueError(f"SCORING_MODE inválido: {mode} (opciones: {', '.join(SCORING_MODES)})")
+    if mode == "single_call":
+        return MultiAttributeScoringService()
+
+    from agents.scoring_agent import ScoringAgent
+
+    if mode == "compare":
+        return ScoringComparison(ScoringAgent())
+    return ScoringAgent()
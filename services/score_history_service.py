@@ -0,0 +1,306 @@
+"""
+Score History Service
+Serie temporal append-only de los análisis (migrations/006_score_history.sql):
+X/Y y pricing por competidor y score por atributo en cada análisis, con el
+delta respecto al anterior calculado en el mismo INSERT.
+
+Consultas (una sentencia cada una, apoyadas en la clave primaria
+(competitor_id, run_at) y en la vista competitor_score_latest):
+- ``top_movers``: mayores movimientos de X/Y (o de un atributo) respecto al
+  análisis anterior o al estado previo a ``since``.
+- ``pricing_changes``: competidores cuya evidencia de pricing cambió.
+- ``trajectories``: últimos N análisis de X/Y por dominio.
+"""
+import hashlib
+import json
+import math
+import os
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from psycopg2.extras import Json, execute_values
+
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+from services.incremental_service import evidence_urls
+
+logger = get_logger("ScoreHistory")
+
+RUNS_TABLE = "competitor_score_runs"
+HISTORY_TABLE = "competitor_score_history"
+
+# Atributo cuya evidencia forma parte de la huella de pricing
+PRICING_ATTRIBUTE = "price_competitiveness"
+
+_INSERT_RUNS = f"""
+    INSERT INTO {RUNS_TABLE}
+        (competitor_id, run_at, x_score, y_score, attributes_scored, pricing, pricing_hash,
+         prev_run_at, delta_x, delta_y, pricing_changed)
+    SELECT v.competitor_id, v.run_at, v.x_score, v.y_score, v.attributes_scored, v.pricing, v.pricing_hash,
+           p.run_at, v.x_score - p.x_score, v.y_score - p.y_score,
+           p.run_at IS NOT NULL AND p.pricing_hash IS DISTINCT FROM v.pricing_hash
+    FROM (VALUES %s) AS v (competitor_id, run_at, x_score, y_score, attributes_scored, pricing, pricing_hash)
+    LEFT JOIN LATERAL (
+        SELECT r.run_at, r.x_score, r.y_score, r.pricing_hash
+        FROM {RUNS_TABLE} r
+        WHERE r.competitor_id = v.competitor_id AND r.run_at < v.run_at
+        ORDER BY r.run_at DESC
+        LIMIT 1
+    ) p ON TRUE
+    ON CONFLICT (competitor_id, run_at) DO NOTHING
+"""
+_RUNS_TEMPLATE = "(%s::integer, %s::timestamptz, %s::numeric, %s::numeric, %s::smallint, %s::jsonb, %s::text)"
+
+_INSERT_HISTORY = f"""
+    INSERT INTO {HISTORY_TABLE}
+        (competitor_id, attribute_id, run_at, raw_score, evidence_urls, delta, evidence_changed)
+    SELECT v.competitor_id, v.attribute_id, v.run_at, v.raw_score, v.evidence_urls,
+           v.raw_score - p.raw_score,
+           p.run_at IS NOT NULL AND p.evidence_urls IS DISTINCT FROM v.evidence_urls
+    FROM (VALUES %s) AS v (competitor_id, attribute_id, run_at, raw_score, evidence_urls)
+    LEFT JOIN LATERAL (
+        SELECT h.run_at, h.raw_score, h.evidence_urls
+        FROM {HISTORY_TABLE} h
+        WHERE h.competitor_id = v.competitor_id AND h.attribute_id = v.attribute_id AND h.run_at < v.run_at
+        ORDER BY h.run_at DESC
+        LIMIT 1
+    ) p ON TRUE
+    ON CONFLICT (competitor_id, attribute_id, run_at) DO NOTHING
+"""
+_HISTORY_TEMPLATE = "(%s::integer, %s::integer, %s::timestamptz, %s::numeric, %s::text[])"
+
+# Un eje o atributo que gana o pierde evidencia (NULL ↔ valor) cuenta como un
+# movimiento de toda la escala (scores en [0, 1]); NULL → NULL no se movió
+_STEP = "CASE WHEN ({new} IS NULL) <> ({old} IS NULL) THEN 1 ELSE coalesce(abs({new} - {old}), 0) END"
+
+# Estado previo: el análisis anterior al último o, con ``since``, el último anterior a esa fecha
+_MOVERS_QUERY = f"""
+    SELECT * FROM (
+        SELECT c.domain, l.run_at, b.run_at AS baseline_at,
+               l.x_score, l.y_score, b.x_score AS baseline_x, b.y_score AS baseline_y,
+               l.x_score - b.x_score AS delta_x, l.y_score - b.y_score AS delta_y,
+               sqrt(({_STEP.format(new="l.x_score", old="b.x_score")}) ^ 2
+                    + ({_STEP.format(new="l.y_score", old="b.y_score")}) ^ 2) AS movement
+        FROM competitor_score_latest l
+        JOIN competitors c ON c.id = l.competitor_id
+        JOIN LATERAL (
+            SELECT r.run_at, r.x_score, r.y_score
+            FROM {RUNS_TABLE} r
+            WHERE r.competitor_id = l.competitor_id
+              AND r.run_at < coalesce(%(since)s::timestamptz, l.run_at)
+            ORDER BY r.run_at DESC
+            LIMIT 1
+        ) b ON TRUE
+        WHERE l.run_at >= coalesce(%(since)s::timestamptz, '-infinity')
+    ) m
+    WHERE movement >= %(min_delta)s
+    ORDER BY movement DESC
+    LIMIT %(limit)s
+"""
+
+_ATTRIBUTE_MOVERS_QUERY = f"""
+    SELECT * FROM (
+        SELECT c.domain, %(attribute)s AS attribute, l.run_at, b.run_at AS baseline_at,
+               l.raw_score, b.raw_score AS baseline_score,
+               l.raw_score - b.raw_score AS delta, {_STEP.format(new="l.raw_score", old="b.raw_score")} AS movement,
+               l.evidence_urls
+        FROM (
+            SELECT DISTINCT ON (h.competitor_id) h.*
+            FROM {HISTORY_TABLE} h
+            WHERE h.attribute_id = (SELECT id FROM dim_attribute WHERE code = %(attribute)s)
+            ORDER BY h.competitor_id DESC, h.run_at DESC
+        ) l
+        JOIN competitors c ON c.id = l.competitor_id
+        JOIN LATERAL (
+            SELECT h.run_at, h.raw_score
+            FROM {HISTORY_TABLE} h
+            WHERE h.competitor_id = l.competitor_id AND h.attribute_id = l.attribute_id
+              AND h.run_at < coalesce(%(since)s::timestamptz, l.run_at)
+            ORDER BY h.run_at DESC
+            LIMIT 1
+        ) b ON TRUE
+        WHERE l.run_at >= coalesce(%(since)s::timestamptz, '-infinity')
+    ) m
+    WHERE movement >= %(min_delta)s
+    ORDER BY movement DESC
+    LIMIT %(limit)s
+"""
+
+# Sin ``since``: último análisis de cada competidor; con ``since``: todos los cambios desde esa fecha
+_PRICING_QUERY = """
+    SELECT c.domain, r.run_at, r.prev_run_at, r.pricing, p.pricing AS prev_pricing
+    FROM {source} r
+    JOIN competitors c ON c.id = r.competitor_id
+    LEFT JOIN {runs} p ON p.competitor_id = r.competitor_id AND p.run_at = r.prev_run_at
+    WHERE r.pricing_changed AND r.run_at >= coalesce(%(since)s::timestamptz, '-infinity')
+    ORDER BY r.run_at DESC
+    LIMIT %(limit)s
+"""
+
+_TRAJECTORIES_QUERY = f"""
+    SELECT domain, run_at, x_score, y_score, delta_x, delta_y
+    FROM (
+        SELECT c.domain, r.run_at, r.x_score, r.y_score, r.delta_x, r.delta_y,
+               row_number() OVER (PARTITION BY r.competitor_id ORDER BY r.run_at DESC) AS run_rank
+        FROM {RUNS_TABLE} r
+        JOIN competitors c ON c.id = r.competitor_id
+        WHERE %(domains)s::text[] IS NULL OR c.domain = ANY(%(domains)s::text[])
+    ) t
+    WHERE run_rank <= %(runs)s
+    ORDER BY domain, run_at
+"""
+
+
+def history_enabled() -> bool:
+    return os.getenv("SCORE_HISTORY", "true").lower() == "true"
+
+
+def pricing_fingerprint(competitor_data, scores) -> Tuple[Optional[Dict], str]:
+    """Pricing extraído y huella estable de la evidencia de pricing (productos + URLs del atributo de precio)"""
+    pricing = getattr(competitor_data, "pricing", None) or None
+    attribute = (getattr(scores, "attributes", None) or {}).get(PRICING_ATTRIBUTE)
+    evidence = {
+        "pricing": pricing,
+        "has_explicit_pricing": getattr(competitor_data, "has_explicit_pricing", None),
+        "evidence_urls": sorted(evidence_urls(attribute)) if attribute is not None else [],
+    }
+    payload = json.dumps(evidence, sort_keys=True, ensure_ascii=False, default=str)
+    return pricing, hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def append_history(cursor, entries: Iterable[Tuple[int, object, object]], attribute_ids: Dict[str, int],
+                   run_at: datetime, page_size: int = 500) -> int:
+    """
+    Añade ``(competitor_id, competitor_data, scores)`` al histórico dentro de
+    la transacción de ``cursor``. Devuelve el número de análisis añadidos.
+    """
+    by_competitor = {competitor_id: (cd, scores) for competitor_id, cd, scores in entries if competitor_id}
+    run_rows, history_rows = [], []
+    for competitor_id, (competitor_data, scores) in by_competitor.items():
+        attributes = getattr(scores, "attributes", None) or {}
+        pricing, pricing_hash = pricing_fingerprint(competitor_data, scores)
+        run_rows.append((
+            competitor_id,
+            run_at,
+            getattr(scores, "x_score", None),
+            getattr(scores, "y_score", None),
+            sum(1 for a in attributes.values() if getattr(a, "raw_score", None) is not None),
+            Json(pricing, dumps=lambda o: json.dumps(o, default=str)) if pricing else None,
+            pricing_hash,
+        ))
+        for code, attribute in attributes.items():
+            if code not in attribute_ids:
+                continue
+            history_rows.append((
+                competitor_id,
+                attribute_ids[code],
+                run_at,
+                getattr(attribute, "raw_score", None),
+                sorted(evidence_urls(attribute)),
+            ))
+    if not run_rows:
+        return 0
+
+    # Las filas de atributo referencian la fila del análisis: primero competitor_score_runs
+    for sql, template, table, rows in ((_INSERT_RUNS, _RUNS_TEMPLATE, RUNS_TABLE, run_rows),
+                                       (_INSERT_HISTORY, _HISTORY_TEMPLATE, HISTORY_TABLE, history_rows)):
+        if not rows:
+            continue
+        execute_values(cursor, sql, rows, template=template, page_size=page_size)
+        metrics.inc("db_round_trips_total", math.ceil(len(rows) / page_size), operation="insert", table=table)
+        metrics.inc("db_rows_written_total", len(rows), table=table)
+    return len(run_rows)
+
+
+def record_history(items: Iterable[Tuple[object, object, object]], ids: Dict[str, int], conn=None) -> int:
+    """
+    Histórico de ``(competitor_data, scores, insights)`` ya guardados con otro
+    escritor (análisis individual con DBWriterAgent), en su propia transacción.
+    """
+    if conn is None:
+        from infrastructure.db_pool import db_transaction
+
+        with db_transaction() as pooled:
+            return record_history(items, ids, pooled)
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT code, id FROM dim_attribute")
+        metrics.inc("db_round_trips_total", operation="select")
+        attribute_ids = dict(cursor.fetchall())
+        entries = [(ids.get(cd.domain), cd, scores) for cd, scores, _ in items if cd is not None]
+        cursor.execute("SELECT now()")
+        run_at = cursor.fetchone()[0]
+        return append_history(cursor, entries, attribute_ids, run_at)
+
+
+# ----------------------------------------------------------------------
+# Consultas
+# ----------------------------------------------------------------------
+
+def _query(sql: str, params: Dict, conn=None) -> pd.DataFrame:
+    """Ejecuta ``sql`` y devuelve un DataFrame (NUMERIC → float)"""
+    if conn is None:
+        from infrastructure.db_pool import db_transaction
+
+        with db_transaction() as pooled:
+            return _query(sql, params, pooled)
+
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+        metrics.inc("db_round_trips_total", operation="select")
+        frame = pd.DataFrame(cursor.fetchall(), columns=[column.name for column in cursor.description])
+    for column in frame.columns:
+        if frame[column].map(lambda v: isinstance(v, Decimal)).any():
+            frame[column] = pd.to_numeric(frame[column], errors="coerce")
+    return frame
+
+
+def top_movers(limit: int = 20, since: Optional[datetime] = None, attribute: Optional[str] = None,
+               min_delta: float = 0.0, conn=None) -> pd.DataFrame:
+    """
+    Competidores que más se movieron entre su último análisis y el estado
+    previo: el análisis anterior o, con ``since``, el último anterior a esa
+    fecha (sólo competidores re-analizados desde entonces). Sin ``attribute``
+    el movimiento es la distancia en el plano X/Y; con él, |delta| del atributo.
+    Pasar de NULL (sin evidencia) a un valor, o al revés, cuenta como 1.
+    """
+    params = {"limit": limit, "since": since, "min_delta": min_delta, "attribute": attribute}
+    return _query(_ATTRIBUTE_MOVERS_QUERY if attribute else _MOVERS_QUERY, params, conn)
+
+
+def pricing_changes(since: Optional[datetime] = None, limit: int = 100, conn=None) -> pd.DataFrame:
+    """
+    Competidores cuya evidencia de pricing cambió respecto al análisis
+    anterior, con el pricing actual y el previo. Sin ``since`` sólo se mira
+    el último análisis de cada competidor.
+    """
+    source = RUNS_TABLE if since is not None else "competitor_score_latest"
+    sql = _PRICING_QUERY.format(source=source, runs=RUNS_TABLE)
+    return _query(sql, {"since": since, "limit": limit}, conn)
+
+
+def trajectories(domains: Optional[List[str]] = None, runs: int = 5, conn=None) -> pd.DataFrame:
+    """Últimos ``runs`` análisis (X/Y y deltas) de ``domains`` (default: todos), en orden cronológico"""
+    return _query(_TRAJECTORIES_QUERY, {"domains": list(domains) if domains else None, "runs": runs}, conn)
+
+
+def _score(value) -> str:
+    """Score para los logs: NULL (eje sin evidencia) como 'NULL'"""
+    return "NULL" if value is None or pd.isna(value) else f"{value:.2f}"
+
+
+def history_report(limit: int = 10, since: Optional[datetime] = None) -> Dict[str, pd.DataFrame]:
+    """Registra los mayores movimientos y cambios de pricing (alertas del run)"""
+    movers = top_movers(limit=limit, since=since, min_delta=float(os.getenv("SCORE_HISTORY_MIN_DELTA", "0.05")))
+    changes = pricing_changes(since=since, limit=limit)
+    for row in movers.itertuples():
+        logger.info(
+            f"  Δ {row.domain}: X {_score(row.baseline_x)} → {_score(row.x_score)} | "
+            f"Y {_score(row.baseline_y)} → {_score(row.y_score)} "
+            f"(desde {row.baseline_at:%Y-%m-%d})"
+        )
+    for row in changes.itertuples():
+        logger.info(f"  💲 {row.domain}: pricing cambió el {row.run_at:%Y-%m-%d}")
+    return {"movers": movers, "pricing_changes": changes}
@@ -0,0 +1,574 @@
+"""
+Validation Service
+Etapa de validación entre scoring e insights: comprueba la extracción y los
+scores de un competidor contra modelos pydantic v2 (su esquema se compila
+una vez al importar el módulo) y verifica que las URLs de evidencia responden.
+
+Reglas (ver "Reglas de Negocio" en el README):
+- Cada dato debe tener URL válida asociada: fuentes, evidencias y source_url
+  de los productos son http(s).
+- Un score sin URLs de evidencia es NULL y sus URLs deben estar entre las
+  fuentes de la extracción.
+- Un precio sin source_url no es evidencia explícita.
+
+Todas las URLs de un competidor se comprueban en un único lote concurrente
+(HEAD, con GET de respaldo si el servidor no admite HEAD) sobre un cliente
+httpx async con pool keep-alive; los resultados concluyentes se guardan en
+UrlCheckCache para no repetir las comprobaciones entre análisis.
+
+VALIDATION_MODE=report sólo informa; enforce además descarta la evidencia no
+válida, anula los scores que se quedan sin evidencia y recalcula X/Y.
+"""
+import asyncio
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Annotated, Dict, Iterable, List, Optional, Set
+from urllib.parse import urlparse
+
+import httpx
+from pydantic import (
+    AfterValidator,
+    BaseModel,
+    ConfigDict,
+    Field,
+    ValidationError,
+    ValidationInfo,
+    field_validator,
+    model_validator,
+)
+
+from domain.attributes import ATTRIBUTE_CODES, axis_scores
+from infrastructure.cache import DEFAULT_USER_AGENT, get_url_check_cache
+from infrastructure.logging_config import get_logger
+from infrastructure.metrics import metrics
+from services.incremental_service import current_source_urls, evidence_urls, source_url
+
+VALIDATION_MODES = ("report", "enforce")
+
+# Resultado de comprobar una URL
+URL_OK = "ok"
+URL_BROKEN = "broken"
+URL_UNKNOWN = "unknown"  # timeout, 5xx, acceso restringido: no se cachea ni se descarta
+
+# Respuestas a HEAD que no dicen nada de la página: se repite con GET
+_HEAD_FALLBACK = {403, 405, 501}
+# 4xx que no prueban que la página no exista
+_INCONCLUSIVE = {401, 403, 407, 408, 425, 429}
+# Campos de un atributo puntuado que pueden contener su evidencia (ver evidence_urls)
+_EVIDENCE_FIELDS = ("evidence_urls", "source_urls", "evidence")
+
+
+def is_http_url(url) -> bool:
+    if not isinstance(url, str):
+        return False
+    try:
+        # urlparse lanza ValueError con hosts mal formados ("http://[::1/")
+        parsed = urlparse(url)
+    except ValueError:
+        return False
+    return parsed.scheme in ("http", "https") and bool(parsed.netloc)
+
+
+def url_key(url: str) -> str:
+    """Host sin www. + ruta sin barra final: una evidencia y su fuente coinciden aunque difieran en eso"""
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return url
+    return f"{parsed.netloc.lower().removeprefix('www.')}{parsed.path.rstrip('/') or '/'}"
+
+
+def _http_url(value: str) -> str:
+    if not is_http_url(value):
+        raise ValueError(f"URL no válida: {value!r}")
+    return value
+
+
+HttpUrlStr = Annotated[str, AfterValidator(_http_url)]
+
+
+# ----------------------------------------------------------------------
+# Esquemas
+# ----------------------------------------------------------------------
+
+class ProductModel(BaseModel):
+    """Producto con precio extraído"""
+    model_config = ConfigDict(extra="ignore")
+
+    name: str = Field(min_length=1)
+    source_url: Optional[HttpUrlStr] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def _source_alias(cls, data):
+        if isinstance(data, dict) and not data.get("source_url") and data.get("url"):
+            data = {**data, "source_url": data["url"]}
+        return data
+
+    @field_validator("source_url")
+    @classmethod
+    def _required(cls, value: Optional[str]) -> str:
+        if not value:
+            raise ValueError("precio sin source_url (no es evidencia explícita)")
+        return value
+
+
+class ExtractionModel(BaseModel):
+    """Extracción del ScraperAgent (sólo los campos con reglas de trazabilidad)"""
+    model_config = ConfigDict(extra="ignore")
+
+    domain: str = Field(min_length=1)
+    name: Optional[str] = None
+    sources: List[HttpUrlStr] = Field(min_length=1)
+    products: List[ProductModel] = Field(default_factory=list)
+
+
+class ScoredAttributeModel(BaseModel):
+    """Score final de un atributo; ``context["sources"]`` son las fuentes normalizadas (url_key)"""
+    model_config = ConfigDict(extra="ignore")
+
+    raw_score: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    evidence_urls: List[HttpUrlStr] = Field(default_factory=list)
+
+    @model_validator(mode="after")
+    def _evidence_rules(self, info: ValidationInfo):
+        if self.raw_score is not None and not self.evidence_urls:
+            raise ValueError("score sin URL de evidencia (debe ser NULL)")
+        sources = (info.context or {}).get("sources")
+        if sources is not None:
+            foreign = [url for url in self.evidence_urls if url_key(url) not in sources]
+            if foreign:
+                raise ValueError(f"evidencia fuera de las fuentes extraídas: {', '.join(foreign)}")
+        return self
+
+
+class ScoresModel(BaseModel):
+    """Scores de un competidor: atributos conocidos y X/Y sólo con evidencia en su eje"""
+    model_config = ConfigDict(extra="ignore")
+
+    attributes: Dict[str, ScoredAttributeModel]
+    x_score: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    y_score: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+
+    @field_validator("attributes")
+    @classmethod
+    def _known_codes(cls, value: Dict[str, ScoredAttributeModel]) -> Dict[str, ScoredAttributeModel]:
+        unknown = sorted(set(value) - set(ATTRIBUTE_CODES))
+        if unknown:
+            raise ValueError(f"atributos desconocidos: {', '.join(unknown)}")
+        return value
+
+    @model_validator(mode="after")
+    def _axes_need_evidence(self):
+        x, y = axis_scores(self.attributes)
+        if self.x_score is not None and x is None:
+            raise ValueError("x_score sin atributos Strategy con evidencia (debe ser NULL)")
+        if self.y_score is not None and y is None:
+            raise ValueError("y_score sin atributos Complexity con evidencia (debe ser NULL)")
+        return self
+
+
+# ----------------------------------------------------------------------
+# Informe
+# ----------------------------------------------------------------------
+
+@dataclass
+class ValidationIssue:
+    """Incumplimiento de una regla; ``path`` indica el dato (p. ej. scores.attributes.ease_of_use)"""
+    path: str
+    message: str
+    severity: str = "error"  # error | warning
+
+
+@dataclass
+class UrlCheck:
+    """Resultado de comprobar una URL"""
+    url: str
+    status: str
+    status_code: Optional[int] = None
+    final_url: Optional[str] = None
+    error: Optional[str] = None
+    cached: bool = False
+
+
+@dataclass
+class ValidationReport:
+    """Resultado agregado de validar un competidor"""
+    domain: str
+    mode: str = "report"
+    issues: List[ValidationIssue] = field(default_factory=list)
+    urls: Dict[str, UrlCheck] = field(default_factory=dict)
+    # enforce: atributos anulados y productos descartados
+    nulled: List[str] = field(default_factory=list)
+    dropped_products: int = 0
+    duration: float = 0.0
+
+    def add(self, path: str, message: str, severity: str = "error"):
+        self.issues.append(ValidationIssue(path, message, severity))
+
+    @property
+    def errors(self) -> List[ValidationIssue]:
+        return [i for i in self.issues if i.severity == "error"]
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+    def url_count(self, status: str) -> int:
+        return sum(1 for check in self.urls.values() if check.status == status)
+
+    def totals(self) -> Dict[str, int]:
+        return {
+            "errors": len(self.errors),
+            "warnings": len(self.issues) - len(self.errors),
+            "urls_checked": len(self.urls),
+            "urls_cached": sum(1 for check in self.urls.values() if check.cached),
+            "urls_broken": self.url_count(URL_BROKEN),
+            "urls_unknown": self.url_count(URL_UNKNOWN),
+            "scores_nulled": len(self.nulled),
+            "products_dropped": self.dropped_products,
+        }
+
+    def summary(self) -> str:
+        totals = self.totals()
+        text = (
+            f"{totals['errors']} errores, {totals['warnings']} avisos | URLs: {totals['urls_checked']} "
+            f"({totals['urls_cached']} en cache), {totals['urls_broken']} rotas, "
+            f"{totals['urls_unknown']} sin respuesta"
+        )
+        if self.nulled or self.dropped_products:
+            text += f" | anulados: {len(self.nulled)} scores, {self.dropped_products} productos"
+        return text
+
+    def to_dict(self) -> Dict:
+        return {
+            "domain": self.domain,
+            "mode": self.mode,
+            "valid": self.valid,
+            "totals": self.totals(),
+            "issues": [asdict(issue) for issue in self.issues],
+            "urls": {url: asdict(check) for url, check in self.urls.items() if check.status != URL_OK},
+            "nulled": self.nulled,
+            "duration": round(self.duration, 3),
+        }
+
+
+# ----------------------------------------------------------------------
+# Verificación de URLs
+# ----------------------------------------------------------------------
+
+class AsyncUrlVerifier:
+    """
+    Comprueba URLs en paralelo con un cliente httpx compartido.
+    VALIDATION_URL_CONCURRENCY limita las peticiones totales y
+    VALIDATION_URL_PER_HOST las simultáneas contra un mismo sitio.
+    """
+
+    def __init__(self):
+        self.concurrency = int(os.getenv("VALIDATION_URL_CONCURRENCY", "32"))
+        self.per_host = int(os.getenv("VALIDATION_URL_PER_HOST", "8"))
+        self.timeout = float(os.getenv("VALIDATION_URL_TIMEOUT", "10"))
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._http = httpx.AsyncClient(
+            headers={"User-Agent": DEFAULT_USER_AGENT},
+            follow_redirects=True,
+            timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5)),
+            limits=httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency,
+                keepalive_expiry=30,
+            ),
+        )
+
+    async def _request(self, url: str) -> httpx.Response:
+        response = await self._http.head(url)
+        if response.status_code in _HEAD_FALLBACK:
+            # Sólo cabeceras: el cuerpo no se descarga
+            async with self._http.stream("GET", url) as response:
+                pass
+        return response
+
+    async def check(self, url: str) -> UrlCheck:
+        if not is_http_url(url):
+            return UrlCheck(url, URL_BROKEN, error="URL no válida")
+        host = urlparse(url).netloc.lower()
+        host_slots = self._hosts.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with self._slots, host_slots:
+            start = time.monotonic()
+            try:
+                response = await self._request(url)
+            except (httpx.InvalidURL, ValueError) as e:
+                # InvalidURL no hereda de HTTPError: la URL no se puede pedir, no es un fallo de red
+                return UrlCheck(url, URL_BROKEN, error=f"{type(e).__name__}: {e}")
+            except httpx.HTTPError as e:
+                return UrlCheck(url, URL_UNKNOWN, error=f"{type(e).__name__}: {e}")
+            finally:
+                metrics.observe("url_check_seconds", time.monotonic() - start)
+
+        code = response.status_code
+        if code < 400:
+            status = URL_OK
+        elif code >= 500 or code in _INCONCLUSIVE:
+            status = URL_UNKNOWN
+        else:
+            status = URL_BROKEN
+        final_url = str(response.url)
+        return UrlCheck(url, status, code, final_url if final_url != url else None)
+
+    async def check_many(self, urls: List[str]) -> Dict[str, UrlCheck]:
+        """Un fallo inesperado en una URL deja esa URL sin respuesta, no al lote entero"""
+        checks = await asyncio.gather(*(self.check(url) for url in urls), return_exceptions=True)
+        results = {}
+        for url, check in zip(urls, checks):
+            if isinstance(check, BaseException):
+                if isinstance(check, asyncio.CancelledError):
+                    raise check
+                check = UrlCheck(url, URL_UNKNOWN, error=f"{type(check).__name__}: {check}")
+            results[check.url] = check
+        return results
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+class UrlVerifier:
+    """
+    Fachada síncrona sobre AsyncUrlVerifier con UrlCheckCache.
+    Como LLMClient, el cliente async vive en un event loop propio en segundo
+    plano y su pool de conexiones se comparte entre los hilos del batch.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="url-verifier", daemon=True)
+        self._thread.start()
+        self.client: AsyncUrlVerifier = self._run(self._create())
+
+    @staticmethod
+    async def _create():
+        return AsyncUrlVerifier()
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def verify(self, urls: Iterable[str]) -> Dict[str, UrlCheck]:
+        """{url: UrlCheck} de ``urls``; las que no están en cache se comprueban en un solo lote"""
+        urls = list(dict.fromkeys(urls))
+        cache = get_url_check_cache()
+        results = {}
+        if cache:
+            for url, (status, status_code, final_url) in cache.get_many(urls).items():
+                results[url] = UrlCheck(url, status, status_code, final_url, cached=True)
+        pending = [url for url in urls if url not in results]
+        if pending:
+            checked = self._run(self.client.check_many(pending))
+            results.update(checked)
+            if cache:
+                cache.put_many(
+                    (c.url, c.status, c.status_code, c.final_url) for c in checked.values() if c.status != URL_UNKNOWN
+                )
+        for check in results.values():
+            metrics.inc("url_checks_total", status=check.status, source="cache" if check.cached else "http")
+        return results
+
+    def close(self):
+        try:
+            self._run(self.client.aclose())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+
+
+_verifier: Optional[UrlVerifier] = None
+_verifier_lock = threading.Lock()
+
+
+def get_url_verifier() -> UrlVerifier:
+    """UrlVerifier compartido del proceso"""
+    global _verifier
+    with _verifier_lock:
+        if _verifier is None:
+            _verifier = UrlVerifier()
+        return _verifier
+
+
+def close_url_verifier():
+    global _verifier
+    with _verifier_lock:
+        if _verifier is not None:
+            _verifier.close()
+            _verifier = None
+
+
+# ----------------------------------------------------------------------
+# Servicio
+# ----------------------------------------------------------------------
+
+def validation_enabled() -> bool:
+    return os.getenv("VALIDATION_ENABLED", "true").lower() == "true"
+
+
+def _products(competitor_data) -> List:
+    pricing = getattr(competitor_data, "pricing", None)
+    products = pricing.get("products") if isinstance(pricing, dict) else None
+    return list(products or [])
+
+
+def _product_payload(product) -> Dict:
+    if isinstance(product, dict):
+        return product
+    return {"name": getattr(product, "name", None), "source_url": getattr(product, "source_url", None),
+            "url": getattr(product, "url", None)}
+
+
+def _product_url(product) -> Optional[str]:
+    payload = _product_payload(product)
+    return payload.get("source_url") or payload.get("url")
+
+
+def _issue_path(prefix: str, loc) -> str:
+    return ".".join([prefix, *(str(part) for part in loc)])
+
+
+class ValidationService:
+    """Valida un competidor (extracción + scores) y devuelve un ValidationReport"""
+
+    def __init__(self, mode: Optional[str] = None, verify_urls: Optional[bool] = None):
+        self.mode = (mode or os.getenv("VALIDATION_MODE", "report")).lower()
+        if self.mode not in VALIDATION_MODES:
+            raise ValueError(f"VALIDATION_MODE no soportado: {self.mode} (usar {', '.join(VALIDATION_MODES)})")
+        if verify_urls is None:
+            verify_urls = os.getenv("VALIDATION_VERIFY_URLS", "true").lower() == "true"
+        self.verify_urls = verify_urls
+        self.logger = get_logger("Validation")
+
+    def validate(self, competitor_data, scores) -> ValidationReport:
+        start = time.monotonic()
+        report = ValidationReport(domain=getattr(competitor_data, "domain", None) or "", mode=self.mode)
+        sources = current_source_urls(competitor_data)
+        source_keys = {url_key(url) for url in sources if is_http_url(url)}
+        products = _products(competitor_data)
+        attributes = getattr(scores, "attributes", None) or {}
+        evidence = {code: evidence_urls(attribute) for code, attribute in attributes.items()}
+
+        self._check_schema(report, "competitor_data", ExtractionModel, {
+            "domain": report.domain,
+            "name": getattr(competitor_data, "name", None),
+            "sources": sources,
+            "products": [_product_payload(p) for p in products],
+        })
+        if scores is not None:
+            self._check_schema(report, "scores", ScoresModel, {
+                "attributes": {
+                    code: {"raw_score": getattr(attribute, "raw_score", None), "evidence_urls": evidence[code]}
+                    for code, attribute in attributes.items()
+                },
+                "x_score": getattr(scores, "x_score", None),
+                "y_score": getattr(scores, "y_score", None),
+            }, context={"sources": source_keys})
+
+        if self.verify_urls:
+            urls = [*sources, *(url for urls in evidence.values() for url in urls), *map(_product_url, products)]
+            report.urls = get_url_verifier().verify(url for url in urls if is_http_url(url))
+            self._check_urls(report, sources, evidence, products)
+
+        if self.mode == "enforce":
+            self._enforce(report, competitor_data, scores, source_keys, evidence, products)
+
+        report.duration = time.monotonic() - start
+        for issue in report.issues:
+            metrics.inc("validation_issues_total", severity=issue.severity)
+        metrics.inc("validation_reports_total", valid=str(report.valid).lower())
+        metrics.inc("validation_scores_nulled_total", len(report.nulled))
+        return report
+
+    @staticmethod
+    def _check_schema(report: ValidationReport, prefix: str, model, payload: Dict, context: Optional[Dict] = None):
+        """Valida ``payload`` y añade al informe todos los errores, no sólo el primero"""
+        try:
+            model.model_validate(payload, context=context)
+        except ValidationError as e:
+            for error in e.errors(include_url=False):
+                report.add(_issue_path(prefix, error["loc"]), error["msg"].removeprefix("Value error, "))
+
+    @staticmethod
+    def _check_urls(report: ValidationReport, sources: List[str], evidence: Dict[str, List[str]], products: List):
+        """Fuentes caídas son avisos; evidencias y precios con URL rota son errores"""
+        def status(url):
+            check = report.urls.get(url)
+            return check.status if check else None
+
+        def describe(url):
+            check = report.urls[url]
+            return f"{check.status_code or check.error}: {url}"
+
+        for url in sources:
+            if status(url) == URL_BROKEN:
+                report.add("competitor_data.sources", f"fuente no disponible ({describe(url)})", "warning")
+        for code, urls in evidence.items():
+            for url in urls:
+                if status(url) == URL_BROKEN:
+                    report.add(f"scores.attributes.{code}.evidence_urls", f"URL de evidencia rota ({describe(url)})")
+                elif status(url) == URL_UNKNOWN:
+                    report.add(f"scores.attributes.{code}.evidence_urls",
+                               f"URL de evidencia sin respuesta ({describe(url)})", "warning")
+        for position, product in enumerate(products):
+            url = _product_url(product)
+            if status(url) == URL_BROKEN:
+                report.add(f"competitor_data.products.{position}.source_url", f"URL de precio rota ({describe(url)})")
+
+    def _enforce(self, report: ValidationReport, competitor_data, scores, source_keys: Set[str],
+                 evidence: Dict[str, List[str]], products: List):
+        """Aplica NULL-sin-evidencia con las URLs ya verificadas"""
+        def usable(url, require_source: bool) -> bool:
+            check = report.urls.get(url)
+            return (is_http_url(url) and (not require_source or url_key(url) in source_keys)
+                    and not (check and check.status == URL_BROKEN))
+
+        attributes = getattr(scores, "attributes", None) or {}
+        for code, attribute in attributes.items():
+            urls = evidence.get(code, [])
+            valid = [url for url in urls if usable(url, require_source=True)]
+            if len(valid) != len(urls):
+                self._keep_evidence(attribute, set(valid))
+            if getattr(attribute, "raw_score", None) is not None and not valid:
+                attribute.raw_score = None
+                report.nulled.append(code)
+        if scores is not None:
+            # Un eje sin atributos con evidencia es NULL; si se anuló algo, X/Y se recalculan
+            x, y = axis_scores(attributes)
+            if report.nulled or x is None:
+                scores.x_score = x
+            if report.nulled or y is None:
+                scores.y_score = y
+        if report.nulled:
+            self.logger.warning(f"⚠ {report.domain}: scores anulados por falta de evidencia válida: "
+                                f"{', '.join(report.nulled)}")
+
+        kept = [p for p in products if usable(_product_url(p), require_source=False)]
+        if len(kept) != len(products):
+            report.dropped_products = len(products) - len(kept)
+            competitor_data.pricing["products"] = kept
+
+    @staticmethod
+    def _keep_evidence(attribute, keep: Set[str]):
+        for name in _EVIDENCE_FIELDS:
+            items = getattr(attribute, name, None)
+            if items:
+                setattr(attribute, name, [item for item in items if source_url(item) in keep])
+                return
+
+    def log_report(self, report: ValidationReport, limit: int = 5):
+        """Resumen del informe y sus primeros ``limit`` problemas"""
+        if report.valid and not report.issues:
+            self.logger.info(f"✓ Validación {report.domain}: {report.summary()}")
+            return
+        icon = "✓" if report.valid else "⚠"
+        self.logger.warning(f"{icon} Validación {report.domain}: {report.summary()}")
+        for issue in report.issues[:limit]:
+            self.logger.warning(f"    [{issue.severity}] {issue.path}: {issue.message}")
+        if len(report.issues) > limit:
+            self.logger.warning(f"    ... y {len(report.issues) - limit} más")
@@ -9,6 +9,8 @@ import requests
 import time
 from pathlib import Path
 
+from infrastructure.ollama_runtime import recommended_parallel
+
 # Configurar encoding para Windows
 if sys.platform == 'win32':
     import codecs
@@ -16,7 +18,11 @@ if sys.platform == 'win32':
     sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
 
 OLLAMA_URL = "http://localhost:11434"
-OLLAMA_MODEL = "llama3.1:8b"
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+# Modo throughput: modelo fijo en memoria y peticiones en paralelo según los núcleos
+OLLAMA_KEEP_ALIVE = "-1"
+OLLAMA_NUM_CTX = os.getenv("OLLAMA_NUM_CTX", "8192")
+OLLAMA_NUM_PARALLEL = str(recommended_parallel())
 
 def check_ollama_installed():
     """Verifica si Ollama está instalado"""
@@ -82,23 +88,34 @@ def pull_model():
         return False
 
 def test_model():
-    """Prueba el modelo con una consulta simple"""
+    """
+    Prueba el modelo como lo usa el agente (/api/chat con salida JSON), lo deja
+    fijo en memoria (keep_alive) y mide los tokens/s de generación
+    """
     print(f"\n🧪 Probando modelo {OLLAMA_MODEL}...")
     
     try:
         response = requests.post(
-            f"{OLLAMA_URL}/api/generate",
+            f"{OLLAMA_URL}/api/chat",
             json={
                 "model": OLLAMA_MODEL,
-                "prompt": "Responde solo con 'OK'",
-                "stream": False
+                "messages": [{"role": "user", "content": 'Responde solo con {"status": "OK"}'}],
+                "format": "json",
+                "stream": False,
+                "keep_alive": int(OLLAMA_KEEP_ALIVE),
+                "options": {"num_ctx": int(OLLAMA_NUM_CTX)},
             },
-            timeout=30
+            # La primera petición incluye la carga del modelo
+            timeout=600
         )
         
         if response.status_code == 200:
             result = response.json()
             print("   ✓ Modelo responde correctamente")
+            load_seconds = result.get("load_duration", 0) / 1e9
+            if result.get("eval_duration"):
+                tokens_per_second = result.get("eval_count", 0) / (result["eval_duration"] / 1e9)
+                print(f"   ⚡ Generación: {tokens_per_second:.1f} tokens/s (carga del modelo: {load_seconds:.1f}s)")
             return True
         else:
             print(f"   ❌ Error al probar modelo: {response.status_code}")
@@ -213,6 +230,13 @@ def setup_ollama():
             content += f"OLLAMA_MODEL={OLLAMA_MODEL}\n"
             needs_update = True
         
+        for key, value in (("OLLAMA_KEEP_ALIVE", OLLAMA_KEEP_ALIVE),
+                           ("OLLAMA_NUM_PARALLEL", OLLAMA_NUM_PARALLEL),
+                           ("OLLAMA_NUM_CTX", OLLAMA_NUM_CTX)):
+            if key not in content:
+                content += f"{key}={value}\n"
+                needs_update = True
+        
         if needs_update:
             with open(env_file, 'w', encoding='utf-8') as f:
                 f.write(content)
@@ -225,6 +249,9 @@ def setup_ollama():
             f.write(f"LLM_PROVIDER=ollama\n")
             f.write(f"OLLAMA_URL={OLLAMA_URL}/api/generate\n")
             f.write(f"OLLAMA_MODEL={OLLAMA_MODEL}\n")
+            f.write(f"OLLAMA_KEEP_ALIVE={OLLAMA_KEEP_ALIVE}\n")
+            f.write(f"OLLAMA_NUM_PARALLEL={OLLAMA_NUM_PARALLEL}\n")
+            f.write(f"OLLAMA_NUM_CTX={OLLAMA_NUM_CTX}\n")
         print("   ✓ Archivo .env creado")
     
     # 6. Verificación final
@@ -242,6 +269,12 @@ def setup_ollama():
     print(f"   LLM_PROVIDER=ollama")
     print(f"   OLLAMA_URL={OLLAMA_URL}/api/generate")
     print(f"   OLLAMA_MODEL={OLLAMA_MODEL}")
+    print(f"   OLLAMA_KEEP_ALIVE={OLLAMA_KEEP_ALIVE}  (modelo fijo en memoria)")
+    print(f"   OLLAMA_NUM_PARALLEL={OLLAMA_NUM_PARALLEL}  ({os.cpu_count()} núcleos)")
+    print(f"   OLLAMA_NUM_CTX={OLLAMA_NUM_CTX}")
+    
+    print("\n⚙ El servidor de Ollama también debe admitir esas peticiones en paralelo:")
+    print(f"   OLLAMA_NUM_PARALLEL={OLLAMA_NUM_PARALLEL} ollama serve")
     
     print("\n💡 Próximos pasos:")
     print("   1. Ejecuta: python check_llm_provider.py")
@@ -0,0 +1,16 @@
+"""
+Configuración común de los tests.
+Si el checkout no incluye infrastructure/logging_config.py se usa el de
+tests/shims, añadido al final del path (el real siempre tiene prioridad) y a
+PYTHONPATH para los intérpretes que lanza benchmarks/import_time.
+"""
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+SHIMS = Path(__file__).resolve().parent / "shims"
+
+if importlib.util.find_spec("infrastructure.logging_config") is None:
+    sys.path.append(str(SHIMS))
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, (os.environ.get("PYTHONPATH"), str(SHIMS))))
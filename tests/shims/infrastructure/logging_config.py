@@ -0,0 +1,14 @@
+"""
+Sustituto mínimo de infrastructure/logging_config.py para los tests.
+tests/conftest.py sólo lo pone en el path (al final) si el módulo real no
+está en el checkout.
+"""
+import logging
+from typing import Optional
+
+
+def get_logger(name: str, log_file: Optional[str] = None) -> logging.Logger:
+    logger = logging.getLogger(name)
+    if log_file:
+        logger.addHandler(logging.FileHandler(log_file, encoding="utf-8"))
+    return logger
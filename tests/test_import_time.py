@@ -0,0 +1,19 @@
+"""
+Presupuesto de arranque de los puntos de entrada (benchmarks/import_time.py).
+Cada módulo se importa en intérpretes limpios; se omite si este checkout no
+tiene algún módulo del proyecto que necesita.
+"""
+import pytest
+
+from benchmarks.import_time import IMPORT_BUDGETS_MS, check
+
+
+@pytest.mark.parametrize("module", list(IMPORT_BUDGETS_MS))
+def test_import_within_budget(module):
+    result = check(module, repeat=5)
+    if result["skipped"]:
+        pytest.skip(f"{module}: {result['skipped']}")
+    assert not result["heavy_modules"], f"{module} carga {', '.join(result['heavy_modules'])} al importarse"
+    assert result["import_ms"] <= result["budget_ms"], (
+        f"{module}: {result['import_ms']} ms > presupuesto {result['budget_ms']:.0f} ms"
+    )
@@ -0,0 +1,99 @@
+"""Leases, caducidad y fencing de la cola de trabajos (infrastructure/job_queue.py) sobre SQLite"""
+import pytest
+
+from infrastructure import job_queue
+from infrastructure.job_queue import SQLiteJobQueue
+
+URLS = ["https://a.com", "https://b.com", "https://c.com"]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(job_queue, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    jobs = SQLiteJobQueue(str(tmp_path / "jobs.db"), lease_seconds=60, max_attempts=2)
+    jobs.enqueue("run", URLS)
+    yield jobs
+    jobs.close()
+
+
+def test_enqueue_is_idempotent(queue):
+    assert queue.enqueue("run", URLS + ["https://www.a.com/otra", "https://d.com"]) == 1
+    assert queue.size("run") == 4
+
+
+def test_each_job_is_leased_once_in_order(queue):
+    first = queue.lease("run", "w1", limit=2)
+    second = queue.lease("run", "w2", limit=2)
+    assert [job.domain for job in first] == ["a.com", "b.com"]
+    assert [job.domain for job in second] == ["c.com"]
+    assert all(job.attempts == 1 for job in first + second)
+    assert queue.lease("run", "w3") == []
+    assert queue.progress("run")["leased"] == 3
+
+
+def test_expired_lease_is_taken_over_and_the_old_owner_is_fenced(queue, clock):
+    [job] = queue.lease("run", "w1")
+    assert queue.checkpoint("run", job.domain, "w1", "extraction", {"name": "A"})
+
+    clock.now += 61
+    [retry] = queue.lease("run", "w2")
+    assert (retry.domain, retry.attempts, retry.phase) == (job.domain, 2, "extraction")
+
+    # w1 perdió el lease: no puede escribir checkpoints, renovar ni cerrar el job
+    assert not queue.checkpoint("run", job.domain, "w1", "scoring", {"x": 1})
+    assert queue.extend("run", "w1", [job.domain]) == [job.domain]
+    assert not queue.complete("run", job.domain, "w1", competitor_id=1)
+    assert not queue.fail("run", job.domain, "w1", "tarde")
+
+    assert queue.load_checkpoint("run", job.domain, "extraction") == {"name": "A"}
+    assert queue.load_checkpoint("run", job.domain, "scoring") is None
+    assert queue.complete("run", job.domain, "w2", competitor_id=7)
+    assert queue.load_checkpoint("run", job.domain, "extraction") is None
+    assert queue.progress("run")["done"] == 1
+
+
+def test_extend_keeps_the_lease_alive(queue, clock):
+    [job] = queue.lease("run", "w1")
+    clock.now += 50
+    assert queue.extend("run", "w1", [job.domain]) == []
+    clock.now += 50
+    assert [j.domain for j in queue.lease("run", "w2", limit=3)] == ["b.com", "c.com"]
+
+
+def test_lease_expiring_on_the_last_attempt_fails_the_job(queue, clock):
+    for owner in ("w1", "w2"):
+        assert queue.lease("run", owner)[0].domain == "a.com"
+        clock.now += 61
+    assert [job.domain for job in queue.lease("run", "w3")] == ["b.com"]
+    assert queue.failures("run") == [("a.com", None, 2, "lease caducado")]
+
+
+def test_release_and_reclaim_return_jobs_without_losing_attempts(queue):
+    jobs = queue.lease("run", "w1", limit=3)
+    queue.release("run", "w1", [jobs[0].domain])
+    assert queue.reclaim("run", "w1") == 2
+    again = queue.lease("run", "w2", limit=3)
+    assert [(job.domain, job.attempts) for job in again] == [("a.com", 1), ("b.com", 2), ("c.com", 2)]
+
+
+def test_enqueue_retries_failed_jobs_with_attempts_left(queue):
+    [job] = queue.lease("run", "w1")
+    assert queue.fail("run", job.domain, "w1", "timeout")
+    assert queue.progress("run")["failed"] == 1
+    queue.enqueue("run", URLS)
+    assert queue.progress("run")["failed"] == 0
+    assert queue.lease("run", "w2")[0].domain == "a.com"
@@ -0,0 +1,67 @@
+"""Validación de la respuesta del scoring en una llamada (MultiAttributeScoringService._parse)"""
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from domain.attributes import ATTRIBUTE_CODES
+from services.multi_attribute_scoring_service import MultiAttributeScoringService
+
+SOURCES = {"https://www.hotel.com/pricing/", "https://hotel.com/integraciones", "http://blog.hotel.com/"}
+
+
+def _response(**overrides) -> str:
+    attributes = [{"code": code, "score": 0.5, "evidence_urls": [], "justification": "-"} for code in ATTRIBUTE_CODES]
+    for item in attributes:
+        item.update(overrides.get(item["code"], {}))
+    return "```json\n" + json.dumps({"attributes": attributes}) + "\n```"
+
+
+@pytest.fixture
+def service():
+    return MultiAttributeScoringService()
+
+
+def test_cited_urls_match_sources_by_url_key(service):
+    text = _response(
+        price_competitiveness={"score": 0.8, "evidence_urls": [
+            "https://hotel.com/pricing", "http://www.hotel.com/pricing/", "https://hotel.com/pricing#planes",
+        ]},
+        integration_capabilities={"score": 0.6, "evidence_urls": ["https://hotel.com/integraciones/"]},
+        brand_sentiment={"score": 0.7, "evidence_urls": ["https://blog.hotel.com"]},
+    )
+    scores = service._parse(text, list(ATTRIBUTE_CODES), SOURCES)
+    # Se guarda la URL tal como figura en las fuentes, una sola vez
+    assert scores["price_competitiveness"].evidence_urls == ["https://www.hotel.com/pricing/"]
+    assert scores["price_competitiveness"].raw_score == 0.8
+    assert scores["integration_capabilities"].evidence_urls == ["https://hotel.com/integraciones"]
+    assert scores["brand_sentiment"].evidence_urls == ["http://blog.hotel.com/"]
+
+
+def test_scores_without_valid_evidence_are_null(service):
+    text = _response(
+        price_competitiveness={"score": 0.9, "evidence_urls": ["https://otro.com/pricing", "https://hotel.com/precios"]},
+        market_reach={"score": 0.4},
+    )
+    scores = service._parse(text, list(ATTRIBUTE_CODES), SOURCES)
+    assert scores["price_competitiveness"].raw_score is None
+    assert scores["price_competitiveness"].evidence_urls == []
+    assert all(score.raw_score is None for score in scores.values())
+
+
+def test_subset_only_requires_requested_codes(service):
+    text = json.dumps({"attributes": [
+        {"code": "market_reach", "score": 0.3, "evidence_urls": ["https://hotel.com/integraciones"]},
+    ]})
+    scores = service._parse(text, ["market_reach"], SOURCES)
+    assert list(scores) == ["market_reach"]
+    assert scores["market_reach"].raw_score == 0.3
+
+
+def test_missing_codes_and_invalid_items_are_rejected(service):
+    with pytest.raises(ValueError, match="faltan atributos"):
+        service._parse(json.dumps({"attributes": []}), ["market_reach"], SOURCES)
+    with pytest.raises(ValidationError):
+        service._parse(_response(market_reach={"score": 1.5}), list(ATTRIBUTE_CODES), SOURCES)
+    with pytest.raises(ValidationError):
+        service._parse(json.dumps({"attributes": [{"code": "inventado", "score": 0.1}]}), ["market_reach"], SOURCES)
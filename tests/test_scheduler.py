@@ -0,0 +1,102 @@
+"""Token buckets, concurrencia y presupuestos del scheduler (infrastructure/scheduler.py)"""
+import pytest
+
+from infrastructure import scheduler as scheduler_module
+from infrastructure.scheduler import BATCH, INTERACTIVE, BudgetExceeded, Gate, Scheduler, Scope, current_scope, scope
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(scheduler_module, "time", clock)
+    return clock
+
+
+def test_request_bucket_refills_at_rpm(clock):
+    gate = Gate("llm:test", rpm=60, tpm=0, max_concurrency=10, reserve=0)
+    for _ in range(60):
+        assert gate._try_acquire(0, INTERACTIVE) == 0
+        gate.in_flight -= 1
+    assert gate._try_acquire(0, INTERACTIVE) == pytest.approx(1.0)
+    clock.now += 1
+    assert gate._try_acquire(0, INTERACTIVE) == 0
+
+
+def test_token_bucket_waits_and_refunds_overestimates(clock):
+    gate = Gate("llm:test", rpm=0, tpm=6000, max_concurrency=10, reserve=0)
+    permit = gate.acquire(tokens=5000)
+    assert gate._try_acquire(2000, INTERACTIVE) == pytest.approx(10.0)
+    # Se estimaron 5000 y se usaron 1000: vuelven 4000 al bucket
+    permit.release(latency=0.1, tokens_used=1000)
+    assert gate._try_acquire(2000, INTERACTIVE) == 0
+
+
+def test_concurrency_reserve_and_interactive_priority(clock):
+    gate = Gate("llm:test", rpm=0, tpm=0, max_concurrency=4, reserve=0.25)
+    assert gate.capacity(INTERACTIVE) == 4
+    assert gate.capacity(BATCH) == 3
+    for _ in range(3):
+        assert gate._try_acquire(0, BATCH) == 0
+    assert gate._try_acquire(0, BATCH) > 0
+    assert gate._try_acquire(0, INTERACTIVE) == 0
+    assert gate._try_acquire(0, INTERACTIVE) > 0
+
+    gate.in_flight = 0
+    gate.waiting[INTERACTIVE] = 1
+    assert gate._try_acquire(0, BATCH) > 0
+
+
+def test_throttle_halves_limit_and_pauses(clock):
+    gate = Gate("llm:test", rpm=0, tpm=0, max_concurrency=8, reserve=0)
+    permit = gate.acquire()
+    permit.release(throttled=True, retry_after=5)
+    assert gate.limit == 4
+    assert gate._try_acquire(0, INTERACTIVE) == pytest.approx(5.0)
+    clock.now += 5
+    assert gate._try_acquire(0, INTERACTIVE) == 0
+
+
+@pytest.fixture
+def budgets(monkeypatch):
+    monkeypatch.setenv("BUDGET_DOMAIN_TOKENS", "1000")
+    monkeypatch.setenv("BUDGET_RUN_TOKENS", "0")
+    monkeypatch.setenv("BUDGET_DEGRADE_AT", "0.8")
+    return Scheduler()
+
+
+def test_domain_budget_degrades_then_rejects(budgets):
+    a = Scope(lane=BATCH, run="r1", domain="a.com")
+    b = Scope(lane=BATCH, run="r1", domain="b.com")
+    budgets.charge("scoring", "ollama", "llama3.1:8b", 700, 100, a)
+    assert not budgets.allows("insights", a)
+    assert budgets.allows("scoring", a)
+    assert budgets.allows("insights", b)
+
+    budgets.charge("scoring", "ollama", "llama3.1:8b", 150, 50, a)
+    assert not budgets.allows("scoring", a)
+    with pytest.raises(BudgetExceeded):
+        budgets.check_budget("scoring", a)
+
+    budgets.forget("r1", "a.com")
+    assert budgets.allows("scoring", a)
+
+
+def test_run_budget_counts_cost(monkeypatch):
+    monkeypatch.setenv("BUDGET_RUN_COST_USD", "0.01")
+    monkeypatch.setenv("LLM_PRICES", "modelo-test=10:10")
+    scheduler = Scheduler()
+    with scope(lane=BATCH, run="r1", domain="a.com"):
+        assert current_scope() == Scope(lane=BATCH, run="r1", domain="a.com")
+        assert scheduler.charge("scoring", "openai", "modelo-test", 500, 500) == pytest.approx(0.01)
+        assert not scheduler.allows("scoring")
+    assert scheduler.allows("scoring")
+    assert scheduler.charge("scoring", "ollama", "modelo-test", 500, 500) == 0.0
+    assert scheduler.run_budget("r1").snapshot()["usage"] == pytest.approx(1.0)
@@ -0,0 +1,68 @@
+"""Serialización JSON con tipos (infrastructure/serialization.py)"""
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import pytest
+
+from infrastructure.serialization import dumps, loads, register_type
+
+
+@register_type
+@dataclass
+class _Score:
+    code: str
+    raw_score: Optional[float]
+    evidence_urls: List[str] = field(default_factory=list)
+
+
+@register_type
+class _Plain:
+    pass
+
+
+class _Unregistered:
+    def __init__(self, name):
+        self.name = name
+        self.scores: Dict[str, _Score] = {}
+
+
+def test_round_trip_keeps_types():
+    payload = {
+        "score": _Score("price_competitiveness", 0.5, ["https://a.com/pricing"]),
+        "urls": {"https://a.com", "https://b.com"},
+        "pair": (1, "x"),
+        "blob": b"\x00\xff",
+        "at": datetime(2026, 1, 1, tzinfo=timezone.utc),
+        "data": SimpleNamespace(name="A", servicios=["pms"]),
+    }
+    restored = loads(dumps(payload))
+    assert restored == payload
+
+
+def test_unregistered_objects_load_as_namespaces():
+    obj = _Unregistered("A")
+    obj.scores["x"] = _Score("x", None)
+    restored = loads(dumps(obj))
+    assert isinstance(restored, SimpleNamespace)
+    assert restored.name == "A"
+    assert restored.scores["x"] == _Score("x", None)
+
+
+@pytest.mark.parametrize("payload", [
+    # Clase del proyecto fuera del registro: el constructor crearía el fichero
+    {"__type__": "infrastructure.job_queue:SQLiteJobQueue", "fields": {"path": "{tmp}/evil/jobs.db"}},
+    {"__type__": "os:system", "fields": {"command": "true"}},
+    {"__type__": "subprocess:Popen", "attrs": {}},
+    # Clase registrada por una vía que no es la suya
+    {"__type__": f"{__name__}:_Plain", "fields": {}},
+    {"__type__": f"{__name__}:_Score", "model": {"code": "x"}},
+    {"__type__": f"{__name__}:_Score", "attrs": {"code": "x"}},
+])
+def test_hostile_payloads_are_rejected(tmp_path, payload):
+    blob = json.dumps(payload).replace("{tmp}", str(tmp_path)).encode("utf-8")
+    with pytest.raises(ValueError):
+        loads(blob)
+    assert not (tmp_path / "evil").exists()
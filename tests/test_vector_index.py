@@ -0,0 +1,89 @@
+"""Inserción, reemplazo, borrado y persistencia del índice vectorial (infrastructure/vector_index.py)"""
+import numpy as np
+import pytest
+
+from infrastructure.vector_index import VectorIndex
+
+DIM = 8
+
+
+def _unit(i: int) -> np.ndarray:
+    vector = np.zeros(DIM, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = VectorIndex(dimension=DIM, index_dir=str(tmp_path / "index"), train_size=1000)
+    index.add(
+        ["a", "b", "c"],
+        np.stack([_unit(0), _unit(1), _unit(2)]),
+        context_types=["pricing", "features", "pricing"],
+        domains=["a.com", "b.com", "c.com"],
+        payloads=[{"text": "A"}, {"text": "B"}, {"text": "C"}],
+    )
+    return index
+
+
+def test_search_returns_nearest_with_metadata(index):
+    [hit] = index.search(_unit(1), k=1)
+    assert (hit.doc_id, hit.context_type, hit.domain, hit.payload) == ("b", "features", "b.com", {"text": "B"})
+    assert hit.similarity == pytest.approx(1.0)
+    assert {h.doc_id for h in index.search(_unit(1), k=3, context_type="pricing")} == {"a", "c"}
+    assert index.search(_unit(0), k=3, domain="otro.com") == []
+
+
+def test_add_with_existing_doc_id_replaces_it(index):
+    index.add(["a"], _unit(3)[None, :], context_types=["pricing"], domains=["a.com"], payloads=[{"text": "A2"}])
+    assert len(index) == 3
+    [hit] = index.search(_unit(3), k=1)
+    assert (hit.doc_id, hit.payload) == ("a", {"text": "A2"})
+    assert [h.doc_id for h in index.search(_unit(0), k=3, min_similarity=0.5)] == []
+
+
+def test_remove_drops_documents_from_results(index):
+    assert index.remove(["b", "desconocido"]) == 1
+    assert len(index) == 2
+    assert "b" not in {h.doc_id for h in index.search(_unit(1), k=3)}
+
+
+def test_rejects_wrong_dimension(index):
+    with pytest.raises(ValueError):
+        index.add(["x"], np.ones((1, DIM + 1)))
+
+
+@pytest.mark.parametrize("storage", ["float32", "float16", "int8"])
+def test_save_and_reload_keep_live_documents(tmp_path, storage):
+    index = VectorIndex(dimension=DIM, index_dir=str(tmp_path / storage), train_size=1000, storage=storage)
+    index.add([f"d{i}" for i in range(DIM)], np.eye(DIM), domains=[f"{i}.com" for i in range(DIM)])
+    index.add(["d0"], _unit(1)[None, :] + _unit(2)[None, :], domains=["0.com"])
+    index.remove(["d7"])
+    index.save()
+
+    reloaded = VectorIndex(dimension=DIM, index_dir=str(tmp_path / storage))
+    assert len(reloaded) == DIM - 1
+    assert reloaded.search(_unit(7), k=1, min_similarity=0.5) == []
+    [hit] = reloaded.search(_unit(3), k=1)
+    assert (hit.doc_id, hit.domain) == ("d3", "3.com")
+    assert hit.similarity == pytest.approx(1.0, abs=0.02)
+    # d0 se reemplazó: su vector es ahora (e1 + e2) / sqrt(2)
+    assert {h.doc_id for h in reloaded.search(_unit(1), k=2)} == {"d0", "d1"}
+
+    # Las inserciones tras cargar (memory-mapped) no pierden lo persistido
+    reloaded.add(["nuevo"], _unit(7)[None, :])
+    assert [h.doc_id for h in reloaded.search(_unit(7), k=1)] == ["nuevo"]
+    assert len(reloaded) == DIM
+
+
+def test_trained_index_survives_reload(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(400, DIM)).astype(np.float32)
+    index = VectorIndex(dimension=DIM, index_dir=str(tmp_path / "ivf"), train_size=100, nprobe=4)
+    index.add([str(i) for i in range(len(vectors))], vectors)
+    assert index._centroids is not None
+    index.save()
+
+    reloaded = VectorIndex(dimension=DIM, index_dir=str(tmp_path / "ivf"), nprobe=4)
+    for i in (0, 123, 399):
+        assert reloaded.search(vectors[i], k=1)[0].doc_id == str(i)